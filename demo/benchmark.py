@@ -0,0 +1,224 @@
+"""Benchmark of the leapctserver processing pipeline
+
+Simulates a raw cone-beam scan (see full_simulation.py) at one of several sizes, runs the standard pipeline
+(attenuation, outlier correction, ring removal, BHC, FBP, median filter, TV denoising) with a memory budget
+that is small enough to force the chunked (out-of-core) code paths, and writes the time, throughput, peak
+memory, and amount of file I/O of every stage to a json results file.
+
+Examples:
+    python benchmark.py --size medium --output results.json
+    python benchmark.py --size medium --baseline results.json --tolerance 0.1
+
+With --baseline, the results are compared with a previous results file and the script exits with status 1
+if any stage became slower, used more memory, or read or wrote more data than the tolerance allows.
+"""
+import sys
+import os
+import time
+import json
+import shutil
+import platform
+import argparse
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'leapctrails'))
+from leapctserver import leapctserver
+from memory_accountant import RSSSampler
+
+
+# Scan sizes of the benchmark
+# memory_fraction is the memory budget, as a fraction of the size of the projection data, beyond the
+# server's scratch space; values below 1 force the chunked code paths, None runs everything in memory
+SIZES = {
+    'small': {'numCols': 256, 'numRows': 32, 'memory_fraction': None},
+    'medium': {'numCols': 512, 'numRows': 64, 'memory_fraction': 0.5},
+    'outofcore': {'numCols': 1024, 'numRows': 256, 'memory_fraction': 0.25},
+}
+
+# The pipeline of the benchmark: (stage name, algorithm, keyword arguments)
+# Each stage is timed separately; the data of the projection stages is the projections, the rest is the volume
+PIPELINE = [
+    ('attenuation', 'makeAttenuationRadiographs', {}),
+    ('outlier', 'outlierCorrection', {}),
+    ('ring_removal', 'ringRemoval', {}),
+    ('BHC', 'singleMaterialBHC', {'material': 'water'}),
+    ('FBP', 'FBP', {}),
+    ('median', 'MedianFilter', {}),
+    ('TV', 'TVdenoising', {}),
+]
+PROJECTION_STAGES = ['attenuation', 'outlier', 'ring_removal', 'BHC', 'FBP']
+
+# Metrics compared with the baseline; a stage regresses if its value exceeds the baseline value by more than the tolerance
+COMPARED_METRICS = ['time', 'peak_rss', 'io_bytes']
+
+
+def simulate_dataset(dataPath, numCols, numRows, seed):
+    from full_simulation import simulate_scan
+    np.random.seed(seed)
+    simulate_scan(dataPath, numCols, numRows)
+
+def make_dataset(dataPath, numCols, numRows, seed=0):
+    """Simulates the scan of a benchmark size into dataPath, unless it is already there
+
+    The simulation holds the whole scan and phantom in memory, so it runs in its own process
+    to keep it out of the peak memory measured by the benchmark.
+    """
+    if os.path.isfile(os.path.join(dataPath, 'geometry.txt')) and os.path.isfile(os.path.join(dataPath, 'air.tif')):
+        return True
+    print('simulating ' + str(numRows) + ' x ' + str(numCols) + ' scan in ' + str(dataPath))
+    process = multiprocessing.get_context('spawn').Process(target=simulate_dataset, args=(dataPath, numCols, numRows, seed))
+    process.start()
+    process.join()
+    return process.exitcode == 0
+
+
+def set_up_server(dataPath, outputDir, memory_fraction=None, max_memory=None):
+    """Returns a leapctserver of the benchmark scan with its memory budget"""
+    lctserver = leapctserver(None, dataPath, outputDir)
+    lctserver.set_raw_data_files('raw.tif', 'air.tif', 'dark.tif')
+    lctserver.geometry_file = 'geometry.txt'
+    lctserver.load_geometry_file()
+    lctserver.set_source_spectra(160.0)
+    lctserver.set_object_model('water')
+    if max_memory is not None:
+        lctserver.max_CPU_memory_usage = max_memory
+    elif memory_fraction is not None:
+        lctserver.max_CPU_memory_usage = lctserver.scratch_space + memory_fraction*lctserver.projection_memory()
+    return lctserver
+
+
+def flux_ROI(lctserver):
+    """Region of the detector [first row, last row, first column, last column] outside the shadow of the phantom"""
+    numRows = lctserver.leapct.get_numRows()
+    numCols = lctserver.leapct.get_numCols()
+    return [1, max(1, numRows//2-1), 1, max(2, numCols//50)]
+
+
+def run_pipeline(lctserver):
+    """Runs the benchmark pipeline, returning the measurements of each stage or None if a stage failed"""
+    stages = []
+    for name, algorithmName, kwargs in PIPELINE:
+        kwargs = dict(kwargs)
+        if algorithmName == 'makeAttenuationRadiographs':
+            kwargs['ROI'] = flux_ROI(lctserver)
+        if name in PROJECTION_STAGES:
+            data_size = lctserver.projection_memory()
+        else:
+            data_size = lctserver.volume_memory()
+        lctserver.profiler.clear()
+        sampler = RSSSampler()
+        sampler.start()
+        time_start = time.perf_counter()
+        retVal = getattr(lctserver, algorithmName)(**kwargs)
+        elapsed = time.perf_counter() - time_start
+        peak_rss = sampler.stop()
+        if retVal == False:
+            print('Error: ' + str(name) + ' failed')
+            return None
+        summary = lctserver.profiler.summary()
+        io_bytes = 0
+        for span in summary['stages']:
+            if span['stage'] == 'read' or span['stage'] == 'write':
+                io_bytes += span['bytes']
+        # peak_rss is the largest resident memory of the process sampled during this stage
+        stage = {'name': name, 'algorithm': algorithmName, 'time': elapsed, 'data_size': data_size,
+                 'throughput': data_size / elapsed if elapsed > 0.0 else 0.0,
+                 'peak_rss': peak_rss, 'io_bytes': io_bytes, 'chunk_size': lctserver.chunk_size,
+                 'spans': summary['stages']}
+        print(name + ': ' + str(round(elapsed, 3)) + ' sec, ' + str(round(stage['throughput'], 3)) + ' GB/sec, ' + str(round(float(io_bytes)/2.0**30, 3)) + ' GB of I/O')
+        stages.append(stage)
+    return stages
+
+
+def run_benchmark(size, workDir, repeats=1, max_memory=None, keep=False):
+    """Runs the benchmark pipeline repeats times on the scan of the given size
+
+    Returns:
+        dictionary of the results, with the fastest time of each stage over the repeats
+    """
+    preset = SIZES[size]
+    dataPath = os.path.join(workDir, size)
+    if make_dataset(dataPath, preset['numCols'], preset['numRows']) == False:
+        print('Error: failed to simulate the scan')
+        return None
+
+    results = {'size': size, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'repeats': repeats,
+               'platform': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__,
+               'cpu_count': os.cpu_count(), 'stages': None}
+    for n in range(repeats):
+        outputDir = 'benchmark_' + str(n)
+        if os.path.isdir(os.path.join(dataPath, outputDir)):
+            shutil.rmtree(os.path.join(dataPath, outputDir))
+        lctserver = set_up_server(dataPath, outputDir, preset['memory_fraction'], max_memory)
+        lctserver.profiler.enable()
+        results['shape'] = [lctserver.leapct.get_numAngles(), lctserver.leapct.get_numRows(), lctserver.leapct.get_numCols()]
+        results['projection_memory'] = lctserver.projection_memory()
+        results['volume_memory'] = lctserver.volume_memory()
+        results['max_CPU_memory_usage'] = lctserver.max_CPU_memory_usage
+        stages = run_pipeline(lctserver)
+        if keep == False:
+            shutil.rmtree(os.path.join(dataPath, outputDir), ignore_errors=True)
+        if stages is None:
+            return None
+        if results['stages'] is None:
+            results['stages'] = stages
+        else:
+            for best, stage in zip(results['stages'], stages):
+                if stage['time'] < best['time']:
+                    best.update(stage)
+    results['total_time'] = sum([stage['time'] for stage in results['stages']])
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.1):
+    """Returns the list of regressions (as strings) of results with respect to a baseline results file"""
+    regressions = []
+    if baseline.get('size') != results.get('size') or baseline.get('shape') != results.get('shape'):
+        print('Warning: the baseline was measured on a different scan size')
+    baseline_stages = {}
+    for stage in baseline.get('stages', []):
+        baseline_stages[stage['name']] = stage
+    for stage in results['stages']:
+        reference = baseline_stages.get(stage['name'], None)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in reference or reference[metric] <= 0:
+                continue
+            ratio = float(stage[metric]) / float(reference[metric])
+            if ratio > 1.0 + tolerance:
+                regressions.append(stage['name'] + ' ' + metric + ': ' + str(round(float(reference[metric]), 4)) + ' -> ' + str(round(float(stage[metric]), 4)) + ' (' + str(round(100.0*(ratio-1.0), 1)) + '% worse)')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the leapctserver processing pipeline')
+    parser.add_argument('--size', default='medium', choices=list(SIZES.keys()), help='size of the simulated scan')
+    parser.add_argument('--workdir', default=os.path.join(os.path.abspath(os.path.dirname(__file__)), 'benchmark_data'), help='folder of the simulated scans')
+    parser.add_argument('--memory', type=float, default=None, help='memory budget (GB) of the server, overrides the budget of the size')
+    parser.add_argument('--repeats', type=int, default=1, help='number of runs; the fastest time of each stage is reported')
+    parser.add_argument('--output', default='benchmark_results.json', help='results file')
+    parser.add_argument('--baseline', default=None, help='results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative increase of each metric over the baseline')
+    parser.add_argument('--keep', action='store_true', help='keep the output of the pipeline')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.size, args.workdir, max(1, args.repeats), args.memory, args.keep)
+    if results is None:
+        sys.exit(2)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('total: ' + str(round(results['total_time'], 3)) + ' sec, results written to ' + str(args.output))
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print('Regressions with respect to ' + str(args.baseline) + ':')
+            for regression in regressions:
+                print('    ' + regression)
+            sys.exit(1)
+        print('no regressions with respect to ' + str(args.baseline))
+    sys.exit(0)
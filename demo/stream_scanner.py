@@ -0,0 +1,93 @@
+"""Stand-in for a scanner that writes its projections one at a time, to try streaming reconstruction
+
+Copies the air scan, dark scan, and geometry of a raw scan (e.g., from full_simulation.py) into a watch folder
+and then copies the projections of the scan into it one by one at a given frame rate, the way an acquisition
+would write them.  Every projection is written to a temporary file first and then renamed, so a reader never
+sees a partly written projection.
+
+Examples:
+    python stream_scanner.py sample_data stream_data --fps 20
+    python stream_scanner.py sample_data stream_data --fps 20 --reconstruct
+
+With --reconstruct, the scan in the watch folder is reconstructed by leapctserver.stream_reconstruction while
+it is being written.
+"""
+import sys
+import os
+import glob
+import time
+import shutil
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'leapctrails'))
+
+
+def projection_files(dataPath, raw_file='raw.tif'):
+    """Returns the files of the raw projection sequence in dataPath, in sequence order"""
+    baseName, extension = os.path.splitext(raw_file)
+    return sorted(glob.glob(os.path.join(dataPath, baseName + '_*' + extension)))
+
+
+def write_scan(dataPath, watchPath, fps=10.0, raw_file='raw.tif', start_delay=1.0):
+    """Writes the raw scan of dataPath into watchPath at fps projections per second"""
+    if os.path.isdir(watchPath) == False:
+        os.makedirs(watchPath)
+    for fileName in ['air.tif', 'dark.tif', 'geometry.txt']:
+        shutil.copyfile(os.path.join(dataPath, fileName), os.path.join(watchPath, fileName))
+    files = projection_files(dataPath, raw_file)
+    if len(files) == 0:
+        print('Error: no projections of ' + str(raw_file) + ' in ' + str(dataPath))
+        return False
+    time.sleep(start_delay)
+    time_start = time.perf_counter()
+    for n in range(len(files)):
+        newFile = os.path.join(watchPath, os.path.basename(files[n]))
+        shutil.copyfile(files[n], newFile + '.part')
+        os.replace(newFile + '.part', newFile)
+        delay = time_start + float(n+1)/fps - time.perf_counter()
+        if delay > 0.0:
+            time.sleep(delay)
+    print('scanner: wrote ' + str(len(files)) + ' projections in ' + str(round(time.perf_counter() - time_start, 3)) + ' sec')
+    return True
+
+
+def reconstruct(watchPath, batch_size, ROI):
+    """Reconstructs the scan in watchPath while it is being written"""
+    from leapctserver import leapctserver
+    lctserver = leapctserver(None, watchPath, 'stream')
+    lctserver.set_raw_data_files('raw.tif', 'air.tif', 'dark.tif')
+    lctserver.geometry_file = 'geometry.txt'
+    while os.path.isfile(os.path.join(watchPath, 'geometry.txt')) == False:
+        time.sleep(0.1)
+    lctserver.load_geometry_file()
+
+    time_start = time.perf_counter()
+    report = lambda f, numReceived: print('reconstruction: ' + str(numReceived) + ' projections after ' + str(round(time.perf_counter() - time_start, 3)) + ' sec')
+    retVal = lctserver.stream_reconstruction(batch_size, ROI, callback=report)
+    if retVal:
+        lctserver.save_volume(update_params=True)
+        print('reconstruction finished ' + str(round(time.perf_counter() - time_start, 3)) + ' sec after it started')
+    return retVal
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a raw scan into a watch folder one projection at a time')
+    parser.add_argument('data', help='folder of the raw scan (raw.tif, air.tif, dark.tif, and geometry.txt)')
+    parser.add_argument('watch', help='watch folder the projections are written to')
+    parser.add_argument('--fps', type=float, default=10.0, help='projections written per second')
+    parser.add_argument('--reconstruct', action='store_true', help='reconstruct the scan while it is written')
+    parser.add_argument('--batch', type=int, default=8, help='number of projections reconstructed together')
+    parser.add_argument('--ROI', type=int, nargs=4, default=None, help='flux normalization region: first row, last row, first column, last column')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.watch):
+        shutil.rmtree(args.watch)
+    if args.reconstruct:
+        scanner = multiprocessing.get_context('spawn').Process(target=write_scan, args=(args.data, args.watch, args.fps))
+        scanner.start()
+        retVal = reconstruct(args.watch, args.batch, args.ROI)
+        scanner.join()
+        sys.exit(0 if retVal else 1)
+    else:
+        sys.exit(0 if write_scan(args.data, args.watch, args.fps) else 1)
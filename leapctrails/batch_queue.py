@@ -0,0 +1,290 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# batch_queue
+# Reconstructs a batch of scans (each given by a leapctserver parameter file)
+# concurrently on a pool of worker processes, admitting scans so that the
+# sum of their memory budgets fits in one overall memory budget
+#
+# Usage: python batch_queue.py [--memory GB] [--workers N] [--pipeline a,b,c]
+#                              [--report file.json] params1.txt params2.txt ...
+################################################################################
+import os
+import sys
+import time
+import multiprocessing
+from chunk_manifest import atomic_write_json
+
+
+DEFAULT_PIPELINE = ['makeAttenuationRadiographs', 'FBP']
+
+
+def parse_pipeline(pipeline):
+    """Converts a list of algorithm names or (name, keyword arguments) pairs to a list of (name, dict) pairs"""
+    if pipeline is None:
+        pipeline = DEFAULT_PIPELINE
+    retVal = []
+    for step in pipeline:
+        if isinstance(step, str):
+            retVal.append((step, {}))
+        else:
+            retVal.append((step[0], dict(step[1])))
+    return retVal
+
+def estimate_peak_memory(lctserver, pipeline):
+    """Returns the peak memory (GB) of running a pipeline fully in memory on the data described by lctserver
+
+    The memory of each algorithm is the number of projection and volume sized arrays that leapctserver plans
+    its chunks with (see leapctserver.memory_multiples); unknown algorithms are assumed to hold one of each.
+    """
+    projection_memory = lctserver.projection_memory()
+    volume_memory = lctserver.volume_memory()
+    peak = 0.0
+    for name, kwargs in parse_pipeline(pipeline):
+        multiples = lctserver.memory_multiples(name, **kwargs)
+        if multiples is None:
+            multiples = (1, 1)
+        num_proj, num_vol = multiples
+        peak = max(peak, num_proj*projection_memory + num_vol*volume_memory)
+    return peak
+
+def run_batch_job(parameter_file, pipeline, max_CPU_memory_usage, outputDir=None):
+    """Runs a pipeline of leapctserver algorithms on one scan; this is the function that the worker processes run
+
+    Args:
+        parameter_file (str): the leapctserver parameter file of the scan
+        pipeline (list): list of (algorithm name, keyword arguments) pairs
+        max_CPU_memory_usage (float): the memory budget (GB) of the leapctserver
+        outputDir (str): the output folder (relative to the scan's path), if None a new folder is created
+
+    Returns:
+        dictionary with the success, timing, and output folder of the job
+    """
+    time_start = time.time()
+    result = {'parameter_file': parameter_file, 'success': False, 'steps': [], 'error': None, 'outputDir': None}
+    try:
+        from leapctserver import leapctserver
+        lctserver = leapctserver(outputDir=outputDir)
+        lctserver.load_parameters(parameter_file)
+        lctserver.max_CPU_memory_usage = max_CPU_memory_usage
+        for name, kwargs in pipeline:
+            if name == 'makeAttenuationRadiographs' and lctserver.data_type == lctserver.ATTENUATION:
+                continue
+            algorithm = getattr(lctserver, name, None)
+            if algorithm is None:
+                result['error'] = 'unknown algorithm ' + str(name)
+                break
+            step_start = time.time()
+            if algorithm(**kwargs) == False:
+                result['error'] = str(name) + ' failed'
+                break
+            result['steps'].append({'algorithm': name, 'time': time.time() - step_start})
+        if result['error'] is None:
+            # Algorithms that ran in memory leave their output in g or f
+            if lctserver.f is not None:
+                lctserver.save_volume(update_params=True)
+            elif lctserver.g is not None:
+                lctserver.save_projection_angles(update_params=True)
+            lctserver.save_parameters()
+            result['outputDir'] = os.path.join(lctserver.path, lctserver.outputDir)
+            result['success'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    result['time'] = time.time() - time_start
+    return result
+
+
+class BatchJob:
+    """ One scan of a batch
+
+    :ivar parameter_file(str): the leapctserver parameter file of the scan
+    :ivar pipeline(list): list of (algorithm name, keyword arguments) pairs to run
+    :ivar outputDir(str): the output folder (relative to the scan's path), None for a new folder
+    :ivar peak_memory(float): estimated peak memory (GB) of running the pipeline fully in memory
+    :ivar memory(float): the memory (GB) reserved for the job, including the process overhead
+    :ivar status(str): pending, running, done, or failed
+    :ivar result(dict): the value returned by run_batch_job
+    """
+    def __init__(self, parameter_file, pipeline, outputDir=None):
+        self.parameter_file = parameter_file
+        self.pipeline = pipeline
+        self.outputDir = outputDir
+        self.peak_memory = 0.0
+        self.memory = 0.0
+        self.status = 'pending'
+        self.result = None
+
+
+class BatchQueue:
+    """ Reconstructs a batch of scans on a pool of worker processes under one memory budget
+
+    Each job is reserved the memory its pipeline needs to run fully in memory (capped at max_job_memory,
+    in which case leapctserver processes it in chunks within that budget) plus a fixed process overhead.
+    Whenever a worker is free, the largest pending job whose reservation fits in the memory not reserved
+    by running jobs is started (best-fit bin packing), so many small scans run side by side while a large
+    scan waits until enough memory is free.  Every job runs in a new process.
+
+    :ivar max_memory(float): total memory (GB) that the running jobs may reserve
+    :ivar numWorkers(int): maximum number of jobs that run at the same time
+    :ivar max_job_memory(float): maximum memory (GB) reserved for one job
+    :ivar min_job_memory(float): minimum memory (GB) given to leapctserver for one job
+    :ivar process_overhead(float): memory (GB) reserved per job for the python process and LEAP
+    :ivar jobs(list): the BatchJob objects in the order they were added
+    """
+    def __init__(self, max_memory=None, numWorkers=None, max_job_memory=None, min_job_memory=1.0, process_overhead=0.5):
+        if max_memory is None:
+            try:
+                import psutil
+                max_memory = 0.8*psutil.virtual_memory().total/2**30
+            except:
+                print('Error: cannot load psutil module which is used to calculate the total amount of CPU RAM!')
+                max_memory = 8.0
+        if numWorkers is None:
+            numWorkers = os.cpu_count()
+        self.max_memory = float(max_memory)
+        self.numWorkers = max(1, int(numWorkers))
+        if max_job_memory is None:
+            max_job_memory = self.max_memory
+        self.max_job_memory = min(float(max_job_memory), self.max_memory)
+        self.min_job_memory = float(min_job_memory)
+        self.process_overhead = float(process_overhead)
+        self.jobs = []
+        self.lctserver = None
+        self.time_start = None
+        self.time_end = None
+
+    def add(self, parameter_file, pipeline=None, outputDir=None):
+        """Adds a scan to the batch and estimates its memory budget
+
+        Args:
+            parameter_file (str): the leapctserver parameter file of the scan
+            pipeline (list): algorithm names or (name, keyword arguments) pairs, default is attenuation followed by FBP
+            outputDir (str): the output folder (relative to the scan's path), if None a new folder is created
+
+        Returns:
+            the new BatchJob
+        """
+        job = BatchJob(parameter_file, parse_pipeline(pipeline), outputDir)
+        if self.lctserver is None:
+            from leapctserver import leapctserver
+            self.lctserver = leapctserver()
+        else:
+            self.lctserver.clearAll()
+        self.lctserver.load_parameters(parameter_file)
+        job.peak_memory = estimate_peak_memory(self.lctserver, job.pipeline)
+        job.memory = min(self.max_memory, self.process_overhead + min(self.max_job_memory, max(self.min_job_memory, job.peak_memory)))
+        self.jobs.append(job)
+        return job
+
+    def next_job(self, memory_free):
+        """Returns the pending job with the largest reservation that fits in memory_free, None if no job fits"""
+        retVal = None
+        for job in self.jobs:
+            if job.status == 'pending' and job.memory <= memory_free:
+                if retVal is None or job.memory > retVal.memory:
+                    retVal = job
+        return retVal
+
+    def run(self, reportFile=None, poll_interval=1.0):
+        """Runs all pending jobs and returns True if all of them succeeded
+
+        Args:
+            reportFile (str): if given, a json report of the jobs and throughput is written here after every job
+            poll_interval (float): seconds between checks for finished jobs
+        """
+        self.time_start = time.time()
+        self.time_end = None
+        running = []
+        memory_used = 0.0
+        pool = multiprocessing.get_context('spawn').Pool(processes=self.numWorkers, maxtasksperchild=1)
+        try:
+            while True:
+                while len(running) < self.numWorkers:
+                    job = self.next_job(self.max_memory - memory_used)
+                    if job is None:
+                        break
+                    job.status = 'running'
+                    memory_used += job.memory
+                    print('starting ' + str(job.parameter_file) + ' (' + str(round(job.memory, 2)) + ' GB)')
+                    running.append((job, pool.apply_async(run_batch_job, (job.parameter_file, job.pipeline, job.memory - self.process_overhead, job.outputDir))))
+                if len(running) == 0:
+                    break
+
+                time.sleep(poll_interval)
+                stillRunning = []
+                for job, asyncResult in running:
+                    if asyncResult.ready() == False:
+                        stillRunning.append((job, asyncResult))
+                        continue
+                    memory_used -= job.memory
+                    try:
+                        job.result = asyncResult.get()
+                    except Exception as e:
+                        job.result = {'parameter_file': job.parameter_file, 'success': False, 'error': str(e)}
+                    if job.result['success']:
+                        job.status = 'done'
+                        print('finished ' + str(job.parameter_file) + ' in ' + str(round(job.result['time'], 1)) + ' sec (' + str(round(self.scans_per_hour(), 1)) + ' scans per hour)')
+                    else:
+                        job.status = 'failed'
+                        print('Error: ' + str(job.parameter_file) + ' failed: ' + str(job.result['error']))
+                    if reportFile is not None:
+                        self.save_report(reportFile)
+                running = stillRunning
+        finally:
+            pool.close()
+            pool.join()
+        self.time_end = time.time()
+        if reportFile is not None:
+            self.save_report(reportFile)
+        print(self.summary())
+        return all([job.status == 'done' for job in self.jobs])
+
+    def elapsed(self):
+        if self.time_start is None:
+            return 0.0
+        if self.time_end is None:
+            return time.time() - self.time_start
+        return self.time_end - self.time_start
+
+    def scans_per_hour(self):
+        """Returns the number of scans completed per hour since run started"""
+        elapsed = self.elapsed()
+        if elapsed <= 0.0:
+            return 0.0
+        return 3600.0 * float(len([job for job in self.jobs if job.status == 'done'])) / elapsed
+
+    def summary(self):
+        numDone = len([job for job in self.jobs if job.status == 'done'])
+        numFailed = len([job for job in self.jobs if job.status == 'failed'])
+        return str(numDone) + ' scans finished, ' + str(numFailed) + ' failed in ' + str(round(self.elapsed(), 1)) + ' sec (' + str(round(self.scans_per_hour(), 1)) + ' scans per hour)'
+
+    def save_report(self, fileName):
+        jobs = []
+        for job in self.jobs:
+            entry = {'parameter_file': job.parameter_file, 'pipeline': [name for name, kwargs in job.pipeline], 'peak_memory': job.peak_memory, 'memory': job.memory, 'status': job.status}
+            if job.result is not None:
+                entry.update({'time': job.result.get('time', None), 'steps': job.result.get('steps', []), 'error': job.result.get('error', None), 'outputDir': job.result.get('outputDir', None)})
+            jobs.append(entry)
+        data = {'max_memory': self.max_memory, 'numWorkers': self.numWorkers, 'elapsed': self.elapsed(), 'scans_per_hour': self.scans_per_hour(), 'jobs': jobs}
+        return atomic_write_json(fileName, data)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Reconstruct a batch of scans concurrently under one memory budget')
+    parser.add_argument('parameter_files', nargs='+', help='leapctserver parameter files, one per scan')
+    parser.add_argument('--memory', type=float, default=None, help='total memory budget (GB), default is 80%% of the CPU RAM')
+    parser.add_argument('--workers', type=int, default=None, help='maximum number of scans reconstructed at the same time')
+    parser.add_argument('--max_job_memory', type=float, default=None, help='maximum memory (GB) of one scan, larger scans are processed in chunks')
+    parser.add_argument('--pipeline', default=','.join(DEFAULT_PIPELINE), help='comma-separated list of leapctserver algorithms')
+    parser.add_argument('--report', default=None, help='json file where the job report is written')
+    args = parser.parse_args()
+
+    queue = BatchQueue(args.memory, args.workers, args.max_job_memory)
+    pipeline = [name.strip() for name in args.pipeline.split(',') if len(name.strip()) > 0]
+    for parameter_file in args.parameter_files:
+        job = queue.add(parameter_file, pipeline)
+        print(str(parameter_file) + ': estimated peak memory ' + str(round(job.peak_memory, 2)) + ' GB, reserved ' + str(round(job.memory, 2)) + ' GB')
+    sys.exit(0 if queue.run(args.report) else 1)
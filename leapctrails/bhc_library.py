@@ -0,0 +1,119 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# bhc_library
+# On-disk library of single-material beam hardening correction (BHC) lookup
+# tables, so that tables for spectra and materials that are used over and over
+# are only calculated once
+################################################################################
+import os
+import hashlib
+import numpy as np
+from chunk_manifest import atomic_write_json, read_json
+
+
+class BHCLibrary:
+    """ A folder of BHC lookup tables and an index file that describes them
+
+    Each table is stored as a float32 npz file whose name is the key of the table (see the key function).
+    The index file (bhc_index.json) maps each key to its file and to a human-readable description of the
+    spectra and material.  The index is only read when a table is first requested, and tables are only read
+    from disk when they are requested; once read they are kept in memory.
+
+    :ivar directory(str): full path of the folder where the library is stored
+    :ivar index(dict): maps keys to the description of each table, None until it is read
+    :ivar tables(dict): the tables that have been read from disk, maps keys to (BHC_LUT, T_lut) pairs
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = None
+        self.tables = {}
+
+    def index_file(self):
+        return os.path.join(self.directory, 'bhc_index.json')
+
+    def load_index(self):
+        if self.index is None:
+            self.index = read_json(self.index_file())
+            if self.index is None:
+                self.index = {}
+        return self.index
+
+    @staticmethod
+    def key(Es, s_total, material, mass_density, reference_energy):
+        """Returns the key of the BHC lookup table of a total system spectral response and material
+
+        Args:
+            Es (numpy array): energy bins (keV)
+            s_total (numpy array): total system spectral response at the energies Es
+            material (string or int): chemical formula or atomic number of the material
+            mass_density (float): mass density of the material (g/cm^3)
+            reference_energy (float): the energy (keV) that the data is corrected to
+
+        Returns:
+            string
+        """
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(Es, dtype=np.float32).tobytes())
+        h.update(np.ascontiguousarray(s_total, dtype=np.float32).tobytes())
+        h.update(str(material).encode('utf-8'))
+        h.update(('%.6g' % float(mass_density)).encode('utf-8'))
+        h.update(('%.6g' % float(reference_energy)).encode('utf-8'))
+        return h.hexdigest()[0:24]
+
+    def contains(self, key):
+        return key in self.tables or key in self.load_index()
+
+    def lookup(self, key):
+        """Returns the BHC lookup table and its sampling (BHC_LUT, T_lut) for the given key, or (None, None) if it is not in the library"""
+        if key in self.tables:
+            return self.tables[key]
+        entry = self.load_index().get(key, None)
+        if entry is None:
+            return None, None
+        fullPath = os.path.join(self.directory, entry['file'])
+        if os.path.isfile(fullPath) == False:
+            return None, None
+        try:
+            with np.load(fullPath) as data:
+                BHC_LUT = np.array(data['BHC_LUT'], dtype=np.float32)
+                T_lut = float(data['T_lut'])
+        except Exception as e:
+            print('Warning: failed to read ' + str(fullPath) + ': ' + str(e))
+            return None, None
+        self.tables[key] = (BHC_LUT, T_lut)
+        return BHC_LUT, T_lut
+
+    def store(self, key, BHC_LUT, T_lut, description=None):
+        """Adds a BHC lookup table to the library
+
+        Args:
+            key (string): the key of the table, see the key function
+            BHC_LUT (numpy array): the lookup table
+            T_lut (float): the sampling of the lookup table
+            description (dict): human-readable description of the spectra and material, stored in the index file
+
+        Returns:
+            True if successful, False otherwise
+        """
+        BHC_LUT = np.array(BHC_LUT, dtype=np.float32)
+        T_lut = float(T_lut)
+        self.tables[key] = (BHC_LUT, T_lut)
+        try:
+            if os.path.isdir(self.directory) == False:
+                os.makedirs(self.directory)
+            fileName = key + '.npz'
+            np.savez(os.path.join(self.directory, fileName), BHC_LUT=BHC_LUT, T_lut=T_lut)
+        except Exception as e:
+            print('Warning: failed to save BHC lookup table to ' + str(self.directory) + ': ' + str(e))
+            return False
+
+        # Another process may have added tables since the index was read
+        self.index = None
+        entry = {'file': fileName}
+        if description is not None:
+            entry.update(description)
+        self.load_index()[key] = entry
+        return atomic_write_json(self.index_file(), self.index)
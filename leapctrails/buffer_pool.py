@@ -0,0 +1,105 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# buffer_pool
+# A pool of preallocated float32 arrays that the chunk loops of leapctserver
+# reuse from one chunk to the next, instead of allocating (and page faulting
+# and zeroing) new arrays for every chunk
+################################################################################
+import threading
+import numpy as np
+
+
+def size_class(numElements):
+    """Returns the capacity (number of elements) of the size class that holds numElements
+
+    The classes are spaced by factors of 2^(1/4), so a new buffer is never more than 19% larger than the array it holds
+    """
+    numElements = max(1, int(numElements))
+    if numElements <= 4096:
+        return 4096
+    k = int(np.ceil(4.0*np.log2(float(numElements))))
+    capacity = int(np.ceil(2.0**(k/4.0)))
+    while capacity < numElements:
+        k += 1
+        capacity = int(np.ceil(2.0**(k/4.0)))
+    return capacity
+
+
+def base_array(x):
+    """Returns the array that owns the memory of x (x itself if it is not a view)"""
+    while isinstance(x, np.ndarray) and isinstance(x.base, np.ndarray):
+        x = x.base
+    return x
+
+
+class BufferPool:
+    """ Size-classed pool of float32 chunk buffers
+
+    acquire returns a C contiguous array of the requested shape that is a view of a pooled buffer; its
+    values are NOT initialized.  Give it back with release when the chunk is finished; the next acquire
+    of the same size class reuses it.  clear empties the pool, e.g., at the end of a chunked run.
+
+    :ivar free(dict): maps each size class to its list of buffers that are not in use
+    :ivar in_use(dict): maps the id of each buffer that was acquired and not released to the buffer
+    :ivar max_free_bytes(int): released buffers beyond this total size are freed instead of pooled
+    :ivar num_allocations(int): number of buffers allocated by the pool
+    :ivar num_reuses(int): number of acquires served by a pooled buffer
+    """
+    def __init__(self, max_free_bytes=2**34):
+        self.max_free_bytes = max_free_bytes
+        self.lock = threading.Lock()
+        self.free = {}
+        self.in_use = {}
+        self.num_allocations = 0
+        self.num_reuses = 0
+
+    def acquire(self, shape):
+        """Returns an uninitialized C contiguous float32 array of the given shape"""
+        shape = tuple([int(n) for n in shape])
+        numElements = int(np.prod(shape))
+        capacity = size_class(numElements)
+        with self.lock:
+            # reuse the smallest free buffer that is large enough, but not one more than twice the size
+            # needed, so that the last, shorter chunk of a run reuses the buffer of the previous chunk
+            buffer = None
+            for size in sorted(self.free.keys()):
+                if size >= capacity and size <= 2*capacity and len(self.free[size]) > 0:
+                    buffer = self.free[size].pop()
+                    self.num_reuses += 1
+                    break
+            if buffer is None:
+                buffer = np.empty(capacity, dtype=np.float32)
+                self.num_allocations += 1
+            self.in_use[id(buffer)] = buffer
+        return buffer[0:numElements].reshape(shape)
+
+    def release(self, x):
+        """Returns the buffer that x (an array returned by acquire, or a view of it) belongs to; arrays that are not from the pool are ignored"""
+        if x is None:
+            return
+        buffer = base_array(x)
+        with self.lock:
+            if self.in_use.pop(id(buffer), None) is None:
+                return
+            if self.free_bytes() + buffer.nbytes <= self.max_free_bytes:
+                self.free.setdefault(buffer.size, []).append(buffer)
+
+    def owns(self, x):
+        """Returns True if x is (a view of) a buffer that was acquired from the pool and not yet released"""
+        return id(base_array(x)) in self.in_use
+
+    def free_bytes(self):
+        return sum([buffer.nbytes for buffers in self.free.values() for buffer in buffers])
+
+    def total_bytes(self):
+        """Returns the memory (bytes) held by the pool, both in use and free"""
+        return self.free_bytes() + sum([buffer.nbytes for buffer in self.in_use.values()])
+
+    def clear(self):
+        """Frees the buffers that are not in use and stops tracking the ones that are (releasing them later does nothing)"""
+        with self.lock:
+            self.free = {}
+            self.in_use = {}
@@ -0,0 +1,388 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# chunk_manifest
+# Bookkeeping for the file sequences written by leapctserver: which index
+# ranges of an in-memory buffer have been modified since the last save,
+# which files on disk already hold the current data, and how far a chunked
+# operation has progressed
+################################################################################
+import os
+import re
+import json
+import zlib
+import numpy as np
+
+
+def atomic_write_json(fullPath, data):
+    """Writes a json file by first writing to a temporary file and then renaming it
+
+    This guarantees that readers either see the previous version of the file or the new version,
+    never a partially written file.
+    """
+    tempPath = fullPath + '.tmp'
+    try:
+        with open(tempPath, 'w') as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, fullPath)
+        return True
+    except Exception as e:
+        print('Error: failed to write ' + str(fullPath) + ': ' + str(e))
+        if os.path.isfile(tempPath):
+            os.remove(tempPath)
+        return False
+
+def read_json(fullPath):
+    """Reads a json file, returns None if it does not exist or cannot be parsed"""
+    if fullPath is None or os.path.isfile(fullPath) == False:
+        return None
+    try:
+        with open(fullPath, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print('Warning: failed to read ' + str(fullPath) + ': ' + str(e))
+        return None
+
+
+class DirtyRanges:
+    """ Tracks the index ranges (inclusive [first, last] pairs) of a buffer that have been modified
+
+    :ivar ranges(list): sorted, non-overlapping list of [first, last] index ranges
+    """
+    def __init__(self):
+        self.ranges = []
+
+    def clear(self):
+        self.ranges = []
+
+    def is_empty(self):
+        return len(self.ranges) == 0
+
+    def mark(self, first, last=None):
+        """Marks the index range [first, last] as modified"""
+        if last is None:
+            last = first
+        if last < first:
+            return
+        merged = []
+        inserted = False
+        for r in self.ranges:
+            if r[1] < first-1:
+                merged.append(r)
+            elif r[0] > last+1:
+                if inserted == False:
+                    merged.append([first, last])
+                    inserted = True
+                merged.append(r)
+            else:
+                first = min(first, r[0])
+                last = max(last, r[1])
+        if inserted == False:
+            merged.append([first, last])
+        self.ranges = merged
+
+    def mark_all(self, N):
+        """Marks every index of a buffer of length N as modified"""
+        self.ranges = []
+        if N > 0:
+            self.ranges = [[0, N-1]]
+
+    def contains(self, ind):
+        for r in self.ranges:
+            if r[0] <= ind <= r[1]:
+                return True
+        return False
+
+    def num_indices(self):
+        return int(np.sum([r[1]-r[0]+1 for r in self.ranges]))
+
+
+def contiguous_ranges(inds):
+    """Groups a sorted list of integers into a list of inclusive [first, last] ranges"""
+    retVal = []
+    for ind in inds:
+        if len(retVal) > 0 and retVal[-1][1] == ind-1:
+            retVal[-1][1] = ind
+        else:
+            retVal.append([ind, ind])
+    return retVal
+
+def file_stat(fileName):
+    """Returns the size and modification time (in nanoseconds) of a file, None if it does not exist"""
+    if fileName is None:
+        return None
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return None
+    return [int(stat.st_size), int(stat.st_mtime_ns)]
+
+def slice_checksum(x, ind, axis=0):
+    """Returns a crc32 checksum of x[ind] along the given axis"""
+    if axis == 0:
+        y = x[ind]
+    elif axis == 1:
+        y = x[:,ind]
+    else:
+        y = x[:,:,ind]
+    return zlib.crc32(memoryview(np.ascontiguousarray(y)).cast('B'))
+
+
+class SaveManifest:
+    """ Records the state of a file sequence on disk so that it can be resaved incrementally
+
+    The manifest is stored next to the file sequence (the base file name with a _manifest.json suffix)
+    and contains the shape of the buffer, the axis that was split into files, a checksum of the data
+    of every file, and the size and modification time of every file after it was written.  When a buffer
+    is saved again, only those files whose checksum changed, that were explicitly marked as modified,
+    or that were changed or removed on disk since they were written need to be rewritten; all other
+    files are left in place.
+
+    :ivar fullPath(str): full path of the base file name of the sequence (e.g., /path/attenRad.tif)
+    :ivar shape(list): shape of the saved buffer
+    :ivar axis(int): axis of the buffer that is split into separate files
+    :ivar checksums(list): crc32 checksum of each saved file (None if unknown)
+    :ivar file_stats(list): size and modification time of each saved file (None if unknown), see file_stat
+    """
+    def __init__(self, fullPath, shape=None, axis=0):
+        self.fullPath = fullPath
+        self.shape = None
+        if shape is not None:
+            self.shape = [int(n) for n in shape]
+        self.axis = int(axis)
+        self.checksums = []
+        self.file_stats = []
+        if self.shape is not None:
+            self.checksums = [None]*self.shape[self.axis]
+            self.file_stats = [None]*self.shape[self.axis]
+        self.rewritten = []
+        self.kept = []
+
+    @staticmethod
+    def manifest_file(fullPath):
+        baseName, ext = os.path.splitext(fullPath)
+        return baseName + '_manifest.json'
+
+    @classmethod
+    def load(cls, fullPath):
+        data = read_json(cls.manifest_file(fullPath))
+        if data is None:
+            return None
+        try:
+            retVal = cls(fullPath, data['shape'], data['axis'])
+            retVal.checksums = list(data['checksums'])
+            file_stats = data.get('file_stats', None)
+            if file_stats is not None and len(file_stats) == len(retVal.file_stats):
+                retVal.file_stats = list(file_stats)
+            retVal.kept = list(data.get('kept', []))
+            retVal.rewritten = list(data.get('rewritten', []))
+            if len(retVal.checksums) != retVal.shape[retVal.axis]:
+                return None
+            return retVal
+        except:
+            return None
+
+    def save(self):
+        data = {'file': os.path.basename(self.fullPath), 'shape': self.shape, 'axis': self.axis, 'checksums': self.checksums, 'file_stats': self.file_stats, 'rewritten': self.rewritten, 'kept': self.kept}
+        return atomic_write_json(self.manifest_file(self.fullPath), data)
+
+    def remove(self):
+        manifestFile = self.manifest_file(self.fullPath)
+        if os.path.isfile(manifestFile):
+            os.remove(manifestFile)
+
+    def matches(self, x, axis):
+        """Returns True if the manifest describes a buffer of the same shape split along the same axis"""
+        if self.shape is None or x is None:
+            return False
+        return list(x.shape) == self.shape and int(axis) == self.axis
+
+    def record_files(self, fileList, first=0, last=None):
+        """Records the size and modification time of the files of indices first to last (all if last is None) after they were written"""
+        if last is None:
+            last = len(self.file_stats)-1
+        files = sequence_files(fileList)
+        for n in range(max(0, first), min(last, len(self.file_stats)-1)+1):
+            self.file_stats[n] = file_stat(files.get(n, None))
+
+    def changed_on_disk(self, fileList):
+        """Returns the sorted list of indices whose file is missing or was changed on disk since it was written"""
+        files = sequence_files(fileList)
+        inds = []
+        for n in range(len(self.file_stats)):
+            stat = file_stat(files.get(n, None))
+            if stat is None or self.file_stats[n] is None or list(self.file_stats[n]) != stat:
+                inds.append(n)
+        return inds
+
+    def changed_indices(self, x, dirty=None, verify=True):
+        """Returns the sorted list of indices (along self.axis) that need to be rewritten
+
+        Args:
+            x (3D numpy array): the buffer about to be saved
+            dirty (DirtyRanges): index ranges that are known to be modified; these are rewritten without comparing checksums
+            verify (bool): if True, the checksum of every index not in dirty is compared to the manifest
+
+        Returns:
+            list of indices to rewrite and the updated list of checksums
+        """
+        N = x.shape[self.axis]
+        checksums = list(self.checksums)
+        inds = []
+        for n in range(N):
+            if dirty is not None and dirty.contains(n):
+                checksums[n] = slice_checksum(x, n, self.axis)
+                inds.append(n)
+            elif checksums[n] is None:
+                checksums[n] = slice_checksum(x, n, self.axis)
+                inds.append(n)
+            elif verify:
+                crc = slice_checksum(x, n, self.axis)
+                if crc != checksums[n]:
+                    checksums[n] = crc
+                    inds.append(n)
+        return inds, checksums
+
+    def update(self, x, first, axis=0):
+        """Records the checksums of a chunk x that was written starting at file sequence index first"""
+        for n in range(x.shape[axis]):
+            if first+n < len(self.checksums):
+                self.checksums[first+n] = slice_checksum(x, n, axis)
+
+
+def hash_parameters(params):
+    """Returns a short hash of a dictionary of algorithm parameters"""
+    import hashlib
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[0:16]
+
+def sequence_number(fileName):
+    """Returns the sequence number of a file of a file sequence (e.g., 12 for raw_0012.tif), None if it has none"""
+    match = re.search(r'(\d+)\D*$', os.path.basename(fileName))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+def sequence_files(fileList):
+    """Returns a dictionary from the index of each file in its sequence (its sequence number relative to the first file) to its file name"""
+    retVal = {}
+    if fileList is None or len(fileList) == 0:
+        return retVal
+    firstNumber = sequence_number(fileList[0])
+    for n in range(len(fileList)):
+        index = n
+        number = sequence_number(fileList[n])
+        if firstNumber is not None and number is not None:
+            index = number - firstNumber
+        retVal[index] = fileList[n]
+    return retVal
+
+def sequence_identity(fileList, stats=True):
+    """Returns a description of a file sequence used to check that a run's input did not change
+    
+    The description has the number of files, the first and last file names and, if stats is True, the total
+    size and latest modification time (in nanoseconds) of the files; None if a file cannot be accessed.
+    """
+    if fileList is None or len(fileList) == 0:
+        return {'count': 0}
+    identity = {'count': len(fileList), 'first': os.path.basename(fileList[0]), 'last': os.path.basename(fileList[-1])}
+    if stats:
+        file_stats = [file_stat(fileName) for fileName in fileList]
+        if None in file_stats:
+            return None
+        identity['bytes'] = int(sum([stat[0] for stat in file_stats]))
+        identity['modified'] = int(max([stat[1] for stat in file_stats]))
+    return identity
+
+
+class RunManifest:
+    """ Records the progress of a chunked leapctserver operation so that it can be resumed after a crash
+    
+    The manifest is written (atomically) to outputDir after every chunk.  A chunk is committed in two phases:
+    its output files are first written to a temporary folder and recorded as pending, then they are renamed
+    to their final names and the chunk's index range is recorded as completed.  Thus a chunk's output either
+    fully replaces the files it overwrites or it is redone on resume; if a crash happens between the two
+    phases, resuming just finishes the renames.
+    
+    :ivar fullPath(str): full path of the manifest file
+    :ivar operation(str): name of the chunked operation, e.g., projection_processing or FBP
+    :ivar params_hash(str): hash of the algorithm parameters
+    :ivar input(dict): input file name and identity of the input sequence
+    :ivar output(str): output file name
+    :ivar numIndices(int): number of angles, rows, or slices that are processed
+    :ivar chunk_size(int): the chunk size used when the run started
+    :ivar completed(DirtyRanges): index ranges whose output has been committed
+    :ivar pending(dict): the chunk whose output files are being renamed, or None
+    :ivar stats(dict): any extra values that must survive a restart (e.g., running min/max)
+    """
+    def __init__(self, fullPath):
+        self.fullPath = fullPath
+        self.operation = None
+        self.params_hash = None
+        self.input = None
+        self.output = None
+        self.numIndices = 0
+        self.chunk_size = 0
+        self.completed = DirtyRanges()
+        self.pending = None
+        self.stats = {}
+        
+    @classmethod
+    def load(cls, fullPath):
+        data = read_json(fullPath)
+        if data is None:
+            return None
+        try:
+            retVal = cls(fullPath)
+            retVal.operation = data['operation']
+            retVal.params_hash = data['params_hash']
+            retVal.input = data['input']
+            retVal.output = data['output']
+            retVal.numIndices = int(data['numIndices'])
+            retVal.chunk_size = int(data['chunk_size'])
+            retVal.completed.ranges = [list(r) for r in data['completed']]
+            retVal.pending = data.get('pending', None)
+            retVal.stats = data.get('stats', {})
+            return retVal
+        except:
+            print('Warning: run manifest ' + str(fullPath) + ' is invalid')
+            return None
+            
+    def save(self):
+        data = {'operation': self.operation, 'params_hash': self.params_hash, 'input': self.input, 'output': self.output,
+                'numIndices': self.numIndices, 'chunk_size': self.chunk_size, 'completed': self.completed.ranges,
+                'pending': self.pending, 'stats': self.stats}
+        return atomic_write_json(self.fullPath, data)
+        
+    def remove(self):
+        if os.path.isfile(self.fullPath):
+            os.remove(self.fullPath)
+            
+    def matches(self, operation, params_hash, input, output, numIndices):
+        return self.operation == operation and self.params_hash == params_hash and self.input == input and self.output == output and self.numIndices == numIndices
+        
+    def mark_completed(self, first, last):
+        self.completed.mark(first, last)
+        self.pending = None
+        
+    def is_finished(self):
+        return self.completed.ranges == [[0, self.numIndices-1]]
+        
+    def remaining_chunks(self, chunk_size=None):
+        """Returns the list of [first, last] chunks that still need to be processed"""
+        if chunk_size is None or chunk_size <= 0:
+            chunk_size = self.chunk_size
+        chunk_size = max(1, int(chunk_size))
+        retVal = []
+        first = 0
+        for r in self.completed.ranges + [[self.numIndices, self.numIndices]]:
+            while first < r[0]:
+                last = min(r[0]-1, first + chunk_size - 1)
+                retVal.append([first, last])
+                first = last+1
+            first = max(first, r[1]+1)
+        return retVal
@@ -0,0 +1,149 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# compact_storage
+# Projections or volumes held in memory with 16 bits per value, which are
+# expanded to float32 one chunk at a time for the algorithms and compressed
+# again afterwards
+################################################################################
+import numpy as np
+
+# Bytes per value of each storage precision
+STORAGE_BYTES = {'float32': 4, 'float16': 2, 'uint16': 2}
+
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+UINT16_MAX = 65535.0
+
+
+def storage_bytes(precision):
+    """Returns the number of bytes per value of a storage precision, None if it is not one of STORAGE_BYTES"""
+    return STORAGE_BYTES.get(precision, None)
+
+
+class CompactArray:
+    """ A 3D float32 array (projections or a volume) held in memory with 16 bits per value
+
+    float16 stores the values as half floats (about 3 significant digits, values beyond +/-65504 are clipped).
+    uint16 stores every index of the first axis (a projection or a z-slice) as 65536 levels between its own
+    minimum and maximum, i.e., x = offsets[n] + scales[n]*q, so its error is at most half a level of that
+    projection or slice.
+
+    Chunks are read (expanded to float32) and written (compressed) along the first axis (projections or
+    z-slices) or the second axis (detector rows).  When the rows written into a uint16 projection fall outside
+    its levels, the whole projection is requantized.
+
+    :ivar shape(tuple): shape of the float32 array
+    :ivar precision(str): 'float16' or 'uint16'
+    :ivar data(numpy array): the compressed values
+    :ivar scales(float32 numpy array): for uint16, the level spacing of each index of the first axis (0 until it is written)
+    :ivar offsets(float32 numpy array): for uint16, the value of level 0 of each index of the first axis
+    """
+    def __init__(self, shape, precision='float16'):
+        if precision not in ['float16', 'uint16']:
+            raise ValueError('invalid compact storage precision: ' + str(precision))
+        self.shape = tuple(int(n) for n in shape)
+        self.precision = precision
+        if precision == 'float16':
+            self.data = np.zeros(self.shape, dtype=np.float16)
+            self.scales = None
+            self.offsets = None
+        else:
+            self.data = np.zeros(self.shape, dtype=np.uint16)
+            self.scales = np.zeros(self.shape[0], dtype=np.float32)
+            self.offsets = np.zeros(self.shape[0], dtype=np.float32)
+
+    @classmethod
+    def from_array(cls, x, precision='float16', block=64):
+        """Returns the compressed copy of the float32 array x, compressed block indices of its first axis at a time"""
+        x_compact = cls(x.shape, precision)
+        for first in range(0, x.shape[0], block):
+            x_compact.write(x[first:first+block], first)
+        return x_compact
+
+    @property
+    def nbytes(self):
+        nbytes = self.data.nbytes
+        if self.scales is not None:
+            nbytes += self.scales.nbytes + self.offsets.nbytes
+        return nbytes
+
+    def read(self, inds=None, axis=0, out=None, rowRange=None, colRange=None):
+        """Expands part of the array to float32
+
+        Args:
+            inds (list of two integers): the range of indices along axis to read; if None, all of them
+            axis (int): 0 to read a range of projections (or z-slices), 1 to read a range of detector rows of all projections
+            out (C contiguous float32 numpy array): if given, the values are written into this array, which must have their shape
+            rowRange (list of two integers): if axis is 0, only these indices of the second axis are read
+            colRange (list of two integers): only these indices of the third axis are read
+
+        Returns:
+            float32 numpy array
+        """
+        index = [slice(None), slice(None), slice(None)]
+        if inds is not None:
+            index[axis] = slice(inds[0], inds[1]+1)
+        if axis == 0 and rowRange is not None:
+            index[1] = slice(rowRange[0], rowRange[1]+1)
+        if colRange is not None:
+            index[2] = slice(colRange[0], colRange[1]+1)
+        x_compact = self.data[tuple(index)]
+        if out is None:
+            out = np.empty(x_compact.shape, dtype=np.float32)
+        if self.precision == 'float16':
+            out[:] = x_compact
+        else:
+            np.multiply(x_compact, self.scales[index[0],None,None], out=out)
+            out += self.offsets[index[0],None,None]
+        return out
+
+    def to_array(self):
+        """Returns the whole array expanded to float32"""
+        return self.read()
+
+    def crop(self, rowRange, colRange):
+        """Returns a copy of the array with only the indices rowRange of the second axis and colRange of the third axis (both inclusive)"""
+        x_crop = CompactArray([self.shape[0], rowRange[1]-rowRange[0]+1, colRange[1]-colRange[0]+1], self.precision)
+        x_crop.data[:] = self.data[:, rowRange[0]:rowRange[1]+1, colRange[0]:colRange[1]+1]
+        if self.scales is not None:
+            x_crop.scales[:] = self.scales
+            x_crop.offsets[:] = self.offsets
+        return x_crop
+
+    def write(self, x, first=0, axis=0):
+        """Compresses the float32 chunk x into the array, starting at index first along axis (0 or 1)"""
+        if axis == 0:
+            view = self.data[first:first+x.shape[0]]
+        else:
+            view = self.data[:,first:first+x.shape[1],:]
+        if self.precision == 'float16':
+            np.clip(x, -FLOAT16_MAX, FLOAT16_MAX, out=view)
+            return
+        if axis == 0:
+            for n in range(x.shape[0]):
+                self.quantize(first+n, x[n], view[n])
+        else:
+            for n in range(self.shape[0]):
+                lo = float(np.min(x[n]))
+                hi = float(np.max(x[n]))
+                if self.scales[n] > 0.0 and lo >= self.offsets[n] and hi <= self.offsets[n] + UINT16_MAX*self.scales[n]:
+                    self.quantize(n, x[n], view[n], requantize=False)
+                else:
+                    x_all = self.read([n, n])[0]
+                    x_all[first:first+x.shape[1],:] = x[n]
+                    self.quantize(n, x_all, self.data[n])
+
+    def quantize(self, n, x, out, requantize=True):
+        """Writes the levels of the values x of index n of the first axis into out; if requantize, the levels are first fit to the range of x"""
+        if requantize:
+            lo = float(np.min(x))
+            hi = float(np.max(x))
+            self.offsets[n] = lo
+            self.scales[n] = (hi - lo) / UINT16_MAX if hi > lo else 1.0
+        q = x - self.offsets[n]
+        q *= 1.0 / self.scales[n]
+        np.rint(q, out=q)
+        np.clip(q, 0.0, UINT16_MAX, out=q)
+        out[:] = q
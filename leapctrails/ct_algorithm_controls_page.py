@@ -24,6 +24,7 @@ class CTalgorithmControlsPage(QWidget):
         self.algorithm_list_combo.addItem("Select...")
         all_algorithms = ['Make Attenuation Radiographs',
                           'Crop Projections',
+                          'Bin Detector',
                           'Outlier Correction',
                           'Find centerCol',
                           'Detector Tilt',
@@ -125,6 +126,8 @@ class CTalgorithmControlsPage(QWidget):
             newAlgorithmPage = MakeAttenuationRadiographsParametersPage(self)
         elif algText == "Crop Projections":
             newAlgorithmPage = CropProjectionsParametersPage(self)
+        elif algText == "Bin Detector":
+            newAlgorithmPage = BinDetectorParametersPage(self)
         elif algText == "Outlier Correction":
             newAlgorithmPage = OutlierCorrectionParametersPage(self)
         elif algText == "Find centerCol":
@@ -26,6 +26,51 @@ class MyMessageBox(QDialog):
         self.setLayout(overallGrid)
         self.resize(300,150)
 
+def draw_ROI_box(lctserver, leapct):
+    """Shows the middle z-slice of the volume (or its FBP preview) so that the user can drag a box on it
+    
+    Returns:
+        [xmin, xmax, ymin, ymax, zmin, zmax] (mm) of the box, whose z range is the z range of the whole volume, None if no box was drawn
+    """
+    from matplotlib.widgets import RectangleSelector
+    if lctserver.f is not None:
+        f_slice = lctserver.f[lctserver.f.shape[0]//2,:,:]
+    else:
+        f_slice = lctserver.FBP_slice(coord='z')
+    if f_slice is None:
+        print('Error: failed to reconstruct a slice to draw the ROI on')
+        return None
+    x = leapct.x_samples()
+    y = leapct.y_samples()
+    z = leapct.z_samples()
+    T_x = leapct.get_voxelWidth()
+    T_z = leapct.get_voxelHeight()
+    
+    box = []
+    def box_selected(press, release):
+        box[:] = [min(press.xdata, release.xdata), max(press.xdata, release.xdata), min(press.ydata, release.ydata), max(press.ydata, release.ydata)]
+    fig, ax = plt.subplots()
+    ax.imshow(np.squeeze(f_slice), cmap='gray', interpolation='nearest', extent=[x[0]-0.5*T_x, x[-1]+0.5*T_x, y[-1]+0.5*T_x, y[0]-0.5*T_x])
+    ax.set_xlabel('x (mm)')
+    ax.set_ylabel('y (mm)')
+    ax.set_title('drag a box around the ROI, then close this window')
+    selector = RectangleSelector(ax, box_selected, useblit=True, interactive=True)
+    plt.show()
+    if len(box) != 4 or None in box or box[1] <= box[0] or box[3] <= box[2]:
+        print('no ROI was drawn')
+        return None
+    return box + [z[0]-0.5*T_z, z[-1]+0.5*T_z]
+
+def ROI_voxel_size(edit):
+    """Returns the voxel size entered in a QLineEdit, None if it is empty or invalid"""
+    if len(edit.text()) == 0:
+        return None
+    try:
+        return float(edit.text())
+    except:
+        print('Error: invalid ROI voxel size')
+        return None
+
 class AlgorithmParameterPage(QWidget):
     """ 
     This is the base class for all of the algorithm control pages i.e. the
@@ -259,6 +304,84 @@ class CropProjectionsParametersPage(AlgorithmParameterPage):
         progressDialog.close()
         QApplication.restoreOverrideCursor()
         
+class BinDetectorParametersPage(AlgorithmParameterPage):
+    def __init__(self, parent = None):
+        super(BinDetectorParametersPage, self).__init__(parent)
+
+        self.parent = parent
+        
+        overall_layout = QGridLayout()
+        
+        rowFactor_label = QLabel("rows per bin")
+        self.rowFactor_edit = QLineEdit("2")
+        colFactor_label = QLabel("columns per bin")
+        self.colFactor_edit = QLineEdit("2")
+        angleFactor_label = QLabel("angles per bin")
+        self.angleFactor_edit = QLineEdit("1")
+        
+        overall_layout.addWidget(rowFactor_label, 0, 0)
+        overall_layout.addWidget(self.rowFactor_edit, 0, 1)
+        overall_layout.addWidget(colFactor_label, 1, 0)
+        overall_layout.addWidget(self.colFactor_edit, 1, 1)
+        overall_layout.addWidget(angleFactor_label, 2, 0)
+        overall_layout.addWidget(self.angleFactor_edit, 2, 1)
+        
+        # Add the help/preview/execute button box in the lower right corner:
+        exe_buttons_layout = QHBoxLayout()
+        exe_buttons_layout.addWidget(self.buttonBox)
+        exe_buttons_layout.addStretch(1)
+
+        overall_vlayout = QVBoxLayout()
+        overall_vlayout.addLayout(overall_layout)
+        overall_vlayout.addLayout(exe_buttons_layout)
+        overall_vlayout.addStretch(1)
+
+        self.buttonBox.previewButton.setEnabled(True)
+        self.setLayout(overall_vlayout)
+        
+        self.buttonBox.helpButton.clicked.connect(self.help_button_Clicked)
+        self.buttonBox.previewButton.clicked.connect(self.preview_button_Clicked)
+        self.buttonBox.executeButton.clicked.connect(self.execute_button_Clicked)
+        
+    def help_button_Clicked(self):
+        currentHelpText = "This algorithm averages blocks of detector pixels (rows per bin x columns per bin) and groups of consecutive projections (angles per bin), which reduces the size of the projection data, and the time of every algorithm after it, by the product of these factors.  The pixel size, center row and column, and the projection angles of the CT geometry are updated accordingly.  Rows, columns, and angles at the end that do not fill a bin are dropped.\n\nUse it when the reconstruction voxel size is larger than the detector pixel size (at the object)."
+        msg = MyMessageBox("Bin Detector", currentHelpText)
+        msg.exec_()
+
+    def preview_button_Clicked(self):
+        if self.computeState == 0:
+            self.previewAlgorithm()
+        
+    def execute_button_Clicked(self):
+        if self.computeState == 0:
+            self.execute_algorithm()
+    
+    def execute_algorithm(self, tryIndex=None):
+        try:
+            rowFactor = int(self.rowFactor_edit.text())
+            colFactor = int(self.colFactor_edit.text())
+            angleFactor = int(self.angleFactor_edit.text())
+        except:
+            print('Error: invalid binning factors')
+            return
+        
+        if self.parent.runningPreviousAlgorithms == False:
+            if self.parent.runPreviousAlgorithms() == False:
+                return
+            
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        progressDialog = ProgressDialog(self.parent, "processing bin_projections...")
+        progressDialog.setModal(True)
+        progressDialog.show()
+        
+        print("bin_projections...")
+        if self.lctserver.bin_projections(rowFactor, colFactor, angleFactor, tryIndex):
+            if tryIndex is None:
+                self.completedSuccessfully()
+        
+        progressDialog.close()
+        QApplication.restoreOverrideCursor()
+        
 class OutlierCorrectionParametersPage(AlgorithmParameterPage):
     def __init__(self, parent = None):
         super(OutlierCorrectionParametersPage, self).__init__(parent)
@@ -1020,6 +1143,16 @@ class TightVolumeParametersPage(AlgorithmParameterPage):
             mu = self.lctserver.physics.mu(self.lctserver.object_model[0], self.lctserver.reference_energy, self.lctserver.object_model[1])
             self.threshold_edit.setText(str(0.5*mu))
         
+        ROI_voxelSize_label = QLabel("<div align='right'>ROI voxel size (mm)</div>")
+        self.ROI_voxelSize_edit = QLineEdit()
+        self.ROI_voxelSize_edit.setToolTip("voxel size of the volume set by drawing an ROI; leave empty to keep the current voxel size")
+        self.ROI_button = QPushButton("Draw ROI...")
+        self.ROI_button.setToolTip("drag a box on a z-slice to set the CT volume to it")
+        overall_layout.addWidget(ROI_voxelSize_label, 1, 0)
+        overall_layout.addWidget(self.ROI_voxelSize_edit, 1, 1)
+        overall_layout.addWidget(self.ROI_button, 1, 2)
+        self.ROI_button.clicked.connect(self.ROI_button_Clicked)
+        
         overall_layout.setRowStretch(overall_layout.rowCount(), 1)
         overall_layout.setColumnStretch(overall_layout.columnCount(), 1)
         
@@ -1041,9 +1174,21 @@ class TightVolumeParametersPage(AlgorithmParameterPage):
         self.buttonBox.executeButton.clicked.connect(self.execute_button_Clicked)
         
     def help_button_Clicked(self):
-        currentHelpText = "This algorithm generates a very low-resolution reconstruction with FBP and estimates the smallest axis aligned bounding box for which there are no voxels outside this box that are above the user-specified threshold.  The CT volume parameters are set accordingly."
+        currentHelpText = "This algorithm generates a very low-resolution reconstruction with FBP and estimates the smallest axis aligned bounding box for which there are no voxels outside this box that are above the user-specified threshold.  The CT volume parameters are set accordingly.\n\nAlternatively, Draw ROI shows a z-slice of the volume on which a box can be dragged; the CT volume is set to this box (over the whole z range) with the ROI voxel size."
         msg = MyMessageBox("Tight Volume", currentHelpText)
         msg.exec_()
+        
+    def ROI_button_Clicked(self):
+        if self.parent.runningPreviousAlgorithms == False:
+            if self.parent.runPreviousAlgorithms() == False:
+                return
+        box = draw_ROI_box(self.lctserver, self.leapct)
+        if box is None:
+            return
+        if self.lctserver.set_ROI_volume(box, ROI_voxel_size(self.ROI_voxelSize_edit)):
+            self.lctserver.clear_volume_data()
+            print('set the CT volume to ' + str(self.leapct.get_numX()) + ' x ' + str(self.leapct.get_numY()) + ' x ' + str(self.leapct.get_numZ()) + ' voxels')
+            self.completedSuccessfully()
     
     def preview_button_Clicked(self):
         self.previewAlgorithm()
@@ -1120,6 +1265,27 @@ class FBPParametersPage(AlgorithmParameterPage):
         overall_layout.addWidget(preview_slice_axis_label, 1, 0)
         overall_layout.addWidget(self.preview_slice_axis_combo, 1, 1)
         
+        ROI_voxelSize_label = QLabel("<div align='right'>ROI voxel size (mm)</div>")
+        self.ROI_voxelSize_edit = QLineEdit()
+        self.ROI_voxelSize_edit.setToolTip("voxel size of the ROI reconstruction; leave empty to keep the current voxel size")
+        self.ROI_button = QPushButton("Reconstruct ROI...")
+        self.ROI_button.setToolTip("drag a box on a z-slice and reconstruct only this box, reading only the detector rows and columns it needs")
+        overall_layout.addWidget(ROI_voxelSize_label, 2, 0)
+        overall_layout.addWidget(self.ROI_voxelSize_edit, 2, 1)
+        overall_layout.addWidget(self.ROI_button, 2, 2)
+        self.ROI_button.clicked.connect(self.ROI_button_Clicked)
+        
+        quick_look_time_label = QLabel("<div align='right'>quick look time (sec)</div>")
+        self.quick_look_time_edit = QLineEdit()
+        self.quick_look_time_edit.setText("5")
+        self.quick_look_time_edit.setToolTip("the angle and detector decimation of the quick look are chosen so that it takes about this long; leave empty to only limit its memory")
+        self.quick_look_button = QPushButton("Quick look")
+        self.quick_look_button.setToolTip("reconstruct a low-resolution version of the whole volume from every k-th angle and a k x k binned detector")
+        overall_layout.addWidget(quick_look_time_label, 3, 0)
+        overall_layout.addWidget(self.quick_look_time_edit, 3, 1)
+        overall_layout.addWidget(self.quick_look_button, 3, 2)
+        self.quick_look_button.clicked.connect(self.quick_look_button_Clicked)
+        
         overall_layout.setRowStretch(overall_layout.rowCount(), 1)
         overall_layout.setColumnStretch(overall_layout.columnCount(), 1)
         
@@ -1167,6 +1333,53 @@ class FBPParametersPage(AlgorithmParameterPage):
         plt.imshow(np.squeeze(f_slice), cmap='gray', interpolation='nearest')
         plt.show()
     
+    def quick_look_button_Clicked(self):
+        target_time = None
+        if len(self.quick_look_time_edit.text()) > 0:
+            try:
+                target_time = float(self.quick_look_time_edit.text())
+            except:
+                print('Error: invalid quick look time')
+                return
+        
+        if self.parent.runningPreviousAlgorithms == False:
+            if self.parent.runPreviousAlgorithms() == False:
+                return
+        
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        print("quick_look...")
+        retVal = self.lctserver.quick_look(target_time)
+        QApplication.restoreOverrideCursor()
+        
+        if retVal and self.lctserver.quick_look_volume is not None:
+            f_quick = self.lctserver.quick_look_volume
+            if self.do_clipping_check.isChecked():
+                f_quick[f_quick<0.0] = 0.0
+            self.lctserver.quick_look_leapct.display(f_quick)
+    
+    def ROI_button_Clicked(self):
+        if self.parent.runningPreviousAlgorithms == False:
+            if self.parent.runPreviousAlgorithms() == False:
+                return
+        box = draw_ROI_box(self.lctserver, self.leapct)
+        if box is None:
+            return
+        
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        progressDialog = ProgressDialog(self.parent, "processing ROI reconstruction...")
+        progressDialog.setModal(True)
+        progressDialog.show()
+        
+        print("ROI_reconstruction...")
+        if self.lctserver.ROI_reconstruction(box, ROI_voxel_size(self.ROI_voxelSize_edit), self.do_clipping_check.isChecked()):
+            self.completedSuccessfully()
+            
+        progressDialog.close()
+        QApplication.restoreOverrideCursor()
+        
+        if self.lctserver.f is not None:
+            self.leapct.display(self.lctserver.f)
+    
     def execute_button_Clicked(self):
         if self.computeState == 0:
             self.execute_algorithm()
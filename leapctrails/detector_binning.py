@@ -0,0 +1,87 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# detector_binning
+# Binning of projection data (averaging blocks of detector pixels and of
+# consecutive angles) and the CT geometry of the binned projections
+################################################################################
+import numpy as np
+
+
+def binned_size(N, factor):
+    """Returns the number of bins of factor values that fit in N values (the values at the end that do not fill a bin are dropped)"""
+    return max(1, int(N) // max(1, int(factor)))
+
+
+def bin_array(x, rowFactor=1, colFactor=1, angleFactor=1, out=None):
+    """Averages blocks of angleFactor x rowFactor x colFactor values of projection data
+
+    The blocks are summed through a reshaped view of x (splitting each axis into bins and the values in each bin)
+    and the sum is scaled by the number of values in a block; x is not copied.
+
+    Args:
+        x (3D numpy array): projection data (angles, rows, columns)
+        rowFactor, colFactor, angleFactor (int): number of rows, columns, and angles in each bin
+        out (C contiguous float32 numpy array): if given, the binned data are written into this array, which must have their shape
+
+    Returns:
+        the binned data
+    """
+    rowFactor = max(1, int(rowFactor))
+    colFactor = max(1, int(colFactor))
+    angleFactor = max(1, int(angleFactor))
+    numAngles = binned_size(x.shape[0], angleFactor)
+    numRows = binned_size(x.shape[1], rowFactor)
+    numCols = binned_size(x.shape[2], colFactor)
+    if rowFactor == 1 and colFactor == 1 and angleFactor == 1:
+        if out is None:
+            return np.array(x, dtype=np.float32)
+        out[:] = x
+        return out
+    x_blocks = x[0:numAngles*angleFactor, 0:numRows*rowFactor, 0:numCols*colFactor].reshape(numAngles, angleFactor, numRows, rowFactor, numCols, colFactor)
+    if out is None:
+        out = np.empty((numAngles, numRows, numCols), dtype=np.float32)
+    np.sum(x_blocks, axis=(1,3,5), dtype=np.float32, out=out)
+    out *= 1.0 / float(angleFactor*rowFactor*colFactor)
+    return out
+
+
+def binned_center(center, factor):
+    """Returns the center row or column (in pixels) of the detector after binning by factor"""
+    return (center - 0.5*(factor-1)) / float(factor)
+
+
+def bin_geometry(leapct, rowFactor=1, colFactor=1, angleFactor=1, angleStep=1):
+    """Changes the CT geometry of leapct to that of its projections binned by bin_array
+
+    Args:
+        leapct (tomographicModels object): the CT geometry, which is changed in place
+        rowFactor, colFactor, angleFactor (int): the binning factors; the angle of a bin of angles is the average of its angles
+        angleStep (int): if larger than 1, only every angleStep-th angle is kept (before angleFactor is applied)
+
+    Returns:
+        True if successful, False otherwise
+    """
+    if leapct.get_geometry() == 'MODULAR':
+        print('Error: binning is not implemented for modular-beam geometries')
+        return False
+    rowFactor = max(1, int(rowFactor))
+    colFactor = max(1, int(colFactor))
+    angleFactor = max(1, int(angleFactor))
+    angleStep = max(1, int(angleStep))
+    if rowFactor > 1:
+        leapct.set_centerRow(binned_center(leapct.get_centerRow(), rowFactor))
+        leapct.set_pixelHeight(leapct.get_pixelHeight()*rowFactor)
+        leapct.set_numRows(binned_size(leapct.get_numRows(), rowFactor))
+    if colFactor > 1:
+        leapct.set_centerCol(binned_center(leapct.get_centerCol(), colFactor))
+        leapct.set_pixelWidth(leapct.get_pixelWidth()*colFactor)
+        leapct.set_numCols(binned_size(leapct.get_numCols(), colFactor))
+    if angleStep > 1 or angleFactor > 1:
+        phis = np.array(leapct.get_angles(), dtype=np.float64)[::angleStep]
+        numAngles = binned_size(phis.size, angleFactor)
+        phis = np.mean(phis[0:numAngles*angleFactor].reshape(numAngles, angleFactor), axis=1)
+        leapct.set_angles(np.ascontiguousarray(phis, dtype=np.float32))
+    return True
@@ -0,0 +1,111 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# filtered_projection_cache
+# Ramp-filtered projections saved to disk, so that FBPs that only differ in
+# their CT volume parameters (voxel size, offsets, numZ, ...) only have to
+# backproject
+################################################################################
+import os
+import uuid
+import numpy as np
+from chunk_manifest import hash_parameters
+
+# The CT geometry and algorithm parameters (read with leapct.get_<name>) that the filtered projections depend on
+FILTER_PARAMETERS = ['geometry', 'sod', 'sdd', 'helicalPitch', 'numCols', 'numRows', 'centerCol', 'centerRow', 'tau',
+                     'pixelWidth', 'pixelHeight', 'detectorType', 'offsetScan', 'truncatedScan', 'rampFilter', 'FBPlowpass']
+
+
+def filter_key(leapct, dataIdentity):
+    """Returns the cache key of the filtered projections of the data described by dataIdentity with the CT geometry of leapct"""
+    params = {'data': dataIdentity, 'angles': leapct.get_angles().tolist()}
+    for name in FILTER_PARAMETERS:
+        params[name] = getattr(leapct, 'get_' + name)()
+    return hash_parameters(params)
+
+
+class FilteredProjectionCache:
+    """ Disk cache of ramp-filtered projections (leapct.filterProjections), one npy file per key
+
+    get returns the filtered projections as a copy-on-write memmap, so only the parts that are used (e.g., the
+    detector rows of a z-slab) are read from disk, and they can be passed to leapct.weightedBackproject as they are.
+    The least recently used files beyond max_entries are deleted.
+
+    :ivar cacheDir(str): folder of the cached files
+    :ivar max_entries(int): number of filtered projection sets kept
+    :ivar hits(int): number of requests that found their filtered projections
+    :ivar misses(int): number of requests that did not
+    """
+    def __init__(self, cacheDir, max_entries=2):
+        self.cacheDir = cacheDir
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+
+    def file_name(self, key):
+        return os.path.join(self.cacheDir, 'filtered_' + str(key) + '.npy')
+
+    def get(self, key, shape=None):
+        """Returns the filtered projections stored under key (a memmap), None if they are not cached or do not have the given shape"""
+        fileName = self.file_name(key)
+        if os.path.isfile(fileName) == False:
+            self.misses += 1
+            return None
+        try:
+            q = np.asarray(np.load(fileName, mmap_mode='c'))
+        except:
+            print('Warning: failed to read ' + str(fileName))
+            self.misses += 1
+            return None
+        if shape is not None and tuple(q.shape) != tuple(shape):
+            self.misses += 1
+            return None
+        os.utime(fileName)
+        self.hits += 1
+        return q
+
+    def put(self, key, q):
+        """Saves the filtered projections q under key; the file is written under a temporary name and renamed when complete"""
+        if os.path.isdir(self.cacheDir) == False:
+            os.makedirs(self.cacheDir)
+        fileName = self.file_name(key)
+        tempName = os.path.join(self.cacheDir, 'filtered_' + uuid.uuid4().hex + '.tmp')
+        try:
+            with open(tempName, 'wb') as f:
+                np.save(f, np.ascontiguousarray(q, dtype=np.float32))
+            os.replace(tempName, fileName)
+        except:
+            print('Warning: failed to save filtered projections to ' + str(fileName))
+            if os.path.isfile(tempName):
+                os.remove(tempName)
+            return False
+        self.prune()
+        return True
+
+    def prune(self):
+        """Deletes the least recently used files beyond max_entries"""
+        if os.path.isdir(self.cacheDir) == False:
+            return
+        fileNames = [os.path.join(self.cacheDir, fileName) for fileName in os.listdir(self.cacheDir) if fileName.startswith('filtered_') and fileName.endswith('.npy')]
+        fileNames.sort(key=lambda fileName: os.path.getmtime(fileName), reverse=True)
+        for fileName in fileNames[self.max_entries:]:
+            try:
+                os.remove(fileName)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Deletes all the cached files"""
+        if os.path.isdir(self.cacheDir) == False:
+            return
+        for fileName in os.listdir(self.cacheDir):
+            if fileName.startswith('filtered_'):
+                try:
+                    os.remove(os.path.join(self.cacheDir, fileName))
+                except OSError:
+                    pass
+
+    def summary(self):
+        return 'filtered projection cache hits: ' + str(self.hits) + ', misses: ' + str(self.misses)
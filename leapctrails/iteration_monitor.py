@@ -0,0 +1,137 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# iteration_monitor
+# Timing, convergence metrics, early stopping, and checkpointing of the
+# iterative reconstruction algorithms run by leapctserver
+################################################################################
+import os
+import time
+import json
+import numpy as np
+
+
+class IterationMonitor:
+    """ Records the time and convergence metric of each iteration of an iterative reconstruction
+
+    The monitor decides when the reconstruction has converged (the metric is below tolerance) and
+    writes a checkpoint of the volume and solver state every checkpoint_interval iterations, so that
+    an interrupted reconstruction can continue from its last checkpoint.  Checkpoints are compressed
+    npz files; the volume is stored as float32.
+
+    :ivar algorithmName(str): name of the algorithm
+    :ivar numIter(int): the requested number of iterations
+    :ivar params_hash(str): hash of the algorithm parameters and data, a checkpoint is only used if it has the same hash
+    :ivar checkpointFile(str): full path of the checkpoint file
+    :ivar checkpoint_interval(int): number of iterations between checkpoints, 0 for no checkpoints
+    :ivar tolerance(float): the reconstruction stops when the metric is below this value, 0 to never stop early
+    :ivar callback(function): if not None, callback(entry) is called after every iteration with the entry added to history
+    :ivar history(list): time (seconds) and metric of each iteration
+    :ivar startIteration(int): the iteration to start at (nonzero after loading a checkpoint)
+    """
+    def __init__(self, algorithmName, numIter, params_hash, checkpointFile=None, checkpoint_interval=0, tolerance=0.0, callback=None):
+        self.algorithmName = algorithmName
+        self.numIter = int(numIter)
+        self.params_hash = params_hash
+        self.checkpointFile = checkpointFile
+        self.checkpoint_interval = max(0, int(checkpoint_interval))
+        self.tolerance = float(tolerance)
+        self.callback = callback
+        self.history = []
+        self.startIteration = 0
+        self.converged = False
+        self.time_start = None
+
+    def load_checkpoint(self, f):
+        """Copies the volume of a matching checkpoint into f
+
+        Returns:
+            dictionary of the solver state saved with the checkpoint, None if there is no matching checkpoint
+        """
+        if self.checkpointFile is None or os.path.isfile(self.checkpointFile) == False:
+            return None
+        try:
+            with np.load(self.checkpointFile) as data:
+                info = json.loads(str(data['info']))
+                if info['algorithm'] != self.algorithmName or info['params_hash'] != self.params_hash or data['f'].shape != f.shape:
+                    print('Warning: ignoring checkpoint ' + str(self.checkpointFile) + ' of a different reconstruction')
+                    return None
+                f[:] = data['f'][:]
+                state = {key: np.array(data[key]) for key in data.files if key != 'f' and key != 'info'}
+        except Exception as e:
+            print('Warning: failed to read checkpoint ' + str(self.checkpointFile) + ': ' + str(e))
+            return None
+        state.update(info['state'])
+        self.startIteration = int(info['iteration'])
+        self.history = info['history']
+        print('Resuming ' + self.algorithmName + ' from the checkpoint at iteration ' + str(self.startIteration))
+        return state
+
+    def save_checkpoint(self, iteration, f, state=None):
+        """Writes the volume and solver state (a dictionary of numpy arrays and numbers) after the given number of iterations"""
+        if self.checkpointFile is None:
+            return False
+        arrays = {'f': np.asarray(f, dtype=np.float32)}
+        scalars = {}
+        if state is not None:
+            for key in state:
+                if isinstance(state[key], np.ndarray):
+                    arrays[key] = state[key]
+                else:
+                    scalars[key] = state[key]
+        info = json.dumps({'algorithm': self.algorithmName, 'params_hash': self.params_hash, 'iteration': int(iteration), 'history': self.history, 'state': scalars})
+        tempPath = self.checkpointFile + '.tmp'
+        try:
+            with open(tempPath, 'wb') as fid:
+                np.savez_compressed(fid, info=np.array(info), **arrays)
+                fid.flush()
+                os.fsync(fid.fileno())
+            os.replace(tempPath, self.checkpointFile)
+            return True
+        except Exception as e:
+            print('Warning: failed to write checkpoint ' + str(self.checkpointFile) + ': ' + str(e))
+            if os.path.isfile(tempPath):
+                os.remove(tempPath)
+            return False
+
+    def remove_checkpoint(self):
+        if self.checkpointFile is not None and os.path.isfile(self.checkpointFile):
+            os.remove(self.checkpointFile)
+
+    def begin_iteration(self):
+        self.time_start = time.time()
+
+    def end_iteration(self, iteration, metric, f, state=None, numIterations=1):
+        """Records an iteration (or numIterations iterations) and writes a checkpoint if one is due
+
+        Args:
+            iteration (int): number of iterations completed so far
+            metric (float): the convergence metric, None if not available
+            f (numpy array): the current volume
+            state (dict): the solver state needed to continue from this iteration
+            numIterations (int): number of iterations performed since begin_iteration
+
+        Returns:
+            True if the reconstruction should stop, False otherwise
+        """
+        elapsed = time.time() - self.time_start
+        entry = {'iteration': int(iteration), 'numIter': self.numIter, 'time': elapsed / float(max(1, numIterations)), 'metric': None}
+        if metric is not None:
+            entry['metric'] = float(metric)
+        self.history.append(entry)
+        message = self.algorithmName + ' iteration ' + str(iteration) + ' of ' + str(self.numIter) + ': ' + str(round(elapsed, 3)) + ' sec'
+        if metric is not None:
+            message += ', metric = ' + str(metric)
+        print(message)
+        if self.callback is not None:
+            self.callback(entry)
+
+        self.converged = metric is not None and self.tolerance > 0.0 and metric < self.tolerance
+        if self.converged:
+            print(self.algorithmName + ' converged (metric < ' + str(self.tolerance) + ')')
+        if self.checkpoint_interval > 0 and self.converged == False and iteration < self.numIter:
+            if iteration // self.checkpoint_interval > (iteration - numIterations) // self.checkpoint_interval:
+                self.save_checkpoint(iteration, f, state)
+        return self.converged
@@ -12,10 +12,25 @@
 import os
 import sys
 import uuid
+import weakref
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
 from leapctype import *
 import leap_preprocessing_algorithms
+from bhc_library import BHCLibrary
+from projection_cache import ProjectionSubsetCache
+from iteration_monitor import IterationMonitor
+from parameter_registry import leapctserver_parameters, parse_parameter_file
+from slab_distribution import LocalTransport
+from timing_spans import SpanRecorder
+from memory_accountant import MemoryAccountant
+from buffer_pool import BufferPool
+from filtered_projection_cache import FilteredProjectionCache, filter_key
+from detector_binning import bin_array, bin_geometry, binned_size
+from compact_storage import CompactArray, storage_bytes
+from chunk_manifest import DirtyRanges, SaveManifest, RunManifest, contiguous_ranges, hash_parameters, sequence_identity, sequence_files
 
 try:
     from xrayphysics import *
@@ -25,6 +40,33 @@ except:
 
 root_path = os.path.dirname(os.path.realpath(__file__))
 
+# Number of projection-sized and volume-sized arrays (num_proj, num_vol) that each algorithm holds in memory,
+# see leapctserver.memory_multiples
+ALGORITHM_MEMORY = {
+    'makeAttenuationRadiographs': (1, 0),
+    'badPixelCorrection': (1, 0),
+    'outlierCorrection': (1, 0),
+    'outlierCorrection_highEnergy': (1, 0),
+    'ringRemoval': (1, 0),
+    'ringRemoval_median': (2, 0),
+    'polynomialBHC': (1, 0),
+    'singleMaterialBHC': (1, 0),
+    'FBP': (1, 1),
+    'SIRT': (2, 2),
+    'SART': (2, 2),
+    'ASDPOCS': (2, 4),
+    'LS': (2, 4),
+    'WLS': (3, 4),
+    'RLS': (2, 5),
+    'RWLS': (3, 5),
+    'DLS': (3, 4),
+    'RDLS': (3, 5),
+    'MLTR': (3, 3),
+    'MedianFilter': (0, 2),
+    'MedianFilter2D': (0, 1),
+    'TVdenoising': (0, 3),
+}
+
 class leapctserver:
     """ This class handles many high-level tasks for LEAP-CT, including file I/O, data chunking, meta-data I/O, and integration of XrayPhysics
     
@@ -54,6 +96,9 @@ class leapctserver:
         self.physics.use_mm()
         
         self.leapct_backup = tomographicModels()
+        
+        # Table of all key = value parameters (see parameter_registry.py)
+        self.parameters = leapctserver_parameters()
             
         self.reset(path, outputDir)
         
@@ -67,10 +112,14 @@ class leapctserver:
             self.path = path
             
         # Output directory (must be a subfolder of path)
+        # If it is not specified, a new folder is used for every session (generated_outputDir), so that
+        # interrupted runs and iterative reconstructions can only be resumed if outputDir is specified
         if outputDir is None:
             self.outputDir = str('leapct_') + str(uuid.uuid4().hex)
+            self.generated_outputDir = self.outputDir
         else:
             self.outputDir = outputDir
+            self.generated_outputDir = None
 
         # File name for air scan data
         self.air_scan_file = None
@@ -84,6 +133,10 @@ class leapctserver:
         # File name for transmission or attenuation projections
         self.projection_file = None
         
+        # Window [firstRow, lastRow, firstCol, lastCol] (detector indices of the files of projection_file) of the
+        # projections that are read from projection_file, or None to read whole projections (see crop_projections)
+        self.projection_crop = None
+        
         # File name for reconstructed slices
         self.reconstruction_file = None
         
@@ -113,6 +166,65 @@ class leapctserver:
         # Reconstruction volume data (numpy array or torch tensor)
         self.f = None
         
+        # Projection data and volume data held in compact storage (see storage_precision); at most one of g and g_compact
+        # (and of f and f_compact) holds data, and when it does it is more recent than the files
+        self.g_compact = None
+        self.f_compact = None
+        
+        # The projection data in memory (g or g_compact) and a token that is replaced whenever they change, see projection_generation
+        self.g_generation = None
+        
+        # Index ranges of the projection data (by angle and by detector row) and of the volume (by z-slice)
+        # that have been modified since they were last saved to file
+        self.g_dirty_angles = DirtyRanges()
+        self.g_dirty_rows = DirtyRanges()
+        self.f_dirty_slices = DirtyRanges()
+        
+        # If True, saving a buffer that was previously saved compares the checksum of every file in the
+        # sequence with the data in memory and only rewrites the files that changed
+        # If False, only the ranges marked with mark_projections_modified or mark_volume_modified are rewritten
+        self.verify_incremental_saves = True
+        
+        # If True, a chunked operation that was interrupted (see begin_chunked_run) continues from the last completed chunk
+        # (its run manifest is in outputDir, so outputDir must be specified to resume in a later session)
+        self.resume_chunked_runs = False
+        
+        # How FBP is chunked when the projections and volume do not fit in memory together (see FBP_chunking_strategy):
+        # 'auto' (by the amount of data each strategy reads), 'z_slab', or 'angle'
+        self.FBP_chunking = 'auto'
+        
+        # Number of worker processes that reconstruct parallel- and fan-beam scans that do not fit in memory
+        # (see FBP_independent_rows), None for one per GPU (one if there are no GPUs)
+        self.FBP_workers = None
+        
+        # If True, FBP keeps the ramp-filtered projections in outputDir/filtered_cache (see filtered_projection_cache.py),
+        # so that reconstructions of the same projections that only change the CT volume only backproject
+        self.use_filtered_projection_cache = False
+        self.filtered_projection_cache = None
+        
+        # Precision of the projections or volume kept in memory when they do not fit in memory as float32 (see compact_storage.py):
+        # 'float32' (such data are chunked through files), 'float16', or 'uint16' (with a scale and offset for every projection or z-slice)
+        self.storage_precision = 'float32'
+        
+        # The measured read rate (bytes/sec) and backprojection rate (voxel updates per angle per sec) that quick_look
+        # uses to pick its decimation factor, and the CT parameters and volume of the last quick look
+        self.quick_look_rates = {'read': 2.0**28, 'backproject': 1.0e9}
+        self.quick_look_leapct = None
+        self.quick_look_volume = None
+        
+        # Iterative reconstructions (see iterative_reconstruction) write a checkpoint every checkpoint_interval iterations (0 for never),
+        # stop when their convergence metric is below stopping_tolerance (0 to always run all iterations), and,
+        # if resume_from_checkpoint is True, continue from the checkpoint of an interrupted reconstruction (checkpoints are in outputDir)
+        # iteration_callback(entry), if not None, is called after every iteration with the time and metric of the iteration
+        # progress_callback(entry), if not None, is called with the same entries, but only for the iterations that are monitored anyway
+        # (every iteration out-of-core), so that showing the progress does not split in-memory reconstructions (see ProgressDialog)
+        self.checkpoint_interval = 0
+        self.stopping_tolerance = 0.0
+        self.resume_from_checkpoint = False
+        self.iteration_callback = None
+        self.progress_callback = None
+        self.iteration_history = []
+        
         # The maximum amount of memory that leapctserver is allowed to use
         # Users are encouraged to change this!
         physicalMemory = self.total_RAM()
@@ -139,6 +251,31 @@ class leapctserver:
         self.scratch_space = 0.125 # extra memory reserved
         self.chunk_size = 0
         
+        # apply_polynomial splits arrays with more elements than this over multiple threads
+        self.polynomial_block_size = 2**24
+        
+        # Records the time, bytes moved, and peak memory of the read, compute, write, and copy stages of the chunked operations
+        # (see timing_spans.py and save_profile); it costs almost nothing while disabled
+        self.profiler = SpanRecorder(enabled=False)
+        
+        # Measures the memory that chunks and the buffers leapctserver owns actually use and feeds it back into set_chunk_size
+        # (see memory_accountant.py); its enforcement is 'off', 'warn', or 'shrink' (make the remaining chunks of a run smaller).
+        # The measured overheads only last for this session unless the memory_overheads_file parameter is set
+        self.memory_accountant = MemoryAccountant('warn', None)
+        
+        # Float32 buffers that the chunk loops reuse from one chunk to the next (see buffer_pool.py and chunk_buffer)
+        self.buffer_pool = BufferPool()
+        
+        # [key, value] of the last result of angle_subset_scale
+        self.angle_subset_scale_cache = None
+        
+        # If not None, zslice_processing only processes the z-slices [first, last] and writes them into its output
+        # sequence; this is how the workers of a distributed run (see slab_distribution.py) process their slabs
+        self.slab_range = None
+        
+        # The output sequence (file name relative to path) of the slabs of slab_range, if None volume_file_name()
+        self.slab_output_file = None
+        
         ### Section IV: spectra parameters
         self.reference_energy = -1.0
         self.lowest_energy = -1.0
@@ -150,10 +287,19 @@ class leapctserver:
         self.detector_response_model = None
         self.object_model = None
         
+        # Energy grid and source, filter, detector, and total system responses of the current spectra parameters
+        # (see spectral_model); it is recomputed whenever spectral_model_key changes
+        self.spectral_model_cache = None
+        
+        # Folder of precomputed single-material BHC lookup tables (see BHC_lookup_table)
+        self.BHC_library_dir = os.path.join(os.path.expanduser('~'), '.leapct', 'bhc_library')
+        self.BHC_library = None
+        
         self.init_angle = 0.0
         self.angular_range = 0.0
         self.angular_step = 0.0
         self.num_angles = 0.0
+        self.rotation_direction = None
         
         ### Other
         self.default_algorithms = None
@@ -255,6 +401,13 @@ class leapctserver:
     def clear_path(self):
         self.path = None
         
+    def outputDir_is_stable(self, feature):
+        """Returns False (with a warning) if outputDir is the folder generated for this session, where a later session cannot find the files of feature"""
+        if self.outputDir is not None and self.outputDir == self.generated_outputDir:
+            print('Warning: outputDir was not specified, so ' + str(feature) + ' written to ' + str(self.outputDir) + ' cannot be found by a later session; specify outputDir to be able to resume')
+            return False
+        return True
+        
     def create_outputDir(self):
         fullPath = os.path.join(self.path, self.outputDir)
         if not os.path.exists(fullPath):
@@ -452,6 +605,7 @@ class leapctserver:
         else:
             self.data_type = self.TRANSMISSION
         self.projection_file = trans
+        self.projection_crop = None
     
     def set_attenuation_data_files(self, atten):
         if atten is None:
@@ -459,6 +613,7 @@ class leapctserver:
         else:
             self.data_type = self.ATTENUATION
         self.projection_file = atten
+        self.projection_crop = None
         
     def set_reconstruction_data_file(self, zslices):
         #if zslices is None:
@@ -515,46 +670,8 @@ class leapctserver:
         self.geometry_file
         """
         f = open(fileName, "w")
-        if self.path is not None and len(self.path) > 0:
-            f.write('path = ' + self.path + '\n')
-        if self.air_scan_file is not None and len(self.air_scan_file) > 0:
-            f.write('air_scan_file = ' + self.air_scan_file + '\n')
-        if self.dark_scan_file is not None and len(self.dark_scan_file) > 0:
-            f.write('dark_scan_file = ' + self.dark_scan_file + '\n')
-        if self.raw_scan_file is not None and len(self.raw_scan_file) > 0:
-            f.write('raw_scan_file = ' + self.raw_scan_file + '\n')
-        if self.projection_file is not None and len(self.projection_file) > 0:
-            f.write('projection_file = ' + self.projection_file + '\n')
-        if self.reconstruction_file is not None and len(self.reconstruction_file) > 0:
-            f.write('reconstruction_file = ' + self.reconstruction_file + '\n')
-        if self.geometry_file is not None and len(self.geometry_file) > 0:
-            f.write('geometry_file = ' + self.geometry_file + '\n')
-        
-        if self.data_type == self.RAW:
-            f.write('data_type = RAW\n')
-        elif self.data_type == self.RAW_DARK_SUBTRACTED:
-            f.write('data_type = RAW_DARK_SUBTRACTED\n')
-        elif self.data_type == self.TRANSMISSION:
-            f.write('data_type = TRANSMISSION\n')
-        elif self.data_type == self.ATTENUATION:
-            f.write('data_type = ATTENUATION\n')
-            
-        #"""
-        if self.source_spectra_file is not None and len(self.source_spectra_file) > 0:
-            f.write('source_spectra_file = ' + self.source_spectra_file + '\n')
-        elif self.kV is not None and self.kV > 0.0:
-            f.write('kV = ' + str(self.kV) + '\n')
-            f.write('anode_material = ' + str(self.anode_material) + '\n')
-            f.write('takeoff_angle = ' + str(self.takeoff_angle) + '\n')
-        if self.xray_filters is not None:
-            f.write('xray_filters = ' + str(self.xray_filters) + '\n')
-        if self.detector_response_model is not None:
-            f.write('detector_response_model = ' + str(self.detector_response_model) + '\n')
-        if self.object_model is not None:
-            f.write('object_model = ' + str(self.object_model) + '\n')
-        if self.reference_energy > 0.0:
-            f.write('reference_energy = ' + str(self.reference_energy) + '\n')
-        #"""
+        for key, value in self.parameters.serialize(self):
+            f.write(key + ' = ' + value + '\n')
         
         #f.write('max_CPU_memory_usage = ' + str(self.max_CPU_memory_usage) + '\n')
         #f.write('GPUs = ' + str(self.leapct.get_gpus()) + '\n')
@@ -589,16 +706,26 @@ class leapctserver:
     def load_projections(self, fileName=None):
         return self.load_projection_angles(fileName)
     
-    def load_projection_angles(self, fileName=None, inds=None):
+    def load_projection_angles(self, fileName=None, inds=None, out=None, rowRange=None, colRange=None):
         """load selected angles of projections
         
         Args:
             fileName (string): full path
             inds (list of two integers): specifies the range of projections to load
+            out (C contiguous float32 numpy array): if given, the projections are loaded into this array, which must have their shape
+            rowRange (list of two integers): if given, only these detector rows of the projections are loaded
+            colRange (list of two integers): if given, only these detector columns of the projections are loaded
             
         Returns:
-            3D numpy of the projections loaded from file
+            3D numpy of the projections loaded from file (or from g_compact, if it holds the projections of fileName;
+            reading all of them moves them out of compact storage, since the caller then holds them as self.g);
+            rowRange and colRange are relative to the window of projection_crop, if fileName is projection_file
         """
+        if self.g_compact is not None and (fileName is None or fileName == self.current_projection_file()):
+            g = self.g_compact.read(inds, 0, out, rowRange, colRange)
+            if inds is None and rowRange is None and colRange is None:
+                self.clear_compact_projections()
+            return g
         if fileName is None:
             if self.data_type == self.RAW or self.data_type == self.RAW_DARK_SUBTRACTED:
                 if self.raw_scan_file is None:
@@ -610,18 +737,30 @@ class leapctserver:
                     print('Error: projection_file is not specified!')
                     return None
                 fileName = self.projection_file
+        crop = self.projection_crop_window(fileName)
+        if crop is not None:
+            rowRange = self.crop_range(crop[0:2], rowRange)
+            colRange = self.crop_range(crop[2:4], colRange)
         fullPath = os.path.join(self.path, fileName)
         #if os.path.isfile(fullPath) == False:
         #    print('Error: ' + str(fullPath) + ' does not exist!')
         #    return None
         dataFolder, baseFileName = os.path.split(fullPath)
         if "sino" in baseFileName:
-            if inds is not None:
-                g = np.zeros((inds[1]-inds[0]+1, self.leapct.get_numRows(), self.leapct.get_numCols()),dtype=np.float32)
+            numRows = self.leapct.get_numRows()
+            if rowRange is not None:
+                numRows = rowRange[1]-rowRange[0]+1
+            numCols = self.leapct.get_numCols()
+            if colRange is not None:
+                numCols = colRange[1]-colRange[0]+1
+            if out is not None:
+                g = out
+            elif inds is not None:
+                g = np.zeros((inds[1]-inds[0]+1, numRows, numCols),dtype=np.float32)
             else:
-                g = np.zeros((self.leapct.get_numAngles(), self.leapct.get_numRows(), self.leapct.get_numCols()),dtype=np.float32)
+                g = np.zeros((self.leapct.get_numAngles(), numRows, numCols),dtype=np.float32)
             #g = np.swapaxes(g, 0, 1)
-            self.leapct.load_data(fullPath, x=g, fileRange=None, rowRange=inds, colRange=None, axis_split=1)
+            self.leapct.load_data(fullPath, x=g, fileRange=rowRange, rowRange=inds, colRange=colRange, axis_split=1)
             #g = np.swapaxes(g, 0, 1)
             #g = np.ascontiguousarray(g, dtype=np.float32)
             """
@@ -641,20 +780,24 @@ class leapctserver:
                     g[n,:,:] = anImage[:,:]
             """
         else:
-            g = self.leapct.load_data(fullPath, x=None, fileRange=inds, rowRange=None, colRange=None)
+            g = self.leapct.load_data(fullPath, x=out, fileRange=inds, rowRange=rowRange, colRange=colRange)
         #self.g = g # ?
         return g
         
-    def load_projection_rows(self, fileName=None, inds=None):
+    def load_projection_rows(self, fileName=None, inds=None, out=None):
         """load selected rows of projections
         
         Args:
             fileName (string): full path
             inds (list of two integers): specifies the range of detector rows to load
+            out (C contiguous float32 numpy array): if given, the sinograms are loaded into this array, which must have their shape
             
         Returns:
-            3D numpy of the sinograms loaded from file
+            3D numpy of the sinograms loaded from file (or from g_compact, if it holds the projections of fileName);
+            inds are relative to the window of projection_crop, if fileName is projection_file
         """
+        if self.g_compact is not None and (fileName is None or fileName == self.current_projection_file()):
+            return self.g_compact.read(inds, 1, out)
         if fileName is None:
             if self.data_type == self.RAW or self.data_type == self.RAW_DARK_SUBTRACTED:
                 if self.raw_scan_file is None:
@@ -666,59 +809,83 @@ class leapctserver:
                     print('Error: projection_file is not specified!')
                     return None
                 fileName = self.projection_file
+        colRange = None
+        crop = self.projection_crop_window(fileName)
+        if crop is not None:
+            inds = self.crop_range(crop[0:2], inds)
+            colRange = [crop[2], crop[3]]
         fullPath = os.path.join(self.path, fileName)
         #if os.path.isfile(fullPath) == False:
         #    print('Error: ' + str(fullPath) + ' does not exist!')
         #    return None
         dataFolder, baseFileName = os.path.split(fullPath)
         if "sino" in baseFileName:
-            if inds is not None:
+            if out is not None:
+                g = out
+            elif inds is not None:
                 g = np.zeros((self.leapct.get_numAngles(), inds[1]-inds[0]+1, self.leapct.get_numCols()),dtype=np.float32)
             else:
                 g = np.zeros((self.leapct.get_numAngles(), self.leapct.get_numRows(), self.leapct.get_numCols()),dtype=np.float32)
             #g = np.swapaxes(g, 0, 1)
-            g = self.leapct.load_data(fullPath, x=g, fileRange=inds, rowRange=None, colRange=None, axis_split=1)
+            g = self.leapct.load_data(fullPath, x=g, fileRange=inds, rowRange=None, colRange=colRange, axis_split=1)
             #g = np.swapaxes(g, 0, 1)
             #g = np.ascontiguousarray(g, dtype=np.float32)
         else:
-            g = self.leapct.load_data(fullPath, x=None, fileRange=None, rowRange=inds, colRange=None)
+            g = self.leapct.load_data(fullPath, x=out, fileRange=None, rowRange=inds, colRange=colRange)
         #self.g = g # ?
         return g
     
+    def projection_crop_window(self, fileName):
+        """Returns the window of the files of fileName that is read (projection_crop if fileName is projection_file), None to read whole projections"""
+        if self.projection_crop is None or fileName is None or fileName != self.projection_file:
+            return None
+        return self.projection_crop
+        
+    def crop_range(self, window, r):
+        """Returns the range r of indices of the window [first, last] (the whole window if r is None) as indices of the whole detector"""
+        if r is None:
+            return [window[0], window[1]]
+        return [window[0]+r[0], window[0]+r[1]]
+        
     def save_projection_angles(self, g=None, seq_offset=0, update_params=False):
         """Saves the projection data in a sequence of tif files, one file for each projection angle
         
         Args:
-            g (C contiguous float32 numpy array or torch tensor): projection data
+            g (float32 numpy array or torch tensor): projection data; a numpy array may be a view (e.g., the interior of a chunk), which is not copied as a whole
             seq_offset (int): the file sequence number for the first file
             
+        If there are no projections in memory, the projections in compact storage or the window of the files of
+        projection_file given by projection_crop (see crop_projections) are saved.
+            
         Returns:
             The base file name of the saved data, if failed to write to file returns None
         """
         if g is None:
             g = self.g
-        if g is None:
+        if g is None and self.g_compact is None and self.projection_crop is None:
             print('Error: no projection data exists to save')
             return None
         self.create_outputDir()
-        #if self.data_type == self.RAW or self.data_type == self.RAW_DARK_SUBTRACTED:
-        #    fileName = self.raw_scan_file
-        #else:
-        #    fileName = self.projection_file
-        fileName = self.get_default_projection_file_name()
-        
-        if self.outputDir in fileName:
-            newFileName = fileName
-        else:
-            newFileName = os.path.join(self.outputDir, fileName)
+        newFileName = self.projection_angles_file_name()
         fullPath = os.path.join(self.path, newFileName)
         
-        if self.leapct.save_projections(fullPath, g, seq_offset) == True:
+        saver = lambda fullPath, x, seq_offset: self.leapct.save_projections(fullPath, x, seq_offset)
+        if g is None and self.g_compact is not None:
+            isSuccessful = self.save_in_batches(lambda inds: self.g_compact.read(inds, 0), self.g_compact.shape, saver, fullPath, 0, self.full_projection_shape())
+        elif g is None:
+            isSuccessful = self.save_in_batches(lambda inds: self.load_projection_angles(self.projection_file, inds), self.full_projection_shape(), saver, fullPath, 0, self.full_projection_shape())
+        elif g is self.g:
+            isSuccessful = self.save_sequence_incremental(fullPath, g, 0, saver, self.g_dirty_angles)
+        else:
+            isSuccessful = self.write_view(saver, fullPath, g, seq_offset, 0)
+            if isSuccessful == True:
+                self.record_saved_chunk(fullPath, g, seq_offset, 0, self.full_projection_shape())
+        if isSuccessful == True:
             if update_params:
-                if self.data_type == self.TRANSMISSION or self.data_type == self.ATTENUATION:
-                    self.projection_file = newFileName
-                else:
-                    self.raw_scan_file = newFileName
+                self.set_projection_file_name(newFileName)
+            elif (g is None or g is self.g) and newFileName == self.projection_file:
+                # the files of projection_file now hold the cropped projections
+                self.projection_crop = None
             return newFileName
         else:
             return None
@@ -727,7 +894,7 @@ class leapctserver:
         """Saves the volume data in a sequence of tif files, one file for each z-slice
         
         Args:
-            f (C contiguous float32 numpy array or torch tensor): volume data
+            f (float32 numpy array or torch tensor): volume data; a numpy array may be a view (e.g., the interior of a chunk), which is not copied as a whole
             seq_offset (int): the file sequence number for the first file
             
         Returns:
@@ -735,25 +902,37 @@ class leapctserver:
         """
         if f is None:
             f = self.f
-        if f is None:
+        if f is None and self.f_compact is None:
             print('Error: no volume data exists to save')
             return None
         self.create_outputDir()
-        fileName = 'zslice.tif'
-        if self.outputDir in fileName:
-            newFileName = fileName
-        else:
-            newFileName = os.path.join(self.outputDir, fileName)
+        newFileName = self.volume_file_name()
         fullPath = os.path.join(self.path, newFileName)
         
-        if self.leapct.save_volume(fullPath, f, seq_offset) == True:
+        saver = lambda fullPath, x, seq_offset: self.leapct.save_volume(fullPath, x, seq_offset)
+        if f is None:
+            isSuccessful = self.save_in_batches(lambda inds: self.f_compact.read(inds, 0), self.f_compact.shape, saver, fullPath, 0, self.full_volume_shape())
+        elif f is self.f:
+            isSuccessful = self.save_sequence_incremental(fullPath, f, 0, saver, self.f_dirty_slices)
+        else:
+            isSuccessful = self.write_view(saver, fullPath, f, seq_offset, 0)
+            if isSuccessful == True:
+                self.record_saved_chunk(fullPath, f, seq_offset, 0, self.full_volume_shape())
+        if isSuccessful == True:
             if update_params:
                 self.reconstruction_file = newFileName
             return newFileName
         else:
             return None
             
-    def load_volume(self, fileName, inds):
+    def load_volume(self, fileName=None, inds=None, out=None):
+        """load selected z-slices of the volume (from f_compact if it holds the volume); if out (C contiguous float32 numpy array) is given, the slices are loaded into it"""
+        if self.f_compact is not None and (fileName is None or fileName == self.reconstruction_file):
+            f = self.f_compact.read(inds, 0, out)
+            if inds is None:
+                # the caller holds the whole volume as self.f
+                self.clear_compact_volume()
+            return f
         if fileName is None:
             if self.reconstruction_file is None or len(self.reconstruction_file) == 0:
                 print('Error: reconstruction_file is not defined!')
@@ -763,9 +942,40 @@ class leapctserver:
         #if os.path.isfile(fullPath) == False:
         #    print('Error: ' + str(fullPath) + ' does not exist!')
         #    return None
-        f = self.leapct.load_data(fullPath, x=None, fileRange=inds, rowRange=None, colRange=None)
+        f = self.leapct.load_data(fullPath, x=out, fileRange=inds, rowRange=None, colRange=None)
         return f
         
+    def projection_angles_file_name(self):
+        """Returns the file name (relative to path) that save_projection_angles writes to"""
+        fileName = self.get_default_projection_file_name()
+        if self.outputDir in fileName:
+            return fileName
+        else:
+            return os.path.join(self.outputDir, fileName)
+            
+    def projection_rows_file_name(self):
+        """Returns the file name (relative to path) that save_projection_rows writes to"""
+        if self.data_type == self.RAW:
+            fileName = 'sino_raw.tif'
+        elif self.data_type == self.RAW_DARK_SUBTRACTED:
+            fileName = 'sino_rawDarkSub.tif'
+        elif self.data_type == self.TRANSMISSION:
+            fileName = 'sino_trans.tif'
+        else:
+            fileName = 'sino.tif'
+        return os.path.join(self.outputDir, fileName)
+        
+    def volume_file_name(self):
+        """Returns the file name (relative to path) that save_volume writes to"""
+        return os.path.join(self.outputDir, 'zslice.tif')
+        
+    def set_projection_file_name(self, newFileName):
+        if self.data_type == self.TRANSMISSION or self.data_type == self.ATTENUATION:
+            self.projection_file = newFileName
+            self.projection_crop = None
+        else:
+            self.raw_scan_file = newFileName
+    
     def get_default_projection_file_name(self):
         if self.outName is not None and len(self.outName) > 0:
             return self.outName
@@ -780,32 +990,26 @@ class leapctserver:
         else:
             return 'image.tif'
     
-    def save_projection_rows(self, g, seq_offset=0, update_params=False):
+    def save_projection_rows(self, g=None, seq_offset=0, update_params=False):
         """Saves the projection data in a sequence of tif files, one file for each detector row
         
         Args:
-            g (C contiguous float32 numpy array or torch tensor): projection data
+            g (float32 numpy array or torch tensor): projection data; a numpy array may be a view (e.g., the interior rows of a chunk), which is not copied as a whole
             seq_offset (int): the file sequence number for the first file
             
+        If there are no projections in memory, the projections in compact storage or the window of the files of
+        projection_file given by projection_crop (see crop_projections) are saved.
+            
         Returns:
             The base file name of the saved data, if failed to write to file returns None
         """
+        if g is None:
+            g = self.g
+        if g is None and self.g_compact is None and self.projection_crop is None:
+            print('Error: no projection data exists to save')
+            return None
         self.create_outputDir()
-        if self.data_type == self.RAW:
-            fileName = 'sino_raw.tif'
-        elif self.data_type == self.RAW_DARK_SUBTRACTED:
-            fileName = 'sino_rawDarkSub.tif'
-        elif self.data_type == self.TRANSMISSION:
-            fileName = 'sino_trans.tif'
-        elif self.data_type == self.ATTENUATION:
-            fileName = 'sino.tif'
-        else:
-            fileName = 'sino.tif'
-            
-        if self.outputDir in fileName:
-            newFileName = fileName
-        else:
-            newFileName = os.path.join(self.outputDir, fileName)
+        newFileName = self.projection_rows_file_name()
         fullPath = os.path.join(self.path, newFileName)
         
         #g = np.swapaxes(g, 0, 1)
@@ -813,16 +1017,214 @@ class leapctserver:
         #g = np.swapaxes(g, 0, 1)
         #g = np.ascontiguousarray(g, dtype=np.float32)
         
-        if self.leapct.save_projections(fullPath, g, seq_offset, axis_split=1) == True:
+        saver = lambda fullPath, x, seq_offset: self.leapct.save_projections(fullPath, x, seq_offset, axis_split=1)
+        if g is None and self.g_compact is not None:
+            isSuccessful = self.save_in_batches(lambda inds: self.g_compact.read(inds, 1), self.g_compact.shape, saver, fullPath, 1, self.full_projection_shape())
+        elif g is None:
+            # rows are read in increasing order, so the window can be saved over the files it is read from
+            isSuccessful = self.save_in_batches(lambda inds: self.load_projection_rows(self.projection_file, inds), self.full_projection_shape(), saver, fullPath, 1, self.full_projection_shape())
+        elif g is self.g:
+            isSuccessful = self.save_sequence_incremental(fullPath, g, 1, saver, self.g_dirty_rows)
+        else:
+            isSuccessful = self.write_view(saver, fullPath, g, seq_offset, 1)
+            if isSuccessful == True:
+                self.record_saved_chunk(fullPath, g, seq_offset, 1, self.full_projection_shape())
+        if isSuccessful == True:
+            if g is None:
+                # the rows past the end of cropped rows written over a longer sequence
+                self.remove_sequence_tail(newFileName, self.full_projection_shape()[1])
+            elif g is self.g:
+                self.remove_sequence_tail(newFileName, g.shape[1])
             if update_params:
-                if self.data_type == self.TRANSMISSION or self.data_type == self.ATTENUATION:
-                    self.projection_file = newFileName
-                else:
-                    self.raw_scan_file = newFileName
+                self.set_projection_file_name(newFileName)
+            elif (g is None or g is self.g) and newFileName == self.projection_file:
+                # the files of projection_file now hold the cropped projections
+                self.projection_crop = None
             return newFileName
         else:
             return None
     
+    def save_in_batches(self, reader, shape, saver, fullPath, axis, full_shape, batch_bytes=2**26):
+        """Writes data of the given shape that are not in memory (in compact storage or a cropped window of files) as a file sequence split along axis
+        
+        reader(inds) returns the float32 data of the range inds of indices along axis; about batch_bytes of the data are read and written at a time.
+        """
+        sliceBytes = 4.0*float(np.prod(shape))/float(shape[axis])
+        batch = max(1, int(batch_bytes / sliceBytes))
+        N = shape[axis]
+        for first in range(0, N, batch):
+            last = min(N-1, first+batch-1)
+            x = reader([first, last])
+            if x is None or saver(fullPath, x, first) == False:
+                return False
+            self.record_saved_chunk(fullPath, x, first, axis, full_shape)
+        return True
+            
+    def remove_sequence_tail(self, fileName, numFiles):
+        """Deletes the files of the sequence fileName (relative to path) after its first numFiles, e.g., the files left over when a shorter sequence was written over it"""
+        fileList = self.leapct.get_file_list(os.path.join(self.path, fileName))
+        if fileList is None or len(fileList) <= numFiles:
+            return
+        for index, fullPath in sequence_files(fileList).items():
+            if index >= numFiles:
+                os.remove(fullPath)
+                
+    def full_projection_shape(self):
+        if self.leapct.ct_geometry_defined():
+            return [self.leapct.get_numAngles(), self.leapct.get_numRows(), self.leapct.get_numCols()]
+        else:
+            return None
+            
+    def full_volume_shape(self):
+        if self.leapct.ct_volume_defined():
+            return [self.leapct.get_numZ(), self.leapct.get_numY(), self.leapct.get_numX()]
+        else:
+            return None
+    
+    def mark_projections_modified(self, angleRange=None, rowRange=None):
+        """Records that part of the projection data in memory has been modified
+        
+        Only needed if verify_incremental_saves is False, otherwise modified files are found by their checksums.
+        
+        Args:
+            angleRange (list of two integers): the range of projection angles that were modified; if None, all angles
+            rowRange (list of two integers): the range of detector rows that were modified; if None, all rows
+        """
+        if self.g is None:
+            return
+        self.new_projection_generation()
+        if angleRange is None:
+            self.g_dirty_angles.mark_all(self.g.shape[0])
+        else:
+            self.g_dirty_angles.mark(angleRange[0], angleRange[1])
+        if rowRange is None:
+            self.g_dirty_rows.mark_all(self.g.shape[1])
+        else:
+            self.g_dirty_rows.mark(rowRange[0], rowRange[1])
+            
+    def mark_volume_modified(self, sliceRange=None):
+        """Records that the z-slices in sliceRange (all slices if None) of the volume in memory have been modified"""
+        if self.f is None:
+            return
+        if sliceRange is None:
+            self.f_dirty_slices.mark_all(self.f.shape[0])
+        else:
+            self.f_dirty_slices.mark(sliceRange[0], sliceRange[1])
+            
+    def buffer_processed_in_memory(self, x):
+        """Called after an algorithm has processed all of self.g or self.f in place"""
+        if x is self.g:
+            self.new_projection_generation()
+        if self.verify_incremental_saves == False:
+            if x is self.g:
+                self.mark_projections_modified()
+            elif x is self.f:
+                self.mark_volume_modified()
+    
+    def write_view(self, saver, fullPath, x, seq_offset, axis, batch_bytes=2**26):
+        """Writes x as a file sequence, starting at file seq_offset, where x may be a view (e.g., the interior of a chunk without its overlap)
+        
+        C contiguous arrays are passed to saver as they are.  Other views are copied a few files at a time
+        into a pooled buffer of about batch_bytes bytes, never as a whole.
+        
+        Args:
+            saver (function): saver(fullPath, x, seq_offset) writes a C contiguous array x as a file sequence
+            fullPath (string): full path of the base file name of the sequence
+            x (float32 numpy array): the data to save
+            seq_offset (int): the file sequence number of the first file
+            axis (int): the axis of x that is split into separate files (0 or 1)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if x.flags['C_CONTIGUOUS']:
+            return saver(fullPath, x, seq_offset)
+        N = x.shape[axis]
+        batch = max(1, min(N, int(batch_bytes // max(1, x.nbytes // max(1, N)))))
+        for first in range(0, N, batch):
+            last = min(N, first+batch)
+            if axis == 0:
+                x_view = x[first:last]
+            else:
+                x_view = x[:,first:last,:]
+            x_batch = self.chunk_buffer(x_view.shape)
+            np.copyto(x_batch, x_view)
+            retVal = saver(fullPath, x_batch, seq_offset+first)
+            self.release_chunk_buffer(x_batch)
+            if retVal == False:
+                return False
+        return True
+        
+    def save_sequence_incremental(self, fullPath, x, axis, saver, dirty):
+        """Saves a whole buffer as a file sequence, only rewriting the files that changed since the last save
+        
+        The state of the file sequence is tracked by a SaveManifest stored next to the files.
+        If there is no manifest, the manifest does not match the buffer, or some of the files are missing,
+        the whole sequence is written.  Files that were changed on disk since they were written are rewritten.
+        
+        Args:
+            fullPath (string): full path of the base file name of the sequence
+            x (C contiguous float32 numpy array): the data to save
+            axis (int): the axis of x that is split into separate files
+            saver (function): saver(fullPath, x_chunk, seq_offset) writes x_chunk starting at file seq_offset
+            dirty (DirtyRanges): index ranges of x known to be modified
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        N = x.shape[axis]
+        manifest = SaveManifest.load(fullPath)
+        if manifest is not None and manifest.matches(x, axis):
+            fileList = self.leapct.get_file_list(fullPath)
+            if fileList is None or len(fileList) < N:
+                manifest = None
+        else:
+            manifest = None
+            
+        if manifest is None:
+            if saver(fullPath, x, 0) == False:
+                return False
+            manifest = SaveManifest(fullPath, x.shape, axis)
+            manifest.update(x, 0, axis)
+            manifest.rewritten = [[0, N-1]]
+            manifest.kept = []
+        else:
+            for n in manifest.changed_on_disk(fileList):
+                manifest.checksums[n] = None
+            inds, checksums = manifest.changed_indices(x, dirty, self.verify_incremental_saves)
+            rewritten = contiguous_ranges(inds)
+            for r in rewritten:
+                if axis == 0:
+                    x_chunk = x[r[0]:r[1]+1]
+                else:
+                    x_chunk = x[:,r[0]:r[1]+1,:]
+                if self.write_view(saver, fullPath, x_chunk, r[0], axis) == False:
+                    manifest.remove()
+                    return False
+            rewritten_inds = set(inds)
+            kept = [n for n in range(N) if n not in rewritten_inds]
+            manifest.checksums = checksums
+            manifest.rewritten = rewritten
+            manifest.kept = contiguous_ranges(kept)
+            if len(inds) < N:
+                print('rewrote ' + str(len(inds)) + ' of ' + str(N) + ' files; other files left in place')
+        manifest.record_files(self.leapct.get_file_list(fullPath))
+        manifest.save()
+        dirty.clear()
+        return True
+        
+    def record_saved_chunk(self, fullPath, x, seq_offset, axis, full_shape):
+        """Updates the SaveManifest of a file sequence after a chunk of it was written"""
+        if full_shape is None:
+            return
+        manifest = SaveManifest.load(fullPath)
+        if manifest is None or manifest.shape != [int(n) for n in full_shape] or manifest.axis != axis:
+            manifest = SaveManifest(fullPath, full_shape, axis)
+        manifest.update(x, seq_offset, axis)
+        manifest.rewritten = [[seq_offset, seq_offset+x.shape[axis]-1]]
+        manifest.record_files(self.leapct.get_file_list(fullPath), seq_offset, seq_offset+x.shape[axis]-1)
+        manifest.save()
+    
     def get_zslice(self, iz, thickness=1):
         # TODO: read from file if not loaded in memory
         if self.f is None:
@@ -929,20 +1331,179 @@ class leapctserver:
     ###################################################################################################################
     ###################################################################################################################
     def set_projection_data(self, g):
+        self.clear_compact_projections()
         self.g = g
+        self.mark_projections_modified()
         
     def clear_projection_data(self):
         if self.g is not None:
             del self.g
         self.g = None
+        self.g_dirty_angles.clear()
+        self.g_dirty_rows.clear()
+        self.clear_compact_projections()
         
     def set_volume_data(self, f):
+        self.clear_compact_volume()
         self.f = f
+        self.mark_volume_modified()
         
     def clear_volume_data(self):
         if self.f is not None:
             del self.f
         self.f = None
+        self.f_dirty_slices.clear()
+        self.clear_compact_volume()
+        
+    def current_projection_file(self):
+        """Returns the file name of the current projection data (raw_scan_file for raw data, projection_file otherwise)"""
+        if self.data_type == self.TRANSMISSION or self.data_type == self.ATTENUATION:
+            return self.projection_file
+        else:
+            return self.raw_scan_file
+        
+    def storage_bytes(self):
+        """Returns the number of bytes per value of the projections or volume held in compact storage (4 if storage_precision is float32 or invalid)"""
+        numBytes = storage_bytes(self.storage_precision)
+        if numBytes is None:
+            print('Warning: invalid storage_precision (' + str(self.storage_precision) + '); using float32')
+            return 4
+        return numBytes
+        
+    def compact_projection_memory(self):
+        """Returns the memory (GB) of the projections in storage_precision"""
+        return self.projection_memory() * self.storage_bytes() / 4.0
+        
+    def compact_volume_memory(self):
+        """Returns the memory (GB) of the volume in storage_precision"""
+        return self.volume_memory() * self.storage_bytes() / 4.0
+        
+    def fits_compact(self, compact_memory, working_memory):
+        """Returns True if data in compact storage (compact_memory GB) leaves room for chunks of at least 1/16 of the float32 working memory of an algorithm"""
+        if self.storage_bytes() >= 4:
+            return False
+        budget = self.max_CPU_memory_usage - self.scratch_space - self.memory_accountant.registered_memory()
+        return compact_memory + working_memory / 16.0 < budget
+        
+    def compact_projections(self):
+        """Moves the projections (self.g or, if it is None, the current projection file) into compact storage
+        
+        Only done if storage_precision is not float32 and the compressed projections fit in memory (see fits_compact)
+        with the float32 chunks of the algorithm (self.num_proj copies of the projections).
+        
+        Returns:
+            True if the projections are in self.g_compact, False otherwise
+        """
+        if self.g_compact is not None:
+            return True
+        if self.fits_compact(self.compact_projection_memory(), self.num_proj*self.projection_memory()) == False:
+            return False
+        if self.g is not None:
+            if type(self.g) is not np.ndarray:
+                return False
+            with self.profiler.span('compact_projections', 'copy', self.g.nbytes):
+                g_compact = CompactArray.from_array(self.g, self.storage_precision)
+            del self.g
+            self.g = None
+            self.g_dirty_angles.clear()
+            self.g_dirty_rows.clear()
+        else:
+            input_file = self.current_projection_file()
+            if input_file is None:
+                return False
+            numAngles = self.leapct.get_numAngles()
+            g_compact = CompactArray([numAngles, self.leapct.get_numRows(), self.leapct.get_numCols()], self.storage_precision)
+            block = max(1, int(2.0**28 / (4.0*self.leapct.get_numRows()*self.leapct.get_numCols())))
+            for angleStart in range(0, numAngles, block):
+                angleEnd = min(numAngles-1, angleStart+block-1)
+                with self.profiler.span('compact_projections', 'read') as span:
+                    g_chunk = self.chunk_buffer([angleEnd-angleStart+1, self.leapct.get_numRows(), self.leapct.get_numCols()])
+                    g_chunk = self.load_projection_angles(input_file, [angleStart, angleEnd], g_chunk)
+                    span.add_bytes(g_chunk)
+                if g_chunk is None:
+                    print('Error: failed to load projections')
+                    return False
+                with self.profiler.span('compact_projections', 'copy', g_chunk.nbytes):
+                    g_compact.write(g_chunk, angleStart)
+                self.release_chunk_buffer(g_chunk)
+        self.set_compact_projections(g_compact)
+        print('projections held in ' + str(self.storage_precision) + ' (' + str(round(float(g_compact.nbytes)/2.0**30, 3)) + ' GB)')
+        return True
+        
+    def compact_volume(self, allocate=False):
+        """Moves the volume (self.f or, if it is None, reconstruction_file) into compact storage
+        
+        Only done if storage_precision is not float32 and the compressed volume fits in memory (see fits_compact)
+        with the float32 chunks of the algorithm (self.num_vol copies of the volume).
+        
+        Args:
+            allocate (bool): if True, the volume is not read but allocated (e.g., for the output of a reconstruction)
+            
+        Returns:
+            True if the volume is in self.f_compact, False otherwise
+        """
+        if self.f_compact is not None and allocate == False:
+            return True
+        if self.fits_compact(self.compact_volume_memory(), max(1, self.num_vol)*self.volume_memory()) == False:
+            return False
+        numZ = self.leapct.get_numZ()
+        if allocate:
+            self.clear_volume_data()
+            f_compact = CompactArray([numZ, self.leapct.get_numY(), self.leapct.get_numX()], self.storage_precision)
+        elif self.f is not None:
+            if type(self.f) is not np.ndarray:
+                return False
+            with self.profiler.span('compact_volume', 'copy', self.f.nbytes):
+                f_compact = CompactArray.from_array(self.f, self.storage_precision)
+            del self.f
+            self.f = None
+            self.f_dirty_slices.clear()
+        else:
+            if self.reconstruction_file is None or len(self.reconstruction_file) == 0:
+                return False
+            f_compact = CompactArray([numZ, self.leapct.get_numY(), self.leapct.get_numX()], self.storage_precision)
+            block = max(1, int(2.0**28 / (4.0*self.leapct.get_numY()*self.leapct.get_numX())))
+            for sliceStart in range(0, numZ, block):
+                sliceEnd = min(numZ-1, sliceStart+block-1)
+                with self.profiler.span('compact_volume', 'read') as span:
+                    f_chunk = self.chunk_buffer([sliceEnd-sliceStart+1, self.leapct.get_numY(), self.leapct.get_numX()])
+                    f_chunk = self.load_volume(self.reconstruction_file, [sliceStart, sliceEnd], f_chunk)
+                    span.add_bytes(f_chunk)
+                if f_chunk is None:
+                    print('Error: failed to load volume')
+                    return False
+                with self.profiler.span('compact_volume', 'copy', f_chunk.nbytes):
+                    f_compact.write(f_chunk, sliceStart)
+                self.release_chunk_buffer(f_chunk)
+        self.set_compact_volume(f_compact)
+        print('volume held in ' + str(self.storage_precision) + ' (' + str(round(float(f_compact.nbytes)/2.0**30, 3)) + ' GB)')
+        return True
+        
+    def set_compact_projections(self, g_compact):
+        self.g_compact = g_compact
+        self.memory_accountant.register('g_compact', int(g_compact.nbytes))
+        
+    def clear_compact_projections(self):
+        self.g_compact = None
+        self.memory_accountant.release('g_compact')
+        
+    def set_compact_volume(self, f_compact):
+        self.f_compact = f_compact
+        self.memory_accountant.register('f_compact', int(f_compact.nbytes))
+        
+    def clear_compact_volume(self):
+        self.f_compact = None
+        self.memory_accountant.release('f_compact')
+        
+    def write_compact_chunk(self, run, x_compact, x, seq_offset, axis=0, inputRange=None):
+        """Compresses a processed chunk into compact storage and marks its range completed in the run manifest (the counterpart of commit_chunk)"""
+        x_compact.write(x, seq_offset, axis)
+        if x_compact is self.g_compact:
+            self.new_projection_generation()
+        if inputRange is None:
+            inputRange = [seq_offset, seq_offset+x.shape[axis]-1]
+        run.mark_completed(int(inputRange[0]), int(inputRange[1]))
+        return True
         
     def available_RAM(self):
         """Returns the amount of available CPU RAM in GB"""
@@ -969,7 +1530,31 @@ class leapctserver:
             return float(x.nbytes) / 2.0**30
         
     def memory_usage(self):
-        return self.memory_used_by_array(self.g) + self.memory_used_by_array(self.f)
+        return self.memory_used_by_array(self.g) + self.memory_used_by_array(self.f) + self.memory_accountant.registered_memory()
+        
+    def chunk_buffer(self, shape):
+        """Returns an uninitialized float32 array for a chunk from the buffer pool; give it back with release_chunk_buffer"""
+        x = self.buffer_pool.acquire(shape)
+        self.memory_accountant.register('buffer_pool', self.buffer_pool.total_bytes())
+        return x
+        
+    def release_chunk_buffer(self, x):
+        """Returns a chunk array (or a view of it) to the buffer pool; arrays that are not from the pool are ignored"""
+        self.buffer_pool.release(x)
+        
+    def clear_chunk_buffers(self):
+        """Frees the pooled chunk buffers, e.g., when a chunked run ends"""
+        self.buffer_pool.clear()
+        self.memory_accountant.register('buffer_pool', self.buffer_pool.total_bytes())
+        
+    def chunk_memory_budget(self):
+        """Returns the memory (GB) that the chunk planner may assume a chunk has
+        
+        This is max_CPU_memory_usage less the scratch space and the registered buffers, divided by the
+        measured overhead of the algorithm being chunked (see memory_accountant.py).
+        """
+        budget = self.max_CPU_memory_usage - self.scratch_space - self.memory_accountant.registered_memory()
+        return budget / self.memory_accountant.overhead()
         
         
     def projection_memory(self):
@@ -990,6 +1575,25 @@ class leapctserver:
         else:
             return 0.0
         
+    def memory_multiples(self, algorithmName, **kwargs):
+        """Returns the number of projection-sized and volume-sized arrays (num_proj, num_vol) that an algorithm holds in memory
+        
+        These are the numbers that the algorithm plans its chunks (see set_chunk_size) or its in-memory run (see iterative_reconstruction) with.
+        
+        Args:
+            algorithmName (string): name of the leapctserver algorithm
+            kwargs: the keyword arguments of the algorithm, for the algorithms whose memory depends on them
+            
+        Returns:
+            (num_proj, num_vol), None if the algorithm is not known
+        """
+        if algorithmName == 'bin_projections':
+            binFactor = kwargs.get('rowFactor', 1) * kwargs.get('colFactor', 1) * kwargs.get('angleFactor', 1)
+            return (1 + 1.0 / float(max(1, binFactor)), 0)
+        if algorithmName == 'ringRemoval' and kwargs.get('which', 'fast') != 'fast':
+            return (3, 0)
+        return ALGORITHM_MEMORY.get(algorithmName, None)
+        
     """
     [self.PROJECTION, self.DETECTOR_ROW, self.Z_SLICE] = [0, 1, 2]
     self.chunking_type = self.PROJECTION
@@ -1007,6 +1611,8 @@ class leapctserver:
             self.num_proj
             self.num_vol
         
+        The chunks are float32.  Projections or a volume held in compact storage (see storage_precision) are
+        registered buffers of 2 bytes per value, so the chunks are sized to the memory that remains next to them.
         """
         
         if self.chunking_type == self.PROJECTION:
@@ -1015,12 +1621,13 @@ class leapctserver:
                 return False
         
             self.num_proj = max(1, self.num_proj)
-            if self.num_proj * self.projection_memory() < self.max_CPU_memory_usage - self.scratch_space:
+            memory_budget = self.chunk_memory_budget()
+            if self.num_proj * self.projection_memory() < memory_budget:
                 self.chunk_size = self.leapct.get_numAngles()
             else:
                 numAngles = self.leapct.get_numAngles()
-                #chunk_size * self.num_proj * self.projection_memory() / float(numAngles) = self.max_CPU_memory_usage - self.scratch_space
-                self.chunk_size = int(float((self.max_CPU_memory_usage - self.scratch_space) * float(numAngles) / (self.num_proj * self.projection_memory())))
+                #chunk_size * self.num_proj * self.projection_memory() / float(numAngles) = memory_budget
+                self.chunk_size = max(1, int(float(memory_budget * float(numAngles) / (self.num_proj * self.projection_memory()))))
                 
                 numChunks = int(np.ceil(float(numAngles)/float(self.chunk_size)))
                 self.chunk_size = int(np.ceil(float(numAngles)/float(numChunks)))
@@ -1031,11 +1638,12 @@ class leapctserver:
                 return False
         
             self.num_proj = max(1, self.num_proj)
-            if self.num_proj * self.projection_memory() < self.max_CPU_memory_usage - self.scratch_space:
+            memory_budget = self.chunk_memory_budget()
+            if self.num_proj * self.projection_memory() < memory_budget:
                 self.chunk_size = self.leapct.get_numRows()
             else:
                 numRows = self.leapct.get_numRows()
-                self.chunk_size = int(float((self.max_CPU_memory_usage - self.scratch_space) * float(numRows) / (self.num_proj * self.projection_memory())))
+                self.chunk_size = max(1, int(float(memory_budget * float(numRows) / (self.num_proj * self.projection_memory()))))
                 
                 numChunks = int(np.ceil(float(numRows)/float(self.chunk_size)))
                 self.chunk_size = int(np.ceil(float(numRows)/float(numChunks)))
@@ -1047,7 +1655,7 @@ class leapctserver:
                 print('Error: CT volume not defined!')
                 return False
 
-            memory_remaining = self.max_CPU_memory_usage - self.scratch_space - self.memory_usage()
+            memory_remaining = (self.max_CPU_memory_usage - self.scratch_space - self.memory_usage()) / self.memory_accountant.overhead()
             if memory_remaining <= 0.0:
                 return False
                 
@@ -1055,16 +1663,28 @@ class leapctserver:
             
             if self.num_proj <= 0:
                 # Postprocessing Algorithm
-                if self.num_vol * self.volume_memory() < self.max_CPU_memory_usage - self.scratch_space:
+                memory_budget = self.chunk_memory_budget()
+                if self.num_vol * self.volume_memory() < memory_budget:
                     self.chunk_size = numZ
                 else:
-                    self.chunk_size = int(float((self.max_CPU_memory_usage - self.scratch_space) * float(numZ) / (self.num_vol * self.volume_memory())))
+                    self.chunk_size = max(1, int(float(memory_budget * float(numZ) / (self.num_vol * self.volume_memory()))))
                     
                     numChunks = int(np.ceil(float(numZ)/float(self.chunk_size)))
                     self.chunk_size = int(np.ceil(float(numZ)/float(numChunks)))
             else:
                 # Reconstruction Algorithm
                 numRows = float(self.leapct.get_numRows())
+                if self.independent_rows():
+                    # every z-slice needs the same number of detector rows and slabs do not overlap
+                    rowsPerSlice = max(1.0, self.leapct.get_voxelHeight() / self.leapct.get_pixelHeight())
+                    mem_per_slice = self.num_vol*self.volume_memory()/numZ + self.num_proj*self.projection_memory()*rowsPerSlice/numRows
+                    self.chunk_size = int(max(1, min(numZ, int(memory_remaining / mem_per_slice))))
+                    numChunks = int(np.ceil(float(numZ)/float(self.chunk_size)))
+                    self.chunk_size = int(np.ceil(float(numZ)/float(numChunks)))
+                    return True
+                if self.is_helical():
+                    self.chunk_size = self.helical_chunk_size(memory_remaining)
+                    return True
                 while self.chunk_size < numZ:
                     numRows_needed = float(self.leapct.numRowsRequiredForBackprojectingSlab(self.chunk_size))
                     mem_needed = self.num_vol*self.volume_memory()*self.chunk_size/numZ + self.num_proj*self.projection_memory()*numRows_needed/numRows
@@ -1084,6 +1704,197 @@ class leapctserver:
         if self.chunk_size > 0:
             return True
     
+    def run_manifest_file(self):
+        return os.path.join(self.path, self.outputDir, 'leapct_run_manifest.json')
+        
+    def run_carry_file(self):
+        return os.path.join(self.path, self.outputDir, 'leapct_run_carry.npz')
+        
+    def run_tmp_dir(self):
+        return os.path.join(self.path, self.outputDir, 'leapct_tmp')
+    
+    def run_info(self, algorithmName, **kwargs):
+        """Returns a description of a chunked operation and its parameters, used to identify the run for resuming"""
+        runInfo = {'algorithm': algorithmName, 'data_type': self.data_type, 'numOverlap': self.numOverlap}
+        runInfo.update(kwargs)
+        return runInfo
+    
+    def begin_chunked_run(self, operation, runInfo, input_file, output_file, numIndices):
+        """Creates (or, if resume_chunked_runs is True, resumes) the run manifest of a chunked operation
+        
+        Args:
+            operation (string): name of the chunked operation
+            runInfo (dict): algorithm name and parameters, see run_info; if None the run can never be resumed
+            input_file (string): file name (relative to path) of the input sequence
+            output_file (string): file name (relative to path) of the output sequence
+            numIndices (int): number of angles, rows, or slices to be processed
+            
+        Returns:
+            RunManifest object
+        """
+        self.create_outputDir()
+        if self.resume_chunked_runs:
+            self.outputDir_is_stable('the run manifest of ' + operation)
+        if runInfo is None:
+            params_hash = uuid.uuid4().hex
+        else:
+            params = [runInfo, self.full_projection_shape(), self.full_volume_shape()]
+            if self.projection_crop is not None:
+                params.append(self.projection_crop)
+            params_hash = hash_parameters(params)
+        inputIdentity = {'file': input_file}
+        if input_file is not None:
+            # the sizes and modification times of an input that the run overwrites change as the run progresses
+            inputIdentity['sequence'] = sequence_identity(self.leapct.get_file_list(os.path.join(self.path, input_file)), input_file != output_file)
+        
+        run = RunManifest.load(self.run_manifest_file())
+        if run is not None:
+            if run.matches(operation, params_hash, inputIdentity, output_file, numIndices):
+                if self.resume_chunked_runs:
+                    if self.finish_pending_chunk(run):
+                        print('Resuming ' + operation + ': ' + str(run.completed.num_indices()) + ' of ' + str(numIndices) + ' already completed')
+                        return run
+                else:
+                    print('Warning: found an incomplete run of ' + operation + '; starting over (set resume_chunked_runs = True to resume it)')
+            else:
+                print('Warning: found an incomplete run of ' + str(run.operation) + ' with different inputs or parameters; its output (' + str(run.output) + ') may be partially processed')
+                
+        run = RunManifest(self.run_manifest_file())
+        run.operation = operation
+        run.params_hash = params_hash
+        run.input = inputIdentity
+        run.output = output_file
+        run.numIndices = int(numIndices)
+        run.chunk_size = int(self.chunk_size)
+        run.save()
+        if os.path.isfile(self.run_carry_file()):
+            os.remove(self.run_carry_file())
+        return run
+        
+    def commit_chunk(self, run, saver, fullPath, x, seq_offset, axis, full_shape, carry=None, inputRange=None):
+        """Writes a processed chunk so that a crash cannot leave it partially written
+        
+        The chunk is first written to a temporary folder, then recorded as pending in the run manifest,
+        and finally its files are renamed to their final names and its range is recorded as completed.
+        
+        Args:
+            run (RunManifest): the manifest of this run
+            saver (function): saver(fullPath, x, seq_offset) writes x as a file sequence
+            fullPath (string): full path of the base file name of the output sequence
+            x (C contiguous float32 numpy array): the processed chunk
+            seq_offset (int): the file sequence number of the first file of this chunk
+            axis (int): the axis of x that is split into separate files
+            full_shape (list): shape of the full (not chunked) data that the output sequence holds
+            carry (dict of numpy arrays): arrays that the next chunk needs (e.g., overlap rows) that must survive a restart
+            inputRange (list of two integers): the range of input indices that this chunk completes, if the output has fewer indices than the input (e.g., binned angles); by default the range of output indices
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        tmpDir = self.run_tmp_dir()
+        if os.path.isdir(tmpDir):
+            for fileName in os.listdir(tmpDir):
+                os.remove(os.path.join(tmpDir, fileName))
+        else:
+            os.makedirs(tmpDir)
+        if saver(os.path.join(tmpDir, os.path.basename(fullPath)), x, seq_offset) == False:
+            return False
+        moves = []
+        for fileName in sorted(os.listdir(tmpDir)):
+            moves.append([os.path.relpath(os.path.join(tmpDir, fileName), self.path), os.path.relpath(os.path.join(os.path.dirname(fullPath), fileName), self.path)])
+        if carry is not None:
+            tmpCarry = os.path.join(tmpDir, 'carry.npz')
+            np.savez(tmpCarry, **carry)
+            moves.append([os.path.relpath(tmpCarry, self.path), os.path.relpath(self.run_carry_file(), self.path)])
+        if inputRange is None:
+            inputRange = [seq_offset, seq_offset+x.shape[axis]-1]
+        run.pending = {'range': [int(inputRange[0]), int(inputRange[1])], 'moves': moves}
+        run.save()
+        if self.finish_pending_chunk(run) == False:
+            return False
+        self.record_saved_chunk(fullPath, x, seq_offset, axis, full_shape)
+        return True
+        
+    def finish_pending_chunk(self, run):
+        """Renames the temporary files of the pending chunk of a run to their final names"""
+        if run.pending is None:
+            return True
+        for move in run.pending['moves']:
+            src = os.path.join(self.path, move[0])
+            dst = os.path.join(self.path, move[1])
+            if os.path.isfile(src):
+                os.replace(src, dst)
+            elif os.path.isfile(dst) == False:
+                print('Error: lost output file ' + str(dst) + ' of the pending chunk')
+                return False
+        run.mark_completed(run.pending['range'][0], run.pending['range'][1])
+        return run.save()
+        
+    def load_run_carry(self):
+        carryFile = self.run_carry_file()
+        if os.path.isfile(carryFile):
+            with np.load(carryFile) as data:
+                return {key: np.array(data[key]) for key in data.files}
+        else:
+            return None
+        
+    def end_chunked_run(self, run):
+        """Removes the run manifest and temporary files of a run that finished successfully"""
+        self.clear_chunk_buffers()
+        run.remove()
+        if os.path.isfile(self.run_carry_file()):
+            os.remove(self.run_carry_file())
+        tmpDir = self.run_tmp_dir()
+        if os.path.isdir(tmpDir) and len(os.listdir(tmpDir)) == 0:
+            os.rmdir(tmpDir)
+    
+    def run_algorithm_name(self, runInfo):
+        if runInfo is None:
+            return None
+        return runInfo.get('algorithm', None)
+        
+    def check_chunk_memory(self, run, chunks, n, nominal_memory, chunk_multiple=1):
+        """Checks the measured memory of chunk n of a run against max_CPU_memory_usage (see memory_accountant.py)
+        
+        If the chunk exceeded the budget and the memory enforcement is 'shrink', the chunks after it are replanned with a smaller chunk size.
+        
+        Args:
+            run (RunManifest): the manifest of the run, which must already have chunk n marked as completed
+            chunks (list): the [first, last] chunks of the run
+            n (int): index of the chunk that just finished
+            nominal_memory (float): the memory (GB) that the chunk planner assumed the chunk needs
+            chunk_multiple (int): a replanned chunk size is rounded down to a multiple of this
+            
+        Returns:
+            the (possibly replanned) list of chunks and the number of chunks
+        """
+        chunk_size = chunks[n][1] - chunks[n][0] + 1
+        new_chunk_size = self.memory_accountant.end_chunk(nominal_memory, self.max_CPU_memory_usage, self.scratch_space, chunk_size)
+        if new_chunk_size < chunk_size:
+            new_chunk_size = max(chunk_multiple, (new_chunk_size // chunk_multiple) * chunk_multiple)
+        if new_chunk_size < chunk_size and n < len(chunks)-1:
+            self.chunk_size = new_chunk_size
+            chunks = chunks[0:n+1] + run.remaining_chunks(new_chunk_size)
+        return chunks, len(chunks)
+        
+    def save_profile(self, fileName=None):
+        """Writes the per-stage timing summary (json) and the Chrome trace of the spans recorded by self.profiler
+        
+        Args:
+            fileName (string): the summary file name; the trace is written next to it with a _trace.json suffix, default is leapct_profile.json in outputDir
+            
+        Returns:
+            the full path of the summary file
+        """
+        self.create_outputDir()
+        if fileName is None or len(fileName) == 0:
+            fileName = os.path.join(self.path, self.outputDir, 'leapct_profile.json')
+        elif os.path.isabs(fileName) == False:
+            fileName = os.path.join(self.path, self.outputDir, fileName)
+        self.profiler.save_json(fileName)
+        self.profiler.save_chrome_trace(os.path.splitext(fileName)[0] + '_trace.json')
+        return fileName
+    
     ###################################################################################################################
     ###################################################################################################################
     # SPECTRA
@@ -1111,6 +1922,7 @@ class leapctserver:
         self.kV = kV
         self.takeoff_angle = takeOffAngle
         self.anode_material = Z
+        self.spectral_model_cache = None
     
     def add_filter(self, material, mass_density, thickness):
         if mass_density is None:
@@ -1119,17 +1931,21 @@ class leapctserver:
             self.xray_filters = [(material, mass_density, thickness)]
         else:
             self.xray_filters.append((material, mass_density, thickness))
+        self.spectral_model_cache = None
     
     def clear_filters(self):
         self.xray_filters = None
+        self.spectral_model_cache = None
         
     def set_detector_response(self, material, mass_density, thickness):
         if mass_density is None:
             mass_density = self.physics.massDensity(material)
         self.detector_response_model = [material, mass_density, thickness]
+        self.spectral_model_cache = None
         
     def clear_detector_response(self):
         self.detector_response_model = None
+        self.spectral_model_cache = None
         
     def set_object_model(self, material, mass_density=None):
         if mass_density is None or mass_density == 0.0:
@@ -1139,55 +1955,104 @@ class leapctserver:
     def clear_object_model(self):
         self.object_model = None
     
-    def source_spectra(self, do_normalize=False):
-        if has_physics == False:
-            print('Error: XrayPhysics library not found!')
+    def spectral_model_key(self):
+        """Returns all the parameters that determine the spectral model
+        
+        Spectra files are identified by their name and modification time, so editing a file also invalidates the cache.
+        """
+        def file_identity(fileName):
+            if isinstance(fileName, str) and os.path.isfile(fileName):
+                return (fileName, os.path.getmtime(fileName))
+            else:
+                return fileName
+        filters = None
+        if self.xray_filters is not None:
+            filters = tuple([tuple(xray_filter) for xray_filter in self.xray_filters])
+        detector_model = None
+        if self.detector_response_model is not None:
+            detector_model = tuple(self.detector_response_model)
+        return (self.kV, self.takeoff_angle, self.anode_material, filters, detector_model, file_identity(self.source_spectra_file),
+                file_identity(self.detector_response_file), self.lowest_energy, self.energy_bin_width)
+    
+    def spectral_model(self):
+        """Returns the energy grid and the source, filter, detector, and total system responses
+        
+        The result is cached and only recomputed if one of the spectra parameters (see spectral_model_key) has changed.
+        The arrays in the returned dictionary are shared with the cache and must not be modified.
+        
+        Returns:
+            dictionary with keys Es, source, filter, detector_Es, detector, and total, or None if the spectra are not defined
+        """
+        key = self.spectral_model_key()
+        if self.spectral_model_cache is not None and self.spectral_model_cache['key'] == key:
+            return self.spectral_model_cache
+        
+        Es, s = self.simulate_source_spectra()
+        if Es is None or s is None:
+            return None
+        filter_response = self.filter_response(Es)
+        detector_Es, d = self.simulate_detector_response(Es)
+        total = s*filter_response
+        if d is not None:
+            total = total*d
+        self.spectral_model_cache = {'key': key, 'Es': Es, 'source': s, 'filter': filter_response, 'detector_Es': detector_Es, 'detector': d, 'total': total}
+        return self.spectral_model_cache
+    
+    def simulate_source_spectra(self):
+        """Calculates the source spectra (without filters), see source_spectra"""
+        if self.is_number(self.source_spectra_file):
+            Es = np.array([float(self.source_spectra_file)], dtype=np.float32)
+            s = Es.copy()
+            s[:] = 1.0
+        elif self.source_spectra_file is not None and os.path.isfile(self.source_spectra_file):
+            Es, s = self.physics.load_spectra(self.source_spectra_file)
+            if Es is None or s is None:
+                return None, None
+        else:
+            Es, s = self.physics.simulateSpectra(self.kV, self.takeoff_angle, self.anode_material)
+            
+            if self.lowest_energy >= 1.0 or self.energy_bin_width >= 1.0:
+                if self.lowest_energy >= 1.0:
+                    lowest_energy  = self.lowest_energy
+                else:
+                    lowest_energy  = Es[0]
+                if self.energy_bin_width >= 1.0:
+                    energy_bin_width  = self.energy_bin_width
+                else:
+                    energy_bin_width  = Es[1]-Es[0]
+                N_E = int(np.ceil((Es[-1]-lowest_energy) / energy_bin_width))
+                Es = np.array(range(N_E), dtype=np.float32)*energy_bin_width + lowest_energy
+                Es, s = self.physics.simulateSpectra(self.kV, self.takeoff_angle, self.anode_material, Es)
+        return Es, s
+        
+    def filter_response(self, Es):
+        """Calculates the combined transmission of all the x-ray filters at the energies Es"""
+        s = np.ones(Es.shape, dtype=np.float32)
+        if self.xray_filters is not None:
+            for n in range(len(self.xray_filters)):
+                s *= self.physics.filterResponse(self.xray_filters[n][0], self.xray_filters[n][1], self.xray_filters[n][2], Es)
+        return s
+    
+    def source_spectra(self, do_normalize=False):
+        if has_physics == False:
+            print('Error: XrayPhysics library not found!')
             return None, None
         elif self.source_spectra_defined() == False:
             print('Error: spectra not defined!')
             return None, None
         else:
-            # Set source spectra
-            if self.is_number(self.source_spectra_file):
-                Es = np.array([float(self.source_spectra_file)], dtype=np.float32)
-                s = Es.copy()
-                s[:] = 1.0
-            elif self.source_spectra_file is not None and os.path.isfile(self.source_spectra_file):
-                Es, s = self.physics.load_spectra(self.source_spectra_file)
-                if Es is None or s is None:
-                    return None, None
-            else:
-                Es, s = self.physics.simulateSpectra(self.kV, self.takeoff_angle, self.anode_material)
-                
-                if self.lowest_energy >= 1.0 or self.energy_bin_width >= 1.0:
-                    if self.lowest_energy >= 1.0:
-                        lowest_energy  = self.lowest_energy
-                    else:
-                        lowest_energy  = Es[0]
-                    if self.energy_bin_width >= 1.0:
-                        energy_bin_width  = self.energy_bin_width
-                    else:
-                        energy_bin_width  = Es[1]-Es[0]
-                    N_E = int(np.ceil((Es[-1]-lowest_energy) / energy_bin_width))
-                    Es = np.array(range(N_E), dtype=np.float32)*energy_bin_width + lowest_energy
-                    Es, s = self.physics.simulateSpectra(self.kV, self.takeoff_angle, self.anode_material, Es)
-                    
-            
-            # Set filter response
-            if self.xray_filters is not None:
-                #print(len(self.xray_filters))
-                #print(self.xray_filters)
-                for n in range(len(self.xray_filters)):
-                    s *= self.physics.filterResponse(self.xray_filters[n][0], self.xray_filters[n][1], self.xray_filters[n][2], Es)
+            model = self.spectral_model()
+            if model is None:
+                return None, None
+            Es = model['Es'].copy()
+            s = model['source']*model['filter']
             if do_normalize:
                 self.physics.normalizeSpectrum(s, Es)
             return Es, s
             
-    def detector_response(self, Es):
-        if has_physics == False:
-            print('Error: XrayPhysics library not found!')
-            return None, None
-        elif self.detector_response_file is not None and os.path.isfile(self.detector_response_file):
+    def simulate_detector_response(self, Es):
+        """Calculates the detector response, see detector_response"""
+        if self.detector_response_file is not None and os.path.isfile(self.detector_response_file):
             Es_new, s = self.physics.load_spectra(self.detector_response_file)
             return Es_new, s
         elif Es is None:
@@ -1200,6 +2065,18 @@ class leapctserver:
             s = Es.copy()
             s[:] = 1.0
             return Es, s
+            
+    def detector_response(self, Es):
+        if has_physics == False:
+            print('Error: XrayPhysics library not found!')
+            return None, None
+        
+        # Use the cached response if Es is the energy grid of the current spectral model
+        if self.source_spectra_defined() and Es is not None:
+            model = self.spectral_model()
+            if model is not None and model['detector'] is not None and np.array_equal(Es, model['Es']):
+                return model['detector_Es'].copy(), model['detector'].copy()
+        return self.simulate_detector_response(Es)
     
     def totalSystemSpectralResponse(self, do_normalize=False):
         if has_physics == False:
@@ -1209,13 +2086,11 @@ class leapctserver:
             print('Error: spectra not defined!')
             return None, None
         else:
-            Es, s = self.source_spectra()
-            if Es is None or s is None:
+            model = self.spectral_model()
+            if model is None:
                 return None, None
-
-            dont_care, d = self.detector_response(Es)
-            if d is not None:
-                s *= d
+            Es = model['Es'].copy()
+            s = model['total'].copy()
             
             if do_normalize:
                 self.physics.normalizeSpectrum(s, Es)
@@ -1244,7 +2119,10 @@ class leapctserver:
             return None, None
         if iz < 0 or iz >= self.leapct.get_numZ():
             iz = self.leapct.get_numZ()//2
-        rowRange = self.leapct.rowRangeNeededForBackprojection(iz)
+        if self.independent_rows():
+            rowRange = self.rows_of_slices(iz, iz)
+        else:
+            rowRange = self.leapct.rowRangeNeededForBackprojection(iz)
         if numPad > 0:
             rowRange[0] = max(0, rowRange[0]-numPad)
             rowRange[1] = min(self.leapct.get_numRows()-1, rowRange[1]+numPad)
@@ -1301,29 +2179,32 @@ class leapctserver:
                 angleStart = n*self.chunk_size
                 angleEnd = min(numAngles-1, angleStart + self.chunk_size - 1)
                 
-                g_chunk = self.load_projection_angles(input_file, [angleStart, angleEnd])
+                with self.profiler.span('stacked_projection', 'read') as span:
+                    g_chunk = self.load_projection_angles(input_file, [angleStart, angleEnd])
+                    span.add_bytes(g_chunk)
                 if g_chunk is None:
                     print('failed to load projections!')
                     return False
                 
-                if self.data_type == self.ATTENUATION:
-                    if has_torch == True and type(self.g) is torch.Tensor:
-                        g_stack_cur = torch.max(g_chunk, axis=0)
-                    else:
-                        g_stack_cur = np.max(g_chunk, axis=0)
-                else:
-                    if has_torch == True and type(self.g) is torch.Tensor:
-                        g_stack_cur = torch.min(g_chunk, axis=0)
-                    else:
-                        g_stack_cur = np.min(g_chunk, axis=0)
-                
-                if g_stack is None:
-                    g_stack = g_stack_cur
-                else:
+                with self.profiler.span('stacked_projection', 'compute', g_chunk.nbytes):
                     if self.data_type == self.ATTENUATION:
-                        g_stack = self.leapct.maximum(g_stack, g_stack_cur)
+                        if has_torch == True and type(self.g) is torch.Tensor:
+                            g_stack_cur = torch.max(g_chunk, axis=0)
+                        else:
+                            g_stack_cur = np.max(g_chunk, axis=0)
+                    else:
+                        if has_torch == True and type(self.g) is torch.Tensor:
+                            g_stack_cur = torch.min(g_chunk, axis=0)
+                        else:
+                            g_stack_cur = np.min(g_chunk, axis=0)
+                    
+                    if g_stack is None:
+                        g_stack = g_stack_cur
                     else:
-                        g_stack = self.leapct.minimum(g_stack, g_stack_cur)
+                        if self.data_type == self.ATTENUATION:
+                            g_stack = self.leapct.maximum(g_stack, g_stack_cur)
+                        else:
+                            g_stack = self.leapct.minimum(g_stack, g_stack_cur)
                 
                 del g_chunk
             
@@ -1376,6 +2257,7 @@ class leapctserver:
         
         func = lambda g: leap_preprocessing_algorithms.gain_correction(self.leapct, g, air_scan, dark_scan, calibration_scans, ROI, badPixelMap)
         if func(self.g) == True:
+            self.buffer_processed_in_memory(self.g)
             self.data_type = self.RAW_DARK_SUBTRACTED
 
             # need to save air scan file
@@ -1419,10 +2301,11 @@ class leapctserver:
             
         algorithm = lambda g: leap_preprocessing_algorithms.makeAttenuationRadiographs(self.leapct, g, air_scan, dark_scan, ROI)
         self.numOverlap = 0
-        self.num_proj = 1
+        self.num_proj, self.num_vol = self.memory_multiples('makeAttenuationRadiographs')
 
         self.outName = 'attenRad.tif'        
-        retVal = self.projection_processing(algorithm, tryIndex)
+        runInfo = self.run_info('makeAttenuationRadiographs', ROI=ROI, air_scan_file=self.air_scan_file, dark_scan_file=self.dark_scan_file)
+        retVal = self.projection_processing(algorithm, tryIndex, runInfo)
         self.outName = None
         if retVal:
             self.data_type = self.ATTENUATION
@@ -1462,49 +2345,112 @@ class leapctserver:
         #"""
                 
     def crop_projections(self, rowRange=None, colRange=None):
-    
+        """Crops the projections to the detector rows rowRange and columns colRange (inclusive ranges; None keeps all of them)
+        
+        The CT geometry is changed to that of the cropped detector.  Projections in memory (or in compact storage) are
+        cropped there; projections in files are not rewritten, instead the window is recorded in projection_crop and
+        load_projection_angles and load_projection_rows only read that window of the files of projection_file.  The
+        cropped projections are written to new files when the projections are saved (save_projection_angles or
+        save_projection_rows) or by the next algorithm that processes them.
+        
+        Args:
+            rowRange (list of two integers): the first and last detector row to keep
+            colRange (list of two integers): the first and last detector column to keep
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.ct_geometry_defined() == False:
+            print('Error: CT geometry not defined!')
+            return False
         if self.data_type != self.ATTENUATION:
             print('Error: this algorithm currently only implemented for attenuation data')
             return False
-        if rowRange is not None:
-            if rowRange[0] < 0 or rowRange[0] >= self.leapct.get_numRows() or rowRange[1] < 0 or rowRange[1] >= self.leapct.get_numRows() or rowRange[0] > rowRange[1]:
-                print('Error: invalid cropping region')
-                return False
-            numRows = rowRange[1] - rowRange[0] + 1
-        else:
-            numRows = self.leapct.get_numRows()
-        if colRange is not None:
-            if colRange[0] < 0 or colRange[0] >= self.leapct.get_numCols() or colRange[1] < 0 or colRange[1] >= self.leapct.get_numCols() or colRange[0] > colRange[1]:
-                print('Error: invalid cropping region')
-                return False
-            numCols = colRange[1] - colRange[0] + 1
+        numRows = self.leapct.get_numRows()
+        numCols = self.leapct.get_numCols()
+        if rowRange is None:
+            rowRange = [0, numRows-1]
+        if colRange is None:
+            colRange = [0, numCols-1]
+        rowRange = [int(rowRange[0]), int(rowRange[1])]
+        colRange = [int(colRange[0]), int(colRange[1])]
+        if rowRange[0] < 0 or rowRange[1] >= numRows or rowRange[0] > rowRange[1] or colRange[0] < 0 or colRange[1] >= numCols or colRange[0] > colRange[1]:
+            print('Error: invalid cropping region')
+            return False
+        if rowRange == [0, numRows-1] and colRange == [0, numCols-1]:
+            return True
+            
+        if self.g is not None:
+            self.g = self.leapct.crop_projections(rowRange, colRange, self.g)
+            self.mark_projections_modified()
+        elif self.g_compact is not None:
+            self.set_compact_projections(self.g_compact.crop(rowRange, colRange))
+            self.leapct.crop_projections(rowRange, colRange)
+        elif self.projection_file is None:
+            print('Error: projection_file is not specified!')
+            return False
         else:
-            numCols = self.leapct.get_numCols()
-        self.chunking_type = self.PROJECTION
-        self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 1 + numRows*numCols / (self.get_numRows()*self.get_numCols())
-        algorithm = lambda g: self.leapct.crop_projections(rowRange, colRange, g)
+            self.leapct.crop_projections(rowRange, colRange)
+        
+        # the window of the files of projection_file (a crop of an already cropped window is composed with it)
+        if self.projection_file is not None:
+            if self.projection_crop is None:
+                self.projection_crop = rowRange + colRange
+            else:
+                self.projection_crop = self.crop_range(self.projection_crop[0:2], rowRange) + self.crop_range(self.projection_crop[2:4], colRange)
+        self.save_parameters()
+        return True
+        
+    def bin_projections(self, rowFactor=1, colFactor=1, angleFactor=1, tryIndex=None):
+        """Bins the projections: averages blocks of rowFactor x colFactor detector pixels and groups of angleFactor consecutive angles
+        
+        The pixel size, centerRow, centerCol, number of rows and columns, and the angles of the CT geometry are
+        changed to those of the binned projections (see detector_binning.bin_geometry); rows, columns, and angles at
+        the end of the detector or scan that do not fill a bin are dropped.
+        
+        Args:
+            rowFactor (int): number of detector rows in a bin
+            colFactor (int): number of detector columns in a bin
+            angleFactor (int): number of consecutive angles in a bin
+            tryIndex (int): if not None, only this projection is binned (without angle binning) and the result is stored in lastImage
             
-        return self.projection_processing(algorithm, tryIndex)
-    
+        Returns:
+            True if successful, False otherwise
         """
         if self.leapct.ct_geometry_defined() == False:
             print('Error: CT geometry not defined!')
             return False
-        if self.data_type == self.ATTENUATION:
-            if self.g is None:
-                self.g = self.load_projections()
-                if self.g is None:
-                    print('Error: failed to load data')
-                    return False
-            if rowRange is not None or colRange is not None:
-                self.g = self.leapct.crop_projections(rowRange, colRange, self.g)
-            return True
-        else:
-            print('Error: crop projections current only implemented for attenuation data')
+        if self.data_type != self.TRANSMISSION and self.data_type != self.ATTENUATION:
+            print('Error: this algorithm currently only implemented for transmission or attenuation data')
             return False
-        #"""
+        if self.leapct.get_geometry() == 'MODULAR':
+            print('Error: binning is not implemented for modular-beam geometries')
+            return False
+        rowFactor = max(1, int(rowFactor))
+        colFactor = max(1, int(colFactor))
+        angleFactor = max(1, int(angleFactor))
+        if rowFactor > self.leapct.get_numRows() or colFactor > self.leapct.get_numCols() or angleFactor > self.leapct.get_numAngles():
+            print('Error: binning factors must not exceed the number of detector rows, columns, and angles')
+            return False
+        if rowFactor == 1 and colFactor == 1 and angleFactor == 1:
+            return True
+        
+        def algorithm(g):
+            if g.shape[0] < angleFactor:
+                # a single projection (tryIndex) cannot be binned in angle
+                return bin_array(g, rowFactor, colFactor)
+            g_binned = bin_array(g, rowFactor, colFactor, angleFactor)
+            if bin_geometry(self.leapct, rowFactor, colFactor, angleFactor) == False:
+                return False
+            return g_binned
+        
+        self.chunking_type = self.PROJECTION
+        self.numOverlap = 0
+        self.num_proj, self.num_vol = self.memory_multiples('bin_projections', rowFactor=rowFactor, colFactor=colFactor, angleFactor=angleFactor)
+        runInfo = self.run_info('bin_projections', rowFactor=rowFactor, colFactor=colFactor, angleFactor=angleFactor)
+        update_geometry = lambda: bin_geometry(self.leapct, rowFactor, colFactor, angleFactor)
+        
+        return self.projection_processing(algorithm, tryIndex, runInfo, angleFactor, update_geometry)
         
     def badPixelCorrection(self, badPixelFile=None, windowSize=5):
         if self.leapct.ct_geometry_defined() == False:
@@ -1541,6 +2487,7 @@ class leapctserver:
                 return False
         
         if leap_preprocessing_algorithms.badPixelCorrection(self.leapct, self.g, air_scan, dark_scan, badPixelMap, windowSize, self.data_type == self.ATTENUATION) == True:
+            self.buffer_processed_in_memory(self.g)
             if air_scan is not None:
                 # need to save air scan file
                 baseFileName, fileExtension = os.path.splitext(os.path.basename(self.air_scan_file))
@@ -1566,11 +2513,11 @@ class leapctserver:
             return False
         self.chunking_type = self.PROJECTION
         self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 1
+        self.num_proj, self.num_vol = self.memory_multiples('outlierCorrection')
         algorithm = lambda g: leap_preprocessing_algorithms.outlierCorrection(self.leapct, g, threshold, windowSize, isAttenuationData=True)
+        runInfo = self.run_info('outlierCorrection', threshold=threshold, windowSize=windowSize)
             
-        return self.projection_processing(algorithm, tryIndex)
+        return self.projection_processing(algorithm, tryIndex, runInfo)
         
         
     def outlierCorrection_highEnergy(self, tryIndex=None):
@@ -1579,11 +2526,11 @@ class leapctserver:
             return False
         self.chunking_type = self.PROJECTION
         self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 1
+        self.num_proj, self.num_vol = self.memory_multiples('outlierCorrection_highEnergy')
         algorithm = lambda g: leap_preprocessing_algorithms.outlierCorrection_highEnergy(self.leapct, g, isAttenuationData=True)
+        runInfo = self.run_info('outlierCorrection_highEnergy')
         
-        return self.projection_processing(algorithm, tryIndex)
+        return self.projection_processing(algorithm, tryIndex, runInfo)
         
     def detectorDeblur_FourierDeconv(self, H, WienerParam=0.0):
         #leap_preprocessing_algorithms.detectorDeblur_FourierDeconv(self.leapct, ...)
@@ -1668,17 +2615,16 @@ class leapctserver:
     def ringRemoval(self, delta=0.01, beta=1.0e3, numIter=30, maxChange=0.05, which='fast', tryIndex=None):
         self.chunking_type = self.DETECTOR_ROW
         self.numOverlap = 3
-        self.num_vol = 0
+        self.num_proj, self.num_vol = self.memory_multiples('ringRemoval', which=which)
         
         #algorithm = lambda f: self.leapct.MedianFilter(f, threshold, windowSize)
         if which == 'fast':
-            self.num_proj = 1
             algorithm = lambda g: leap_preprocessing_algorithms.ringRemoval_fast(self.leapct, g, delta, beta, numIter, maxChange)
         else:
-            self.num_proj = 3
             algorithm = lambda g: leap_preprocessing_algorithms.ringRemoval(self.leapct, g, delta, beta, numIter, maxChange)
+        runInfo = self.run_info('ringRemoval', delta=delta, beta=beta, numIter=numIter, maxChange=maxChange, which=which)
             
-        return self.sinogram_processing(algorithm, tryIndex)
+        return self.sinogram_processing(algorithm, tryIndex, runInfo)
     
         """
         if self.leapct.ct_geometry_defined() == False:
@@ -1727,10 +2673,10 @@ class leapctserver:
     def ringRemoval_median(self, threshold=0.0, windowSize=5, numIter=1, tryIndex=None):
         self.chunking_type = self.DETECTOR_ROW
         self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 2
+        self.num_proj, self.num_vol = self.memory_multiples('ringRemoval_median')
         algorithm = lambda g: leap_preprocessing_algorithms.ringRemoval_median(self.leapct, g, threshold, windowSize, numIter)
-        return self.sinogram_processing(algorithm, tryIndex)
+        runInfo = self.run_info('ringRemoval_median', threshold=threshold, windowSize=windowSize, numIter=numIter)
+        return self.sinogram_processing(algorithm, tryIndex, runInfo)
         
     def parameter_sweep(self, values, param='centerCol', iz=None, algorithmName='FBP'):
         if self.leapct.all_defined() == False:
@@ -1761,32 +2707,89 @@ class leapctserver:
     def polynomialBHC(self, coeffs, tryIndex=None):
         if coeffs is None:
             print('Error: must define the polynomial coefficients for BHC')
+            return False
+        coeffs = np.array(coeffs, dtype=np.float32).flatten()
         self.chunking_type = self.DETECTOR_ROW
         self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 1
+        self.num_proj, self.num_vol = self.memory_multiples('polynomialBHC')
         algorithm = lambda g: self.apply_polynomial(g, coeffs)
-        return self.sinogram_processing(algorithm, tryIndex)
-    
-    def apply_polynomial(self, g, coeffs):
+        runInfo = self.run_info('polynomialBHC', coeffs=coeffs.tolist())
+        return self.sinogram_processing(algorithm, tryIndex, runInfo)
     
-        if coeffs.size == 1:
-            if coeffs[0] != 1.0:
-                g[:] = coeffs[0]*g[:]
-        elif coeffs.size == 2:
-            if coeffs[0] != 1.0 or coeffs[1] != 0.0:
-                g[:] = coeffs[0]*g[:] + coeffs[1]*g[:]**2
-        elif coeffs.size == 3:
-            if coeffs[0] != 1.0 or coeffs[1] != 0.0 or coeffs[2] != 0.0:
-                g[:] = coeffs[0]*g[:] + coeffs[1]*g[:]**2 + coeffs[2]*g[:]**3
-        elif coeffs.size == 4:
-            if coeffs[0] != 1.0 or coeffs[1] != 0.0 or coeffs[2] != 0.0 or coeffs[3] != 0.0:
-                g[:] = coeffs[0]*g[:] + coeffs[1]*g[:]**2 + coeffs[2]*g[:]**3 + coeffs[3]*g[:]**4
-        else:
-            if coeffs[0] != 1.0 or coeffs[1] != 0.0 or coeffs[2] != 0.0 or coeffs[3] != 0.0 or coeffs[4] != 0.0:
-                g[:] = coeffs[0]*g[:] + coeffs[1]*g[:]**2 + coeffs[2]*g[:]**3 + coeffs[3]*g[:]**4 + coeffs[4]*g[:]**5
+    def apply_polynomial(self, g, coeffs, numThreads=None):
+        """Replaces g with coeffs[0]*g + coeffs[1]*g**2 + ... + coeffs[N-1]*g**N (in place)
+        
+        The polynomial is evaluated with Horner's method using one scratch buffer.  Large numpy arrays
+        are split into blocks of detector rows that are processed on a thread pool.
+        
+        Args:
+            g (C contiguous float32 numpy array or torch tensor): projection data
+            coeffs (numpy array): polynomial coefficients of any order; there is no constant term
+            numThreads (int): number of threads; if None, uses all CPU cores for arrays with more than polynomial_block_size elements
+        """
+        coeffs = np.array(coeffs, dtype=np.float32).flatten()
+        if coeffs.size == 0 or (coeffs[0] == 1.0 and np.all(coeffs[1:] == 0.0)):
+            return True
+        
+        if type(g) is not np.ndarray:
+            # torch tensor
+            y = coeffs[-1]
+            for n in range(coeffs.size-2, -1, -1):
+                y = y*g + float(coeffs[n])
+            g[:] = y*g
+            return True
+        
+        if numThreads is None:
+            if g.size > self.polynomial_block_size:
+                numThreads = os.cpu_count()
+            else:
+                numThreads = 1
+        numThreads = max(1, min(int(numThreads), g.shape[1] if g.ndim == 3 else 1))
+        
+        def horner(x):
+            scratch = np.empty_like(x)
+            scratch[:] = coeffs[-1]
+            for n in range(coeffs.size-2, -1, -1):
+                scratch *= x
+                scratch += coeffs[n]
+            x *= scratch
+        
+        if numThreads == 1:
+            horner(g)
+        else:
+            rowBlocks = np.array_split(np.arange(g.shape[1]), numThreads)
+            with ThreadPoolExecutor(max_workers=numThreads) as pool:
+                list(pool.map(lambda rows: horner(g[:,rows[0]:rows[-1]+1,:]), [rows for rows in rowBlocks if rows.size > 0]))
+        return True
+        
+    def BHC_polynomial_from_lookup_table(self, BHC_LUT, T_lut, order=5, maxValue=None):
+        """Fits a polynomial (with no constant term) to a BHC lookup table so that it can be applied with apply_polynomial
+        
+        Args:
+            BHC_LUT (numpy array): the lookup table; BHC_LUT[n] is the corrected value of the measured attenuation n*T_lut
+            T_lut (float): the sampling of the lookup table
+            order (int): order of the polynomial
+            maxValue (float): only fit the table for measured attenuations up to this value; if None, fits the whole table
+            
+        Returns:
+            numpy array of the polynomial coefficients
+        """
+        BHC_LUT = np.array(BHC_LUT, dtype=np.float64)
+        x = np.array(range(BHC_LUT.size), dtype=np.float64)*T_lut
+        if maxValue is not None:
+            ind = x <= maxValue
+            x = x[ind]
+            BHC_LUT = BHC_LUT[ind]
+        order = max(1, int(order))
+        A = np.zeros((x.size, order), dtype=np.float64)
+        for n in range(order):
+            A[:,n] = x**(n+1)
+        coeffs = np.linalg.lstsq(A, BHC_LUT, rcond=None)[0]
+        maxError = np.max(np.abs(np.matmul(A, coeffs) - BHC_LUT))
+        print('BHC polynomial of order ' + str(order) + ' fits the lookup table with a maximum error of ' + str(maxError))
+        return np.array(coeffs, dtype=np.float32)
     
-    def singleMaterialBHC(self, material=None, tryIndex=None):
+    def singleMaterialBHC(self, material=None, tryIndex=None, polynomialOrder=None):
         if has_physics == False:
             print('Error: BHC requires the XrayPhysics package!')
             return False
@@ -1800,19 +2803,121 @@ class leapctserver:
                 return False
                 
         Es, s_total = self.totalSystemSpectralResponse()
+        if Es is None or s_total is None:
+            return False
         if self.reference_energy is None or self.reference_energy < Es[0] or self.reference_energy > Es[-1]:
             self.reference_energy = self.physics.meanEnergy(s_total, Es)
-        BHC_LUT, T_lut = self.physics.setBHClookupTable(s_total, Es, material, self.reference_energy)
+        BHC_LUT, T_lut = self.BHC_lookup_table(material, Es, s_total, self.reference_energy)
         if BHC_LUT is None:
             return False        
         
         self.chunking_type = self.DETECTOR_ROW
         self.numOverlap = 0
-        self.num_vol = 0
-        self.num_proj = 1
-        algorithm = lambda g: self.leapct.applyTransferFunction(g, BHC_LUT, T_lut)
-        return self.sinogram_processing(algorithm, tryIndex)
+        self.num_proj, self.num_vol = self.memory_multiples('singleMaterialBHC')
+        if polynomialOrder is not None and polynomialOrder > 0:
+            # apply a polynomial fit of the lookup table instead of the table itself
+            coeffs = self.BHC_polynomial_from_lookup_table(BHC_LUT, T_lut, polynomialOrder)
+            algorithm = lambda g: self.apply_polynomial(g, coeffs)
+        else:
+            algorithm = lambda g: self.leapct.applyTransferFunction(g, BHC_LUT, T_lut)
+        runInfo = self.run_info('singleMaterialBHC', material=material, reference_energy=self.reference_energy, BHC_LUT=hash_parameters(np.array(BHC_LUT).tolist()), T_lut=T_lut, polynomialOrder=polynomialOrder)
+        return self.sinogram_processing(algorithm, tryIndex, runInfo)
+            
+    
+    def get_BHC_library(self):
+        if self.BHC_library is None or self.BHC_library.directory != self.BHC_library_dir:
+            self.BHC_library = BHCLibrary(self.BHC_library_dir)
+        return self.BHC_library
+    
+    def BHC_lookup_table(self, material, Es, s_total, reference_energy, returnCalculated=False):
+        """Returns the single-material BHC lookup table of a spectral response, reading it from the BHC library if it is there
+        
+        Tables that are not in the library are calculated with setBHClookupTable and added to the library.
+        
+        Args:
+            material (string or int): chemical formula or atomic number of the material
+            Es (numpy array): energy bins (keV)
+            s_total (numpy array): total system spectral response
+            reference_energy (float): the energy (keV) that the data is corrected to
+            returnCalculated (bool): if True, also returns whether the table was calculated (True) or read from the library (False)
+            
+        Returns:
+            the lookup table and its sampling, (None, None) if failed
+        """
+        if self.object_model is not None and self.object_model[0] == material:
+            mass_density = self.object_model[1]
+        else:
+            mass_density = self.physics.massDensity(material)
+        library = self.get_BHC_library()
+        key = BHCLibrary.key(Es, s_total, material, mass_density, reference_energy)
+        BHC_LUT, T_lut = library.lookup(key)
+        if BHC_LUT is not None:
+            if returnCalculated:
+                return BHC_LUT, T_lut, False
+            return BHC_LUT, T_lut
+            
+        BHC_LUT, T_lut = self.physics.setBHClookupTable(s_total, Es, material, reference_energy)
+        if BHC_LUT is None:
+            if returnCalculated:
+                return None, None, False
+            return None, None
+        description = {'material': str(material), 'mass_density': float(mass_density), 'reference_energy': float(reference_energy),
+                       'kV': self.kV, 'takeoff_angle': self.takeoff_angle, 'anode_material': self.anode_material,
+                       'xray_filters': str(self.xray_filters), 'detector_response_model': str(self.detector_response_model),
+                       'source_spectra_file': str(self.source_spectra_file), 'detector_response_file': str(self.detector_response_file)}
+        library.store(key, BHC_LUT, T_lut, description)
+        if returnCalculated:
+            return BHC_LUT, T_lut, True
+        return BHC_LUT, T_lut
+        
+    def precompute_BHC_library(self, kVs, filter_sets, materials):
+        """Fills the BHC library with the lookup tables of every combination of source voltage, filters, and material
+        
+        The take-off angle, anode material, detector response, energy binning, and reference energy are the current values.
+        All spectra parameters are restored when done.
+        
+        Args:
+            kVs (list of floats): source voltages
+            filter_sets (list): each element is a list of (material, mass_density, thickness) filters, or None for no filters
+            materials (list): chemical formulas or atomic numbers of the materials
             
+        Returns:
+            the number of lookup tables that were calculated (tables that were already in the library are not counted)
+        """
+        if has_physics == False:
+            print('Error: BHC requires the XrayPhysics package!')
+            return 0
+        kV_save = self.kV
+        xray_filters_save = self.xray_filters
+        source_spectra_file_save = self.source_spectra_file
+        
+        numCalculated = 0
+        self.source_spectra_file = None
+        try:
+            for kV in kVs:
+                for filter_set in filter_sets:
+                    self.set_source_spectra(kV, self.takeoff_angle, self.anode_material)
+                    self.clear_filters()
+                    if filter_set is not None:
+                        for xray_filter in filter_set:
+                            self.add_filter(xray_filter[0], xray_filter[1], xray_filter[2])
+                    Es, s_total = self.totalSystemSpectralResponse()
+                    if Es is None or s_total is None:
+                        continue
+                    reference_energy = self.reference_energy
+                    if reference_energy is None or reference_energy < Es[0] or reference_energy > Es[-1]:
+                        reference_energy = self.physics.meanEnergy(s_total, Es)
+                    for material in materials:
+                        print('BHC lookup table: ' + str(kV) + ' kV, filters = ' + str(filter_set) + ', material = ' + str(material))
+                        isCalculated = self.BHC_lookup_table(material, Es, s_total, reference_energy, returnCalculated=True)[2]
+                        if isCalculated:
+                            numCalculated += 1
+        finally:
+            self.kV = kV_save
+            self.xray_filters = xray_filters_save
+            self.source_spectra_file = source_spectra_file_save
+            self.spectral_model_cache = None
+        return numCalculated
     
     def projection_processing_setup(self, tryIndex=None):
         if self.leapct.ct_geometry_defined() == False:
@@ -1831,11 +2936,16 @@ class leapctserver:
             if self.num_proj*self.projection_memory() >= self.max_CPU_memory_usage:
                 # not enough memory for this operation, so clear any memory currently being used
                 self.clear_volume_data()
+                if self.compact_projections():
+                    # the chunks are expanded from and compressed back into g_compact
+                    self.set_chunk_size()
+                    self.create_outputDir()
+                    return True
                 if self.g is not None:
                     # save projection data first
                     print('Saving projection data to disk...')
                     self.save_projection_angles(self.g, update_params=True)
-                    self.clear_projection_data_data()
+                    self.clear_projection_data()
                     
                 self.set_chunk_size()
                 self.create_outputDir() # do I really need to do this?
@@ -1857,9 +2967,22 @@ class leapctserver:
         else:
             return True
     
-    def projection_processing(self, algorithm, tryIndex=None):
+    def projection_processing(self, algorithm, tryIndex=None, runInfo=None, angleFactor=1, update_geometry=None):
+        """Runs an algorithm on all the projections (or, if tryIndex is not None, on a single projection)
+        
+        algorithm(g) processes the projections g in place and returns True or False, or returns a new array of
+        processed projections (e.g., binned or cropped projections), which then replaces g.  An algorithm that
+        combines groups of angleFactor consecutive angles into one is given chunks that start at a multiple of
+        angleFactor, and angles at the end that do not fill a group are dropped.
+        
+        An algorithm that also changes the CT geometry does so on every chunk (the geometry is restored after
+        all but the last one); update_geometry() makes the same change, for a resumed run whose chunks were
+        all already completed.
+        """
+        self.memory_accountant.begin_run(self.run_algorithm_name(runInfo))
         if self.projection_processing_setup(tryIndex) == False:
             return False
+        angleFactor = max(1, int(angleFactor))
         
         if self.data_type == self.TRANSMISSION or self.data_type == self.ATTENUATION:
             input_file = self.projection_file
@@ -1869,47 +2992,104 @@ class leapctserver:
         if tryIndex is None:
             # Need to process the entire set of projections
             numAngles = self.leapct.get_numAngles()
-            numChunks = int(np.ceil(float(numAngles)/float(self.chunk_size)))
-            if self.chunk_size < numAngles:
+            if self.chunk_size < numAngles or self.g_compact is not None:
+                numAngles = max(1, numAngles // angleFactor) * angleFactor
+                self.chunk_size = max(angleFactor, (self.chunk_size // angleFactor) * angleFactor)
+                output_file = self.projection_angles_file_name()
+                output_full_path = os.path.join(self.path, output_file)
+                saver = lambda fullPath, x, seq_offset: self.leapct.save_projections(fullPath, x, seq_offset)
+                # the output of a run on the projections in compact storage goes back into compact storage (a new
+                # array if the algorithm changes the shape of the projections), and such runs cannot be resumed
+                g_compact_out = None
+                if self.g_compact is not None:
+                    runInfo = None
+                run = self.begin_chunked_run('projection_processing', runInfo, input_file, output_file, numAngles)
+                chunks = run.remaining_chunks(self.chunk_size)
+                numChunks = len(chunks)
+                if numChunks == 0:
+                    if update_geometry is not None:
+                        if update_geometry() == False:
+                            return False
+                    else:
+                        print('Warning: all chunks of this run were already completed; any change of the CT geometry made by this algorithm was not reapplied')
                 
                 print('Performing algorithm in ' + str(numChunks) + ' chunks of ' + str(self.chunk_size) + ' slices...')
                 
-                for n in range(numChunks):
+                n = 0
+                while n < numChunks:
                     print('processing chunk ' + str(n+1) + ' of ' + str(numChunks))
                     
-                    angleStart = n*self.chunk_size
-                    angleEnd = min(numAngles-1, angleStart + self.chunk_size - 1)
+                    angleStart = chunks[n][0]
+                    angleEnd = chunks[n][1]
                     
                     #print('reading ' + str(input_file) + '...')
-                    g_chunk = self.load_projection_angles(input_file, [angleStart, angleEnd])
+                    self.memory_accountant.begin_chunk()
+                    with self.profiler.span('projection_processing', 'read') as span:
+                        g_chunk = self.chunk_buffer([angleEnd-angleStart+1, self.leapct.get_numRows(), self.leapct.get_numCols()])
+                        g_chunk = self.load_projection_angles(input_file, [angleStart, angleEnd], g_chunk)
+                        span.add_bytes(g_chunk)
                     if g_chunk is None:
                         print('failed to load projections!')
                         return False
                     
                     self.leapct_backup.copy_parameters(self.leapct)
-                    if algorithm(g_chunk) == False:
+                    with self.profiler.span('projection_processing', 'compute', g_chunk.nbytes):
+                        retVal = algorithm(g_chunk)
+                    if isinstance(retVal, np.ndarray):
+                        g_out = retVal
+                    elif retVal == False:
                         self.leapct.copy_parameters(self.leapct_backup)
                         return False
-                    
-                    if n == numChunks-1:
-                        update_params = True
                     else:
-                        update_params = False
+                        g_out = g_chunk
                     
-                    self.save_projection_angles(g_chunk, angleStart, update_params=update_params)
-                    if update_params:
-                        self.save_parameters()
-                    else:
+                    with self.profiler.span('projection_processing', 'write', g_out.nbytes):
+                        if self.g_compact is not None:
+                            if g_compact_out is None:
+                                if g_out.shape[1:] == self.g_compact.shape[1:] and angleFactor == 1:
+                                    g_compact_out = self.g_compact
+                                else:
+                                    g_compact_out = CompactArray([numAngles // angleFactor, g_out.shape[1], g_out.shape[2]], self.g_compact.precision)
+                            retVal = self.write_compact_chunk(run, g_compact_out, g_out, angleStart // angleFactor, 0, [angleStart, angleEnd])
+                        else:
+                            retVal = self.commit_chunk(run, saver, output_full_path, g_out, angleStart // angleFactor, 0, [numAngles // angleFactor, g_out.shape[1], g_out.shape[2]], inputRange=[angleStart, angleEnd])
+                    if retVal == False:
+                        print('Error: failed to save chunk')
+                        self.leapct.copy_parameters(self.leapct_backup)
+                        return False
+                    if n < numChunks-1:
                         self.leapct.copy_parameters(self.leapct_backup)
-                    del g_chunk
+                    nominal_memory = self.num_proj*self.memory_used_by_array(g_chunk)
+                    if g_out is not g_chunk:
+                        self.release_chunk_buffer(g_out)
+                    self.release_chunk_buffer(g_chunk)
+                    del g_chunk, g_out
+                    chunks, numChunks = self.check_chunk_memory(run, chunks, n, nominal_memory, angleFactor)
+                    n += 1
                 
+                if self.g_compact is not None:
+                    if g_compact_out is not None and g_compact_out is not self.g_compact:
+                        self.set_compact_projections(g_compact_out)
+                else:
+                    # with fewer output angles than input angles (binning), files of the input may be left past the end
+                    self.remove_sequence_tail(output_file, numAngles // angleFactor)
+                    self.set_projection_file_name(output_file)
+                self.save_parameters()
+                self.end_chunked_run(run)
+                self.memory_accountant.end_run()
                 return True
             else:
                 if self.g is None:
                     # data should have been loaded by projection_processing_setup
                     print('Error: failed to load data')
                     return False
-                return algorithm(self.g)
+                with self.profiler.span('projection_processing', 'compute', self.g.nbytes):
+                    retVal = algorithm(self.g)
+                if isinstance(retVal, np.ndarray):
+                    self.set_projection_data(retVal)
+                    return True
+                self.buffer_processed_in_memory(self.g)
+                return retVal
         else:
             iAngle = tryIndex
             if iAngle < 0 or iAngle >= self.leapct.get_numAngles():
@@ -1920,13 +3100,15 @@ class leapctserver:
                 print('Error: failed to load data')
                 return False
             self.leapct_backup.copy_parameters(self.leapct)
-            algorithm(aProj)
+            retVal = algorithm(aProj)
             self.leapct.copy_parameters(self.leapct_backup)
+            if isinstance(retVal, np.ndarray):
+                aProj = retVal
             self.lastImage = np.squeeze(aProj)
             
             return True
         
-    def sinogram_processing(self, algorithm, tryIndex=None):
+    def sinogram_processing(self, algorithm, tryIndex=None, runInfo=None):
         if self.leapct.ct_geometry_defined() == False:
             print('Error: CT geometry must be defined before running this algorithm!')
             return False
@@ -1938,6 +3120,7 @@ class leapctserver:
         self.num_vol = 0
         self.num_proj = max(1, self.num_proj)
         self.numOverlap = max(0, self.numOverlap)
+        self.memory_accountant.begin_run(self.run_algorithm_name(runInfo))
         
         self.chunk_size = self.leapct.get_numRows()
         
@@ -1946,81 +3129,124 @@ class leapctserver:
             if self.num_proj*self.projection_memory() >= self.max_CPU_memory_usage:
                 # not enough memory for this operation, so clear any memory currently being used
                 self.clear_volume_data()
-                if self.g is not None:
+                if self.compact_projections():
+                    # the chunks are expanded from and compressed back into g_compact, so the run cannot be resumed
+                    runInfo = None
+                elif self.g is not None:
                     # save projection data first
                     print('Saving projection data to disk...')
                     self.save_projection_rows(self.g, update_params=True)
-                    self.clear_projection_data_data()
+                    self.clear_projection_data()
                     
                 ############################################################################################
                 self.set_chunk_size()
                 self.create_outputDir() # do I really need to do this?
                 
                 numRows = self.leapct.get_numRows()
-                numChunks = int(np.ceil(float(numRows)/float(self.chunk_size)))
+                output_file = self.projection_rows_file_name()
+                output_full_path = os.path.join(self.path, output_file)
+                row_saver = lambda fullPath, x, seq_offset: self.leapct.save_projections(fullPath, x, seq_offset, axis_split=1)
+                saver = lambda fullPath, x, seq_offset: self.write_view(row_saver, fullPath, x, seq_offset, 1)
+                run = self.begin_chunked_run('sinogram_processing', runInfo, self.projection_file, output_file, numRows)
+                chunks = run.remaining_chunks(self.chunk_size)
+                numChunks = len(chunks)
                 
                 print('Performing algorithm in ' + str(numChunks) + ' chunks of ' + str(self.chunk_size) + ' slices...')
                 
-                if self.numOverlap > 0:
-                    g_lastRows = np.zeros((self.leapct.get_numAngles(), self.numOverlap, self.leapct.get_numCols()), dtype=np.float32)
-                else:
-                    g_lastRows = None
-                    
+                # When the output sequence is the input sequence, each chunk overwrites the rows that the next chunk
+                # reads as its overlap, so the unprocessed overlap rows are carried over from the previous chunk
+                inPlace = self.g_compact is not None or (self.projection_file is not None and os.path.abspath(os.path.join(self.path, self.projection_file)) == os.path.abspath(output_full_path))
+                
+                # the overlap rows of the previous chunk; after a restart these are restored from the run's carry file
+                g_lastRows = None
                 last_row = None
-                for n in range(numChunks):
+                if numChunks > 0 and chunks[0][0] > 0:
+                    carry = self.load_run_carry()
+                    if carry is not None:
+                        g_lastRows = carry.get('g_lastRows', None)
+                        last_row = carry.get('last_row', None)
+                    
+                n = 0
+                while n < numChunks:
                     print('processing chunk ' + str(n+1) + ' of ' + str(numChunks))
                     
-                    rowStart = n*self.chunk_size
-                    rowEnd = min(numRows-1, rowStart + self.chunk_size - 1)
+                    rowStart = chunks[n][0]
+                    rowEnd = chunks[n][1]
                     
                     rowStart_pad = max(0, rowStart - self.numOverlap)
                     rowEnd_pad = min(numRows-1, rowEnd + self.numOverlap)
                     
-                    padded_left_rows = []
-                    padded_right_rows = []
-                    if rowStart_pad < rowStart:
-                        padded_left_rows = list(range(rowStart_pad-rowStart_pad, rowStart-rowStart_pad))
-                    if rowEnd_pad > rowEnd:
-                        padded_right_rows = list(range(rowEnd+1-rowStart_pad, rowEnd_pad+1-rowStart_pad))
-                    padded_rows = padded_left_rows + padded_right_rows
-                    
                     print('reading ' + str(self.projection_file) + '...')
-                    g_chunk = self.load_projection_rows(self.projection_file, [rowStart_pad, rowEnd_pad])
+                    self.memory_accountant.begin_chunk()
+                    with self.profiler.span('sinogram_processing', 'read') as span:
+                        g_chunk = self.chunk_buffer([self.leapct.get_numAngles(), rowEnd_pad-rowStart_pad+1, self.leapct.get_numCols()])
+                        g_chunk = self.load_projection_rows(self.projection_file, [rowStart_pad, rowEnd_pad], g_chunk)
+                        span.add_bytes(g_chunk)
                     if g_chunk is None:
                         print('failed to load rows!')
+                        return False
                         
                     if self.numOverlap >= 1:
-                        if n > 0:
-                            g_chunk[:,0:self.numOverlap,:] = g_lastRows[:]
-                        if n < numChunks-1:
-                            g_lastRows[:] = g_chunk[:,g_chunk.shape[1]-self.numOverlap:g_chunk.shape[1],:]
+                        with self.profiler.span('sinogram_processing', 'copy') as span:
+                            if rowStart > 0 and g_lastRows is not None:
+                                # the unprocessed rows just before rowStart
+                                g_chunk[:,rowStart-rowStart_pad-g_lastRows.shape[1]:rowStart-rowStart_pad,:] = g_lastRows[:]
+                            if inPlace and rowEnd < numRows-1:
+                                # the unprocessed rows [rowEnd+1-numOverlap, rowEnd] are the overlap of the next chunk
+                                carryStart = max(rowStart_pad, rowEnd+1-self.numOverlap)
+                                g_lastRows = g_chunk[:,carryStart-rowStart_pad:rowEnd-rowStart_pad+1,:].copy()
+                                self.memory_accountant.register('g_lastRows', g_lastRows, temporary=True)
+                                span.add_bytes(g_lastRows)
                         
-                    algorithm(g_chunk)
+                    with self.profiler.span('sinogram_processing', 'compute', g_chunk.nbytes):
+                        algorithm(g_chunk)
                     
                     #if n == 1:
                     #    self.leapct.display(g_chunk)
                     
-                    # Perform single-slice feathering between slabs
-                    if self.numOverlap >= 1:
-                        if last_row is not None:
-                            g_chunk[:,self.numOverlap,:] = 0.5*(last_row[:,:] + g_chunk[:,self.numOverlap,:])
-                        
-                        last_row = np.zeros((g_chunk.shape[0], g_chunk.shape[2]), dtype=np.float32)
-                        last_row[:,:] = g_chunk[:,g_chunk.shape[1]-self.numOverlap,:]
-                            
-                    if len(padded_rows) > 0:
-                        g_chunk = np.delete(g_chunk, padded_rows, axis=1)
-                    
-                    if n == numChunks-1:
-                        update_params = True
-                    else:
-                        update_params = False
+                    with self.profiler.span('sinogram_processing', 'copy') as span:
+                        # Perform single-slice feathering between slabs: rowStart is averaged (in place) with
+                        # the same row processed as the overlap of the previous chunk
+                        if self.numOverlap >= 1:
+                            if last_row is not None and rowStart > 0:
+                                g_row = g_chunk[:,rowStart-rowStart_pad,:]
+                                g_row += last_row
+                                g_row *= 0.5
+                            if rowEnd < numRows-1:
+                                if last_row is None or last_row.shape != (g_chunk.shape[0], g_chunk.shape[2]):
+                                    last_row = np.zeros((g_chunk.shape[0], g_chunk.shape[2]), dtype=np.float32)
+                                    self.memory_accountant.register('last_row', last_row, temporary=True)
+                                np.copyto(last_row, g_chunk[:,rowEnd+1-rowStart_pad,:])
+                                span.add_bytes(last_row)
                     
-                    self.save_projection_rows(g_chunk, rowStart, update_params=update_params)
-                    if update_params:
-                        self.save_parameters()
-                    del g_chunk
+                    # the interior rows (without the overlap) are written through a view, not a copy of the chunk
+                    g_interior = g_chunk[:,rowStart-rowStart_pad:rowEnd-rowStart_pad+1,:]
+                    carry = None
+                    if self.numOverlap >= 1 and rowEnd < numRows-1:
+                        carry = {'last_row': last_row}
+                        if g_lastRows is not None:
+                            carry['g_lastRows'] = g_lastRows
+                    with self.profiler.span('sinogram_processing', 'write', g_interior.nbytes):
+                        if self.g_compact is not None:
+                            retVal = self.write_compact_chunk(run, self.g_compact, g_interior, rowStart, 1)
+                        else:
+                            retVal = self.commit_chunk(run, saver, output_full_path, g_interior, rowStart, 1, [g_chunk.shape[0], numRows, g_chunk.shape[2]], carry)
+                    if retVal == False:
+                        print('Error: failed to save chunk')
+                        return False
+                    nominal_memory = self.num_proj*self.memory_used_by_array(g_chunk)
+                    self.release_chunk_buffer(g_chunk)
+                    del g_chunk, g_interior
+                    chunks, numChunks = self.check_chunk_memory(run, chunks, n, nominal_memory)
+                    n += 1
                 
+                if self.g_compact is None:
+                    # a sequence of cropped rows written over the rows it was read from leaves the rows past its end
+                    self.remove_sequence_tail(output_file, numRows)
+                    self.set_projection_file_name(output_file)
+                self.save_parameters()
+                self.end_chunked_run(run)
+                self.memory_accountant.end_run()
                 return True
             else:
                 # there is enough memory to perform operation in one chunk
@@ -2028,11 +3254,16 @@ class leapctserver:
                     # clear volume data memory because it pushes us past the limit
                     self.clear_volume_data()
                 if self.g is None:
-                    self.g = self.load_projection_angles(self.projection_file)
+                    with self.profiler.span('sinogram_processing', 'read') as span:
+                        self.g = self.load_projection_angles(self.projection_file)
+                        span.add_bytes(self.g)
                 if self.g is None:
                     print('Error: failed to load data')
                     return False
-                return algorithm(self.g)
+                with self.profiler.span('sinogram_processing', 'compute', self.g.nbytes):
+                    retVal = algorithm(self.g)
+                self.buffer_processed_in_memory(self.g)
+                return retVal
         else:
             if self.leapct.ct_volume_defined() == False:
                 print('Error: CT volume parameters must be defined!')
@@ -2062,7 +3293,7 @@ class leapctserver:
     def reconstruction_slab_processing(self):
         pass
         
-    def zslice_processing(self, algorithm, tryIndex=None):
+    def zslice_processing(self, algorithm, tryIndex=None, runInfo=None):
         if self.leapct.ct_volume_defined() == False:
             print('Error: CT volume must be defined before running this algorithm!')
             return False
@@ -2071,15 +3302,25 @@ class leapctserver:
         self.num_proj = 0
         self.num_vol = max(1, self.num_vol)
         self.numOverlap = max(0, self.numOverlap)
+        self.memory_accountant.begin_run(self.run_algorithm_name(runInfo))
         
         self.chunk_size = self.leapct.get_numZ()
         
+        if self.slab_range is not None:
+            if self.slab_range[1] < self.slab_range[0]:
+                # zslice_processing_distributed only needs the chunking parameters of the algorithm
+                return True
+            return self.process_zslice_slab(algorithm)
+        
         if tryIndex is None:
             # Need to process the whole volume
             if self.num_vol*self.volume_memory() >= self.max_CPU_memory_usage:
                 # not enough memory for this operation, so clear any memory currently being used
                 self.clear_projection_data()
-                if self.f is not None:
+                if self.compact_volume():
+                    # the chunks are expanded from and compressed back into f_compact, so the run cannot be resumed
+                    runInfo = None
+                elif self.f is not None:
                     # save volume data first
                     print('Saving volume to disk...')
                     self.save_volume(self.f, update_params=True)
@@ -2090,67 +3331,105 @@ class leapctserver:
                 self.create_outputDir() # do I really need to do this?
                 
                 numZ = self.leapct.get_numZ()
-                numChunks = int(np.ceil(float(numZ)/float(self.chunk_size)))
+                output_file = self.volume_file_name()
+                output_full_path = os.path.join(self.path, output_file)
+                slice_saver = lambda fullPath, x, seq_offset: self.leapct.save_volume(fullPath, x, seq_offset)
+                saver = lambda fullPath, x, seq_offset: self.write_view(slice_saver, fullPath, x, seq_offset, 0)
+                run = self.begin_chunked_run('zslice_processing', runInfo, self.reconstruction_file, output_file, numZ)
+                chunks = run.remaining_chunks(self.chunk_size)
+                numChunks = len(chunks)
                 
                 print('Performing algorithm in ' + str(numChunks) + ' chunks of ' + str(self.chunk_size) + ' slices...')
                 
-                if self.numOverlap > 0:
-                    f_lastSlices = np.zeros((self.numOverlap, self.leapct.get_numY(), self.leapct.get_numX()), dtype=np.float32)
-                else:
-                    f_lastSlices = None
-                    
+                # When the output sequence is the input sequence, each chunk overwrites the slices that the next chunk
+                # reads as its overlap, so the unprocessed overlap slices are carried over from the previous chunk
+                inPlace = self.f_compact is not None or (self.reconstruction_file is not None and os.path.abspath(os.path.join(self.path, self.reconstruction_file)) == os.path.abspath(output_full_path))
+                
+                # the overlap slices of the previous chunk; after a restart these are restored from the run's carry file
+                f_lastSlices = None
                 last_slice = None
-                for n in range(numChunks):
+                if numChunks > 0 and chunks[0][0] > 0:
+                    carry = self.load_run_carry()
+                    if carry is not None:
+                        f_lastSlices = carry.get('f_lastSlices', None)
+                        last_slice = carry.get('last_slice', None)
+                    
+                n = 0
+                while n < numChunks:
                     print('processing chunk ' + str(n+1) + ' of ' + str(numChunks))
                     
-                    sliceStart = n*self.chunk_size
-                    sliceEnd = min(numZ-1, sliceStart + self.chunk_size - 1)
+                    sliceStart = chunks[n][0]
+                    sliceEnd = chunks[n][1]
                     
                     sliceStart_pad = max(0, sliceStart - self.numOverlap)
                     sliceEnd_pad = min(numZ-1, sliceEnd + self.numOverlap)
                     
-                    padded_left_slices = []
-                    padded_right_slices = []
-                    if sliceStart_pad < sliceStart:
-                        padded_left_slices = list(range(sliceStart_pad-sliceStart_pad, sliceStart-sliceStart_pad))
-                    if sliceEnd_pad > sliceEnd:
-                        padded_right_slices = list(range(sliceEnd+1-sliceStart_pad, sliceEnd_pad+1-sliceStart_pad))
-                    padded_slices = padded_left_slices + padded_right_slices
-                    
                     print('reading ' + str(self.reconstruction_file) + '...')
-                    f_chunk = self.load_volume(self.reconstruction_file, [sliceStart_pad, sliceEnd_pad])
+                    self.memory_accountant.begin_chunk()
+                    with self.profiler.span('zslice_processing', 'read') as span:
+                        f_chunk = self.chunk_buffer([sliceEnd_pad-sliceStart_pad+1, self.leapct.get_numY(), self.leapct.get_numX()])
+                        f_chunk = self.load_volume(self.reconstruction_file, [sliceStart_pad, sliceEnd_pad], f_chunk)
+                        span.add_bytes(f_chunk)
                     if f_chunk is None:
                         print('failed to load slices!')
+                        return False
                         
                     if self.numOverlap >= 1:
-                        if n > 0:
-                            f_chunk[0:self.numOverlap,:,:] = f_lastSlices[:]
-                        if n < numChunks-1:
-                            f_lastSlices[:] = f_chunk[f_chunk.shape[0]-self.numOverlap:f_chunk.shape[0],:,:]
-                        
-                    algorithm(f_chunk)
-                    
-                    # Perform single-slice feathering between slabs
-                    if self.numOverlap >= 1:
-                        if last_slice is not None:
-                            f_chunk[self.numOverlap,:,:] = 0.5*(last_slice[:,:] + f_chunk[self.numOverlap,:,:])
+                        with self.profiler.span('zslice_processing', 'copy') as span:
+                            if sliceStart > 0 and f_lastSlices is not None:
+                                # the unprocessed slices just before sliceStart
+                                f_chunk[sliceStart-sliceStart_pad-f_lastSlices.shape[0]:sliceStart-sliceStart_pad,:,:] = f_lastSlices[:]
+                            if inPlace and sliceEnd < numZ-1:
+                                # the unprocessed slices [sliceEnd+1-numOverlap, sliceEnd] are the overlap of the next chunk
+                                carryStart = max(sliceStart_pad, sliceEnd+1-self.numOverlap)
+                                f_lastSlices = f_chunk[carryStart-sliceStart_pad:sliceEnd-sliceStart_pad+1,:,:].copy()
+                                self.memory_accountant.register('f_lastSlices', f_lastSlices, temporary=True)
+                                span.add_bytes(f_lastSlices)
                         
-                        last_slice = np.zeros((f_chunk.shape[1], f_chunk.shape[2]), dtype=np.float32)
-                        last_slice[:,:] = f_chunk[f_chunk.shape[0]-self.numOverlap,:,:]
-                            
-                    if len(padded_slices) > 0:
-                        f_chunk = np.delete(f_chunk, padded_slices, axis=0)
+                    with self.profiler.span('zslice_processing', 'compute', f_chunk.nbytes):
+                        algorithm(f_chunk)
                     
-                    if n == numChunks-1:
-                        update_params = True
-                    else:
-                        update_params = False
+                    with self.profiler.span('zslice_processing', 'copy') as span:
+                        # Perform single-slice feathering between slabs: sliceStart is averaged (in place) with
+                        # the same slice processed as the overlap of the previous chunk
+                        if self.numOverlap >= 1:
+                            if last_slice is not None and sliceStart > 0:
+                                f_slice = f_chunk[sliceStart-sliceStart_pad,:,:]
+                                f_slice += last_slice
+                                f_slice *= 0.5
+                            if sliceEnd < numZ-1:
+                                if last_slice is None or last_slice.shape != (f_chunk.shape[1], f_chunk.shape[2]):
+                                    last_slice = np.zeros((f_chunk.shape[1], f_chunk.shape[2]), dtype=np.float32)
+                                    self.memory_accountant.register('last_slice', last_slice, temporary=True)
+                                np.copyto(last_slice, f_chunk[sliceEnd+1-sliceStart_pad,:,:])
+                                span.add_bytes(last_slice)
                     
-                    self.save_volume(f_chunk, sliceStart, update_params=update_params)
-                    if update_params:
-                        self.save_parameters()
-                    del f_chunk
+                    # the interior slices (without the overlap) are a C contiguous view of the chunk, so trimming the overlap copies nothing
+                    f_interior = f_chunk[sliceStart-sliceStart_pad:sliceEnd-sliceStart_pad+1,:,:]
+                    carry = None
+                    if self.numOverlap >= 1 and sliceEnd < numZ-1:
+                        carry = {'last_slice': last_slice}
+                        if f_lastSlices is not None:
+                            carry['f_lastSlices'] = f_lastSlices
+                    with self.profiler.span('zslice_processing', 'write', f_interior.nbytes):
+                        if self.f_compact is not None:
+                            retVal = self.write_compact_chunk(run, self.f_compact, f_interior, sliceStart)
+                        else:
+                            retVal = self.commit_chunk(run, saver, output_full_path, f_interior, sliceStart, 0, [numZ, f_chunk.shape[1], f_chunk.shape[2]], carry)
+                    if retVal == False:
+                        print('Error: failed to save chunk')
+                        return False
+                    nominal_memory = self.num_vol*self.memory_used_by_array(f_chunk)
+                    self.release_chunk_buffer(f_chunk)
+                    del f_chunk, f_interior
+                    chunks, numChunks = self.check_chunk_memory(run, chunks, n, nominal_memory)
+                    n += 1
                 
+                if self.f_compact is None:
+                    self.reconstruction_file = output_file
+                self.save_parameters()
+                self.end_chunked_run(run)
+                self.memory_accountant.end_run()
                 return True
             else:
                 # there is enough memory to perform operation in one chunk
@@ -2158,11 +3437,16 @@ class leapctserver:
                     # clear projection data memory because it pushes us past the limit
                     self.clear_projection_data()
                 if self.f is None:
-                    self.f = self.load_volume(self.reconstruction_file)
+                    with self.profiler.span('zslice_processing', 'read') as span:
+                        self.f = self.load_volume(self.reconstruction_file)
+                        span.add_bytes(self.f)
                 if self.f is None:
                     print('Error: failed to load data')
                     return False
-                return algorithm(self.f)
+                with self.profiler.span('zslice_processing', 'compute', self.f.nbytes):
+                    retVal = algorithm(self.f)
+                self.buffer_processed_in_memory(self.f)
+                return retVal
         else:
             # just trying this algorithm for a single slice
             iz = tryIndex
@@ -2181,6 +3465,32 @@ class leapctserver:
                 return True
         
     
+    def process_zslice_slab(self, algorithm):
+        """Applies a volume filter to the z-slices self.slab_range (read with numOverlap halo slices) and writes them into the output sequence"""
+        numZ = self.leapct.get_numZ()
+        sliceStart = self.slab_range[0]
+        sliceEnd = self.slab_range[1]
+        sliceStart_pad = max(0, sliceStart - self.numOverlap)
+        sliceEnd_pad = min(numZ-1, sliceEnd + self.numOverlap)
+        
+        f_chunk = self.chunk_buffer([sliceEnd_pad-sliceStart_pad+1, self.leapct.get_numY(), self.leapct.get_numX()])
+        f_chunk = self.load_volume(self.reconstruction_file, [sliceStart_pad, sliceEnd_pad], f_chunk)
+        if f_chunk is None:
+            print('failed to load slices!')
+            return False
+        algorithm(f_chunk)
+        if sliceStart_pad < sliceStart or sliceEnd_pad > sliceEnd:
+            f_chunk = f_chunk[sliceStart-sliceStart_pad:sliceEnd-sliceStart_pad+1,:,:]
+        
+        self.create_outputDir()
+        output_file = self.slab_output_file
+        if output_file is None:
+            output_file = self.volume_file_name()
+        fullPath = os.path.join(self.path, output_file)
+        retVal = self.leapct.save_volume(fullPath, f_chunk, sliceStart)
+        self.release_chunk_buffer(f_chunk)
+        return retVal
+        
     ###################################################################################################################
     ###################################################################################################################
     # RECONSTRUCTION ALGORITHMS
@@ -2230,15 +3540,26 @@ class leapctserver:
         
         if self.projection_memory() + self.volume_memory() < self.max_CPU_memory_usage:
             if self.g is None:
-                self.g = self.load_projections()
+                with self.profiler.span('FBP', 'read') as span:
+                    self.g = self.load_projections()
+                    span.add_bytes(self.g)
                 if self.g is None:
                     print('Error: failed to load data')
                     return False
 
             if self.f is not None:
                 del self.f
+            self.clear_compact_volume()
             self.f = self.leapct.allocate_volume()
-            if self.leapct.FBP(self.g, self.f) is not None:
+            q = self.filtered_projections()
+            with self.profiler.span('FBP', 'compute', self.g.nbytes):
+                if q is not None:
+                    retVal = self.leapct.weightedBackproject(q, self.f)
+                else:
+                    retVal = self.leapct.FBP(self.g, self.f)
+            del q
+            if retVal is not None:
+                self.buffer_processed_in_memory(self.f)
                 if doClipping:
                     self.f[self.f<0.0] = 0.0
                     minValue = 0.0
@@ -2253,90 +3574,850 @@ class leapctserver:
                 return False
         else:
             # some bit of chunk needs to be performed
+            self.clear_volume_data()
             if self.projection_memory() >= self.max_CPU_memory_usage:
-                # not even enough memory to hold projections, so save data to disk just in case it is there
-                if self.g is not None:
+                # not even enough memory to hold projections, so hold them in compact storage or save data to disk just in case it is there
+                self.num_proj = 1
+                if self.compact_projections() == False and self.g is not None:
                     # save volume data first
                     print('Saving projection data to disk...')
                     self.save_projection_angles(self.g, update_params=True)
-                    self.clear_projection_data_data()
+                    self.clear_projection_data()
+            
+            # the worker processes only read files, so they cannot reconstruct projections held in compact storage,
+            # and they do not use the filtered projection cache (see FBP_independent_rows)
+            if self.independent_rows() and self.g is None and self.g_compact is None and self.FBP_chunking != 'angle' and self.use_filtered_projection_cache == False:
+                return self.FBP_independent_rows(doClipping)
+            
+            strategy = self.FBP_chunking_strategy()
+            if strategy is None:
+                return False
+            if strategy[0] == 'angle':
+                return self.FBP_angle_chunks(strategy[1], strategy[2], doClipping)
         
             # chunking!
-            output_file = os.path.join(self.outputDir, 'zslice.tif')
+            output_file = self.volume_file_name()
             output_full_path = os.path.join(self.path, output_file)
             self.create_outputDir()
             self.chunking_type = self.Z_SLICE
-            self.num_vol = 1
-            self.num_proj = 1
+            self.num_proj, self.num_vol = self.memory_multiples('FBP')
+            self.memory_accountant.begin_run('FBP')
+            # the z-slabs are compressed into f_compact instead of written to file if the volume fits in compact storage
+            self.compact_volume(allocate=True)
             self.set_chunk_size()
             if self.chunk_size < 1:
                 print('Error: insufficient memory!')
                 return False
                 
-            numChunks = int(np.ceil(float(self.leapct.get_numZ())/float(self.chunk_size)))
             z = self.leapct.z_samples()
+            if self.g is None and self.g_compact is None and self.f_compact is None:
+                runInfo = self.run_info('FBP', doClipping=doClipping, geometry=self.leapct.get_geometry(), centerCol=self.leapct.get_centerCol(), z0=self.leapct.get_z0())
+            else:
+                # the projections in memory have no file identity, so runs reconstructing them are never resumed
+                runInfo = None
+            run = self.begin_chunked_run('FBP', runInfo, self.projection_file, output_file, z.size)
+            saver = lambda fullPath, x, seq_offset: self.leapct_backup.save_volume(fullPath, x, seq_offset)
+            chunks = run.remaining_chunks(self.chunk_size)
+            numChunks = len(chunks)
             
             print('Performing FBP in ' + str(numChunks) + ' chunks of ' + str(self.chunk_size) + ' slices...')
             
-            minValue = None
-            maxValue = None
-            for n in range(numChunks):
+            minValue = run.stats.get('minValue', None)
+            maxValue = run.stats.get('maxValue', None)
+            q = self.filtered_projections(compute=False)
+            n = 0
+            while n < numChunks:
                 print('processing chunk ' + str(n+1) + ' of ' + str(numChunks))
-                self.leapct_backup.copy_parameters(self.leapct)
-                
-                sliceStart = n*self.chunk_size
-                sliceEnd = min(z.size-1, sliceStart + self.chunk_size - 1)
-                numZ = sliceEnd - sliceStart + 1
                 
-                self.leapct_backup.set_numZ(numZ)
-                self.leapct_backup.set_offsetZ(self.leapct_backup.get_offsetZ() + z[sliceStart]-self.leapct_backup.get_z0())
-                rowRange = self.leapct_backup.rowRangeNeededForBackprojection()
-
-                if self.g is not None:
-                    g_chunk = self.leapct_backup.cropProjections(rowRange, None, self.g)
-                else:
-                    g_chunk = self.load_projection_rows(self.projection_file, rowRange)
-                    if g_chunk is None:
-                        print('Error: failed to load projection data!')
-                        return False
-                    self.leapct_backup.cropProjections(rowRange, None)
+                sliceStart = chunks[n][0]
+                sliceEnd = chunks[n][1]
                 
-                f_chunk = self.leapct_backup.FBP(g_chunk)
-                del g_chunk
+                self.memory_accountant.begin_chunk()
+                f_chunk = self.FBP_slab(sliceStart, sliceEnd, doClipping, q)
+                if f_chunk is None:
+                    return False
                 
                 if doClipping:
-                    f_chunk[f_chunk<0.0] = 0.0
                     minValue_cur = 0.0
                 else:
                     minValue_cur = np.min(f_chunk)
                 maxValue_cur = np.max(f_chunk)
                 if minValue is None:
-                    minValue = minValue_cur
-                    maxValue = maxValue_cur
+                    minValue = float(minValue_cur)
+                    maxValue = float(maxValue_cur)
                 else:
-                    minValue = min(minValue, minValue_cur)
-                    maxValue = max(maxValue, maxValue_cur)
+                    minValue = float(min(minValue, minValue_cur))
+                    maxValue = float(max(maxValue, maxValue_cur))
+                run.stats['minValue'] = minValue
+                run.stats['maxValue'] = maxValue
                 
-                self.leapct_backup.save_volume(output_full_path, f_chunk, sliceStart)
+                with self.profiler.span('FBP', 'write', f_chunk.nbytes):
+                    if self.f_compact is not None:
+                        retVal = self.write_compact_chunk(run, self.f_compact, f_chunk, sliceStart)
+                    else:
+                        retVal = self.commit_chunk(run, saver, output_full_path, f_chunk, sliceStart, 0, [z.size, f_chunk.shape[1], f_chunk.shape[2]])
+                if retVal == False:
+                    print('Error: failed to save chunk')
+                    return False
+                nominal_memory = self.num_vol*self.memory_used_by_array(f_chunk) + self.num_proj*4.0*float(self.leapct_backup.get_numAngles()*self.leapct_backup.get_numRows()*self.leapct_backup.get_numCols())/2.0**30
+                self.release_chunk_buffer(f_chunk)
                 del f_chunk
-            self.reconstruction_file = output_file
+                chunks, numChunks = self.check_chunk_memory(run, chunks, n, nominal_memory)
+                n += 1
+            if self.f_compact is None:
+                self.reconstruction_file = output_file
+            self.end_chunked_run(run)
+            self.memory_accountant.end_run()
             print('range of values: ' + str(minValue) + ', ' + str(maxValue))
             if self.leapct.wmax is None:
                 self.leapct.wmax = maxValue
             return True
             
-    def FBP_slice(self, islice=None, coord='z'):
-        if self.leapct.all_defined() == False:
-            print('Error: CT geometry and CT volume must be defined before running this algorithm!')
+    def independent_rows(self):
+        """Returns True if each detector row only contributes to the z-slices at its own height, as in parallel- and fan-beam geometries
+        
+        The z-slabs of these geometries need disjoint sets of detector rows (no overlap between slabs), so they can be reconstructed independently.
+        """
+        return self.leapct.ct_geometry_defined() and self.leapct.get_geometry() in ['PARALLEL', 'FAN']
+        
+    def rows_of_slices(self, sliceStart, sliceEnd):
+        """Returns the detector rows [first, last] at the heights of the z-slices [sliceStart, sliceEnd] of a parallel- or fan-beam geometry
+        
+        When the voxels are taller than the detector pixels, the rows of each slice are all included.
+        """
+        z = self.leapct.z_samples()
+        pixelHeight = self.leapct.get_pixelHeight()
+        voxelHeight = self.leapct.get_voxelHeight()
+        centerRow = self.leapct.get_centerRow()
+        numRows = self.leapct.get_numRows()
+        rowStart = int(np.floor((z[sliceStart] - 0.5*voxelHeight)/pixelHeight + centerRow + 0.5 + 1.0e-3))
+        rowEnd = int(np.ceil((z[sliceEnd] + 0.5*voxelHeight)/pixelHeight + centerRow - 0.5 - 1.0e-3))
+        rowStart = min(numRows-1, max(0, rowStart))
+        rowEnd = min(numRows-1, max(rowStart, rowEnd))
+        return [rowStart, rowEnd]
+        
+    def projection_generation(self):
+        """Returns a token of the projection data in memory (self.g, or else self.g_compact) that changes whenever they change
+        
+        The token is replaced when the data are a different array than at the previous call, and when they are
+        modified in place (see buffer_processed_in_memory, mark_projections_modified, and write_compact_chunk).
+        
+        Returns:
+            the token (string), None if there are no projections in memory
+        """
+        x = self.g
+        if x is None:
+            x = self.g_compact
+        if x is None:
             return None
-        if self.data_type != self.ATTENUATION:
-            print('Error: data_type must be ATTENUATION for reconstruction')
+        if self.g_generation is None or self.g_generation[0]() is not x:
+            self.g_generation = [weakref.ref(x), uuid.uuid4().hex]
+        return self.g_generation[1]
+        
+    def new_projection_generation(self):
+        """Records that the projection data in memory were modified in place, see projection_generation"""
+        self.g_generation = None
+        
+    def projection_data_identity(self):
+        """Returns a description of the projection data that changes whenever the data change
+        
+        This is the generation of the projections in memory (see projection_generation) or, if they are on disk, the names, sizes,
+        and modification times of the projection files.
+        """
+        if self.g is not None:
+            if type(self.g) is not np.ndarray:
+                return None
+            return {'memory': self.projection_generation(), 'shape': list(self.g.shape)}
+        if self.g_compact is not None:
+            return {'compact': self.projection_generation(), 'shape': list(self.g_compact.shape)}
+        if self.projection_file is None:
             return None
-        if self.g is None:
+        fileList = self.leapct.get_file_list(os.path.join(self.path, self.projection_file))
+        if fileList is None or len(fileList) == 0:
+            return None
+        identity = sequence_identity(fileList)
+        if identity is None:
+            return None
+        if self.projection_crop is not None:
+            identity['crop'] = list(self.projection_crop)
+        return identity
+        
+    def filtered_projections(self, compute=True):
+        """Returns the ramp-filtered projections (leapct.filterProjections) of the projections from the filtered projection cache
+        
+        The cache key is the identity of the projection data (see projection_data_identity) and the CT geometry and filter
+        parameters (see filtered_projection_cache.py); the CT volume parameters are not part of it, since the filtered projections do not depend on them.
+        
+        Args:
+            compute (bool): if True and the filtered projections are not cached, they are computed from the projections in memory and saved to the cache
+            
+        Returns:
+            the filtered projections (possibly a memmap of the cached file), None if use_filtered_projection_cache is False, the geometry is helical, or they are not cached and cannot be computed
+        """
+        if self.use_filtered_projection_cache == False or self.is_helical() or self.data_type != self.ATTENUATION:
+            return None
+        identity = self.projection_data_identity()
+        if identity is None:
+            return None
+        cacheDir = os.path.join(self.path, self.outputDir, 'filtered_cache')
+        if self.filtered_projection_cache is None or self.filtered_projection_cache.cacheDir != cacheDir:
+            self.filtered_projection_cache = FilteredProjectionCache(cacheDir)
+        key = filter_key(self.leapct, identity)
+        q = self.filtered_projection_cache.get(key, self.full_projection_shape())
+        if q is not None or compute == False or self.g is None:
+            return q
+        if 2.0*self.projection_memory() + self.volume_memory() >= self.max_CPU_memory_usage:
+            return None
+        
+        q = np.array(self.g, dtype=np.float32)
+        with self.profiler.span('filterProjections', 'compute', q.nbytes):
+            self.leapct.filterProjections(q)
+        with self.profiler.span('filterProjections', 'write', q.nbytes):
+            self.filtered_projection_cache.put(key, q)
+        return q
+        
+    def is_helical(self):
+        """Returns True for helical cone-beam geometries (nonzero helicalPitch)"""
+        return self.leapct.ct_geometry_defined() and self.leapct.get_geometry() == 'CONE' and self.leapct.get_helicalPitch() != 0.0
+        
+    def helical_source_z(self, phis):
+        """Returns the z-coordinate of the source of a helical scan at the angles phis (degrees)
+        
+        LEAP places the helix so that the source is at z = 0 at the middle of the angles of the geometry.
+        """
+        phis = np.array(phis, dtype=np.float64)
+        return self.leapct.get_helicalPitch() * (phis - 0.5*(phis[0]+phis[-1])) * np.pi/180.0
+        
+    def helical_slab_plan(self, sliceStart, sliceEnd):
+        """Returns the projections that contribute to the z-slices [sliceStart, sliceEnd] of a helical scan
+        
+        A projection contributes to the slab if the cone from the source through the slab (whose voxels may be anywhere
+        within the radius of the volume, so at any magnification between sdd/(sod+R) and sdd/(sod-R)) hits the detector.
+        The source moves along z, so these angles form one window, of about as many turns as the slab is tall
+        compared to the pitch, and not the whole scan.
+        
+        Returns:
+            the range of angles [first, last] and the range of detector rows [first, last] of these projections
+        """
+        phis = self.leapct.get_angles()
+        numAngles = phis.size
+        numRows = self.leapct.get_numRows()
+        z_source = self.helical_source_z(phis)
+        z = self.leapct.z_samples()
+        voxelHeight = self.leapct.get_voxelHeight()
+        z_low = z[sliceStart] - 0.5*voxelHeight
+        z_high = z[sliceEnd] + 0.5*voxelHeight
+        
+        sod = self.leapct.get_sod()
+        sdd = self.leapct.get_sdd()
+        R = np.sqrt((0.5*self.leapct.get_numX()*self.leapct.get_voxelWidth() + abs(self.leapct.get_offsetX()))**2 + (0.5*self.leapct.get_numY()*self.leapct.get_voxelWidth() + abs(self.leapct.get_offsetY()))**2)
+        R = min(R, 0.99*sod)
+        v_low = sdd*np.minimum((z_low - z_source)/(sod-R), (z_low - z_source)/(sod+R))
+        v_high = sdd*np.maximum((z_high - z_source)/(sod-R), (z_high - z_source)/(sod+R))
+        # one extra row on each side for the interpolation of the backprojection
+        row_low = v_low/self.leapct.get_pixelHeight() + self.leapct.get_centerRow() - 1.0
+        row_high = v_high/self.leapct.get_pixelHeight() + self.leapct.get_centerRow() + 1.0
+        
+        inds = np.nonzero(np.logical_and(row_high >= 0.0, row_low <= numRows-1))[0]
+        if inds.size == 0:
+            # the slab is outside the scan; reconstruct it from the projection nearest to it
+            iAngle = int(np.argmin(np.abs(z_source - 0.5*(z_low+z_high))))
+            return [iAngle, iAngle], [0, numRows-1]
+        angleRange = [max(0, int(inds[0])-1), min(numAngles-1, int(inds[-1])+1)]
+        rowStart = max(0, int(np.floor(np.min(row_low[angleRange[0]:angleRange[1]+1]))))
+        rowEnd = min(numRows-1, int(np.ceil(np.max(row_high[angleRange[0]:angleRange[1]+1]))))
+        return angleRange, [rowStart, max(rowStart, rowEnd)]
+        
+    def helical_subset_geometry(self, leapct_slab, angleRange):
+        """Restricts the CT geometry of leapct_slab (a copy of leapct with the volume of a z-slab) to the angles of angleRange
+        
+        The helix of the restricted geometry is centered on the middle of its own angles, so the slab is shifted by
+        the height of the source there to stay at the same place relative to the source.
+        """
+        phis = self.leapct.get_angles()
+        if angleRange[0] == 0 and angleRange[1] == phis.size-1:
+            return leapct_slab
+        phis_slab = phis[angleRange[0]:angleRange[1]+1]
+        leapct_slab.set_angles(np.ascontiguousarray(phis_slab, dtype=np.float32))
+        leapct_slab.set_offsetZ(leapct_slab.get_offsetZ() - self.helical_subset_shift(phis_slab))
+        return leapct_slab
+        
+    def helical_subset_shift(self, phis_subset):
+        """Returns the shift in z of the helix of a geometry with only the angles phis_subset (in the order of the scan) of a helical scan
+        
+        The helix of that geometry is centered on the middle of its first and last angle (see helical_source_z), so its
+        volume must be moved down by this amount to stay at the same place relative to the source.
+        """
+        phis = self.leapct.get_angles()
+        return self.leapct.get_helicalPitch()*0.5*((phis_subset[0]+phis_subset[-1]) - (phis[0]+phis[-1]))*np.pi/180.0
+        
+    def helical_chunk_size(self, memory_remaining):
+        """Returns the number of z-slices of the slabs of a helical scan, the largest that fit in memory_remaining (GB)
+        
+        Each slab needs num_vol copies of its slices and num_proj copies of the projections of its angle window
+        (see helical_slab_plan), measured on a slab at the middle of the volume.
+        """
+        numZ = self.leapct.get_numZ()
+        numCols = self.leapct.get_numCols()
+        def memory_needed(chunk_size):
+            sliceStart = max(0, numZ//2 - chunk_size//2)
+            sliceEnd = min(numZ-1, sliceStart + chunk_size - 1)
+            angleRange, rowRange = self.helical_slab_plan(sliceStart, sliceEnd)
+            numProjectionValues = float(angleRange[1]-angleRange[0]+1) * float(rowRange[1]-rowRange[0]+1) * float(numCols)
+            return self.num_vol*self.volume_memory()*float(chunk_size)/float(numZ) + self.num_proj*4.0*numProjectionValues/2.0**30
+        
+        chunk_low = 1
+        chunk_high = numZ
+        while chunk_low < chunk_high:
+            chunk_mid = (chunk_low + chunk_high + 1)//2
+            if memory_needed(chunk_mid) <= memory_remaining:
+                chunk_low = chunk_mid
+            else:
+                chunk_high = chunk_mid-1
+        numChunks = int(np.ceil(float(numZ)/float(chunk_low)))
+        return int(np.ceil(float(numZ)/float(numChunks)))
+        
+    def FBP_independent_rows(self, doClipping=False):
+        """Reconstructs a parallel- or fan-beam scan in z-slabs on a pool of FBP_workers worker processes
+        
+        Each worker reads only the detector rows of its slab (with no overlap with other slabs), reconstructs it, and writes
+        its slices directly into the output sequence (see FBP_distributed).  The memory budget is split between the workers,
+        each worker is given one of the GPUs of leapct (in turn), and the CPU cores are split between the workers.
+        
+        The workers read the projections from their files, so this is not used for projections in memory or in compact
+        storage, nor with use_filtered_projection_cache (the workers filter their own rows and do not use the cache).
+        FBP_chunking_strategy is not consulted: the slabs read every projection once, so no strategy reads less.
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        gpus = self.leapct.get_gpus()
+        gpus = [] if gpus is None else [int(gpu) for gpu in gpus if gpu >= 0]
+        numWorkers = self.FBP_workers
+        if numWorkers is None:
+            numWorkers = max(1, len(gpus))
+        numWorkers = max(1, min(int(numWorkers), self.leapct.get_numZ()))
+        worker_memory = self.scratch_space + (self.max_CPU_memory_usage - self.scratch_space - self.memory_usage()) / float(numWorkers)
+        if worker_memory <= self.scratch_space:
+            print('Error: insufficient memory!')
+            return False
+        numThreads = max(1, os.cpu_count() // numWorkers)
+        return self.FBP_distributed(LocalTransport(numWorkers, gpus, numThreads), doClipping, worker_memory)
+        
+    def FBP_chunking_strategy(self):
+        """Chooses how FBP is chunked when the projections and the volume do not fit in memory together
+        
+        The z-slab strategy reconstructs a slab of z-slices at a time, which only needs memory for the slab and
+        the detector rows it needs, but the rows needed by neighboring slabs overlap (more so for cone-beam
+        scans of tall objects), so parts of the projections are read more than once.  The angle strategy keeps
+        the whole volume in memory, plus a second volume for the FBP of each chunk, and reads every projection
+        once (see FBP_angle_chunks).  The angle strategy is chosen if it fits in max_CPU_memory_usage, reads
+        fewer bytes than the z-slabs would, and the FBP of this CT geometry can be split by angles (see angle_subset_scale).
+        
+        Returns:
+            ['z_slab'], ['angle', chunk_size, scale], or None if the setting of FBP_chunking is invalid
+        """
+        if self.FBP_chunking not in ['auto', 'z_slab', 'angle']:
+            print('Error: FBP_chunking must be auto, z_slab, or angle')
+            return None
+        if self.FBP_chunking == 'z_slab' or self.is_helical():
+            return ['z_slab']
+        
+        # the angle strategy: the volume, the FBP of a chunk, and as many angles as fit in what is left
+        numAngles = self.leapct.get_numAngles()
+        memory_remaining = self.chunk_memory_budget() - self.memory_used_by_array(self.g) - 2.0*self.volume_memory()
+        if self.g is not None:
+            angle_chunk_size = numAngles
+        else:
+            angle_chunk_size = min(numAngles, int(memory_remaining * float(numAngles) / self.projection_memory()))
+        if memory_remaining <= 0.0 or angle_chunk_size < 1:
+            if self.FBP_chunking == 'angle':
+                print('Warning: insufficient memory to hold the volume twice; using the z-slab FBP')
+            return ['z_slab']
+        numChunks = int(np.ceil(float(numAngles)/float(angle_chunk_size)))
+        angle_chunk_size = int(np.ceil(float(numAngles)/float(numChunks)))
+        
+        if self.FBP_chunking == 'auto':
+            # bytes the z-slab strategy reads: every slab reads the detector rows it needs of all the projections
+            self.chunking_type = self.Z_SLICE
+            self.num_proj, self.num_vol = self.memory_multiples('FBP')
+            self.set_chunk_size()
+            numZ = self.leapct.get_numZ()
+            if self.chunk_size >= 1:
+                numSlabs = int(np.ceil(float(numZ)/float(self.chunk_size)))
+                rowsRead = numSlabs * min(self.leapct.get_numRows(), self.leapct.numRowsRequiredForBackprojectingSlab(self.chunk_size))
+                zslab_bytes = self.projection_memory() * float(rowsRead) / float(self.leapct.get_numRows())
+            else:
+                zslab_bytes = np.inf
+            # bytes the angle strategy reads: every projection once (none if they are in memory)
+            if self.g is not None:
+                angle_bytes = 0.0
+            else:
+                angle_bytes = self.projection_memory()
+            if angle_bytes >= zslab_bytes:
+                return ['z_slab']
+        
+        scale = self.angle_subset_scale(angle_chunk_size)
+        if scale is None:
+            if self.FBP_chunking == 'angle':
+                print('Warning: the FBP of this CT geometry cannot be split by angles; using the z-slab FBP')
+            return ['z_slab']
+        return ['angle', angle_chunk_size, scale]
+        
+    def FBP_angle_chunks(self, chunk_size, scale, doClipping=False):
+        """Reconstructs self.f by adding up the FBPs of chunks of angles, reading each projection once
+        
+        The volume stays in memory (self.f) and is not saved to file.  The run accumulates into the volume, so an
+        interrupted run is not resumed (see resume_chunked_runs).  If the memory accountant shrinks the chunk size
+        during the run, scale is recalibrated for the new partition of the angles (and the sum so far is rescaled);
+        if the new partition cannot be calibrated, the chunk size is kept.
+        
+        Args:
+            chunk_size (int): number of angles of each chunk
+            scale (float): the factor from angle_subset_scale
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        numAngles = self.leapct.get_numAngles()
+        self.memory_accountant.begin_run('FBP_angle')
+        self.clear_volume_data()
+        self.f = self.leapct.allocate_volume()
+        f_scratch = self.chunk_buffer(self.f.shape)
+        print('Performing FBP in ' + str(int(np.ceil(float(numAngles)/float(chunk_size)))) + ' chunks of ' + str(chunk_size) + ' angles...')
+        
+        # the chunks of angles that were added up so far
+        subsets = []
+        angleStart = 0
+        while angleStart < numAngles:
+            angleEnd = min(numAngles-1, angleStart+chunk_size-1)
+            print('processing angles ' + str(angleStart) + ' to ' + str(angleEnd))
+            self.memory_accountant.begin_chunk()
+            if self.g is not None:
+                g_chunk = self.g[angleStart:angleEnd+1]
+            else:
+                with self.profiler.span('FBP', 'read') as span:
+                    g_chunk = self.chunk_buffer([angleEnd-angleStart+1, self.leapct.get_numRows(), self.leapct.get_numCols()])
+                    g_chunk = self.load_projection_angles(self.projection_file, [angleStart, angleEnd], g_chunk)
+                    span.add_bytes(g_chunk)
+                if g_chunk is None:
+                    print('Error: failed to load projection data!')
+                    self.release_chunk_buffer(f_scratch)
+                    return False
+            
+            retVal = self.FBP_angle_subset(g_chunk, [angleStart, angleEnd], self.f, f_scratch, scale)
+            nominal_memory = self.memory_used_by_array(g_chunk) + 2.0*self.volume_memory()
+            self.release_chunk_buffer(g_chunk)
+            del g_chunk
+            if retVal == False:
+                print('Error: FBP failed')
+                self.release_chunk_buffer(f_scratch)
+                return False
+            subsets.append([angleStart, angleEnd])
+            angleStart = angleEnd+1
+            new_chunk_size = self.memory_accountant.end_chunk(nominal_memory, self.max_CPU_memory_usage, self.scratch_space, chunk_size)
+            if new_chunk_size != chunk_size and angleStart < numAngles:
+                new_scale = self.angle_subset_scale(subsets + self.angle_partition(new_chunk_size, angleStart))
+                if new_scale is None:
+                    print('Warning: keeping the chunk size of ' + str(chunk_size) + ' angles, since the FBP cannot be split into chunks of ' + str(new_chunk_size) + ' angles')
+                else:
+                    self.f *= new_scale / scale
+                    scale = new_scale
+                    chunk_size = new_chunk_size
+        self.release_chunk_buffer(f_scratch)
+        self.clear_chunk_buffers()
+        self.memory_accountant.end_run()
+        
+        self.buffer_processed_in_memory(self.f)
+        if doClipping:
+            self.f[self.f<0.0] = 0.0
+            minValue = 0.0
+        else:
+            minValue = np.min(self.f)
+        maxValue = np.max(self.f)
+        print('range of values: ' + str(minValue) + ', ' + str(maxValue))
+        if self.leapct.wmax is None:
+            self.leapct.wmax = maxValue
+        return True
+        
+    def FBP_slab(self, sliceStart, sliceEnd, doClipping=False, q=None):
+        """Reconstructs the z-slices [sliceStart, sliceEnd] from only the detector rows (and, for helical scans, the angles) they need
+        
+        On return, leapct_backup holds the CT volume parameters of the slab.
+        
+        Args:
+            q (numpy array): if not None, the ramp-filtered projections (see filtered_projections); the rows of the slab are taken from them and only backprojected
+        
+        Returns:
+            the reconstructed slab (a buffer of buffer_pool; give it back with release_chunk_buffer), None if failed
+        """
+        z = self.leapct.z_samples()
+        self.leapct_backup.copy_parameters(self.leapct)
+        self.leapct_backup.set_numZ(sliceEnd - sliceStart + 1)
+        self.leapct_backup.set_offsetZ(self.leapct_backup.get_offsetZ() + z[sliceStart]-self.leapct_backup.get_z0())
+        angleRange = None
+        if self.independent_rows():
+            rowRange = self.rows_of_slices(sliceStart, sliceEnd)
+        elif self.is_helical():
+            angleRange, rowRange = self.helical_slab_plan(sliceStart, sliceEnd)
+            self.helical_subset_geometry(self.leapct_backup, angleRange)
+        else:
+            rowRange = self.leapct_backup.rowRangeNeededForBackprojection()
+
+        filtered = False
+        if q is not None and angleRange is None:
+            with self.profiler.span('FBP', 'read') as span:
+                g_chunk = self.chunk_buffer([q.shape[0], rowRange[1]-rowRange[0]+1, q.shape[2]])
+                g_chunk[:] = q[:, rowRange[0]:rowRange[1]+1, :]
+                span.add_bytes(g_chunk)
+            self.leapct_backup.cropProjections(rowRange, None)
+            filtered = True
+        elif angleRange is not None:
+            if self.g is not None:
+                with self.profiler.span('FBP', 'copy') as span:
+                    g_chunk = self.chunk_buffer([angleRange[1]-angleRange[0]+1, rowRange[1]-rowRange[0]+1, self.leapct.get_numCols()])
+                    g_chunk[:] = self.g[angleRange[0]:angleRange[1]+1, rowRange[0]:rowRange[1]+1, :]
+                    span.add_bytes(g_chunk)
+            else:
+                with self.profiler.span('FBP', 'read') as span:
+                    g_chunk = self.chunk_buffer([angleRange[1]-angleRange[0]+1, rowRange[1]-rowRange[0]+1, self.leapct.get_numCols()])
+                    g_chunk = self.load_projection_angles(self.projection_file, angleRange, g_chunk, rowRange)
+                    span.add_bytes(g_chunk)
+                if g_chunk is None:
+                    print('Error: failed to load projection data!')
+                    return None
+            self.leapct_backup.cropProjections(rowRange, None)
+        elif self.g is not None:
+            with self.profiler.span('FBP', 'copy') as span:
+                g_chunk = self.leapct_backup.cropProjections(rowRange, None, self.g)
+                span.add_bytes(g_chunk)
+        else:
+            with self.profiler.span('FBP', 'read') as span:
+                g_chunk = self.chunk_buffer([self.leapct.get_numAngles(), rowRange[1]-rowRange[0]+1, self.leapct.get_numCols()])
+                g_chunk = self.load_projection_rows(self.projection_file, rowRange, g_chunk)
+                span.add_bytes(g_chunk)
+            if g_chunk is None:
+                print('Error: failed to load projection data!')
+                return None
+            self.leapct_backup.cropProjections(rowRange, None)
+        
+        f_chunk = self.chunk_buffer([sliceEnd-sliceStart+1, self.leapct_backup.get_numY(), self.leapct_backup.get_numX()])
+        with self.profiler.span('FBP', 'compute', g_chunk.nbytes):
+            if filtered:
+                f_chunk = self.leapct_backup.weightedBackproject(g_chunk, f_chunk)
+            else:
+                f_chunk = self.leapct_backup.FBP(g_chunk, f_chunk)
+        self.release_chunk_buffer(g_chunk)
+        del g_chunk
+        if f_chunk is not None and doClipping:
+            f_chunk[f_chunk<0.0] = 0.0
+        return f_chunk
+        
+    def angle_partition(self, subset_size, angleStart=0):
+        """Returns the contiguous subsets [first, last] of subset_size angles (the last one may be smaller) that cover the angles from angleStart to the end"""
+        numAngles = self.leapct.get_numAngles()
+        subset_size = max(1, int(subset_size))
+        return [[first, min(numAngles-1, first+subset_size-1)] for first in range(angleStart, numAngles, subset_size)]
+        
+    def angle_subset_scale(self, subsets):
+        """Returns the factor that makes the sum of the FBPs of contiguous subsets of the angles equal to the FBP of all the angles
+        
+        LEAP weights each FBP by the angular range of its own projections (e.g., the redundancy of a 360 degree
+        scan or short scan weights), so the FBPs of angle subsets do not simply add up.  The factor is calibrated
+        on a single detector row of this CT geometry by reconstructing a disk both ways, with exactly the subsets
+        that are added up.
+        
+        Args:
+            subsets (int or list): the number of angles in each subset (see angle_partition), or the list of [first, last] subsets, which must cover all the angles
+            
+        Returns:
+            the factor, or None if the FBP of this CT geometry cannot be split by angles (the two reconstructions differ by more than a scale factor)
+        """
+        phis = self.leapct.get_angles()
+        numAngles = phis.size
+        if np.isscalar(subsets):
+            subsets = self.angle_partition(subsets)
+        subsets = [[int(subset[0]), int(subset[1])] for subset in subsets]
+        key = hash_parameters([self.leapct.get_geometry(), phis.tolist(), self.leapct.get_numCols(), self.leapct.get_pixelWidth(), self.leapct.get_centerCol(), subsets])
+        if self.angle_subset_scale_cache is not None and self.angle_subset_scale_cache[0] == key:
+            return self.angle_subset_scale_cache[1]
+        
+        leapct_calibration = tomographicModels()
+        leapct_calibration.copy_parameters(self.leapct)
+        iRow = self.leapct.get_numRows()//2
+        leapct_calibration.cropProjections([iRow, iRow], None)
+        leapct_calibration.set_default_volume()
+        leapct_calibration.set_numZ(1)
+        
+        x = leapct_calibration.x_samples()
+        y = leapct_calibration.y_samples()
+        R = 0.25*min(x[-1]-x[0], y[-1]-y[0])
+        f_disk = leapct_calibration.allocate_volume()
+        f_disk[:,:,:] = np.array(x[None,None,:]**2 + y[None,:,None]**2 < R**2, dtype=np.float32)
+        g = leapct_calibration.allocate_projections()
+        leapct_calibration.project(g, f_disk)
+        f_all = leapct_calibration.FBP(g)
+        
+        f_sum = np.zeros_like(f_all)
+        leapct_subset = tomographicModels()
+        for angleStart, angleEnd in subsets:
+            leapct_subset.copy_parameters(leapct_calibration)
+            leapct_subset.set_angles(np.ascontiguousarray(phis[angleStart:angleEnd+1], dtype=np.float32))
+            f_sum += leapct_subset.FBP(np.ascontiguousarray(g[angleStart:angleEnd+1]))
+        
+        scale = None
+        denominator = float(np.sum(f_sum*f_sum))
+        if denominator > 0.0:
+            scale = float(np.sum(f_all*f_sum)) / denominator
+            residual = np.sqrt(float(np.sum((f_all - scale*f_sum)**2)) / max(1.0e-20, float(np.sum(f_all*f_all))))
+            if residual > 0.01:
+                scale = None
+        self.angle_subset_scale_cache = [key, scale]
+        return scale
+        
+    def FBP_angle_subset(self, g_subset, angleRange, f, f_scratch=None, scale=1.0):
+        """Adds the FBP of the projections of the angles [first, last] to f
+        
+        Args:
+            g_subset (C contiguous float32 numpy array): attenuation projections of the angles angleRange
+            angleRange (list of two integers): the range of angles of g_subset
+            f (C contiguous float32 numpy array): the volume that the reconstruction is added to
+            f_scratch (C contiguous float32 numpy array): volume-sized array used to hold the FBP of the subset, if None one is taken from buffer_pool
+            scale (float): the factor from angle_subset_scale
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        leapct_subset = self.subset_projector(range(angleRange[0], angleRange[1]+1))
+        release_scratch = f_scratch is None
+        if f_scratch is None:
+            f_scratch = self.chunk_buffer(f.shape)
+        retVal = True
+        with self.profiler.span('FBP_angle_subset', 'compute', g_subset.nbytes):
+            if leapct_subset.FBP(g_subset, f_scratch) is None:
+                retVal = False
+            else:
+                if scale != 1.0:
+                    f_scratch *= scale
+                f += f_scratch
+        if release_scratch:
+            self.release_chunk_buffer(f_scratch)
+        return retVal
+        
+    def stream_reconstruction(self, batch_size=8, ROI=None, timeout=60.0, poll_interval=0.5, callback=None):
+        """Reconstructs a scan while it is being acquired, from the projections that land in the folder of raw_scan_file
+        
+        See stream_reconstruction.py.  Every batch of new projections is flat/dark corrected, saved as attenuation
+        projections, filtered, and its backprojection is added to a volume kept in memory (self.f), which holds the
+        partial reconstruction during the scan.
+        
+        Args:
+            batch_size (int): number of projections that are processed together
+            ROI (list of four integers): flux normalization region, see makeAttenuationRadiographs
+            timeout (float): seconds to wait for a new projection before giving up
+            poll_interval (float): seconds between checks of the folder
+            callback (function): if not None, called as callback(f, numReceived) after every batch
+            
+        Returns:
+            True if the full scan was received and reconstructed, False otherwise
+        """
+        from stream_reconstruction import StreamingReconstruction
+        stream = StreamingReconstruction(self, batch_size, ROI, timeout, poll_interval, callback)
+        return stream.run()
+        
+    def FBP_distributed(self, transport=None, doClipping=False, worker_memory=None):
+        """Reconstructs the volume in z-slabs that are distributed over the workers of a transport
+        
+        The projection data must be on disk; each worker reads only the detector rows its slab needs
+        and writes its slices directly into the output sequence.
+        
+        Args:
+            transport: LocalTransport or SocketTransport object (see slab_distribution.py), if None a LocalTransport with one worker per CPU core is used
+            doClipping (bool): if True, negative values are set to zero
+            worker_memory (float): memory (GB) of each worker, if None max_CPU_memory_usage
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.all_defined() == False:
+            print('Error: CT geometry and CT volume must be defined before running this algorithm!')
+            return False
+        if self.data_type != self.ATTENUATION:
+            print('Error: data_type must be ATTENUATION for reconstruction')
+            return False
+        if self.g is not None or self.g_compact is not None:
+            # the workers read the projections from file
+            print('Saving projection data to disk...')
+            self.save_projection_angles(update_params=True)
+            self.clear_projection_data()
+        self.clear_volume_data()
+        
+        self.chunking_type = self.Z_SLICE
+        self.num_proj, self.num_vol = self.memory_multiples('FBP')
+        runInfo = self.run_info('FBP', doClipping=doClipping, geometry=self.leapct.get_geometry(), centerCol=self.leapct.get_centerCol(), z0=self.leapct.get_z0())
+        task = {'operation': 'FBP', 'doClipping': doClipping}
+        run = self.run_distributed('FBP', runInfo, self.projection_file, task, transport, worker_memory)
+        if run is None:
+            return False
+        self.reconstruction_file = self.volume_file_name()
+        maxValue = run.stats.get('maxValue', None)
+        print('range of values: ' + str(run.stats.get('minValue', None)) + ', ' + str(maxValue))
+        if self.leapct.wmax is None:
+            self.leapct.wmax = maxValue
+        return True
+        
+    def zslice_processing_distributed(self, algorithmName, transport=None, **kwargs):
+        """Runs a volume filter (e.g., MedianFilter or TVdenoising) in z-slabs that are distributed over the workers of a transport
+        
+        Args:
+            algorithmName (string): name of the leapctserver method of the filter
+            transport: LocalTransport or SocketTransport object (see slab_distribution.py), if None a LocalTransport with one worker per CPU core is used
+            kwargs: the arguments of the filter
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.ct_volume_defined() == False:
+            print('Error: CT volume must be defined before running this algorithm!')
+            return False
+        if self.f is not None or self.f_compact is not None:
+            print('Saving volume to disk...')
+            self.save_volume(update_params=True)
+        self.clear_projection_data()
+        self.clear_volume_data()
+        
+        # the filter's own chunking parameters determine the slab size
+        self.slab_range = [0, -1]
+        getattr(self, algorithmName)(**kwargs)
+        self.slab_range = None
+        
+        # The workers read halo slices of their neighbours' slabs, so when the input is the output sequence, the
+        # slabs are written to a staging sequence that replaces the output sequence once all of them are finished
+        output_file = self.volume_file_name()
+        if self.reconstruction_file == output_file:
+            slab_file = os.path.join(self.outputDir, 'leapct_staging', os.path.basename(output_file))
+            if os.path.isdir(os.path.dirname(os.path.join(self.path, slab_file))) == False:
+                os.makedirs(os.path.dirname(os.path.join(self.path, slab_file)))
+        else:
+            slab_file = output_file
+        
+        runInfo = self.run_info(algorithmName, **kwargs)
+        task = {'operation': 'zslice_processing', 'algorithm': algorithmName, 'kwargs': kwargs}
+        run = self.run_distributed('zslice_processing', runInfo, self.reconstruction_file, task, transport, output_file=slab_file)
+        if run is None:
+            return False
+        if slab_file != output_file:
+            self.swap_in_sequence(slab_file, output_file)
+        self.reconstruction_file = output_file
+        self.save_parameters()
+        return True
+        
+    def swap_in_sequence(self, staging_file, output_file):
+        """Moves the files of the sequence staging_file over those of output_file (which has the same base file name in another folder)"""
+        outputFolder = os.path.dirname(os.path.join(self.path, output_file))
+        for fileName in self.leapct.get_file_list(os.path.join(self.path, staging_file)):
+            os.replace(fileName, os.path.join(outputFolder, os.path.basename(fileName)))
+        SaveManifest(os.path.join(self.path, output_file)).remove()
+        stagingFolder = os.path.dirname(os.path.join(self.path, staging_file))
+        if os.path.isdir(stagingFolder) and len(os.listdir(stagingFolder)) == 0:
+            os.rmdir(stagingFolder)
+        
+    def run_distributed(self, operation, runInfo, input_file, task, transport=None, worker_memory=None, output_file=None):
+        """Splits the volume into z-slabs and runs task on each slab on the workers of transport
+        
+        The slabs are written into the sequence output_file (relative to path), by default volume_file_name().
+        
+        The slab size is set by set_chunk_size (using the current chunking parameters), so that each slab
+        fits in max_CPU_memory_usage (or worker_memory, if given) on the worker nodes.  With worker_memory, the
+        workers share this machine, so the slabs are also made small enough to give every worker of the transport one.  The parameters are saved to the output folder
+        for the workers to load; the workers must see the same path as this server.  Completed slabs are
+        recorded in the run manifest, so an interrupted run can be resumed (see resume_chunked_runs).
+        
+        Returns:
+            the RunManifest of the finished run, None if any slab failed
+        """
+        self.create_outputDir()
+        max_memory = self.max_CPU_memory_usage
+        if worker_memory is not None:
+            self.max_CPU_memory_usage = worker_memory
+        retVal = self.set_chunk_size()
+        self.max_CPU_memory_usage = max_memory
+        if retVal != True or self.chunk_size < 1:
+            print('Error: insufficient memory!')
+            return None
+        if worker_memory is None:
+            worker_memory = self.max_CPU_memory_usage
+        elif transport is not None:
+            numWorkers = getattr(transport, 'numWorkers', 1)
+            self.chunk_size = int(min(self.chunk_size, np.ceil(float(self.leapct.get_numZ())/float(numWorkers))))
+        if output_file is None:
+            output_file = self.volume_file_name()
+        output_full_path = os.path.join(self.path, output_file)
+        
+        # The workers write directly into the output sequence, so a save manifest of its previous content is invalid
+        SaveManifest(output_full_path).remove()
+        parameter_file = os.path.join(self.path, self.outputDir, 'leapct_distributed_params.txt')
+        self.save_parameters(parameter_file)
+        
+        numZ = self.leapct.get_numZ()
+        run = self.begin_chunked_run(operation, runInfo, input_file, output_file, numZ)
+        chunks = run.remaining_chunks(self.chunk_size)
+        tasks = []
+        for n in range(len(chunks)):
+            slabTask = dict(task)
+            slabTask.update({'index': n, 'slices': chunks[n], 'parameter_file': parameter_file, 'outputDir': self.outputDir,
+                             'output_file': output_file, 'max_CPU_memory_usage': worker_memory})
+            tasks.append(slabTask)
+        
+        def slab_finished(slabTask, result):
+            if result['success'] == False:
+                print('Error: slab ' + str(slabTask['slices']) + ' failed: ' + str(result['error']))
+                return
+            print('finished slices ' + str(slabTask['slices'][0]) + ' to ' + str(slabTask['slices'][1]) + ' (' + str(round(result['time'], 1)) + ' sec)')
+            if 'minValue' in result:
+                run.stats['minValue'] = min(run.stats.get('minValue', result['minValue']), result['minValue'])
+                run.stats['maxValue'] = max(run.stats.get('maxValue', result['maxValue']), result['maxValue'])
+            run.mark_completed(slabTask['slices'][0], slabTask['slices'][1])
+            run.save()
+        
+        if transport is None:
+            transport = LocalTransport()
+        print('Distributing ' + operation + ' in ' + str(len(tasks)) + ' slabs of ' + str(self.chunk_size) + ' slices...')
+        transport.map(tasks, slab_finished)
+        if run.is_finished() == False:
+            print('Error: ' + operation + ' did not finish; rerun with resume_chunked_runs = True to redo the failed slabs')
+            return None
+        self.end_chunked_run(run)
+        return run
+        
+    def FBP_slice(self, islice=None, coord='z'):
+        if self.leapct.all_defined() == False:
+            print('Error: CT geometry and CT volume must be defined before running this algorithm!')
+            return None
+        if self.data_type != self.ATTENUATION:
+            print('Error: data_type must be ATTENUATION for reconstruction')
+            return None
+        if self.g is None:
             self.g = self.load_projections()
             if self.g is None:
                 print('Error: failed to load data')
                 return None
+        q = None
+        if coord == 'z':
+            # only use filtered projections that are already cached; filtering all the projections costs more than one slice
+            q = self.filtered_projections(compute=False)
+        if q is not None:
+            # backproject the cached filtered projections into the one slice
+            if islice is None or islice < 0 or islice >= self.leapct.get_numZ():
+                islice = self.leapct.get_numZ()//2
+            z = self.leapct.z_samples()
+            self.leapct_backup.copy_parameters(self.leapct)
+            self.leapct_backup.set_numZ(1)
+            self.leapct_backup.set_offsetZ(self.leapct_backup.get_offsetZ() + z[islice]-self.leapct_backup.get_z0())
+            f_slice = self.leapct_backup.allocate_volume()
+            if self.leapct_backup.weightedBackproject(q, f_slice) is None:
+                return None
+            return f_slice
         f_slice = self.leapct.FBP_slice(self.g, islice, coord)
         return f_slice
         
@@ -2393,102 +4474,1009 @@ class leapctserver:
         M_zx = np.amax(np.amax(f,axis=2),axis=0)
         M_zy = np.amax(np.amax(f,axis=1),axis=0)
         
-        ind_x = np.squeeze(np.argwhere(M_zy > threshold))
-        ind_y = np.squeeze(np.argwhere(M_zx > threshold))
-        ind_z = np.squeeze(np.argwhere(M_yx > threshold))
-        x = self.leapct.x_samples()
-        y = self.leapct.y_samples()
-        z = self.leapct.z_samples()
-        AABB = [x[ind_x[0]], x[ind_x[-1]], y[ind_y[0]], y[ind_y[-1]], z[ind_z[0]], z[ind_z[-1]]]
-
-        self.leapct.set_default_volume()
-        T_x = self.leapct.get_voxelWidth()
-        T_z = self.leapct.get_voxelHeight()
-        numX_full = self.leapct.get_numX()
-        numY_full = self.leapct.get_numY()
-        numZ_full = self.leapct.get_numZ()
-        offsetZ_full = self.leapct.get_offsetZ()
-        numX = int((AABB[1]-AABB[0])/T_x)+3*int(L)
-        numY = int((AABB[3]-AABB[2])/T_x)+3*int(L)
-        numZ = int((AABB[5]-AABB[4])/T_z)+2*int(L)
-        offsetX = 0.5*(AABB[0]+AABB[1])
-        offsetY = 0.5*(AABB[2]+AABB[3])
-        offsetZ = 0.5*(AABB[4]+AABB[5])
+        ind_x = np.squeeze(np.argwhere(M_zy > threshold))
+        ind_y = np.squeeze(np.argwhere(M_zx > threshold))
+        ind_z = np.squeeze(np.argwhere(M_yx > threshold))
+        x = self.leapct.x_samples()
+        y = self.leapct.y_samples()
+        z = self.leapct.z_samples()
+        AABB = [x[ind_x[0]], x[ind_x[-1]], y[ind_y[0]], y[ind_y[-1]], z[ind_z[0]], z[ind_z[-1]]]
+
+        self.leapct.set_default_volume()
+        T_x = self.leapct.get_voxelWidth()
+        T_z = self.leapct.get_voxelHeight()
+        numX_full = self.leapct.get_numX()
+        numY_full = self.leapct.get_numY()
+        numZ_full = self.leapct.get_numZ()
+        offsetZ_full = self.leapct.get_offsetZ()
+        numX = int((AABB[1]-AABB[0])/T_x)+3*int(L)
+        numY = int((AABB[3]-AABB[2])/T_x)+3*int(L)
+        numZ = int((AABB[5]-AABB[4])/T_z)+2*int(L)
+        offsetX = 0.5*(AABB[0]+AABB[1])
+        offsetY = 0.5*(AABB[2]+AABB[3])
+        offsetZ = 0.5*(AABB[4]+AABB[5])
+        
+        if numX > numX_full:
+            numX = numX_full
+            offsetX = 0.0
+        if numY > numY_full:
+            numY = numY_full
+            offsetY = 0.0
+        if numZ > numZ_full:
+            numZ = numZ_full
+            offsetZ = offsetZ_full
+        
+        #self.leapct.print_parameters()
+        self.leapct.copy_parameters(self.leapct_backup)
+        self.leapct.set_volume(numX, numY, numZ, T_x, T_z, offsetX, offsetY, offsetZ)
+        #self.leapct.print_parameters()
+        reductionFactor = (float(numX_full)*float(numY_full)*float(numZ_full)) / (float(numX)*float(numY)*float(numZ))
+        print('Reduced volume size by a factor of: ' + str(reductionFactor))
+        
+        if tryIndex is not None:
+            iz = tryIndex
+            if iz < 0 or iz >= self.leapct.get_numZ():
+                iz = self.leapct.get_numZ()//2
+            g_ROI, rowRange = self.grab_necessary_sinograms_for_reconstruction(iz)
+            if g_ROI is None:
+                print('Error: failed to load data')
+                return False
+            
+            self.leapct.crop_projections(rowRange)
+            f_slice = self.leapct.FBP_slice(g_ROI, iz)
+            del g_ROI
+            self.lastImage = np.squeeze(f_slice)
+            self.leapct.copy_parameters(self.leapct_backup)
+            return True
+        else:
+            return True
+            
+    def quick_look_factor(self, target_time=None, target_memory=None):
+        """Returns the smallest decimation factor of a quick look (see quick_look) that meets a time and a memory target
+        
+        The time of a quick look is estimated from the bytes it reads and the voxel updates of its backprojection,
+        using the rates measured by the previous quick looks (quick_look_rates).
+        
+        Args:
+            target_time (float): the time (sec) the quick look may take, None for no time target
+            target_memory (float): the memory (GB) the quick look may use, if None the memory that is available within max_CPU_memory_usage
+            
+        Returns:
+            the decimation factor and the estimated time (sec) of the quick look
+        """
+        if target_memory is None:
+            target_memory = self.max_CPU_memory_usage - self.scratch_space - self.memory_usage()
+        numAngles = self.leapct.get_numAngles()
+        numRows = self.leapct.get_numRows()
+        numCols = self.leapct.get_numCols()
+        if self.leapct.ct_volume_defined():
+            numVoxels = float(self.leapct.get_numX())*float(self.leapct.get_numY())*float(self.leapct.get_numZ())
+        else:
+            numVoxels = float(numCols)*float(numCols)*float(numRows)
+        maxFactor = max(1, min(numRows, numCols)//4)
+        for factor in range(1, maxFactor+1):
+            numAngles_quick = int(np.ceil(float(numAngles)/float(factor)))
+            projection_memory = 4.0*numAngles_quick*binned_size(numRows, factor)*binned_size(numCols, factor)/2.0**30
+            volume_memory = 4.0*numVoxels/float(factor**3)/2.0**30
+            if self.g is None:
+                read_bytes = 4.0*numAngles_quick*numRows*numCols
+            else:
+                read_bytes = 0.0
+            estimated_time = read_bytes/self.quick_look_rates['read'] + numAngles_quick*numVoxels/float(factor**3)/self.quick_look_rates['backproject']
+            if projection_memory + volume_memory <= target_memory and (target_time is None or estimated_time <= target_time):
+                return factor, estimated_time
+        return maxFactor, estimated_time
+        
+    def load_binned_projections(self, angleStep=1, rowFactor=1, colFactor=1):
+        """Returns every angleStep-th projection, binned by rowFactor x colFactor (see detector_binning.py)
+        
+        The projections are binned as they are read, one projection (or one block of sinograms) at a time, so the
+        projections are never held at full resolution.
+        """
+        numAngles = self.leapct.get_numAngles()
+        numRows = self.leapct.get_numRows()
+        numCols = self.leapct.get_numCols()
+        inds = range(0, numAngles, angleStep)
+        g_binned = np.empty((len(inds), binned_size(numRows, rowFactor), binned_size(numCols, colFactor)), dtype=np.float32)
+        if self.g is not None:
+            return bin_array(self.g[::angleStep], rowFactor, colFactor, 1, g_binned)
+        if self.projection_file is None and self.g_compact is None:
+            print('Error: projection_file is not specified!')
+            return None
+        
+        if self.g_compact is None and "sino" in os.path.basename(self.projection_file):
+            # read blocks of whole bins of rows
+            rowsPerBlock = rowFactor*max(1, int(2.0**26 / (4.0*numAngles*numCols*rowFactor)))
+            for rowStart in range(0, g_binned.shape[1]*rowFactor, rowsPerBlock):
+                rowEnd = min(g_binned.shape[1]*rowFactor, rowStart+rowsPerBlock)-1
+                g_block = self.chunk_buffer([numAngles, rowEnd-rowStart+1, numCols])
+                g_block = self.load_projection_rows(self.projection_file, [rowStart, rowEnd], g_block)
+                if g_block is None:
+                    return None
+                bin_array(g_block[::angleStep], rowFactor, colFactor, 1, g_binned[:, rowStart//rowFactor:(rowEnd+1)//rowFactor, :])
+                self.release_chunk_buffer(g_block)
+        else:
+            g_one = self.chunk_buffer([1, numRows, numCols])
+            for n in range(len(inds)):
+                g_one = self.load_projection_angles(self.projection_file, [inds[n], inds[n]], g_one)
+                if g_one is None:
+                    return None
+                bin_array(g_one, rowFactor, colFactor, 1, g_binned[n:n+1])
+            self.release_chunk_buffer(g_one)
+        return g_binned
+        
+    def quick_look(self, target_time=5.0, target_memory=None, factor=None):
+        """Reconstructs a low-resolution version of the whole volume within a time and memory target
+        
+        Only every factor-th projection is read, its detector is binned by factor x factor as it is read, and it is
+        reconstructed on a volume with voxels factor times larger.  The result is kept in quick_look_volume (with its
+        CT parameters in quick_look_leapct); the CT parameters and data of the server do not change.
+        
+        Args:
+            target_time (float): the time (sec) the quick look may take, None for no time target
+            target_memory (float): the memory (GB) the quick look may use, see quick_look_factor
+            factor (int): the decimation factor, if None it is chosen by quick_look_factor
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.ct_geometry_defined() == False:
+            print('Error: CT geometry not defined!')
+            return False
+        if self.data_type != self.ATTENUATION:
+            print('Error: data_type must be ATTENUATION for reconstruction')
+            return False
+        if factor is None:
+            factor, estimated_time = self.quick_look_factor(target_time, target_memory)
+            print('quick look: every ' + str(factor) + ' angles, ' + str(factor) + 'x' + str(factor) + ' binning (estimated ' + str(round(estimated_time, 2)) + ' sec)')
+        factor = max(1, int(factor))
+        
+        leapct_quick = tomographicModels()
+        leapct_quick.copy_parameters(self.leapct)
+        if bin_geometry(leapct_quick, factor, factor, 1, factor) == False:
+            return False
+        if self.leapct.ct_volume_defined():
+            leapct_quick.set_volume(int(np.ceil(self.leapct.get_numX()/float(factor))), int(np.ceil(self.leapct.get_numY()/float(factor))), int(np.ceil(self.leapct.get_numZ()/float(factor))),
+                                    self.leapct.get_voxelWidth()*factor, self.leapct.get_voxelHeight()*factor, self.leapct.get_offsetX(), self.leapct.get_offsetY(), self.leapct.get_offsetZ())
+        else:
+            leapct_quick.set_default_volume()
+        
+        time_start = time.perf_counter()
+        read_bytes = 0.0
+        if self.g is None:
+            read_bytes = 4.0*leapct_quick.get_numAngles()*self.leapct.get_numRows()*self.leapct.get_numCols()
+        with self.profiler.span('quick_look', 'read', int(read_bytes)):
+            g_quick = self.load_binned_projections(factor, factor, factor)
+        if g_quick is None:
+            print('Error: failed to load projection data!')
+            return False
+        time_read = time.perf_counter() - time_start
+        
+        time_start = time.perf_counter()
+        with self.profiler.span('quick_look', 'compute', g_quick.nbytes):
+            f_quick = leapct_quick.FBP(g_quick)
+        time_FBP = time.perf_counter() - time_start
+        del g_quick
+        self.clear_chunk_buffers()
+        if f_quick is None:
+            return False
+        
+        if read_bytes > 0.0 and time_read > 0.0:
+            self.quick_look_rates['read'] = read_bytes / time_read
+        if time_FBP > 0.0:
+            self.quick_look_rates['backproject'] = float(leapct_quick.get_numAngles())*float(f_quick.size) / time_FBP
+        print('quick look took ' + str(round(time_read + time_FBP, 2)) + ' sec')
+        self.quick_look_leapct = leapct_quick
+        self.quick_look_volume = f_quick
+        return True
+        
+    def set_ROI_volume(self, box, voxelSize=None):
+        """Sets the CT volume to a box, in physical coordinates, with the given voxel size
+        
+        Args:
+            box (list of six floats): [xmin, xmax, ymin, ymax, zmin, zmax] (mm)
+            voxelSize (float): voxel width (mm); the voxel height is scaled by the same factor, if None the current voxel size is kept
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.ct_geometry_defined() == False:
+            print('Error: CT geometry not defined!')
+            return False
+        if box is None or len(box) != 6 or box[1] <= box[0] or box[3] <= box[2] or box[5] <= box[4]:
+            print('Error: the ROI must be [xmin, xmax, ymin, ymax, zmin, zmax] with min < max')
+            return False
+        if self.leapct.ct_volume_defined() == False:
+            self.leapct.set_default_volume()
+        T_x = self.leapct.get_voxelWidth()
+        T_z = self.leapct.get_voxelHeight()
+        if voxelSize is not None:
+            if voxelSize <= 0.0:
+                print('Error: voxel size must be positive')
+                return False
+            T_z = T_z * voxelSize / T_x
+            T_x = voxelSize
+        numX = max(1, int(np.ceil((box[1]-box[0])/T_x)))
+        numY = max(1, int(np.ceil((box[3]-box[2])/T_x)))
+        numZ = max(1, int(np.ceil((box[5]-box[4])/T_z)))
+        self.leapct.set_volume(numX, numY, numZ, T_x, T_z, 0.5*(box[0]+box[1]), 0.5*(box[2]+box[3]), 0.5*(box[4]+box[5]))
+        return True
+        
+    def ROI_column_range(self, leapct_ROI):
+        """Returns the detector columns [first, last] that the volume of leapct_ROI projects into over all the angles
+        
+        Over a rotation, a point at distance r from the axis of rotation projects anywhere within r of the
+        central ray (magnified for fan- and cone-beam), so the columns are those within the largest such
+        distance of the box from centerCol, plus a margin of two columns.
+        """
+        x = leapct_ROI.x_samples()
+        y = leapct_ROI.y_samples()
+        r = np.sqrt(max(x[0]**2, x[-1]**2) + max(y[0]**2, y[-1]**2)) + leapct_ROI.get_voxelWidth()
+        geometry = leapct_ROI.get_geometry()
+        if geometry == 'PARALLEL' or geometry == 'CONE-PARALLEL':
+            u_max = r
+        else:
+            sod = leapct_ROI.get_sod()
+            if r >= sod:
+                return [0, leapct_ROI.get_numCols()-1]
+            u_max = leapct_ROI.get_sdd() * r / np.sqrt(sod**2 - r**2)
+        centerCol = leapct_ROI.get_centerCol()
+        pixelWidth = leapct_ROI.get_pixelWidth()
+        colStart = max(0, int(np.floor(centerCol - u_max/pixelWidth)) - 2)
+        colEnd = min(leapct_ROI.get_numCols()-1, int(np.ceil(centerCol + u_max/pixelWidth)) + 2)
+        return [colStart, max(colStart, colEnd)]
+        
+    def ROI_reconstruction(self, box, voxelSize=None, doClipping=False):
+        """Reconstructs only a box, in physical coordinates, possibly with smaller voxels (a zoomed-in reconstruction)
+        
+        The CT volume is set to the box (see set_ROI_volume) and only the detector rows and columns that the box projects
+        into over all the angles are read (or copied, if the projections are in memory).  The projections are truncated
+        by the column crop, so truncatedScan is turned on for the reconstruction.  If the box and its detector window do
+        not fit in memory, the ROI volume is reconstructed with FBP instead.
+        
+        Args:
+            box (list of six floats): [xmin, xmax, ymin, ymax, zmin, zmax] (mm)
+            voxelSize (float): voxel width (mm), if None the current voxel size is kept
+            doClipping (bool): if True, negative values are set to zero
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.ct_geometry_defined() == False:
+            print('Error: CT geometry not defined!')
+            return False
+        if self.data_type != self.ATTENUATION:
+            print('Error: data_type must be ATTENUATION for reconstruction')
+            return False
+        if self.set_ROI_volume(box, voxelSize) == False:
+            return False
+        self.clear_volume_data()
+        print('ROI volume: ' + str(self.leapct.get_numX()) + ' x ' + str(self.leapct.get_numY()) + ' x ' + str(self.leapct.get_numZ()) + ' voxels of size ' + str(self.leapct.get_voxelWidth()) + ' mm')
+        
+        rowRange = self.leapct.rowRangeNeededForBackprojection()
+        colRange = self.ROI_column_range(self.leapct)
+        numAngles = self.leapct.get_numAngles()
+        window_memory = 4.0*float(numAngles)*float(rowRange[1]-rowRange[0]+1)*float(colRange[1]-colRange[0]+1)/2.0**30
+        if window_memory + self.volume_memory() + self.memory_used_by_array(self.g) >= self.max_CPU_memory_usage - self.scratch_space:
+            print('Warning: the detector window of the ROI does not fit in memory; reconstructing with FBP')
+            return self.FBP(doClipping)
+        print('reading detector rows ' + str(rowRange) + ' and columns ' + str(colRange))
+        
+        self.leapct_backup.copy_parameters(self.leapct)
+        if self.g is not None:
+            with self.profiler.span('ROI_reconstruction', 'copy') as span:
+                g_ROI = np.ascontiguousarray(self.g[:, rowRange[0]:rowRange[1]+1, colRange[0]:colRange[1]+1])
+                span.add_bytes(g_ROI)
+        else:
+            with self.profiler.span('ROI_reconstruction', 'read') as span:
+                g_ROI = self.load_projection_angles(self.projection_file, None, None, rowRange, colRange)
+                span.add_bytes(g_ROI)
+            if g_ROI is None:
+                print('Error: failed to load projection data!')
+                return False
+        self.leapct_backup.cropProjections(rowRange, colRange)
+        if colRange[0] > 0 or colRange[1] < self.leapct.get_numCols()-1:
+            self.leapct_backup.set_truncatedScan(True)
+        
+        self.f = self.leapct.allocate_volume()
+        with self.profiler.span('ROI_reconstruction', 'compute', g_ROI.nbytes):
+            retVal = self.leapct_backup.FBP(g_ROI, self.f)
+        del g_ROI
+        if retVal is None:
+            self.clear_volume_data()
+            return False
+        self.buffer_processed_in_memory(self.f)
+        if doClipping:
+            self.f[self.f<0.0] = 0.0
+        print('range of values: ' + str(np.min(self.f)) + ', ' + str(np.max(self.f)))
+        return True
+    
+    def iterative_reconstruction(self, algorithmName, params, numIter, inMemoryAlgorithm, num_vol_outOfCore=None, outOfCoreAlgorithm=None, isConjugateGradient=False):
+        """Runs an iterative reconstruction algorithm in memory if possible, otherwise out-of-core
+        
+        If the projections and volumes that the algorithm uses (see memory_multiples) fit in memory, inMemoryAlgorithm(g, f, numIter) (the LEAP-CT algorithm) is run.
+        Otherwise, the volume is kept in memory and outOfCoreAlgorithm(stream, monitor) is run, which reads subsets of projection
+        angles from disk on every iteration (see iterative_stream).  The reconstruction is stored in self.f and
+        the current value of self.f (if it has the correct size) is used as the initial guess.
+        
+        The progress of the reconstruction is tracked by an IterationMonitor (see iteration_monitor), which records the
+        time and convergence metric of every iteration in self.iteration_history, stops the reconstruction when the metric
+        is below stopping_tolerance, and writes a checkpoint every checkpoint_interval iterations.  To do this in memory,
+        the LEAP-CT algorithm is run a few iterations at a time.
+        
+        Args:
+            algorithmName (string): name of the algorithm, used for messages and to look up its memory_multiples
+            params (dict): the algorithm parameters, used to match checkpoints
+            numIter (int): number of iterations
+            inMemoryAlgorithm (function): inMemoryAlgorithm(g, f, numIter) runs the algorithm
+            num_vol_outOfCore (int): number of volume-sized arrays used by outOfCoreAlgorithm
+            outOfCoreAlgorithm (function): outOfCoreAlgorithm(stream, monitor) runs the algorithm on self.f
+            isConjugateGradient (bool): if True, the in-memory algorithm is only split at checkpoints because restarting loses its search direction
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.leapct.all_defined() == False:
+            print('Error: CT geometry and CT volume must be defined before running this algorithm!')
+            return False
+        if self.data_type != self.ATTENUATION:
+            print('Error: data_type must be ATTENUATION for reconstruction')
+            return False
+        
+        if self.f is not None and list(self.f.shape) != self.full_volume_shape():
+            self.clear_volume_data()
+        
+        num_proj, num_vol = self.memory_multiples(algorithmName)
+        isMonitored = self.checkpoint_interval > 0 or self.stopping_tolerance > 0.0 or self.iteration_callback is not None
+        if isMonitored:
+            # the relative update is calculated from a copy of the volume
+            num_vol += 1
+        if num_proj*self.projection_memory() + num_vol*self.volume_memory() < self.max_CPU_memory_usage - self.scratch_space:
+            if self.g is None:
+                self.g = self.load_projections()
+                if self.g is None:
+                    print('Error: failed to load data')
+                    return False
+            if self.f is None:
+                self.f = self.leapct.allocate_volume()
+            monitor = self.iteration_monitor(algorithmName, params, numIter)
+            if self.resume_from_checkpoint:
+                monitor.load_checkpoint(self.f)
+            if isMonitored == False:
+                monitor.begin_iteration()
+                if inMemoryAlgorithm(self.g, self.f, numIter-monitor.startIteration) is None:
+                    return False
+                monitor.end_iteration(numIter, None, self.f, numIterations=numIter-monitor.startIteration)
+            else:
+                if self.checkpoint_interval > 0:
+                    numIter_segment = self.checkpoint_interval
+                elif isConjugateGradient:
+                    numIter_segment = numIter
+                else:
+                    numIter_segment = 1
+                f_0 = self.f.copy()
+                n = monitor.startIteration
+                while n < numIter:
+                    numIter_cur = min(numIter_segment, numIter-n)
+                    f_0[:] = self.f[:]
+                    monitor.begin_iteration()
+                    if inMemoryAlgorithm(self.g, self.f, numIter_cur) is None:
+                        return False
+                    n += numIter_cur
+                    if monitor.end_iteration(n, self.relative_update(self.f, f_0), self.f, numIterations=numIter_cur):
+                        break
+                del f_0
+            monitor.remove_checkpoint()
+            self.iteration_history = monitor.history
+            self.buffer_processed_in_memory(self.f)
+            return True
+        
+        if outOfCoreAlgorithm is None:
+            print('Error: insufficient memory for ' + algorithmName + ' (an out-of-core version of this algorithm is not available)')
+            return False
+        if self.leapct.get_geometry() == 'MODULAR':
+            print('Error: insufficient memory for ' + algorithmName + ' (out-of-core reconstruction is not available for modular-beam geometries)')
+            return False
+        if num_vol_outOfCore*self.volume_memory() >= self.max_CPU_memory_usage - self.scratch_space:
+            print('Error: insufficient memory for ' + algorithmName + ' (the volume must fit in memory)')
+            return False
+        if self.g is not None and self.memory_used_by_array(self.g) + num_vol_outOfCore*self.volume_memory() >= self.max_CPU_memory_usage - self.scratch_space:
+            # not enough memory to keep the projections, so save them to disk
+            print('Saving projection data to disk...')
+            self.save_projection_angles(self.g, update_params=True)
+            self.clear_projection_data()
+        if self.f is None:
+            self.f = self.leapct.allocate_volume()
+        
+        stream = self.iterative_stream(num_vol_outOfCore)
+        if stream is None:
+            return False
+        print('Performing ' + algorithmName + ' out-of-core in blocks of ' + str(stream['numAnglesPerBlock']) + ' projections...')
+        monitor = self.iteration_monitor(algorithmName, params, numIter)
+        retVal = outOfCoreAlgorithm(stream, monitor)
+        self.end_iterative_stream(stream)
+        self.iteration_history = monitor.history
+        if retVal == False:
+            return False
+        monitor.remove_checkpoint()
+        self.buffer_processed_in_memory(self.f)
+        return True
+        
+    def iteration_monitor(self, algorithmName, params, numIter):
+        """Returns the IterationMonitor of an iterative reconstruction, see iterative_reconstruction"""
+        params_hash = hash_parameters([algorithmName, params, self.projection_file, self.full_projection_shape(), self.full_volume_shape()])
+        self.create_outputDir()
+        if self.checkpoint_interval > 0 or self.resume_from_checkpoint:
+            self.outputDir_is_stable('the checkpoints of ' + algorithmName)
+        checkpointFile = os.path.join(self.path, self.outputDir, 'leapct_' + algorithmName + '_checkpoint.npz')
+        callbacks = [callback for callback in [self.iteration_callback, self.progress_callback] if callback is not None]
+        def callback(entry):
+            for cb in callbacks:
+                cb(entry)
+        if len(callbacks) == 0:
+            callback = None
+        return IterationMonitor(algorithmName, numIter, params_hash, checkpointFile, self.checkpoint_interval, self.stopping_tolerance, callback)
+        
+    def relative_update(self, f, f_0):
+        """Returns ||f - f_0|| / ||f||"""
+        f_norm = np.sqrt(float(np.vdot(f.ravel(), f.ravel())))
+        if f_norm <= 0.0:
+            return None
+        diff_squared = 0.0
+        for n in range(f.shape[0]):
+            d = f[n] - f_0[n]
+            diff_squared += float(np.vdot(d.ravel(), d.ravel()))
+        return np.sqrt(diff_squared) / f_norm
+        
+    def iterative_stream(self, num_vol):
+        """Sets up the reading of subsets of projection angles for out-of-core iterative reconstruction
+        
+        The memory that remains after num_vol volumes is split between the arrays of one block of projections
+        and an LRU cache of blocks that have already been read, so that blocks are only read from disk again
+        when the cache is full.
+        
+        Returns:
+            dictionary describing the stream, None if there is not enough memory
+        """
+        numAngles = self.leapct.get_numAngles()
+        angle_memory = self.projection_memory() / float(numAngles)
+        memory_remaining = self.max_CPU_memory_usage - self.scratch_space - num_vol*self.volume_memory() - self.memory_used_by_array(self.g)
+        
+        # each block needs about four projection-sized arrays: data, row sums, and two work arrays
+        numAnglesPerBlock = min(numAngles, int(0.5*memory_remaining / (4.0*angle_memory)))
+        if numAnglesPerBlock < 1:
+            print('Error: insufficient memory!')
+            return None
+        cache_memory = 0.0
+        if self.g is None:
+            cache_memory = memory_remaining - 4.0*numAnglesPerBlock*angle_memory
+        return {'numAnglesPerBlock': numAnglesPerBlock, 'cache': ProjectionSubsetCache(cache_memory), 'rowSums': None, 'rowSumsFile': None,
+                'subsetSums': None, 'subsetSumsFile': None}
+        
+    def end_iterative_stream(self, stream):
+        print(stream['cache'].summary())
+        stream['cache'].clear()
+        for key in ['rowSums', 'subsetSums']:
+            if stream[key] is not None:
+                stream[key] = None
+                if os.path.isfile(stream[key+'File']):
+                    os.remove(stream[key+'File'])
+        
+    def angle_blocks(self, stream, inds=None):
+        """Splits a list of projection angle indices (all angles if None) into blocks that fit in the memory budget"""
+        if inds is None:
+            inds = list(range(self.leapct.get_numAngles()))
+        N = stream['numAnglesPerBlock']
+        return [tuple(inds[n:n+N]) for n in range(0, len(inds), N)]
+        
+    def subset_projector(self, inds):
+        """Returns a copy of leapct (leapct_backup) whose CT geometry only has the given projection angles
+        
+        For helical scans, the volume is shifted to stay in place relative to the source (see helical_subset_shift).
+        """
+        phis = self.leapct.get_angles()
+        self.leapct_backup.copy_parameters(self.leapct)
+        if len(inds) < phis.size:
+            phis_subset = phis[list(inds)]
+            self.leapct_backup.set_angles(np.ascontiguousarray(phis_subset, dtype=np.float32))
+            if self.is_helical():
+                self.leapct_backup.set_offsetZ(self.leapct_backup.get_offsetZ() - self.helical_subset_shift(phis_subset))
+        return self.leapct_backup
+        
+    def load_projection_subset(self, inds):
+        """Returns the projections of the given angles from memory or, if they are not in memory, from file"""
+        if self.g is not None:
+            return np.ascontiguousarray(self.g[list(inds)])
+        g_subset = []
+        for angleRange in contiguous_ranges(list(inds)):
+            g_chunk = self.load_projection_angles(self.projection_file, angleRange)
+            if g_chunk is None:
+                return None
+            g_subset.append(g_chunk)
+        if len(g_subset) == 1:
+            return g_subset[0]
+        else:
+            return np.ascontiguousarray(np.concatenate(g_subset, axis=0))
+        
+    def stream_projections(self, stream, block):
+        g_block = stream['cache'].get(('g', block), lambda: self.load_projection_subset(block))
+        if g_block is None:
+            print('Error: failed to load projections!')
+        return g_block
+        
+    def stream_row_sums(self, stream, block, scratch):
+        """Returns the row sums (the projection of a volume of ones) of a block of projections
+        
+        The first call overwrites scratch (a volume-sized work array of the caller) with the volume of ones.
+        """
+        if stream['rowSums'] is None:
+            # calculate the row sums of all projections once and store them in a memory-mapped file
+            self.create_outputDir()
+            stream['rowSumsFile'] = os.path.join(self.path, self.outputDir, 'leapct_rowsums.npy')
+            rowSums = np.lib.format.open_memmap(stream['rowSumsFile'], mode='w+', dtype=np.float32, shape=tuple(self.full_projection_shape()))
+            scratch[:] = 1.0
+            for aBlock in self.angle_blocks(stream):
+                A = self.subset_projector(aBlock)
+                g_ones = A.allocate_projections()
+                A.project(g_ones, scratch)
+                rowSums[list(aBlock)] = g_ones
+                del g_ones
+            rowSums.flush()
+            stream['rowSums'] = rowSums
+        return stream['cache'].get(('rowSums', block), lambda: np.array(stream['rowSums'][list(block)]))
+        
+    def stream_subset_sums(self, stream, numSubsets):
+        """Returns the memory-mapped file that holds the backprojection of ones (A^T 1) of each of numSubsets subsets of the angles"""
+        if stream['subsetSums'] is None:
+            self.create_outputDir()
+            stream['subsetSumsFile'] = os.path.join(self.path, self.outputDir, 'leapct_subsetsums.npy')
+            stream['subsetSums'] = np.lib.format.open_memmap(stream['subsetSumsFile'], mode='w+', dtype=np.float32, shape=tuple([numSubsets] + self.full_volume_shape()))
+        return stream['subsetSums']
+        
+    def SART_outOfCore(self, stream, monitor, numIter, numSubsets=1, mask=None, isSIRT=False, numTV=0, filters=None):
+        """Out-of-core SIRT (isSIRT=True), SART, and ASDPOCS (numTV > 0), see iterative_reconstruction
+        
+        The convergence metric is the relative residual ||g - Af|| / ||g|| at the start of each iteration.
+        """
+        f = self.f
+        numAngles = self.leapct.get_numAngles()
+        numSubsets = max(1, min(numAngles, int(numSubsets)))
+        if isSIRT:
+            numSubsets = 1
+        subsets = [list(range(m, numAngles, numSubsets)) for m in range(numSubsets)]
+        
+        # C = A^T 1 does not change between iterations, so it is calculated once per subset; with more than one
+        # subset, the C of each subset is kept in a memory-mapped file
+        C_computed = [False]*numSubsets
+        C_subsets = None
+        if numSubsets > 1:
+            C_subsets = self.stream_subset_sums(stream, numSubsets)
+        
+        d = np.zeros(f.shape, dtype=np.float32)
+        C = np.zeros(f.shape, dtype=np.float32)
+        scratch = np.zeros(f.shape, dtype=np.float32)
+        if numTV > 0:
+            f_0 = f.copy()
+        if self.resume_from_checkpoint:
+            monitor.load_checkpoint(f)
+        
+        for n in range(monitor.startIteration, numIter):
+            monitor.begin_iteration()
+            residual_squared = 0.0
+            g_squared = 0.0
+            if numTV > 0:
+                f_0[:] = f[:]
+            for m in range(numSubsets):
+                d[:] = 0.0
+                if C_computed[m] == False:
+                    C[:] = 0.0
+                elif C_subsets is not None:
+                    C[:] = C_subsets[m]
+                for block in self.angle_blocks(stream, subsets[m]):
+                    g_block = self.stream_projections(stream, block)
+                    if g_block is None:
+                        return False
+                    rowSums = self.stream_row_sums(stream, block, scratch)
+                    A = self.subset_projector(block)
+                    
+                    # d += A^T (g - Af) / A1
+                    r = np.zeros(g_block.shape, dtype=np.float32)
+                    A.project(r, f)
+                    np.subtract(g_block, r, out=r)
+                    residual_squared += float(np.vdot(r.ravel(), r.ravel()))
+                    g_squared += float(np.vdot(g_block.ravel(), g_block.ravel()))
+                    r[rowSums > 0.0] /= rowSums[rowSums > 0.0]
+                    r[rowSums <= 0.0] = 0.0
+                    A.backproject(r, scratch)
+                    d += scratch
+                    
+                    # C += A^T 1
+                    if C_computed[m] == False:
+                        r[:] = 1.0
+                        A.backproject(r, scratch)
+                        C += scratch
+                    del r
+                    
+                if C_computed[m] == False:
+                    if C_subsets is not None:
+                        C_subsets[m] = C
+                    C_computed[m] = True
+                ind = C > 0.0
+                d[ind] /= C[ind]
+                if mask is not None:
+                    d *= mask
+                f += d
+                f[f<0.0] = 0.0
+                
+            if numTV > 0:
+                # TV gradient descent steps, scaled by the change made by the data update
+                if filters is None:
+                    filters = filterSequence(1.0)
+                    filters.append(TV(self.leapct, delta=0.02/20.0))
+                np.subtract(f, f_0, out=d)
+                dp = np.sqrt(np.vdot(d.ravel(), d.ravel()))
+                for k in range(numTV):
+                    grad = filters.gradient(f)
+                    grad_norm = np.sqrt(np.vdot(grad.ravel(), grad.ravel()))
+                    if grad_norm <= 0.0:
+                        break
+                    f -= (0.2*dp/grad_norm)*grad
+                    f[f<0.0] = 0.0
+                    del grad
+            
+            metric = None
+            if g_squared > 0.0:
+                metric = np.sqrt(residual_squared / g_squared)
+            if monitor.end_iteration(n+1, metric, f):
+                break
+        return True
+        
+    def RWLS_outOfCore(self, stream, monitor, numIter, filters=None, W=None, preconditioner=None, nonnegativityConstraint=True, isWeighted=True):
+        """Out-of-core LS, WLS, RLS, and RWLS by preconditioned conjugate gradient, see iterative_reconstruction
+        
+        The weights are exp(-g) if W is None and isWeighted is True; W may also be a numpy array (or memmap) of the size of the projections.
+        The convergence metric is the relative residual ||Af - g|| / ||g|| at the start of each iteration.
+        """
+        f = self.f
+        if preconditioner is not None and preconditioner != 'SQS':
+            print('Warning: only the SQS preconditioner is available for out-of-core reconstruction; no preconditioner will be used')
+            preconditioner = None
+        blocks = self.angle_blocks(stream)
+        
+        def weights(block, g_block):
+            if isWeighted == False:
+                return None
+            elif W is None:
+                return stream['cache'].get(('W', block), lambda: np.exp(-g_block))
+            else:
+                return np.ascontiguousarray(W[list(block)], dtype=np.float32)
+        
+        grad = np.zeros(f.shape, dtype=np.float32)
+        p = np.zeros(f.shape, dtype=np.float32)
+        scratch = np.zeros(f.shape, dtype=np.float32)
+        P = None
+        if preconditioner == 'SQS':
+            # P = 1 / A^T W A 1
+            P = np.zeros(f.shape, dtype=np.float32)
+            for block in blocks:
+                g_block = self.stream_projections(stream, block)
+                if g_block is None:
+                    return False
+                r = self.stream_row_sums(stream, block, scratch).copy()
+                W_block = weights(block, g_block)
+                if W_block is not None:
+                    r *= W_block
+                A = self.subset_projector(block)
+                A.backproject(r, scratch)
+                P += scratch
+                del r
+            ind = P > 0.0
+            P[ind] = 1.0 / P[ind]
+        
+        gamma_old = None
+        if self.resume_from_checkpoint:
+            state = monitor.load_checkpoint(f)
+            if state is not None and 'p' in state:
+                p[:] = state['p'][:]
+                gamma_old = state['gamma_old']
+        
+        for n in range(monitor.startIteration, numIter):
+            monitor.begin_iteration()
+            residual_squared = 0.0
+            g_squared = 0.0
+            
+            # grad = A^T W (Af - g) + R'(f)
+            grad[:] = 0.0
+            for block in blocks:
+                g_block = self.stream_projections(stream, block)
+                if g_block is None:
+                    return False
+                A = self.subset_projector(block)
+                r = np.zeros(g_block.shape, dtype=np.float32)
+                A.project(r, f)
+                r -= g_block
+                residual_squared += float(np.vdot(r.ravel(), r.ravel()))
+                g_squared += float(np.vdot(g_block.ravel(), g_block.ravel()))
+                W_block = weights(block, g_block)
+                if W_block is not None:
+                    r *= W_block
+                A.backproject(r, scratch)
+                grad += scratch
+                del r
+            if filters is not None:
+                grad += filters.gradient(f)
+            
+            # preconditioned Fletcher-Reeves conjugate direction (kept in p)
+            if P is not None:
+                np.multiply(P, grad, out=scratch)
+            else:
+                scratch[:] = grad[:]
+            gamma = float(np.vdot(grad.ravel(), scratch.ravel()))
+            if gamma <= 0.0:
+                break
+            if gamma_old is None:
+                p[:] = -scratch[:]
+            else:
+                p *= gamma / gamma_old
+                p -= scratch
+            gamma_old = gamma
+            
+            # step size = -grad.p / (||Ap||_W^2 + p^T R''(f) p)
+            num = -float(np.vdot(grad.ravel(), p.ravel()))
+            denom = 0.0
+            for block in blocks:
+                g_block = self.stream_projections(stream, block)
+                if g_block is None:
+                    return False
+                A = self.subset_projector(block)
+                r = np.zeros(g_block.shape, dtype=np.float32)
+                A.project(r, p)
+                W_block = weights(block, g_block)
+                if W_block is not None:
+                    denom += float(np.vdot(r.ravel(), (W_block*r).ravel()))
+                else:
+                    denom += float(np.vdot(r.ravel(), r.ravel()))
+                del r
+            if filters is not None:
+                denom += filters.quadForm(f, p)
+            if denom <= 0.0:
+                break
+            f += (num/denom)*p
+            if nonnegativityConstraint:
+                f[f<0.0] = 0.0
+            
+            metric = None
+            if g_squared > 0.0:
+                metric = np.sqrt(residual_squared / g_squared)
+            if monitor.end_iteration(n+1, metric, f, {'p': p, 'gamma_old': gamma_old}):
+                break
+        return True
+        
+    def detector_laplacian(self, g, numDims=1):
+        """Returns the negative Laplacian (D^T D, with D the finite difference) of each projection in g
         
-        if numX > numX_full:
-            numX = numX_full
-            offsetX = 0.0
-        if numY > numY_full:
-            numY = numY_full
-            offsetY = 0.0
-        if numZ > numZ_full:
-            numZ = numZ_full
-            offsetZ = offsetZ_full
+        The derivative is taken along the detector columns (numDims=1) or along the detector rows and columns (numDims=2),
+        with zero-flux boundary conditions, so the result is positive semi-definite.
+        """
+        Lg = np.zeros(g.shape, dtype=np.float32)
+        if numDims == 1:
+            axes = [2]
+        else:
+            axes = [1, 2]
+        for axis in axes:
+            d = np.diff(np.moveaxis(g, axis, -1), axis=-1)
+            Lg_view = np.moveaxis(Lg, axis, -1)
+            Lg_view[..., 1:] += d
+            Lg_view[..., :-1] -= d
+            del d
+        return Lg
+        
+    def DLS_outOfCore(self, stream, monitor, numIter, filters=None, preconditionerFWHM=1.0, nonnegativityConstraint=False, dimDeriv=1):
+        """Out-of-core DLS and RDLS by preconditioned conjugate gradient, see iterative_reconstruction
+        
+        Minimizes (Af - g)^T L (Af - g) + R(f), where L is the negative Laplacian of each projection (see detector_laplacian),
+        so the projections are fit in the derivative domain.  If preconditionerFWHM > 1, the gradient is preconditioned
+        by blurring it with a Gaussian of that FWHM (in voxels).
+        The convergence metric is the relative residual sqrt((Af - g)^T L (Af - g) / g^T L g) at the start of each iteration.
+        """
+        f = self.f
+        blocks = self.angle_blocks(stream)
+        
+        grad = np.zeros(f.shape, dtype=np.float32)
+        p = np.zeros(f.shape, dtype=np.float32)
+        scratch = np.zeros(f.shape, dtype=np.float32)
+        
+        gamma_old = None
+        if self.resume_from_checkpoint:
+            state = monitor.load_checkpoint(f)
+            if state is not None and 'p' in state:
+                p[:] = state['p'][:]
+                gamma_old = state['gamma_old']
+        
+        for n in range(monitor.startIteration, numIter):
+            monitor.begin_iteration()
+            residual_squared = 0.0
+            g_squared = 0.0
+            
+            # grad = A^T L (Af - g) + R'(f)
+            grad[:] = 0.0
+            for block in blocks:
+                g_block = self.stream_projections(stream, block)
+                if g_block is None:
+                    return False
+                A = self.subset_projector(block)
+                r = np.zeros(g_block.shape, dtype=np.float32)
+                A.project(r, f)
+                r -= g_block
+                Lr = self.detector_laplacian(r, dimDeriv)
+                residual_squared += float(np.vdot(r.ravel(), Lr.ravel()))
+                Lg = stream['cache'].get(('Lg', block), lambda: self.detector_laplacian(g_block, dimDeriv))
+                g_squared += float(np.vdot(g_block.ravel(), Lg.ravel()))
+                A.backproject(Lr, scratch)
+                grad += scratch
+                del r, Lr
+            if filters is not None:
+                grad += filters.gradient(f)
+            
+            # preconditioned Fletcher-Reeves conjugate direction (kept in p)
+            scratch[:] = grad[:]
+            if preconditionerFWHM > 1.0:
+                self.leapct.BlurFilter(scratch, preconditionerFWHM)
+            gamma = float(np.vdot(grad.ravel(), scratch.ravel()))
+            if gamma <= 0.0:
+                break
+            if gamma_old is None:
+                p[:] = -scratch[:]
+            else:
+                p *= gamma / gamma_old
+                p -= scratch
+            gamma_old = gamma
+            
+            # step size = -grad.p / ((Ap)^T L (Ap) + p^T R''(f) p)
+            num = -float(np.vdot(grad.ravel(), p.ravel()))
+            denom = 0.0
+            for block in blocks:
+                A = self.subset_projector(block)
+                r = A.allocate_projections()
+                A.project(r, p)
+                Lr = self.detector_laplacian(r, dimDeriv)
+                denom += float(np.vdot(r.ravel(), Lr.ravel()))
+                del r, Lr
+            if filters is not None:
+                denom += filters.quadForm(f, p)
+            if denom <= 0.0:
+                break
+            f += (num/denom)*p
+            if nonnegativityConstraint:
+                f[f<0.0] = 0.0
+            
+            metric = None
+            if g_squared > 0.0:
+                metric = np.sqrt(max(0.0, residual_squared) / g_squared)
+            if monitor.end_iteration(n+1, metric, f, {'p': p, 'gamma_old': gamma_old}):
+                break
+        return True
         
-        #self.leapct.print_parameters()
-        self.leapct.copy_parameters(self.leapct_backup)
-        self.leapct.set_volume(numX, numY, numZ, T_x, T_z, offsetX, offsetY, offsetZ)
-        #self.leapct.print_parameters()
-        reductionFactor = (float(numX_full)*float(numY_full)*float(numZ_full)) / (float(numX)*float(numY)*float(numZ))
-        print('Reduced volume size by a factor of: ' + str(reductionFactor))
+    def MLTR_outOfCore(self, stream, monitor, numIter, numSubsets=1, filters=None, mask=None):
+        """Out-of-core ordered subsets maximum likelihood transmission reconstruction, see iterative_reconstruction
         
-        if tryIndex is not None:
-            iz = tryIndex
-            if iz < 0 or iz >= self.leapct.get_numZ():
-                iz = self.leapct.get_numZ()//2
-            g_ROI, rowRange = self.grab_necessary_sinograms_for_reconstruction(iz)
-            if g_ROI is None:
-                print('Error: failed to load data')
-                return False
+        The convergence metric is the relative update ||f_{n+1} - f_n|| / ||f_{n+1}|| of each iteration.
+        """
+        f = self.f
+        numAngles = self.leapct.get_numAngles()
+        numSubsets = max(1, min(numAngles, int(numSubsets)))
+        subsets = [list(range(m, numAngles, numSubsets)) for m in range(numSubsets)]
+        
+        num = np.zeros(f.shape, dtype=np.float32)
+        den = np.zeros(f.shape, dtype=np.float32)
+        scratch = np.zeros(f.shape, dtype=np.float32)
+        if self.resume_from_checkpoint:
+            monitor.load_checkpoint(f)
+        
+        for n in range(monitor.startIteration, numIter):
+            monitor.begin_iteration()
+            update_squared = 0.0
+            for m in range(numSubsets):
+                num[:] = 0.0
+                den[:] = 0.0
+                for block in self.angle_blocks(stream, subsets[m]):
+                    g_block = self.stream_projections(stream, block)
+                    if g_block is None:
+                        return False
+                    t_block = stream['cache'].get(('t', block), lambda: np.exp(-g_block))
+                    rowSums = self.stream_row_sums(stream, block, scratch)
+                    A = self.subset_projector(block)
+                    
+                    # num += A^T (exp(-Af) - t), den += A^T (A1 exp(-Af))
+                    l = np.zeros(g_block.shape, dtype=np.float32)
+                    A.project(l, f)
+                    np.negative(l, out=l)
+                    np.exp(l, out=l)
+                    r = l - t_block
+                    A.backproject(r, scratch)
+                    num += scratch
+                    l *= rowSums
+                    A.backproject(l, scratch)
+                    den += scratch
+                    del l, r
+                if filters is not None:
+                    num -= filters.gradient(f) / float(numSubsets)
+                ind = den > 0.0
+                num[ind] /= den[ind]
+                num[~ind] = 0.0
+                if mask is not None:
+                    num *= mask
+                f += num
+                f[f<0.0] = 0.0
+                update_squared += float(np.vdot(num.ravel(), num.ravel()))
             
-            self.leapct.crop_projections(rowRange)
-            f_slice = self.leapct.FBP_slice(g_ROI, iz)
-            del g_ROI
-            self.lastImage = np.squeeze(f_slice)
-            self.leapct.copy_parameters(self.leapct_backup)
-            return True
-        else:
-            return True
+            metric = None
+            f_squared = float(np.vdot(f.ravel(), f.ravel()))
+            if f_squared > 0.0:
+                metric = np.sqrt(update_squared / f_squared)
+            if monitor.end_iteration(n+1, metric, f):
+                break
+        return True
     
     def SIRT(self, numIter, mask=None):
-        #self.leapct.SIRT(g, f, numIter, mask)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.SIRT(g, f, numIter, mask)
+        outOfCoreAlgorithm = lambda stream, monitor: self.SART_outOfCore(stream, monitor, numIter, 1, mask, isSIRT=True)
+        params = {'mask': mask is not None}
+        return self.iterative_reconstruction('SIRT', params, numIter, inMemoryAlgorithm, 4, outOfCoreAlgorithm)
         
     def SART(self, numIter, numSubsets=1, mask=None):
-        #self.leapct.SART(g, f, numIter, numSubsets, mask)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.SART(g, f, numIter, numSubsets, mask)
+        outOfCoreAlgorithm = lambda stream, monitor: self.SART_outOfCore(stream, monitor, numIter, numSubsets, mask)
+        params = {'numSubsets': numSubsets, 'mask': mask is not None}
+        return self.iterative_reconstruction('SART', params, numIter, inMemoryAlgorithm, 4, outOfCoreAlgorithm)
         
     def ASDPOCS(self, numIter, numSubsets, numTV, filters=None, mask=None):
-        #self.leapct.ASDPOCS(g, f, numIter, numSubsets, numTV, filters, mask)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.ASDPOCS(g, f, numIter, numSubsets, numTV, filters, mask)
+        outOfCoreAlgorithm = lambda stream, monitor: self.SART_outOfCore(stream, monitor, numIter, numSubsets, mask, numTV=numTV, filters=filters)
+        params = {'numSubsets': numSubsets, 'numTV': numTV, 'filters': filters is not None, 'mask': mask is not None}
+        return self.iterative_reconstruction('ASDPOCS', params, numIter, inMemoryAlgorithm, 6, outOfCoreAlgorithm)
         
     def LS(self, numIter, preconditioner=None, nonnegativityConstraint=True):
-        #self.leapct.LS(g, f, numIter, preconditioner, nonnegativityConstraint)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.LS(g, f, numIter, preconditioner, nonnegativityConstraint)
+        outOfCoreAlgorithm = lambda stream, monitor: self.RWLS_outOfCore(stream, monitor, numIter, None, None, preconditioner, nonnegativityConstraint, isWeighted=False)
+        params = {'preconditioner': preconditioner, 'nonnegativityConstraint': nonnegativityConstraint}
+        return self.iterative_reconstruction('LS', params, numIter, inMemoryAlgorithm, 5, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def WLS(self, numIter, W=None, preconditioner=None, nonnegativityConstraint=True):
-        #self.leapct.WLS(g, f, numIter, W, preconditioner, nonnegativityConstraint)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.WLS(g, f, numIter, W, preconditioner, nonnegativityConstraint)
+        outOfCoreAlgorithm = lambda stream, monitor: self.RWLS_outOfCore(stream, monitor, numIter, None, W, preconditioner, nonnegativityConstraint)
+        params = {'W': W is not None, 'preconditioner': preconditioner, 'nonnegativityConstraint': nonnegativityConstraint}
+        return self.iterative_reconstruction('WLS', params, numIter, inMemoryAlgorithm, 5, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def RLS(self, numIter, filters=None, preconditioner=None, nonnegativityConstraint=True):
-        #self.leapct.RLS(g, f, numIter, filters, preconditioner, nonnegativityConstraint)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.RLS(g, f, numIter, filters, preconditioner, nonnegativityConstraint)
+        outOfCoreAlgorithm = lambda stream, monitor: self.RWLS_outOfCore(stream, monitor, numIter, filters, None, preconditioner, nonnegativityConstraint, isWeighted=False)
+        params = {'filters': filters is not None, 'preconditioner': preconditioner, 'nonnegativityConstraint': nonnegativityConstraint}
+        return self.iterative_reconstruction('RLS', params, numIter, inMemoryAlgorithm, 6, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def RWLS(self, numIter, filters=None, W=None, preconditioner=None, nonnegativityConstraint=True):
-        #self.leapct.RWLS(g, f, numIter, filters, W, preconditioner, nonnegativityConstraint)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.RWLS(g, f, numIter, filters, W, preconditioner, nonnegativityConstraint)
+        outOfCoreAlgorithm = lambda stream, monitor: self.RWLS_outOfCore(stream, monitor, numIter, filters, W, preconditioner, nonnegativityConstraint)
+        params = {'filters': filters is not None, 'W': W is not None, 'preconditioner': preconditioner, 'nonnegativityConstraint': nonnegativityConstraint}
+        return self.iterative_reconstruction('RWLS', params, numIter, inMemoryAlgorithm, 6, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def DLS(self, numIter, preconditionerFWHM=1.0, nonnegativityConstraint=False, dimDeriv=2):
-        #self.leapct.DLS(g, f, numIter, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.DLS(g, f, numIter, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
+        outOfCoreAlgorithm = lambda stream, monitor: self.DLS_outOfCore(stream, monitor, numIter, None, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
+        params = {'preconditionerFWHM': preconditionerFWHM, 'nonnegativityConstraint': nonnegativityConstraint, 'dimDeriv': dimDeriv}
+        return self.iterative_reconstruction('DLS', params, numIter, inMemoryAlgorithm, 5, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def RDLS(self, numIter, filters=None, preconditionerFWHM=1.0, nonnegativityConstraint=False, dimDeriv=1):
-        #self.leapct.RDLS(g, f, numIter, filters, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.RDLS(g, f, numIter, filters, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
+        outOfCoreAlgorithm = lambda stream, monitor: self.DLS_outOfCore(stream, monitor, numIter, filters, preconditionerFWHM, nonnegativityConstraint, dimDeriv)
+        params = {'filters': filters is not None, 'preconditionerFWHM': preconditionerFWHM, 'nonnegativityConstraint': nonnegativityConstraint, 'dimDeriv': dimDeriv}
+        return self.iterative_reconstruction('RDLS', params, numIter, inMemoryAlgorithm, 6, outOfCoreAlgorithm, isConjugateGradient=True)
         
     def MLTR(self, numIter, numSubsets=1, filters=None, mask=None):
-        #self.leapct.MLTR(g, f, numIter, numSubsets, filters, mask)
-        pass
+        inMemoryAlgorithm = lambda g, f, numIter: self.leapct.MLTR(g, f, numIter, numSubsets, filters, mask)
+        outOfCoreAlgorithm = lambda stream, monitor: self.MLTR_outOfCore(stream, monitor, numIter, numSubsets, filters, mask)
+        params = {'numSubsets': numSubsets, 'filters': filters is not None, 'mask': mask is not None}
+        return self.iterative_reconstruction('MLTR', params, numIter, inMemoryAlgorithm, 4, outOfCoreAlgorithm)
 
     
     ###################################################################################################################
@@ -2499,29 +5487,29 @@ class leapctserver:
     def MedianFilter(self, threshold=0.0, windowSize=3, tryIndex=None):
         self.chunking_type = self.Z_SLICE
         self.numOverlap = 1
-        self.num_proj = 0
-        self.num_vol = 2
+        self.num_proj, self.num_vol = self.memory_multiples('MedianFilter')
         
         algorithm = lambda f: self.leapct.MedianFilter(f, threshold, windowSize)
-        return self.zslice_processing(algorithm, tryIndex)
+        runInfo = self.run_info('MedianFilter', threshold=threshold, windowSize=windowSize)
+        return self.zslice_processing(algorithm, tryIndex, runInfo)
         
     def MedianFilter2D(self, threshold=0.0, windowSize=3, tryIndex=None):
         self.chunking_type = self.Z_SLICE
         self.numOverlap = 0
-        self.num_proj = 0
-        self.num_vol = 1
+        self.num_proj, self.num_vol = self.memory_multiples('MedianFilter2D')
         
         algorithm = lambda f: self.leapct.MedianFilter2D(f, threshold, windowSize)
-        return self.zslice_processing(algorithm, tryIndex)
+        runInfo = self.run_info('MedianFilter2D', threshold=threshold, windowSize=windowSize)
+        return self.zslice_processing(algorithm, tryIndex, runInfo)
         
     def TVdenoising(self, delta=0.001, beta=1.0e1, numIter=20, p=1.2, tryIndex=None):
         self.chunking_type = self.Z_SLICE
         self.numOverlap = 3 # 4?
-        self.num_proj = 0
-        self.num_vol = 3
+        self.num_proj, self.num_vol = self.memory_multiples('TVdenoising')
         
         algorithm = lambda f: self.leapct.TV_denoise(f, delta, beta, numIter, p)
-        return self.zslice_processing(algorithm, tryIndex)
+        runInfo = self.run_info('TVdenoising', delta=delta, beta=beta, numIter=numIter, p=p)
+        return self.zslice_processing(algorithm, tryIndex, runInfo)
     
     def compress_volume(self, dtype=np.uint16, wmin=0.0, wmax=None):
         if self.reconstruction_file is None or len(self.reconstruction_file) == 0:
@@ -2564,822 +5552,42 @@ class leapctserver:
             
     def clear_cmd(self, text):
         key = text.split(' ')[1].strip()
-        #print("Error: clear command not yet implemented")
-        match key:
-            case "archdir" | "path":
-                self.path = ""
-            case "outputdir":
-                self.outputDir = ""
-            case "dataType":
-                #[self.UNSPECIFIED, self.RAW, self.RAW_DARK_SUBTRACTED, self.TRANSMISSION, self.ATTENUATION]
-                self.dataType = self.UNSPECIFIED
-            case "backgroundFile":
-                self.air_scan_file = ""
-            case "darkCurrentFile":
-                self.dark_scan_file = ""
-            case "sfile":
-                self.raw_scan_file = ""
-            case "pfile":
-                self.projection_file = ""
-            case "rfile":
-                self.reconstruction_file = ""
-            case "systemGeometryFile":
-                self.geometry_file = ""
-            case "lengthUnits":
-                pass
-            case "bgeometry":
-                self.leapct.set_geometry(0)
-            case "geometry":
-                self.leapct.set_geometry(0)
-            case "sod":
-                self.leapct.set_sod(0.0)
-            case "sdd":
-                self.leapct.set_sdd(0.0)
-            case "odd":
-                pass
-            case "helicalpitch":
-                self.leapct.set_helicalPitch(0.0)
-            case "nangles":
-                self.num_angles = 0
-                self.leapct.set_numAngles(0)
-            case "initangle":
-                self.init_angle = 0.0
-                phis = self.leapct.get_angles()
-                if phis is not None:
-                    phis -= phi[0]
-                    self.leapct.set_angles(phis)
-            case "arange":
-                self.angular_range = 0.0
-                self.angular_step = 0.0
-                self.leapct.set_numAngles(0)
-            case "rotationDirection":
-                phis = self.leapct.get_angles()
-                if phis is not None and phis.size > 1:
-                    if phis[1] < phis[0]:
-                        phis *= -1.0
-                        self.leapct.set_angles(phis)
-            case "rotationdirection":
-                phis = self.leapct.get_angles()
-                if phis is not None and phis.size > 1:
-                    if phis[1] < phis[0]:
-                        phis *= -1.0
-                        self.leapct.set_angles(phis)
-            case "nrays":
-                self.leapct.set_numCols(0)
-            case "nslices":
-                self.leapct.set_numRows(0)
-            case "pxcenter":
-                self.leapct.set_centerCol(0.0)
-            case "pzcenter":
-                self.leapct.set_centerRow(0.0)
-            case "pxmidoff":
-                leapct.set_tau(0.0)
-            case "pxsize":
-                self.leapct.set_pixelWidth(0.0)
-            case "pzsize":
-                self.leapct.set_pixelHeight(0.0)
-            case "detectorShape":
-                self.leapct.set_flatDetector()
-            case "detectorResponseFile":
-                self.detector_response_file = ""
-            case "kV":
-                self.kV = -1.0
-            case "takeOffAngle":
-                self.takeoff_angle = 11.0
-            case "anodeMaterial":
-                self.anode_material = 74
-            case "filterMaterials":
-                self.xray_filters = None
-            case "spectraFile":
-                #self.spectra_model_file = ""
-                self.source_spectra_file = ""
-            case "referenceEnergy":
-                self.reference_energy = -1.0
-            case "numTVneighbors":
-                self.leapct.set_numTVneighbors(26)
-            case "projector" | "backprojector":
-                self.leapct.set_projector('SF')
-            case "rfilter":
-                self.leapct.set_rampFilter(2)
-            case "rampFWHM":
-                self.leapct.set_FBPlowpass(1.0)
-            case "rxsize":
-                self.leapct.set_voxelWidth(0.0)
-            case "rysize":
-                self.leapct.set_voxelWidth(0.0)
-            case "rzsize":
-                self.leapct.set_voxelHeigh(0.0)
-            case "rxref":
-                self.leapct.set_offsetX(0.0)
-            case "ryref":
-                self.leapct.set_offsetY(0.0)
-            case "rzref":
-                self.leapct.set_offsetZ(0.0)
-            case "rxoffset":
-                pass
-            case "ryoffset":
-                pass
-            case "rzoffset":
-                pass
-            case "rxelements":
-                self.leapct.set_numX(0)
-            case "ryelements":
-                self.leapct.set_numY(0)
-            case "rzelements":
-                self.leapct.set_numZ(0)
-            case "axisOfSymmetry":
-                self.leapct.clear_axisOfSymmetry()
-            case "halfscan":
-                self.leapct.set_offsetScan(False)
-            case _:
-                print("Error: cmd keyword " + str(key) + " not yet implemented!")
-                return False
+        if self.parameters.clear(self, key) == False:
+            print("Error: cmd keyword " + str(key) + " not yet implemented!")
+            return False
         return True
     
     def set_cmd(self, text, printError=True):
-        key = text.split('=')[0].strip()
-        value = text.split('=')[1].strip()
+        key, sep, value = text.partition('=')
+        key = key.strip()
+        value = value.strip()
         if len(key) > 0 and len(value) > 0:
-            self.set_key_value_pairs(key, value, printError)
+            return self.set_key_value_pairs(key, value, printError)
+        return False
         
     def set_key_value_pairs(self, key, value, printError=True):
-        match key:
-            case "archdir" | "path":
-                self.path = value
-            case "outputdir":
-                self.outputDir = value
-            case "dataType" | "data_type":
-                #[self.UNSPECIFIED, self.RAW, self.RAW_DARK_SUBTRACTED, self.TRANSMISSION, self.ATTENUATION]
-                if value.upper() == "RAW_UNCALIB" or value.upper() == "RAW":
-                    self.data_type = self.RAW
-                elif value.upper() == "RAW_CALIB" or value.upper() == "RAW_DARKSUB" or value.upper() == "RAW_DARK_SUBTRACTED":
-                    self.data_type = self.RAW_DARK_SUBTRACTED
-                elif value.upper() == "TRANS_RAD" or value.upper() == "TRANSMISSION":
-                    self.data_type = self.TRANSMISSION
-                elif value.upper() == "ATTEN_RAD" or value.upper() == "ATTENUATION" or value.upper() == "SINOGRAM":
-                    self.data_type = self.ATTENUATION
-                elif value.upper() == "RECXY":
-                    self.data_type = self.UNSPECIFIED
-            case "backgroundFile" | "air_scan_file":
-                self.air_scan_file = value
-            case "darkCurrentFile" | "dark_scan_file":
-                self.dark_scan_file = value
-            case "sfile" | "scan_file" | "raw_scan_file":
-                self.raw_scan_file = value
-            case "Filename Prefix":
-                self.raw_scan_file = value + str("*[0-9].tif")
-            case "pfile" | "projection_file":
-                self.projection_file = value
-            case "rfile" | "reconstruction_file":
-                self.reconstruction_file = value
-            case "systemGeometryFile" | "system_geometry_file" | "geometry_file":
-                self.geometry_file = value
-            case "lengthUnits":
-                pass
-            case "max_CPU_memory_usage" | "maxMemoryUsage":
-                self.max_CPU_memory_usage = float(value)
-            case "GPUs" | "gpus":
-                self.leapct.set_gpus(list(eval(value)))
-            case "bgeometry" | "geometry":
-                self.leapct.set_geometry(value)
-            case "geometry":
-                self.leapct.set_geometry(value)
-            case "sod" | "Object to Source (mm)":
-                self.leapct.set_sod(float(value))
-            case "sdd" | "Camera to Source (mm)":
-                self.leapct.set_sdd(float(value))
-            case "odd":
-                pass
-            case "helicalpitch" | "helicalPitch" | "helical_pitch":
-                self.leapct.set_helicalPitch(float(value))
-            case "nangles" | "numAngles" | "Number of Files":
-                self.num_angles = int(value)
-                if key == "Number of Files":
-                    self.num_angles = self.num_angles - 1
-                self.leapct.set_numAngles(int(value))
-                if self.num_angles > 0 and self.angular_range != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_range)
-                    self.leapct.set_angles(phis)
-                elif self.num_angles > 0 and self.angular_step != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_step*self.num_angles)
-                    self.leapct.set_angles(phis)
-            case "initangle" | "init_angle":
-                self.init_angle = float(value)
-                if self.num_angles > 0 and self.angular_range != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_range)
-                    self.leapct.set_angles(phis)
-                elif self.num_angles > 0 and self.angular_step != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_step*self.num_angles)
-                    self.leapct.set_angles(phis)
-            case "arange" | "angularRange" | "angular_range":
-                self.angular_range = float(value)
-                if self.num_angles > 0 and self.angular_range != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_range)
-                    self.leapct.set_angles(phis)
-            case "Rotation Step (deg)":
-                self.angular_step = float(value)
-                if self.num_angles > 0 and self.angular_step != 0.0:
-                    phis = self.init_angle + self.leapct.setAngleArray(self.num_angles, self.angular_step*self.num_angles)
-                    self.leapct.set_angles(phis)
-            case "rotationDirection":
-                print("Set rotationDirection not yet implemented!")
-            case "nrays" | "numCols" | "Number of Columns":
-                self.leapct.set_numCols(int(value))
-            case "nslices" | "numRows" | "Number of Rows":
-                self.leapct.set_numRows(int(value))
-            case "pxcenter" | "centerCol":
-                self.leapct.set_centerCol(float(value))
-            case "pzcenter" | "centerRow" | "Optical Axis (line)":
-                self.leapct.set_centerRow(float(value))
-            case "pxmidoff":
-                #print("Set pxmidoff not yet implemented!")
-                self.leapct.set_tau(float(value))
-            case "tau":
-                self.leapct.set_tau(float(value))
-            case "pxsize" | "pixelWidth":
-                self.leapct.set_pixelWidth(float(value))
-            case "pzsize" | "pixelHeight":
-                self.leapct.set_pixelHeight(float(value))
-            case "detectorShape" | "detector_shape" | "detectorType" | "detector_type":
-                if value == "FLAT":
-                    self.leapct.set_flatDetector()
-                else:
-                    self.leapct.set_curvedDetector()
-            case "detectorResponseFile" | "detector_response_file":
-                self.detector_response_file = value
-            case "kV" | "Source Voltage (kV)":
-                self.kV = float(value)
-            case "takeOffAngle" | "takeoff_angle":
-                self.takeoff_angle = float(value)
-            case "anodeMaterial" | "anode_material":
-                self.anode_material = int(value)
-            case "filterMaterials" | "xray_filters":
-                if value[0] == '[':
-                    self.xray_filters = eval(value)
-                else:
-                    self.xray_filters = value
-            case "object_model":
-                if value[0] == '[':
-                    self.object_model = eval(value)
-                else:
-                    self.object_model = value
-            case "detector_response_model":
-                if value[0] == '[':
-                    self.detector_response_model = eval(value)
-                else:
-                    self.detector_response_model = value
-            case "spectraFile" | "source_spectra_file":
-                #self.spectra_model_file = value
-                self.source_spectra_file = value
-            case "referenceEnergy" | "reference_energy":
-                self.reference_energy = float(value)
-            case "numTVneighbors":
-                self.leapct.set_numTVneighbors(int(value))
-            case "projector" | "backprojector":
-                self.leapct.set_projector(value)
-            case "default_algorithms":
-                self.default_algorithms = eval(value)
-            case "rfilter":
-                self.leapct.set_rampFilter(int(value))
-            case "rampID" | "rampFilter":
-                self.leapct.set_rampFilter(int(value))
-            case "rampFWHM" | "FBPlowpass":
-                self.leapct.set_FBPlowpass(float(value))
-            case "rxsize" | "voxelWidth":
-                self.leapct.set_voxelWidth(float(value))
-            case "rysize" | "voxelWidth":
-                self.leapct.set_voxelWidth(float(value))
-            case "rzsize" | "voxelHeight":
-                self.leapct.set_voxelHeight(float(value))
-            case "rxref":
-                #rxref = 0.5*(self.leapct.get_numX()-1) - self.leapct.get_offsetX()/self.leapct.get_voxelWidth()
-                rref = float(value)
-                offsetX = 0.5*(self.leapct.get_numX()-1)*self.leapct.get_voxelWidth() - rref*self.leapct.get_voxelWidth()
-                self.leapct.set_offsetX(offsetX)
-            case "ryref":
-                rref = float(value)
-                offsetY = 0.5*(self.leapct.get_numY()-1)*self.leapct.get_voxelWidth() - rref*self.leapct.get_voxelWidth()
-                self.leapct.set_offsetY(offsetY)
-            case "rzref":
-                rref = float(value)
-                offsetZ = 0.5*(self.leapct.get_numZ()-1)*self.leapct.get_voxelHeight() - rref*self.leapct.get_voxelHeight()
-                self.leapct.set_offsetZ(offsetZ)
-            case "offsetX":
-                self.leapct.set_offsetX(float(value))
-            case "offsetY":
-                self.leapct.set_offsetY(float(value))
-            case "offsetZ":
-                self.leapct.set_offsetZ(float(value))
-            case "rxoffset":
-                pass
-            case "ryoffset":
-                pass
-            case "rzoffset":
-                pass
-            case "rxelements" | "numX":
-                self.leapct.set_numX(int(value))
-            case "ryelements" | "numY":
-                self.leapct.set_numY(int(value))
-            case "rzelements" | "numZ":
-                self.leapct.set_numZ(int(value))
-            case "halfscan" | "offsetScan":
-                if value.lower() == "true":
-                    self.leapct.set_offsetScan(True)
-                elif value.lower() == "false":
-                    self.leapct.set_offsetScan(False)
-                else:
-                    print("Error setting offsetScan")
-            case "truncatedScan":
-                if value.lower() == "true":
-                    self.leapct.set_truncatedScan(True)
-                elif value.lower() == "false":
-                    self.leapct.set_truncatedScan(False)
-                else:
-                    print("Error setting truncatedScan")
-            case "trackHistory":
-                pass
-            case "Camera Pixel Size (um)":
-                self.leapct.set_pixelWidth(float(value)/1000.0)
-                self.leapct.set_pixelHeight(float(value)/1000.0)
-            case _:
-                if printError:
-                    print("Error: cmd keyword " + str(key) + " not yet implemented!")
-                return False
-        return True
+        return self.parameters.apply(self, [(key, value)], printError)
         
     def getParam(self, text):
-        match text:
-            case "archdir":
-                return self.path
-            case "outputdir":
-                return self.outputDir
-            case "dataType":
-                #[self.UNSPECIFIED, self.RAW, self.RAW_DARK_SUBTRACTED, self.TRANSMISSION, self.ATTENUATION]
-                if self.data_type == 0:
-                    return "UNKNOWN"
-                elif self.data_type == 1:
-                    return "RAW_UNCALIB"
-                elif self.data_type == 2:
-                    return "RAW_DARKSUB"
-                elif self.data_type == 3:
-                    return "TRANS_RAD"
-                else: #if self.data_type == 4:
-                    return "ATTEN_RAD"
-            case "datatype":
-                if self.data_type == 0:
-                    return "UNKNOWN"
-                elif self.data_type == 1:
-                    return "RAW_UNCALIB"
-                elif self.data_type == 2:
-                    return "RAW_DARKSUB"
-                elif self.data_type == 3:
-                    return "TRANS_RAD"
-                else: #if self.data_type == 4:
-                    return "ATTEN_RAD"
-            case "backgroundFile":
-                return self.air_scan_file
-            case "backgroundfile":
-                return self.air_scan_file
-            case "darkCurrentFile":
-                return self.dark_scan_file
-            case "darkcurrentfile":
-                return self.dark_scan_file
-            case "sfile":
-                return self.raw_scan_file
-            case "pfile":
-                return self.projection_file
-            case "rfile":
-                return self.reconstruction_file
-            case "systemGeometryFile":
-                return self.geometry_file
-            case "lengthUnits":
-                return "mm"
-            case "bgeometry":
-                return self.leapct.get_geometry()
-            case "geometry":
-                return self.leapct.get_geometry()
-            case "sod":
-                return str(self.leapct.get_sod())
-            case "sdd":
-                return str(self.leapct.get_sdd())
-            case "odd":
-                return str(self.leapct.get_sdd() - self.leapct.get_sod())
-            case "helicalpitch" | "helicalPitch":
-                return str(self.leapct.get_helicalPitch())
-            case "normalizedHelicalPitch":
-                return str(self.leapct.get_normalizedHelicalPitch())
-            case "axisOfSymmetry":
-                axisOfSymmetry = self.leapct.get_axisOfSymmetry()
-                if np.abs(self.leapct.get_axisOfSymmetry()) <= 30.0:
-                    return str(axisOfSymmetry)
-                else:
-                    return ""
-            case "nangles":
-                return str(self.leapct.get_numAngles())
-            case "initangle":
-                phis = self.leapct.get_angles()
-                if phis is None or len(phis) == 0:
-                    return str(0.0)
-                else:
-                    return str(phis[0])
-            case "initAngle":
-                phis = self.leapct.get_angles()
-                if phis is None or len(phis) == 0:
-                    return str(0.0)
-                else:
-                    return str(phis[0])
-            case "arange":
-                return str(self.leapct.get_angularRange())
-            case "rotationDirection":
-                if self.leapct.get_angularRange() >= 0.0:
-                    return "COUNTERCLOCKWISE"
-                else:
-                    return "CLOCKWISE"
-            case "rotationdirection":
-                if self.leapct.get_angularRange() >= 0.0:
-                    return "COUNTERCLOCKWISE"
-                else:
-                    return "CLOCKWISE"
-            case "nrays":
-                return str(self.leapct.get_numCols())
-            case "nslices":
-                return str(self.leapct.get_numRows())
-            case "pxcenter":
-                return str(self.leapct.get_centerCol())
-            case "pzcenter":
-                return str(self.leapct.get_centerRow())
-            case "pxmidoff":
-                #print("Error: getParams pxmidoff not yet implemented!")
-                #return str(0.0)
-                return str(self.leapct.get_tau())
-            case "tau":
-                return str(self.leapct.get_tau())
-            case "pxsize":
-                return str(self.leapct.get_pixelWidth())
-            case "pzsize":
-                return str(self.leapct.get_pixelHeight())
-            case "detectorShape":
-                return self.leapct.get_detectorType()
-            case "detectorResponseFile":
-                return self.detector_response_file
-            case "kV":
-                return str(self.kV)
-            case "takeOffAngle":
-                return str(self.takeoff_angle)
-            case "anodeMaterial":
-                return str(self.anode_material)
-            case "filterMaterials":
-                return str(self.xray_filters)
-            case "spectraFile":
-                #return self.spectra_model_file
-                return self.source_spectra_file
-            case "referenceEnergy":
-                return str(self.reference_energy)
-            case "numTVneighbors":
-                return str(self.leapct.get_numTVneighbors())
-            case "projector" | "backprojector":
-                return self.leapct.get_projector()
-            case "rfilter":
-                return str(self.leapct.get_rampFilter())
-            case "rampID":
-                return str(self.leapct.get_rampFilter())
-            case "rampFWHM":
-                return str(self.leapct.get_FBPlowpass())
-            case "rxsize":
-                return str(self.leapct.get_voxelWidth())
-            case "rysize":
-                return str(self.leapct.get_voxelWidth())
-            case "rzsize":
-                return str(self.leapct.get_voxelHeight())
-            case "rxref":
-                if self.leapct.get_voxelWidth() <= 0.0:
-                    return str(0.0)
-                else:
-                    return str(0.5*(self.leapct.get_numX()-1) - self.leapct.get_offsetX()/self.leapct.get_voxelWidth())
-            case "ryref":
-                if self.leapct.get_voxelWidth() <= 0.0:
-                    return str(0.0)
-                else:
-                    return str(0.5*(self.leapct.get_numY()-1) - self.leapct.get_offsetY()/self.leapct.get_voxelWidth())
-            case "rzref":
-                if self.leapct.get_voxelHeight() <= 0.0:
-                    return str(0.0)
-                else:
-                    return str(0.5*(self.leapct.get_numZ()-1) - self.leapct.get_offsetZ()/self.leapct.get_voxelHeight())
-            case "rxoffset":
-                return str(0)
-            case "ryoffset":
-                return str(0)
-            case "rzoffset":
-                return str(0)
-            case "rxelements":
-                return str(self.leapct.get_numX())
-            case "ryelements":
-                return str(self.leapct.get_numY())
-            case "rzelements":
-                return str(self.leapct.get_numZ())
-            case "halfscan":
-                return str(self.leapct.get_offsetScan())
-            case "ImageJpath":
-                return ""
-            case "LTTcmd":
-                return ""
-            case "wmin":
-                return ""
-            case "wmax":
-                return ""
-            case "compressFile":
-                return "False"
-            case "LTTwCmd":
-                return ""
-            case "trackHistory":
-                return "False"
-            case "fileType":
-                return "tif"
-            case "untruncatedProjection":
-                return "0"
-            case _:
-                print("Error: getParam keyword " + str(text) +  " not yet implemented!")
-                return ""
-        
-    def unknown(self, text):
-        match text:
-            case "archdir":
-                if len(self.path) >  0:
-                    return False
-                else:
-                    return True
-            case "outputdir":
-                if len(self.outputDir) >  0:
-                    return False
-                else:
-                    return True
-            case "dataType":
-                if self.data_type == self.UNSPECIFIED:
-                    return True
-                else:
-                    return False
-            case "datatype":
-                if self.data_type == self.UNSPECIFIED:
-                    return True
-                else:
-                    return False
-            case "backgroundFile":
-                if len(self.air_scan_file) >  0:
-                    return False
-                else:
-                    return True
-            case "backgroundfile":
-                if len(self.air_scan_file) >  0:
-                    return False
-                else:
-                    return True
-                return self.air_scan_file
-            case "darkCurrentFile":
-                if len(self.dark_scan_file) >  0:
-                    return False
-                else:
-                    return True
-            case "darkcurrentfile":
-                if len(self.dark_scan_file) >  0:
-                    return False
-                else:
-                    return True
-            case "sfile":
-                if len(self.raw_scan_file) >  0:
-                    return False
-                else:
-                    return True
-            case "pfile":
-                if len(self.projection_file) >  0:
-                    return False
-                else:
-                    return True
-            case "rfile":
-                if len(self.reconstruction_file) >  0:
-                    return False
-                else:
-                    return True
-            case "systemGeometryFile":
-                if len(self.geometry_file) >  0:
-                    return False
-                else:
-                    return True
-            case "lengthUnits":
-                return False
-            case "bgeometry":
-                return False
-            case "geometry":
-                return False
-            case "sod":
-                if self.leapct.get_sod() > 0.0:
-                    return False
-                else:
-                    return True
-            case "sdd":
-                if self.leapct.get_sdd() > 0.0:
-                    return False
-                else:
-                    return True
-            case "odd":
-                if self.leapct.get_sod() > 0.0 and self.leapct.get_sdd() > 0.0:
-                    return False
-                else:
-                    return True
-            case "helicalpitch":
-                return False
-            case "helicalPitch":
-                return False
-            case "normalizedHelicalPitch":
-                return False
-            case "axisOfSymmetry":
-                axisOfSymmetry = self.leapct.get_axisOfSymmetry()
-                if np.abs(self.leapct.get_axisOfSymmetry()) <= 30.0:
-                    return False
-                else:
-                    return True
-            case "nangles":
-                if self.leapct.get_numAngles() > 0:
-                    return False
-                else:
-                    return True
-            case "initangle":
-                phis = self.leapct.get_angles()
-                if phis is None or len(phis) == 0:
-                    return True
-                else:
-                    return False
-            case "initAngle":
-                phis = self.leapct.get_angles()
-                if phis is None or len(phis) == 0:
-                    return True
-                else:
-                    return False
-            case "arange":
-                if self.leapct.get_angularRange() == 0.0:
-                    return True
-                else:
-                    return False
-            case "rotationDirection":
-                if self.leapct.get_angularRange() == 0.0:
-                    return True
-                else:
-                    return False
-            case "rotationdirection":
-                if self.leapct.get_angularRange() == 0.0:
-                    return True
-                else:
-                    return False
-            case "nrays":
-                if self.leapct.get_numCols() > 0:
-                    return False
-                else:
-                    return True
-            case "nslices":
-                if self.leapct.get_numRows() > 0:
-                    return False
-                else:
-                    return True
-            case "pxcenter":
-                return False
-            case "pzcenter":
-                return False
-            case "pxmidoff":
-                return False
-            case "pxsize":
-                if self.leapct.get_pixelWidth() > 0.0:
-                    return False
-                else:
-                    return True
-            case "pzsize":
-                if self.leapct.get_pixelHeight() > 0.0:
-                    return False
-                else:
-                    return True
-            case "detectorShape":
-                return False
-            case "detectorResponseFile":
-                if len(self.detector_response_file) == 0:
-                    return True
-                else:
-                    return False
-            case "kV":
-                if self.kV > 0.0:
-                    return False
-                else:
-                    return True
-            case "takeOffAngle":
-                if self.takeoff_angle > 0.0:
-                    return False
-                else:
-                    return True
-            case "anodeMaterial":
-                return False
-            case "filterMaterials":
-                if xray_filters is None:
-                    return True
-                else:
-                    return False
-            case "spectraFile":
-                #if len(self.spectra_model_file) > 0:
-                if len(self.source_spectra_file) > 0:
-                    return False
-                else:
-                    return True
-            case "referenceEnergy":
-                if self.reference_energy > 0.0:
-                    return False
-                else:
-                    return True
-            case "numTVneighbors":
-                return False
-            case "projector" | "backprojector":
-                return False
-            case "rfilter":
-                return False
-            case "rxsize":
-                if self.leapct.get_voxelWidth() > 0.0:
-                    return False
-                else:
-                    return True
-            case "rysize":
-                if self.leapct.get_voxelWidth() > 0.0:
-                    return False
-                else:
-                    return True
-            case "rzsize":
-                if self.leapct.get_voxelHeight() > 0.0:
-                    return False
-                else:
-                    return True
-            case "rxref":
-                if self.leapct.get_voxelWidth() <= 0.0:
-                    return True
-                else:
-                    return False
-            case "ryref":
-                if self.leapct.get_voxelWidth() <= 0.0:
-                    return True
-                else:
-                    return False
-            case "rzref":
-                if self.leapct.get_voxelHeight() <= 0.0:
-                    return True
-                else:
-                    return False
-            case "rxoffset":
-                return False
-            case "ryoffset":
-                return False
-            case "rzoffset":
-                return False
-            case "rxelements":
-                if self.leapct.get_numX() > 0:
-                    return False
-                else:
-                    return True
-            case "ryelements":
-                if self.leapct.get_numY() > 0:
-                    return False
-                else:
-                    return True
-            case "rzelements":
-                if self.leapct.get_numZ() > 0:
-                    return False
-                else:
-                    return True
-            case "halfscan":
-                return False
-            case "ImageJpath":
-                return True
-            case "LTTcmd":
-                return True
-            case "wmin":
-                return True
-            case "wmax":
-                return True
-            case "compressFile":
-                return True
-            case "LTTwCmd":
-                return True
-            case "trackHistory":
-                return True
-            case "fileType":
-                return False
-            case _:
-                print("Error: getParam keyword " + str(text) +  " not yet implemented!")
-                return ""
-
+        value = self.parameters.get(self, text)
+        if value is None:
+            print("Error: getParam keyword " + str(text) +  " not yet implemented!")
+            return ""
+        return value
+        
     def loadsct(self, fileName):
         if fileName.endswith('.sct'):
             fdes = open(fileName, 'r')
             Lines = fdes.readlines()
+            fdes.close()
+            pairs = []
             for line in Lines:
                 if line[0] == '-':
                     line = line[1:].strip()
                     x = line.split(' ', 1)
                     if len(x) == 2:
-                        self.set_key_value_pairs(x[0], x[1])
+                        pairs.append((x[0], x[1]))
+            self.parameters.apply(self, pairs)
         else:
             print('This is not an sct file')
             
@@ -3387,9 +5595,13 @@ class leapctserver:
         if fileName.endswith('.log'):
             fdes = open(fileName, 'r')
             Lines = fdes.readlines()
+            fdes.close()
+            pairs = []
             for line in Lines:
-                if "=" in line:
-                    self.set_cmd(line, False)
+                key, sep, value = line.partition('=')
+                if len(sep) > 0 and len(key.strip()) > 0 and len(value.strip()) > 0:
+                    pairs.append((key.strip(), value.strip()))
+            self.parameters.apply(self, pairs, False)
             self.path = os.path.split(fileName)[0]
             self.leapct.set_geometry("CONE")
             self.leapct.set_flatDetector()
@@ -3408,27 +5620,14 @@ class leapctserver:
         self.geometry_file = None
     
     def load_key_equal_value(self, fileName):
-        if os.path.isfile(fileName) == False:
-            fileName = os.path.join(self.path, fileName)
-            if os.path.isfile(fileName) == False:
-                print('Error: meta-data file does not exist!')
-                return
-        fdes = open(fileName, 'r')
-        Lines = fdes.readlines()
-        for line in Lines:
-            line = line.lstrip()
-            if line[0] == '#':
-                pass
-            elif "=" in line:
-                #print(line)
-                self.set_cmd(line, False)
-            else:
-                line = line.rstrip()
-                if line.endswith('.txt'):
-                    self.load_key_equal_value(line)
+        """Reads a key = value parameter file (and the files it includes) and applies all of its settings at once"""
+        pairs = parse_parameter_file(fileName, self.path)
+        if pairs is None:
+            return False
+        self.parameters.apply(self, pairs, False)
         if self.path is None or len(self.path) == 0:
             self.path = os.path.split(fileName)[0]
-        
+        return True
         
     def getHelpText(self, text, length=0):
         return "---"
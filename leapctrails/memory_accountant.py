@@ -0,0 +1,243 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# memory_accountant
+# Measures the memory that leapctserver actually uses: a registry of the
+# buffers it owns besides g and f, live sampling of the resident memory of
+# the process while chunks are processed, and, per algorithm, the measured
+# ratio of the peak memory of a chunk to what the chunk planner assumed
+################################################################################
+import os
+import json
+import threading
+from timing_spans import peak_RSS, nbytes_of
+from chunk_manifest import atomic_write_json
+
+try:
+    import psutil
+    has_psutil = True
+except:
+    has_psutil = False
+
+
+def current_RSS():
+    """Returns the current resident memory (GB) of this process
+
+    Falls back to the peak resident memory if the current value cannot be measured.
+    """
+    if has_psutil:
+        try:
+            return float(psutil.Process().memory_info().rss) / 2.0**30
+        except:
+            pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return float(f.read().split()[1]) * float(os.sysconf('SC_PAGE_SIZE')) / 2.0**30
+    except:
+        return peak_RSS()
+
+
+class RSSSampler:
+    """ Samples the resident memory of this process on a background thread and keeps its maximum
+
+    :ivar interval(float): seconds between samples
+    :ivar peak(float): the largest resident memory (GB) seen since start
+    """
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.stop()
+        self.peak = current_RSS()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while self.stopped.wait(self.interval) == False:
+            self.peak = max(self.peak, current_RSS())
+
+    def stop(self):
+        """Stops sampling and returns the peak resident memory (GB)"""
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        self.peak = max(self.peak, current_RSS())
+        return self.peak
+
+
+class MemoryAccountant:
+    """ Tracks the memory used by leapctserver and feeds it back into the chunk planner (see leapctserver.set_chunk_size)
+
+    The chunk planner assumes that a chunk needs num_proj copies of its projections plus num_vol copies of
+    its volume.  While a chunk is processed, the resident memory of the process is sampled; the ratio of
+    the peak memory of the chunk to the planner's assumption is the overhead of the algorithm, which
+    covers its temporaries and the memory LEAP allocates internally.  The largest overhead seen in the
+    latest run of each algorithm is kept (and saved to overheads_file) and the planner divides its memory
+    budget by it the next time the algorithm is chunked.
+
+    :ivar enforcement(str): what to do when a chunk exceeds max_CPU_memory_usage: 'off' (do not measure), 'warn', or 'shrink' (warn and make the remaining chunks smaller)
+    :ivar buffers(dict): maps the names of registered buffers to their sizes (bytes)
+    :ivar overheads(dict): maps algorithm names to their measured overhead (>= 1)
+    :ivar overheads_file(str): json file where the overheads are saved, None to not save them
+    :ivar base_rss(float): resident memory (GB) of the process when the accountant was created; memory above it is attributed to leapctserver
+    :ivar peak_usage(float): the largest memory (GB) attributed to leapctserver during a chunk
+    :ivar algorithm(str): the algorithm of the current run
+    :ivar min_sample_memory(float): chunks whose nominal memory (GB) is smaller than this do not update the overheads, since their measurements are mostly noise
+    """
+    def __init__(self, enforcement='warn', overheads_file=None, sample_interval=0.02):
+        self.enforcement = enforcement
+        self.buffers = {}
+        self.temporary_buffers = set()
+        self.overheads = {}
+        self.overheads_file = overheads_file
+        self.overheads_loaded = False
+        self.base_rss = current_RSS()
+        self.peak_usage = 0.0
+        self.algorithm = None
+        self.min_sample_memory = 1.0/64.0
+        self.sampler = RSSSampler(sample_interval)
+        self.run_overhead = None
+        self.chunk_start_rss = 0.0
+        self.warned = False
+
+    def set_enforcement(self, enforcement):
+        if enforcement not in ['off', 'warn', 'shrink']:
+            print('Error: memory_enforcement must be off, warn, or shrink')
+            return False
+        self.enforcement = enforcement
+        return True
+
+    def set_overheads_file(self, overheads_file):
+        """Sets the json file where the overheads are saved (and read from the next time they are needed), None to keep them in this session"""
+        self.overheads_file = overheads_file
+        self.overheads_loaded = False
+
+    def register(self, name, x, temporary=False):
+        """Records a buffer owned by leapctserver (other than g and f)
+
+        Args:
+            name (str): name of the buffer; registering a name again replaces its size
+            x (numpy array or int): the buffer or its size in bytes
+            temporary (bool): if True, the buffer only lives during the current run and is released when the run ends
+        """
+        if isinstance(x, int):
+            self.buffers[name] = x
+        else:
+            self.buffers[name] = nbytes_of(x)
+        if temporary:
+            self.temporary_buffers.add(name)
+
+    def release(self, name):
+        self.buffers.pop(name, None)
+        self.temporary_buffers.discard(name)
+
+    def registered_memory(self):
+        """Returns the total size (GB) of the registered buffers"""
+        return float(sum(self.buffers.values())) / 2.0**30
+
+    def usage(self):
+        """Returns the memory (GB) currently attributed to leapctserver"""
+        return max(0.0, current_RSS() - self.base_rss)
+
+    def load_overheads(self):
+        self.overheads_loaded = True
+        if self.overheads_file is None or os.path.isfile(self.overheads_file) == False:
+            return
+        try:
+            with open(self.overheads_file, 'r') as f:
+                overheads = json.load(f)
+            for algorithm in overheads:
+                self.overheads.setdefault(algorithm, max(1.0, float(overheads[algorithm])))
+        except:
+            print('Warning: failed to read ' + str(self.overheads_file))
+
+    def save_overheads(self):
+        if self.overheads_file is None:
+            return False
+        folder = os.path.dirname(self.overheads_file)
+        if len(folder) > 0 and os.path.isdir(folder) == False:
+            os.makedirs(folder)
+        return atomic_write_json(self.overheads_file, self.overheads)
+
+    def overhead(self, algorithm=None):
+        """Returns the measured overhead of an algorithm (by default the algorithm of the current run), 1 if it was never measured"""
+        if algorithm is None:
+            algorithm = self.algorithm
+        if algorithm is None or self.enforcement == 'off':
+            return 1.0
+        if self.overheads_loaded == False:
+            self.load_overheads()
+        return self.overheads.get(algorithm, 1.0)
+
+    def begin_run(self, algorithm):
+        """Sets the algorithm whose overhead the chunk planner uses and the following chunks measure"""
+        self.sampler.stop() # in case the previous run failed in the middle of a chunk
+        for name in list(self.temporary_buffers):
+            self.release(name)
+        self.algorithm = algorithm
+        self.run_overhead = None
+        self.warned = False
+
+    def end_run(self):
+        """Releases the temporary buffers of the run and saves the overhead it measured"""
+        for name in list(self.temporary_buffers):
+            self.release(name)
+        if self.algorithm is not None and self.run_overhead is not None:
+            if self.overheads_loaded == False:
+                self.load_overheads()
+            self.overheads[self.algorithm] = self.run_overhead
+            self.save_overheads()
+        self.algorithm = None
+        self.run_overhead = None
+
+    def begin_chunk(self):
+        """Starts sampling the memory of a chunk; call this before the chunk is read"""
+        if self.enforcement == 'off':
+            return
+        self.chunk_start_rss = current_RSS()
+        self.sampler.start()
+
+    def end_chunk(self, nominal_memory, max_memory, scratch_space, chunk_size):
+        """Stops sampling the memory of a chunk and checks it against the memory budget
+
+        Args:
+            nominal_memory (float): the memory (GB) that the chunk planner assumed the chunk needs
+            max_memory (float): the memory budget (GB), i.e., max_CPU_memory_usage
+            scratch_space (float): the memory (GB) reserved for other uses
+            chunk_size (int): the size of the chunk
+
+        Returns:
+            the chunk size to use for the remaining chunks (smaller than chunk_size only if enforcement is 'shrink' and the chunk exceeded the budget)
+        """
+        if self.enforcement == 'off':
+            return chunk_size
+        peak = self.sampler.stop()
+        footprint = max(0.0, peak - self.chunk_start_rss)
+        usage = max(0.0, peak - self.base_rss)
+        self.peak_usage = max(self.peak_usage, usage)
+
+        if self.algorithm is not None and nominal_memory >= self.min_sample_memory:
+            ratio = max(1.0, footprint / nominal_memory)
+            if self.run_overhead is None or ratio > self.run_overhead:
+                self.run_overhead = ratio
+
+        if usage <= max_memory:
+            return chunk_size
+        if self.warned == False:
+            print('Warning: ' + str(self.algorithm) + ' used ' + str(round(usage, 3)) + ' GB, which exceeds max_CPU_memory_usage = ' + str(round(max_memory, 3)) + ' GB')
+            self.warned = True
+        if self.enforcement != 'shrink' or footprint <= 0.0:
+            return chunk_size
+        available = max_memory - scratch_space - max(0.0, self.chunk_start_rss - self.base_rss)
+        new_chunk_size = max(1, int(float(chunk_size) * available / footprint))
+        if new_chunk_size < chunk_size:
+            print('Warning: reducing the chunk size from ' + str(chunk_size) + ' to ' + str(new_chunk_size))
+            return new_chunk_size
+        return chunk_size
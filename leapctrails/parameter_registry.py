@@ -0,0 +1,496 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# parameter_registry
+# Table of the key = value parameters understood by leapctserver: how each
+# value is parsed, applied, read back, reset, and saved, and a reader for
+# parameter files (with includes) that parses a whole file in one pass
+################################################################################
+import os
+import numpy as np
+
+
+def parse_value(kind, text):
+    """Converts the text of a parameter value to the given kind
+
+    Args:
+        kind (str): 'str', 'int', 'float', 'bool', or 'literal'
+        text (str): the value as written in a parameter file
+
+    Returns:
+        the parsed value; raises ValueError if the text cannot be parsed
+    """
+    if kind == 'str':
+        return text
+    elif kind == 'int':
+        return int(text)
+    elif kind == 'float':
+        return float(text)
+    elif kind == 'bool':
+        if text.lower() == 'true' or text == '1':
+            return True
+        elif text.lower() == 'false' or text == '0':
+            return False
+        raise ValueError('expected True or False')
+    else: # literal
+        # python lists, tuples and dictionaries are written with str(); any other text is kept as a string
+        if text == 'None':
+            return None
+        elif len(text) > 0 and text[0] in '[({':
+            try:
+                return eval(text)
+            except Exception as e:
+                raise ValueError(str(e))
+        return text
+
+
+class Parameter:
+    """ One key = value parameter of leapctserver
+
+    :ivar name(str): the key that save_parameters writes
+    :ivar kind(str): 'str', 'int', 'float', 'bool', or 'literal', see parse_value
+    :ivar setter(function): setter(server, value) applies a parsed value, None if the parameter cannot be set
+    :ivar getter(function): getter(server) returns the current value, None if the parameter cannot be read
+    :ivar default(str): the text of the value the clear command resets the parameter to, None if clear does nothing
+    :ivar aliases(tuple): other keys (LTT, vendor, or older leapctserver names) of this parameter
+    :ivar after(function): after(server) is called once at the end of any batch of settings that set this parameter
+    :ivar save(bool or function): True if save_parameters writes the parameter (when it is not None or empty), or a function save(server) that decides
+    :ivar saved_value(function): if not None, saved_value(server) returns the value that save_parameters writes (instead of the getter's)
+    :ivar clear(function): if not None, clear(server) resets the parameter (instead of setting it to default)
+    """
+    def __init__(self, name, kind='str', setter=None, getter=None, default=None, aliases=(), after=None, save=False, saved_value=None, clear=None):
+        self.name = name
+        self.kind = kind
+        self.setter = setter
+        self.getter = getter
+        self.default = default
+        self.aliases = tuple(aliases)
+        self.after = after
+        self.save = save
+        self.saved_value = saved_value
+        self.clear = clear
+
+    def parse(self, text):
+        return parse_value(self.kind, text)
+
+    def is_saved(self, server):
+        if callable(self.save):
+            return self.save(server)
+        return self.save
+
+
+class ParameterRegistry:
+    """ Maps every key and alias to its Parameter
+
+    :ivar parameters(list): the parameters in the order they were added (the order save_parameters writes them)
+    :ivar keys(dict): maps every key and alias to its Parameter
+    """
+    def __init__(self):
+        self.parameters = []
+        self.keys = {}
+
+    def add(self, name, kind='str', setter=None, getter=None, default=None, aliases=(), after=None, save=False, saved_value=None, clear=None):
+        parameter = Parameter(name, kind, setter, getter, default, aliases, after, save, saved_value, clear)
+        self.parameters.append(parameter)
+        for key in (name,) + parameter.aliases:
+            self.keys[key] = parameter
+        return parameter
+
+    def lookup(self, key):
+        return self.keys.get(key, None)
+
+    def apply(self, server, pairs, printError=True):
+        """Applies a batch of (key, value) settings to a leapctserver object
+
+        The settings are applied in order; quantities that depend on several parameters (e.g., the
+        projection angles) are calculated once at the end of the batch rather than after every setting.
+
+        Args:
+            server (leapctserver object): the server whose parameters are set
+            pairs (list): list of (key, value text) pairs
+            printError (bool): if True, prints an error for every unknown key
+
+        Returns:
+            True if every setting was applied, False otherwise
+        """
+        retVal = True
+        hooks = []
+        for key, value in pairs:
+            parameter = self.keys.get(key, None)
+            if parameter is None or parameter.setter is None:
+                if printError:
+                    print("Error: cmd keyword " + str(key) + " not yet implemented!")
+                retVal = False
+                continue
+            try:
+                x = parameter.parse(value)
+            except ValueError as e:
+                print('Error: invalid value for ' + str(key) + ' (' + str(value) + '): ' + str(e))
+                retVal = False
+                continue
+            parameter.setter(server, x)
+            if parameter.after is not None and parameter.after not in hooks:
+                hooks.append(parameter.after)
+        for hook in hooks:
+            hook(server)
+        return retVal
+
+    def get(self, server, key):
+        """Returns the value of a parameter as a string, None if the key is unknown"""
+        parameter = self.keys.get(key, None)
+        if parameter is None or parameter.getter is None:
+            return None
+        x = parameter.getter(server)
+        if x is None:
+            return ""
+        return str(x)
+
+    def clear(self, server, key):
+        """Resets a parameter to its default value
+
+        Returns:
+            True if the key is known, False otherwise
+        """
+        parameter = self.keys.get(key, None)
+        if parameter is None:
+            return False
+        if parameter.clear is not None:
+            parameter.clear(server)
+        elif parameter.default is not None and parameter.setter is not None:
+            parameter.setter(server, parameter.parse(parameter.default))
+            if parameter.after is not None:
+                parameter.after(server)
+        return True
+
+    def serialize(self, server):
+        """Returns the list of (key, value text) pairs that save_parameters writes"""
+        retVal = []
+        for parameter in self.parameters:
+            if parameter.getter is None or parameter.is_saved(server) == False:
+                continue
+            if parameter.saved_value is not None:
+                x = parameter.saved_value(server)
+            else:
+                x = parameter.getter(server)
+            if x is None or (isinstance(x, str) and len(x) == 0):
+                continue
+            retVal.append((parameter.name, str(x)))
+        return retVal
+
+
+def find_parameter_file(fileName, folders):
+    """Returns the full path of fileName, searching the given folders if it is not found as is; None if it does not exist"""
+    if os.path.isfile(fileName):
+        return fileName
+    for folder in folders:
+        if folder is not None and len(folder) > 0 and os.path.isfile(os.path.join(folder, fileName)):
+            return os.path.join(folder, fileName)
+    return None
+
+def parse_parameter_file(fileName, path=None):
+    """Reads a key = value parameter file, and the files it includes, into a list of (key, value) pairs
+
+    Lines starting with # are comments and any line without an = that ends with .txt includes
+    another parameter file, whose pairs are inserted in place of that line.  Files are searched for
+    relative to path (or the value of path set earlier in the file) and to the folder of the file that
+    includes them.  An include that would form a cycle is skipped.
+
+    Args:
+        fileName (str): the parameter file
+        path (str): folder searched for fileName and its includes
+
+    Returns:
+        list of (key, value) pairs, None if fileName does not exist
+    """
+    return _parse_parameter_file(fileName, [path], [])
+
+def _parse_parameter_file(fileName, folders, includeStack):
+    fullPath = find_parameter_file(fileName, folders)
+    if fullPath is None:
+        print('Error: meta-data file ' + str(fileName) + ' does not exist!')
+        return None
+    realPath = os.path.realpath(fullPath)
+    if realPath in includeStack:
+        print('Error: ' + str(fullPath) + ' is already being read, skipping the cyclic include')
+        return []
+    includeStack.append(realPath)
+
+    path = folders[0]
+    pairs = []
+    with open(fullPath, 'r') as fdes:
+        Lines = fdes.read().splitlines()
+    for line in Lines:
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+        key, sep, value = line.partition('=')
+        if len(sep) > 0:
+            key = key.strip()
+            value = value.strip()
+            if len(key) > 0 and len(value) > 0:
+                pairs.append((key, value))
+                if key == 'path' or key == 'archdir':
+                    path = value
+        elif line.endswith('.txt'):
+            included = _parse_parameter_file(line, [path, os.path.dirname(fullPath)], includeStack)
+            if included is not None:
+                pairs.extend(included)
+    includeStack.pop()
+    return pairs
+
+
+####################################################################################################
+# The leapctserver parameter table
+####################################################################################################
+def _update_angles(server):
+    """Sets the projection angles from the number of angles, initial angle, angular range or step, and rotation direction"""
+    if server.num_angles > 0 and server.angular_range != 0.0:
+        phis = server.init_angle + server.leapct.setAngleArray(server.num_angles, server.angular_range)
+    elif server.num_angles > 0 and server.angular_step != 0.0:
+        phis = server.init_angle + server.leapct.setAngleArray(server.num_angles, server.angular_step*server.num_angles)
+    else:
+        return
+    if server.rotation_direction == 'CLOCKWISE':
+        phis = -1.0*phis
+    server.leapct.set_angles(phis)
+
+def _set_num_angles(server, value):
+    server.num_angles = value
+    server.leapct.set_numAngles(value)
+
+def _set_number_of_files(server, value):
+    # Vendor logs count the final projection at the initial angle
+    server.num_angles = value - 1
+    server.leapct.set_numAngles(value)
+
+def _get_init_angle(server):
+    phis = server.leapct.get_angles()
+    if phis is None or len(phis) == 0:
+        return 0.0
+    return phis[0]
+
+def _set_rotation_direction(server, value):
+    server.rotation_direction = value.upper()
+    phis = server.leapct.get_angles()
+    if phis is not None and phis.size > 1:
+        if (value.upper() == 'CLOCKWISE') == (phis[1] > phis[0]):
+            server.leapct.set_angles(-1.0*phis)
+
+def _get_rotation_direction(server):
+    if server.leapct.get_angularRange() >= 0.0:
+        return "COUNTERCLOCKWISE"
+    return "CLOCKWISE"
+
+def _set_data_type(server, value):
+    value = value.upper()
+    if value == "RAW_UNCALIB" or value == "RAW":
+        server.data_type = server.RAW
+    elif value == "RAW_CALIB" or value == "RAW_DARKSUB" or value == "RAW_DARK_SUBTRACTED":
+        server.data_type = server.RAW_DARK_SUBTRACTED
+    elif value == "TRANS_RAD" or value == "TRANSMISSION":
+        server.data_type = server.TRANSMISSION
+    elif value == "ATTEN_RAD" or value == "ATTENUATION" or value == "SINOGRAM":
+        server.data_type = server.ATTENUATION
+    elif value == "RECXY" or value == "UNKNOWN" or value == "UNSPECIFIED":
+        server.data_type = server.UNSPECIFIED
+
+def _get_data_type(server):
+    return ["UNKNOWN", "RAW_UNCALIB", "RAW_DARKSUB", "TRANS_RAD", "ATTEN_RAD"][server.data_type]
+
+def _saved_data_type(server):
+    # parameter files use the leapctserver names of the data types
+    return ["", "RAW", "RAW_DARK_SUBTRACTED", "TRANSMISSION", "ATTENUATION"][server.data_type]
+
+def _set_gpus(server, value):
+    # a list or tuple of GPU indices, a single index, or indices separated by commas or spaces
+    if isinstance(value, str):
+        value = [int(gpu) for gpu in value.replace(',', ' ').split()]
+    elif np.isscalar(value):
+        value = [int(value)]
+    server.leapct.set_gpus([int(gpu) for gpu in value])
+
+def _clear_angular_range(server):
+    server.angular_range = 0.0
+    server.angular_step = 0.0
+    server.leapct.set_numAngles(0)
+
+def _set_detector_type(server, value):
+    if value == "FLAT":
+        server.leapct.set_flatDetector()
+    else:
+        server.leapct.set_curvedDetector()
+
+def _set_axis_of_symmetry(server, value):
+    if np.abs(value) > 30.0:
+        server.leapct.clear_axisOfSymmetry()
+    else:
+        server.leapct.set_axisOfSymmetry(value)
+
+def _get_axis_of_symmetry(server):
+    axisOfSymmetry = server.leapct.get_axisOfSymmetry()
+    if np.abs(axisOfSymmetry) <= 30.0:
+        return axisOfSymmetry
+    return None
+
+def _set_memory_overheads_file(server, value):
+    if value is None or len(value) == 0:
+        server.memory_accountant.set_overheads_file(None)
+    else:
+        value = os.path.expanduser(value)
+        if os.path.isabs(value) == False and server.path is not None:
+            value = os.path.join(server.path, value)
+        server.memory_accountant.set_overheads_file(value)
+
+def _get_memory_overheads_file(server):
+    if server.memory_accountant.overheads_file is None:
+        return ''
+    return server.memory_accountant.overheads_file
+
+def _set_camera_pixel_size(server, value):
+    server.leapct.set_pixelWidth(value/1000.0)
+    server.leapct.set_pixelHeight(value/1000.0)
+
+def _reference_parameter(registry, name, axis):
+    """Adds rxref, ryref, or rzref: the voxel index of the origin along one axis"""
+    if axis == 'Z':
+        voxelSize = lambda s: s.leapct.get_voxelHeight()
+    else:
+        voxelSize = lambda s: s.leapct.get_voxelWidth()
+    numVoxels = lambda s: getattr(s.leapct, 'get_num' + axis)()
+    def setter(s, rref):
+        getattr(s.leapct, 'set_offset' + axis)(0.5*(numVoxels(s)-1)*voxelSize(s) - rref*voxelSize(s))
+    def getter(s):
+        if voxelSize(s) <= 0.0:
+            return 0.0
+        return 0.5*(numVoxels(s)-1) - getattr(s.leapct, 'get_offset' + axis)()/voxelSize(s)
+    registry.add(name, 'float', setter, getter, clear=lambda s: getattr(s.leapct, 'set_offset' + axis)(0.0))
+
+def _leapct_parameter(registry, name, kind, default=None, aliases=()):
+    """Adds a parameter stored in leapct, read and written with leapct.get_<name> and leapct.set_<name>"""
+    registry.add(name, kind, lambda s, v: getattr(s.leapct, 'set_' + name)(v), lambda s: getattr(s.leapct, 'get_' + name)(), default, aliases)
+
+def _attribute_parameter(registry, name, kind, default=None, aliases=(), save=False, attribute=None):
+    """Adds a parameter stored in an attribute of leapctserver (by default the attribute with the same name)"""
+    if attribute is None:
+        attribute = name
+    registry.add(name, kind, lambda s, v: setattr(s, attribute, v), lambda s: getattr(s, attribute), default, aliases, save=save)
+
+def _constant_parameter(registry, name, value):
+    """Adds an LTT parameter that leapctserver ignores; setting it does nothing and it always has the same value"""
+    registry.add(name, 'str', lambda s, v: None, lambda s: value)
+
+_leapctserver_parameters = None
+
+def leapctserver_parameters():
+    """Returns the registry of all leapctserver parameters"""
+    global _leapctserver_parameters
+    if _leapctserver_parameters is not None:
+        return _leapctserver_parameters
+    r = ParameterRegistry()
+
+    # File names, in the order save_parameters writes them
+    _attribute_parameter(r, 'path', 'str', '', aliases=('archdir',), save=True)
+    _attribute_parameter(r, 'air_scan_file', 'str', '', aliases=('backgroundFile', 'backgroundfile'), save=True)
+    _attribute_parameter(r, 'dark_scan_file', 'str', '', aliases=('darkCurrentFile', 'darkcurrentfile'), save=True)
+    _attribute_parameter(r, 'raw_scan_file', 'str', '', aliases=('sfile', 'scan_file'), save=True)
+    _attribute_parameter(r, 'projection_file', 'str', '', aliases=('pfile',), save=True)
+    _attribute_parameter(r, 'projection_crop', 'literal', 'None', save=lambda s: s.projection_crop is not None)
+    _attribute_parameter(r, 'reconstruction_file', 'str', '', aliases=('rfile',), save=True)
+    _attribute_parameter(r, 'geometry_file', 'str', '', aliases=('systemGeometryFile', 'system_geometry_file'), save=True)
+    r.add('data_type', 'str', _set_data_type, _get_data_type, 'UNKNOWN', ('dataType', 'datatype'), save=lambda s: s.data_type != s.UNSPECIFIED, saved_value=_saved_data_type)
+    r.add('Filename Prefix', 'str', lambda s, v: setattr(s, 'raw_scan_file', v + str("*[0-9].tif")))
+    _attribute_parameter(r, 'outputdir', 'str', '', attribute='outputDir')
+    _constant_parameter(r, 'lengthUnits', 'mm')
+
+    # Spectra
+    spectra_from_kV = lambda s: (s.source_spectra_file is None or len(s.source_spectra_file) == 0) and s.kV is not None and s.kV > 0.0
+    _attribute_parameter(r, 'source_spectra_file', 'str', '', aliases=('spectraFile',), save=True)
+    _attribute_parameter(r, 'kV', 'float', '-1.0', aliases=('Source Voltage (kV)',), save=spectra_from_kV)
+    _attribute_parameter(r, 'anode_material', 'int', '74', aliases=('anodeMaterial',), save=spectra_from_kV)
+    _attribute_parameter(r, 'takeoff_angle', 'float', '11.0', aliases=('takeOffAngle',), save=spectra_from_kV)
+    _attribute_parameter(r, 'xray_filters', 'literal', 'None', aliases=('filterMaterials',), save=True)
+    _attribute_parameter(r, 'detector_response_model', 'literal', 'None', save=True)
+    _attribute_parameter(r, 'object_model', 'literal', 'None', save=True)
+    _attribute_parameter(r, 'reference_energy', 'float', '-1.0', aliases=('referenceEnergy',), save=lambda s: s.reference_energy > 0.0)
+    _attribute_parameter(r, 'detector_response_file', 'str', '', aliases=('detectorResponseFile',))
+
+    # Resources and run control
+    _attribute_parameter(r, 'max_CPU_memory_usage', 'float', aliases=('maxMemoryUsage',))
+    r.add('GPUs', 'literal', _set_gpus, lambda s: s.leapct.get_gpus(), aliases=('gpus',))
+    _attribute_parameter(r, 'default_algorithms', 'literal')
+    _attribute_parameter(r, 'BHC_library_dir', 'str')
+    _attribute_parameter(r, 'checkpoint_interval', 'int', '0')
+    _attribute_parameter(r, 'stopping_tolerance', 'float', '0.0')
+    _attribute_parameter(r, 'resume_from_checkpoint', 'bool', 'False')
+    _attribute_parameter(r, 'resume_chunked_runs', 'bool', 'False')
+    _attribute_parameter(r, 'FBP_chunking', 'str', 'auto')
+    _attribute_parameter(r, 'FBP_workers', 'literal', 'None')
+    _attribute_parameter(r, 'use_filtered_projection_cache', 'bool', 'False')
+    _attribute_parameter(r, 'storage_precision', 'str', 'float32')
+    r.add('profiling', 'bool', lambda s, v: s.profiler.enable(v), lambda s: s.profiler.enabled, 'False')
+    r.add('memory_enforcement', 'str', lambda s, v: s.memory_accountant.set_enforcement(v), lambda s: s.memory_accountant.enforcement, 'warn')
+    r.add('memory_overheads_file', 'str', _set_memory_overheads_file, _get_memory_overheads_file, '')
+
+    # CT geometry
+    r.add('geometry', 'str', lambda s, v: s.leapct.set_geometry(v), lambda s: s.leapct.get_geometry(), aliases=('bgeometry',), clear=lambda s: s.leapct.set_geometry(0))
+    _leapct_parameter(r, 'sod', 'float', '0.0', aliases=('Object to Source (mm)',))
+    _leapct_parameter(r, 'sdd', 'float', '0.0', aliases=('Camera to Source (mm)',))
+    r.add('odd', 'str', lambda s, v: None, lambda s: s.leapct.get_sdd() - s.leapct.get_sod())
+    _leapct_parameter(r, 'helicalPitch', 'float', '0.0', aliases=('helicalpitch', 'helical_pitch'))
+    r.add('normalizedHelicalPitch', 'float', getter=lambda s: s.leapct.get_normalizedHelicalPitch())
+    r.add('axisOfSymmetry', 'float', _set_axis_of_symmetry, _get_axis_of_symmetry, '90.0')
+    r.add('numAngles', 'int', _set_num_angles, lambda s: s.leapct.get_numAngles(), '0', ('nangles',), after=_update_angles)
+    r.add('Number of Files', 'int', _set_number_of_files, after=_update_angles)
+    r.add('init_angle', 'float', lambda s, v: setattr(s, 'init_angle', v), _get_init_angle, '0.0', ('initangle', 'initAngle'), after=_update_angles)
+    r.add('angular_range', 'float', lambda s, v: setattr(s, 'angular_range', v), lambda s: s.leapct.get_angularRange(), '0.0', ('arange', 'angularRange'), after=_update_angles, clear=_clear_angular_range)
+    r.add('Rotation Step (deg)', 'float', lambda s, v: setattr(s, 'angular_step', v), after=_update_angles)
+    r.add('rotationDirection', 'str', _set_rotation_direction, _get_rotation_direction, 'COUNTERCLOCKWISE', ('rotationdirection',))
+    _leapct_parameter(r, 'numCols', 'int', '0', aliases=('nrays', 'Number of Columns'))
+    _leapct_parameter(r, 'numRows', 'int', '0', aliases=('nslices', 'Number of Rows'))
+    _leapct_parameter(r, 'centerCol', 'float', '0.0', aliases=('pxcenter',))
+    _leapct_parameter(r, 'centerRow', 'float', '0.0', aliases=('pzcenter', 'Optical Axis (line)'))
+    _leapct_parameter(r, 'tau', 'float', '0.0', aliases=('pxmidoff',))
+    _leapct_parameter(r, 'pixelWidth', 'float', '0.0', aliases=('pxsize',))
+    _leapct_parameter(r, 'pixelHeight', 'float', '0.0', aliases=('pzsize',))
+    r.add('Camera Pixel Size (um)', 'float', _set_camera_pixel_size)
+    r.add('detectorType', 'str', _set_detector_type, lambda s: s.leapct.get_detectorType(), 'FLAT', ('detectorShape', 'detector_shape', 'detector_type'))
+    _leapct_parameter(r, 'offsetScan', 'bool', 'False', aliases=('halfscan',))
+    _leapct_parameter(r, 'truncatedScan', 'bool', 'False')
+
+    # CT volume
+    _leapct_parameter(r, 'voxelWidth', 'float', '0.0', aliases=('rxsize', 'rysize'))
+    _leapct_parameter(r, 'voxelHeight', 'float', '0.0', aliases=('rzsize',))
+    _leapct_parameter(r, 'numX', 'int', '0', aliases=('rxelements',))
+    _leapct_parameter(r, 'numY', 'int', '0', aliases=('ryelements',))
+    _leapct_parameter(r, 'numZ', 'int', '0', aliases=('rzelements',))
+    _leapct_parameter(r, 'offsetX', 'float', '0.0')
+    _leapct_parameter(r, 'offsetY', 'float', '0.0')
+    _leapct_parameter(r, 'offsetZ', 'float', '0.0')
+    _reference_parameter(r, 'rxref', 'X')
+    _reference_parameter(r, 'ryref', 'Y')
+    _reference_parameter(r, 'rzref', 'Z')
+    _constant_parameter(r, 'rxoffset', 0)
+    _constant_parameter(r, 'ryoffset', 0)
+    _constant_parameter(r, 'rzoffset', 0)
+
+    # Algorithms
+    _leapct_parameter(r, 'projector', 'str', 'SF', aliases=('backprojector',))
+    _leapct_parameter(r, 'numTVneighbors', 'int', '26')
+    _leapct_parameter(r, 'rampFilter', 'int', '2', aliases=('rfilter', 'rampID'))
+    _leapct_parameter(r, 'FBPlowpass', 'float', '1.0', aliases=('rampFWHM',))
+
+    # LTT parameters that have no leapctserver equivalent
+    _constant_parameter(r, 'trackHistory', 'False')
+    _constant_parameter(r, 'ImageJpath', '')
+    _constant_parameter(r, 'LTTcmd', '')
+    _constant_parameter(r, 'LTTwCmd', '')
+    _constant_parameter(r, 'wmin', '')
+    _constant_parameter(r, 'wmax', '')
+    _constant_parameter(r, 'compressFile', 'False')
+    _constant_parameter(r, 'fileType', 'tif')
+    _constant_parameter(r, 'untruncatedProjection', '0')
+
+    _leapctserver_parameters = r
+    return r
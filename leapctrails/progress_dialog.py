@@ -11,6 +11,7 @@ class ProgressDialog(QDialog):
         self.resize(350,75)
 
         self.operationSuccessful = False
+        self.lctserver = None
 
         self.setWindowTitle(txt)
 
@@ -28,6 +29,26 @@ class ProgressDialog(QDialog):
         parentRect = QRect(parent.mapToGlobal(parent.pos()), parent.size())
         self.move(int(parentRect.left() + parentRect.width() * 0.25), int(parentRect.top() + parentRect.height() * 0.25))
 
+    def showEvent(self, event):
+        # While the dialog is shown, the iterative reconstructions of the server show their progress in it
+        self.lctserver = getattr(self.parent, 'lctserver', None)
+        if self.lctserver is not None:
+            self.lctserver.progress_callback = self.show_iteration
+        super(ProgressDialog, self).showEvent(event)
+
+    def hideEvent(self, event):
+        if self.lctserver is not None and self.lctserver.progress_callback == self.show_iteration:
+            self.lctserver.progress_callback = None
+        super(ProgressDialog, self).hideEvent(event)
+
+    def show_iteration(self, entry):
+        # leapctserver.progress_callback of the iterative reconstructions while the dialog is shown
+        message = "iteration " + str(entry['iteration']) + " of " + str(entry['numIter']) + " (" + str(round(entry['time'], 2)) + " sec/iteration)"
+        if entry['metric'] is not None:
+            message += ", metric = " + "{:.3e}".format(entry['metric'])
+        self.messageLabel.setText(message)
+        QApplication.processEvents()
+
     def doing(self):
 
         QApplication.setOverrideCursor(Qt.WaitCursor)
@@ -0,0 +1,55 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# projection_cache
+# Least recently used cache of subsets of projection data (and of other
+# projection-sized arrays such as row sums) that are streamed from disk by
+# the out-of-core iterative reconstruction algorithms of leapctserver
+################################################################################
+from collections import OrderedDict
+
+
+class ProjectionSubsetCache:
+    """ Least recently used cache of arrays, limited by the total amount of memory they use
+
+    Arrays returned by get are shared with the cache and must not be modified.
+
+    :ivar max_memory(float): the maximum amount of memory (GB) the cached arrays may use
+    :ivar memory(float): the amount of memory (GB) the cached arrays currently use
+    :ivar hits(int): number of requests that were served from the cache
+    :ivar misses(int): number of requests that had to call the loader
+    """
+    def __init__(self, max_memory):
+        self.max_memory = max(0.0, float(max_memory))
+        self.entries = OrderedDict()
+        self.memory = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.memory = 0.0
+
+    def get(self, key, loader):
+        """Returns the array stored under key; if it is not in the cache, it is created with loader() and added to the cache (if it fits)"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        x = loader()
+        if x is None:
+            return None
+        x_memory = float(x.nbytes) / 2.0**30
+        if x_memory <= self.max_memory:
+            while self.memory + x_memory > self.max_memory and len(self.entries) > 0:
+                oldKey, oldValue = self.entries.popitem(last=False)
+                self.memory -= float(oldValue.nbytes) / 2.0**30
+            self.entries[key] = x
+            self.memory += x_memory
+        return x
+
+    def summary(self):
+        return 'cache hits: ' + str(self.hits) + ', misses: ' + str(self.misses) + ', memory: ' + str(round(self.memory, 3)) + ' GB'
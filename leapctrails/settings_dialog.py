@@ -80,6 +80,18 @@ class SettingsDialogControls(QWidget):
         overallgrid.addLayout(memory_layout, curRow, 0)
         curRow += 1
         
+        storage_layout = QHBoxLayout()
+        storage_label = QLabel("Compact storage")
+        storage_label.setToolTip("projections or volumes that do not fit in the usable CPU RAM as float32 are held in memory\nwith 16 bits per value (float16, or uint16 with a scale and offset per projection or slice)\ninstead of being processed in chunks through files")
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItems(["off (float32)", "float16", "uint16"])
+        self.storage_combo.currentIndexChanged.connect(self.storage_combo_selectionchange)
+        storage_layout.addWidget(storage_label)
+        storage_layout.addWidget(self.storage_combo)
+        storage_layout.addStretch(1)
+        overallgrid.addLayout(storage_layout, curRow, 0)
+        curRow += 1
+        
         TV_group = QGroupBox("Total Variation")
         TV_group.setToolTip("Using 26 neighbors produces better results,\nbut computations take about twice as long as using only 6 neighbors")
         TV_layout = QGridLayout()
@@ -268,6 +280,9 @@ class SettingsDialogControls(QWidget):
         else:
             self.gpu_four_check.setChecked(False)
         self.memory_edit.setText(str(self.lctserver.max_CPU_memory_usage))
+        storage_precisions = ['float32', 'float16', 'uint16']
+        if self.lctserver.storage_precision in storage_precisions:
+            self.storage_combo.setCurrentIndex(storage_precisions.index(self.lctserver.storage_precision))
         
     def save_defaults_button_Clicked(self):
         self.lctserver.save_defaults(str(self.custom_defaults_edit.text()))
@@ -304,6 +319,9 @@ class SettingsDialogControls(QWidget):
             except:
                 pass
         
+    def storage_combo_selectionchange(self):
+        self.lctserver.storage_precision = ['float32', 'float16', 'uint16'][self.storage_combo.currentIndex()]
+        
     def push_log_debug_radio(self):
         self.leapct.set_log_debug()
         
@@ -0,0 +1,277 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# slab_distribution
+# Transports that run the z-slab tasks of leapctserver.FBP_distributed and
+# leapctserver.zslice_processing_distributed on several worker processes,
+# either on this machine or on other nodes that connect over TCP
+#
+# Start a worker on another node with:
+#   python slab_distribution.py --worker host:port --authkey key
+# The workers must see the data and output folders under the same paths as
+# the coordinator (e.g., a shared network file system).
+################################################################################
+import os
+import sys
+import time
+import queue
+import threading
+import multiprocessing
+import numpy as np
+
+
+# The leapctserver of the most recent task of this worker process, reused by the following tasks of the same run
+_slab_server = {'key': None, 'lctserver': None}
+
+# The GPU that a LocalTransport assigned to this worker process, None to use the GPUs of the parameter file
+_slab_worker = {'GPU': None}
+
+def init_slab_worker(gpu_queue, numThreads):
+    """Initializes a worker process of a LocalTransport: takes one GPU from gpu_queue and limits its CPU threads to numThreads"""
+    if numThreads is not None:
+        # read by the OpenMP runtime when LEAP is loaded by the first task
+        os.environ['OMP_NUM_THREADS'] = str(int(numThreads))
+    if gpu_queue is not None:
+        _slab_worker['GPU'] = gpu_queue.get()
+
+def slab_task_server(task):
+    """Returns a leapctserver configured by the parameter file of a slab task"""
+    key = (task['parameter_file'], task['outputDir'])
+    if _slab_server['key'] != key:
+        from leapctserver import leapctserver
+        lctserver = leapctserver(outputDir=task['outputDir'])
+        lctserver.load_parameters(task['parameter_file'])
+        if _slab_worker['GPU'] is not None:
+            lctserver.leapct.set_gpus([_slab_worker['GPU']])
+        _slab_server['key'] = key
+        _slab_server['lctserver'] = lctserver
+    lctserver = _slab_server['lctserver']
+    lctserver.max_CPU_memory_usage = task['max_CPU_memory_usage']
+    return lctserver
+
+def run_slab_task(task):
+    """Processes one z-slab and writes it into the output sequence; this is the function that the workers run
+
+    Args:
+        task (dict): the slab ('slices'), the operation ('FBP' or 'zslice_processing') and its arguments, and the run's parameter file, see leapctserver.run_distributed
+
+    Returns:
+        dictionary with the success and timing of the task (and the range of values of FBP slabs)
+    """
+    time_start = time.time()
+    result = {'index': task['index'], 'slices': task['slices'], 'success': False, 'error': None}
+    try:
+        lctserver = slab_task_server(task)
+        sliceStart = task['slices'][0]
+        sliceEnd = task['slices'][1]
+        if task['operation'] == 'FBP':
+            f_chunk = lctserver.FBP_slab(sliceStart, sliceEnd, task['doClipping'])
+            if f_chunk is None:
+                result['error'] = 'reconstruction failed'
+            else:
+                result['minValue'] = float(np.min(f_chunk))
+                result['maxValue'] = float(np.max(f_chunk))
+                fullPath = os.path.join(lctserver.path, task['output_file'])
+                if lctserver.leapct_backup.save_volume(fullPath, f_chunk, sliceStart) == False:
+                    result['error'] = 'failed to save slices'
+                lctserver.release_chunk_buffer(f_chunk)
+        else:
+            lctserver.slab_range = [sliceStart, sliceEnd]
+            lctserver.slab_output_file = task['output_file']
+            retVal = getattr(lctserver, task['algorithm'])(**task['kwargs'])
+            lctserver.slab_range = None
+            lctserver.slab_output_file = None
+            if retVal == False:
+                result['error'] = str(task['algorithm']) + ' failed'
+        result['success'] = result['error'] is None
+    except Exception as e:
+        result['error'] = str(e)
+    result['time'] = time.time() - time_start
+    return result
+
+
+class LocalTransport:
+    """ Runs slab tasks on a pool of worker processes on this machine
+
+    :ivar numWorkers(int): number of worker processes
+    :ivar gpus(list of integers): if not None, each worker process is given one of these GPUs (in turn)
+    :ivar numThreads(int): if not None, the number of CPU threads of each worker process
+    """
+    def __init__(self, numWorkers=None, gpus=None, numThreads=None):
+        if numWorkers is None:
+            numWorkers = os.cpu_count()
+        self.numWorkers = max(1, int(numWorkers))
+        if gpus is not None and len(gpus) == 0:
+            gpus = None
+        self.gpus = gpus
+        self.numThreads = numThreads
+
+    def map(self, tasks, callback):
+        """Runs run_slab_task on every task, calling callback(task, result) in this process as each one finishes"""
+        if len(tasks) == 0:
+            return
+        context = multiprocessing.get_context('spawn')
+        numProcesses = min(self.numWorkers, len(tasks))
+        gpu_queue = None
+        if self.gpus is not None:
+            gpu_queue = context.Queue()
+            for n in range(numProcesses):
+                gpu_queue.put(self.gpus[n % len(self.gpus)])
+        pool = context.Pool(processes=numProcesses, initializer=init_slab_worker, initargs=(gpu_queue, self.numThreads))
+        try:
+            for result in pool.imap_unordered(run_slab_task, tasks):
+                callback(tasks[result['index']], result)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class SocketTransport:
+    """ Sends slab tasks to worker processes that connect over TCP, possibly from other nodes
+
+    Each connected worker is sent one task at a time; if a worker disconnects (or does not return its result
+    within task_timeout seconds), its task is given to another worker.  If no worker is connected for
+    idle_timeout seconds while tasks remain, map gives up and returns with those tasks unfinished.
+
+    Connections are authenticated with authkey, which must be given (as an argument or in the LEAPCT_AUTHKEY
+    environment variable), since the tasks and results are pickled.  By default the coordinator only listens on
+    this machine; give the address of a network interface to accept workers from other nodes.
+
+    :ivar address(tuple): the (host, port) that the coordinator listens on
+    :ivar authkey(bytes): shared secret that the workers must present
+    :ivar numLocalWorkers(int): number of workers started on this machine when map is called (e.g., for testing)
+    :ivar task_timeout(float): seconds to wait for the result of a task, None to wait as long as the worker is connected
+    :ivar idle_timeout(float): seconds to wait for a worker to connect while tasks remain
+    """
+    def __init__(self, address=('127.0.0.1', 6010), authkey=None, numLocalWorkers=0, task_timeout=None, idle_timeout=600.0):
+        if authkey is None:
+            authkey = os.environ.get('LEAPCT_AUTHKEY', None)
+        if authkey is None or len(authkey) == 0:
+            raise ValueError('an authkey must be given to SocketTransport (or set in LEAPCT_AUTHKEY)')
+        if isinstance(authkey, str):
+            authkey = authkey.encode('utf-8')
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.numLocalWorkers = max(0, int(numLocalWorkers))
+        self.task_timeout = task_timeout
+        self.idle_timeout = float(idle_timeout)
+
+    def map(self, tasks, callback):
+        """Runs run_slab_task on every task on the connected workers, calling callback(task, result) in this process as each one finishes"""
+        if len(tasks) == 0:
+            return
+        from multiprocessing.connection import Listener
+        pending = queue.Queue()
+        for task in tasks:
+            pending.put(task)
+        lock = threading.Lock()
+        done = threading.Event()
+        numRemaining = [len(tasks)]
+        numConnected = [0]
+
+        def wait_for_result(conn):
+            time_start = time.time()
+            while conn.poll(1.0) == False:
+                if done.is_set():
+                    raise EOFError
+                if self.task_timeout is not None and time.time() - time_start > self.task_timeout:
+                    raise TimeoutError
+            return conn.recv()
+
+        def serve(conn):
+            with lock:
+                numConnected[0] += 1
+            try:
+                while done.is_set() == False:
+                    try:
+                        task = pending.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    try:
+                        conn.send(task)
+                        result = wait_for_result(conn)
+                    except (EOFError, OSError, TimeoutError):
+                        if done.is_set() == False:
+                            print('Warning: lost a worker, resubmitting slices ' + str(task['slices']))
+                        pending.put(task)
+                        return
+                    with lock:
+                        callback(task, result)
+                        numRemaining[0] -= 1
+                        if numRemaining[0] == 0:
+                            done.set()
+                conn.send(None)
+            except (EOFError, OSError):
+                pass
+            finally:
+                with lock:
+                    numConnected[0] -= 1
+                conn.close()
+
+        def accept(listener):
+            while done.is_set() == False:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError):
+                    # raised when the listener is closed, or when a client fails authentication
+                    continue
+                threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+        listener = Listener(self.address, authkey=self.authkey)
+        print('waiting for slab workers at ' + str(listener.address))
+        threading.Thread(target=accept, args=(listener,), daemon=True).start()
+        localWorkers = []
+        context = multiprocessing.get_context('spawn')
+        for n in range(self.numLocalWorkers):
+            worker = context.Process(target=serve_slab_worker, args=(('localhost', listener.address[1]), self.authkey))
+            worker.start()
+            localWorkers.append(worker)
+        try:
+            idle_start = time.time()
+            while done.wait(1.0) == False:
+                with lock:
+                    isIdle = numConnected[0] == 0
+                if isIdle == False or any([worker.is_alive() for worker in localWorkers]):
+                    idle_start = time.time()
+                elif time.time() - idle_start > self.idle_timeout:
+                    print('Error: no slab workers connected for ' + str(self.idle_timeout) + ' seconds; ' + str(numRemaining[0]) + ' slabs did not finish')
+                    break
+        finally:
+            done.set()
+            listener.close()
+            for worker in localWorkers:
+                worker.join(timeout=5.0)
+                if worker.is_alive():
+                    worker.terminate()
+
+
+def serve_slab_worker(address, authkey):
+    """Connects to a SocketTransport coordinator and runs the slab tasks it sends until it has no more"""
+    from multiprocessing.connection import Client
+    conn = Client(tuple(address), authkey=authkey)
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            conn.send(run_slab_task(task))
+    except EOFError:
+        pass
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a leapctserver slab worker')
+    parser.add_argument('--worker', required=True, help='host:port of the coordinator')
+    parser.add_argument('--authkey', default=os.environ.get('LEAPCT_AUTHKEY', None), help='shared secret of the coordinator (default: LEAPCT_AUTHKEY)')
+    args = parser.parse_args()
+    if args.authkey is None or len(args.authkey) == 0:
+        print('Error: the authkey of the coordinator must be given with --authkey or LEAPCT_AUTHKEY')
+        sys.exit(1)
+    host, port = args.worker.rsplit(':', 1)
+    serve_slab_worker((host, int(port)), args.authkey.encode('utf-8'))
+    sys.exit(0)
@@ -0,0 +1,244 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# stream_reconstruction
+# Reconstruction of a scan while it is being acquired: the projections that
+# land in the scan folder are corrected, filtered, and backprojected in small
+# batches of angles into a volume that stays in memory
+################################################################################
+import os
+import time
+import numpy as np
+import leap_preprocessing_algorithms
+from chunk_manifest import sequence_number
+
+
+class ScanFolderWatcher:
+    """ Watches the file sequence of a scan that is being written
+
+    A file has landed once its size is nonzero and did not change between two polls of the folder.  Only
+    the files that continue the sequence without a gap are counted, so num_landed is always the number of
+    files at the start of the sequence that can be read.
+
+    :ivar fullPath(str): full path of the file sequence, e.g., /data/scan/raw.tif
+    :ivar num_landed(int): number of files of the sequence that have landed
+    """
+    def __init__(self, leapct, fullPath):
+        self.leapct = leapct
+        self.fullPath = fullPath
+        self.num_landed = 0
+        self.sizes = {}
+
+    def poll(self):
+        """Checks the folder for new files and returns num_landed"""
+        fileList = self.leapct.get_file_list(self.fullPath)
+        if fileList is None or len(fileList) <= self.num_landed:
+            return self.num_landed
+        firstNumber = sequence_number(fileList[0])
+        for n in range(self.num_landed, len(fileList)):
+            if firstNumber is not None and sequence_number(fileList[n]) != firstNumber + n:
+                break # the previous file of the sequence has not appeared yet
+            try:
+                size = os.path.getsize(fileList[n])
+            except OSError:
+                break
+            if size <= 0 or self.sizes.get(fileList[n], -1) != size:
+                self.sizes[fileList[n]] = size
+                break # still being written
+            self.sizes.pop(fileList[n], None)
+            self.num_landed = n+1
+        return self.num_landed
+
+
+class StreamingReconstruction:
+    """ Reconstructs a scan from its projections while they are acquired
+
+    The projections of the scan (raw_scan_file, or projection_file for transmission or attenuation data) are
+    watched for as they are written.  Every batch_size projections that land are flat/dark corrected,
+    appended to the attenuation projections in outputDir, filtered and backprojected with the CT geometry
+    of their angles, and added to lctserver.f.  The FBP of contiguous subsets of the angles adds up to the FBP
+    of the full scan up to a factor (see leapctserver.angle_subset_scale), so when the last projection lands
+    lctserver.f is the FBP of the scan.  For CT geometries where this does not hold (e.g., short scans, whose
+    weights depend on the full angular range), the volume during the scan is only a preview and the final
+    volume is reconstructed by leapctserver.FBP from the saved attenuation projections.
+
+    :ivar batch_size(int): number of projections that are processed together
+    :ivar ROI(list of four integers): flux normalization region, see makeAttenuationRadiographs
+    :ivar timeout(float): seconds to wait for a new projection before giving up
+    :ivar poll_interval(float): seconds between checks of the scan folder
+    :ivar callback(function): if not None, called as callback(f, numReceived) after every batch
+    :ivar num_received(int): number of projections reconstructed so far
+    """
+    def __init__(self, lctserver, batch_size=8, ROI=None, timeout=60.0, poll_interval=0.5, callback=None):
+        self.lctserver = lctserver
+        self.batch_size = max(1, int(batch_size))
+        self.ROI = ROI
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.callback = callback
+        self.num_received = 0
+
+    def input_file(self):
+        lctserver = self.lctserver
+        if lctserver.data_type == lctserver.RAW or lctserver.data_type == lctserver.RAW_DARK_SUBTRACTED:
+            return lctserver.raw_scan_file
+        else:
+            return lctserver.projection_file
+
+    def check(self):
+        """Returns True if the scan can be reconstructed while it is acquired"""
+        lctserver = self.lctserver
+        if lctserver.leapct.all_defined() == False:
+            print('Error: CT geometry and CT volume must be defined before running this algorithm!')
+            return False
+        if lctserver.data_type <= lctserver.UNSPECIFIED or lctserver.data_type > lctserver.ATTENUATION:
+            print('Error: must specify data_type')
+            return False
+        if self.input_file() is None:
+            print('Error: the file of the projections is not specified!')
+            return False
+        if self.ROI is not None:
+            ROI = self.ROI
+            if ROI[0] < 0 or ROI[2] < 0 or ROI[1] < ROI[0] or ROI[3] < ROI[2] or ROI[1] >= lctserver.leapct.get_numRows() or ROI[3] >= lctserver.leapct.get_numCols():
+                print('Error: invalid ROI')
+                return False
+        # the volume, the FBP of a batch, and a batch of projections
+        batch_memory = lctserver.projection_memory() * float(self.batch_size) / float(lctserver.leapct.get_numAngles())
+        if 2.0*lctserver.volume_memory() + batch_memory > lctserver.max_CPU_memory_usage - lctserver.scratch_space:
+            print('Error: insufficient memory to hold the volume during the scan')
+            return False
+        return True
+
+    def read_gain_images(self):
+        """Returns the air and dark scans that correct the projections (None for those that are not needed)"""
+        lctserver = self.lctserver
+        air_scan = None
+        dark_scan = None
+        if lctserver.data_type == lctserver.RAW:
+            dark_scan = lctserver.read_image_file(lctserver.dark_scan_file)
+            if dark_scan is None:
+                print('Error: failed to load dark scan file')
+                return None
+        if lctserver.data_type == lctserver.RAW or lctserver.data_type == lctserver.RAW_DARK_SUBTRACTED:
+            air_scan = lctserver.read_image_file(lctserver.air_scan_file)
+            if air_scan is None:
+                print('Error: failed to load air scan file')
+                return None
+        return [air_scan, dark_scan]
+
+    def wait_for_projections(self, watcher, numNeeded):
+        """Waits until numNeeded projections have landed, or no new projection landed for timeout seconds
+
+        Returns:
+            the number of projections that have landed
+        """
+        lastChange = time.time()
+        numLanded = watcher.poll()
+        while numLanded < numNeeded:
+            time.sleep(self.poll_interval)
+            numLanded_new = watcher.poll()
+            if numLanded_new > numLanded:
+                numLanded = numLanded_new
+                lastChange = time.time()
+            elif time.time() - lastChange > self.timeout:
+                break
+        return numLanded
+
+    def run(self):
+        """Reconstructs the scan as it is acquired
+
+        Returns:
+            True if all the projections of the scan were received and reconstructed, False otherwise
+        """
+        if self.check() == False:
+            return False
+        lctserver = self.lctserver
+        leapct = lctserver.leapct
+        numAngles = leapct.get_numAngles()
+        gain_images = self.read_gain_images()
+        if gain_images is None:
+            return False
+        air_scan, dark_scan = gain_images
+        needsCorrection = lctserver.data_type != lctserver.ATTENUATION
+
+        scale = lctserver.angle_subset_scale(self.batch_size)
+        if scale is None:
+            print('Warning: the FBP of this CT geometry cannot be accumulated over batches of angles; the volume during the scan is only a preview and the final volume is reconstructed once the scan is complete')
+
+        input_file = self.input_file()
+        watcher = ScanFolderWatcher(leapct, os.path.join(lctserver.path, input_file))
+        lctserver.create_outputDir()
+        output_file = os.path.join(lctserver.outputDir, 'attenRad.tif')
+        output_full_path = os.path.join(lctserver.path, output_file)
+
+        lctserver.clear_projection_data()
+        lctserver.clear_volume_data()
+        lctserver.f = leapct.allocate_volume()
+        f_batch = lctserver.chunk_buffer(lctserver.f.shape)
+        self.num_received = 0
+        print('Waiting for ' + str(numAngles) + ' projections in ' + str(watcher.fullPath) + '...')
+        while self.num_received < numAngles:
+            angleStart = self.num_received
+            angleEnd = min(numAngles-1, angleStart + self.batch_size - 1)
+            # a batch is only processed once all its projections have landed, so the batches are the
+            # subsets that angle_subset_scale was calibrated for
+            numLanded = self.wait_for_projections(watcher, angleEnd+1)
+            if numLanded <= angleEnd:
+                print('Error: no new projections arrived for ' + str(self.timeout) + ' seconds; received ' + str(self.num_received) + ' of ' + str(numAngles))
+                lctserver.release_chunk_buffer(f_batch)
+                return False
+
+            with lctserver.profiler.span('stream_reconstruction', 'read') as span:
+                g_batch = lctserver.chunk_buffer([angleEnd-angleStart+1, leapct.get_numRows(), leapct.get_numCols()])
+                g_batch = lctserver.load_projection_angles(input_file, [angleStart, angleEnd], g_batch)
+                span.add_bytes(g_batch)
+            if g_batch is None:
+                print('Error: failed to load projections ' + str(angleStart) + ' to ' + str(angleEnd))
+                lctserver.release_chunk_buffer(f_batch)
+                return False
+
+            leapct_batch = lctserver.subset_projector(range(angleStart, angleEnd+1))
+            if needsCorrection:
+                with lctserver.profiler.span('stream_reconstruction', 'compute', g_batch.nbytes):
+                    retVal = leap_preprocessing_algorithms.makeAttenuationRadiographs(leapct_batch, g_batch, air_scan, dark_scan, self.ROI)
+                if retVal == False:
+                    print('Error: failed to correct projections ' + str(angleStart) + ' to ' + str(angleEnd))
+                    lctserver.release_chunk_buffer(g_batch)
+                    lctserver.release_chunk_buffer(f_batch)
+                    return False
+            with lctserver.profiler.span('stream_reconstruction', 'write', g_batch.nbytes):
+                retVal = leapct.save_projections(output_full_path, g_batch, angleStart)
+            if retVal == False:
+                print('Error: failed to save projections ' + str(angleStart) + ' to ' + str(angleEnd))
+                lctserver.release_chunk_buffer(g_batch)
+                lctserver.release_chunk_buffer(f_batch)
+                return False
+
+            retVal = lctserver.FBP_angle_subset(g_batch, [angleStart, angleEnd], lctserver.f, f_batch, 1.0 if scale is None else scale)
+            lctserver.release_chunk_buffer(g_batch)
+            if retVal == False:
+                print('Error: FBP of projections ' + str(angleStart) + ' to ' + str(angleEnd) + ' failed')
+                lctserver.release_chunk_buffer(f_batch)
+                return False
+            self.num_received = angleEnd+1
+            print('received ' + str(self.num_received) + ' of ' + str(numAngles) + ' projections')
+            if self.callback is not None:
+                self.callback(lctserver.f, self.num_received)
+        lctserver.release_chunk_buffer(f_batch)
+        lctserver.clear_chunk_buffers()
+
+        lctserver.data_type = lctserver.ATTENUATION
+        lctserver.set_projection_file_name(output_file)
+        lctserver.save_parameters()
+        if scale is None:
+            lctserver.clear_volume_data()
+            return lctserver.FBP()
+
+        lctserver.buffer_processed_in_memory(lctserver.f)
+        maxValue = np.max(lctserver.f)
+        print('range of values: ' + str(np.min(lctserver.f)) + ', ' + str(maxValue))
+        if leapct.wmax is None:
+            leapct.wmax = maxValue
+        return True
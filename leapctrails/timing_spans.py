@@ -0,0 +1,162 @@
+################################################################################
+# Copyright 2024 Kyle Champley
+# SPDX-License-Identifier: MIT
+#
+# LivermorE AI Projector for Computed Tomography (LEAP)
+# timing_spans
+# Lightweight instrumentation of the chunk loops of leapctserver: wall time,
+# bytes moved, and peak memory of each stage (read, compute, write, copy),
+# exported as a json summary or as a Chrome trace (chrome://tracing)
+################################################################################
+import os
+import sys
+import time
+import threading
+import json
+
+try:
+    import resource
+    has_resource = True
+except:
+    has_resource = False
+
+
+def peak_RSS():
+    """Returns the peak resident memory (GB) of this process, 0 if it cannot be measured"""
+    if has_resource:
+        maxrss = float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        if sys.platform == 'darwin':
+            return maxrss / 2.0**30 # bytes
+        return maxrss / 2.0**20 # kilobytes
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return float(getattr(info, 'peak_wset', info.rss)) / 2.0**30
+    except:
+        return 0.0
+
+def nbytes_of(x):
+    if x is None:
+        return 0
+    return int(getattr(x, 'nbytes', 0))
+
+
+class NullSpan:
+    """ The span returned by a disabled SpanRecorder; it does nothing """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, x):
+        pass
+
+_null_span = NullSpan()
+
+
+class Span:
+    """ Times one stage of an operation; created by SpanRecorder.span """
+    def __init__(self, recorder, operation, stage, nbytes):
+        self.recorder = recorder
+        self.operation = operation
+        self.stage = stage
+        self.nbytes = nbytes
+        self.time_start = 0.0
+
+    def __enter__(self):
+        self.time_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.record(self, time.perf_counter())
+        return False
+
+    def add_bytes(self, x):
+        """Adds the size of the numpy array x (or an int number of bytes) to the bytes moved by this stage"""
+        if isinstance(x, int):
+            self.nbytes += x
+        else:
+            self.nbytes += nbytes_of(x)
+
+
+class SpanRecorder:
+    """ Aggregates the wall time, bytes moved, and peak memory of the stages of chunked operations
+
+    Instrumented code is written as
+        with self.profiler.span('FBP', 'read') as span:
+            g_chunk = ...
+            span.add_bytes(g_chunk)
+    When the recorder is disabled, span returns a shared object whose methods do nothing.
+
+    :ivar enabled(bool): if False, nothing is recorded
+    :ivar stages(dict): maps 'operation.stage' to its number of spans, total time (seconds), and total bytes
+    :ivar events(list): the individual spans, in Chrome trace event format
+    :ivar max_events(int): spans after this many are aggregated but not kept as trace events
+    :ivar peak_rss(float): the largest peak resident memory (GB) of the process seen at the end of a span
+    """
+    def __init__(self, enabled=False, max_events=100000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.stages = {}
+        self.events = []
+        self.peak_rss = 0.0
+        self.time_origin = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def span(self, operation, stage, nbytes=0):
+        """Returns a context manager that times one stage (e.g., read, compute, write, or copy) of an operation"""
+        if self.enabled == False:
+            return _null_span
+        return Span(self, operation, stage, nbytes)
+
+    def record(self, span, time_end):
+        elapsed = time_end - span.time_start
+        rss = peak_RSS()
+        name = span.operation + '.' + span.stage
+        with self.lock:
+            stage = self.stages.get(name, None)
+            if stage is None:
+                stage = {'operation': span.operation, 'stage': span.stage, 'count': 0, 'time': 0.0, 'bytes': 0, 'peak_rss': 0.0}
+                self.stages[name] = stage
+            stage['count'] += 1
+            stage['time'] += elapsed
+            stage['bytes'] += span.nbytes
+            stage['peak_rss'] = max(stage['peak_rss'], rss)
+            self.peak_rss = max(self.peak_rss, rss)
+            if len(self.events) < self.max_events:
+                self.events.append({'name': span.stage, 'cat': span.operation, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                    'ts': 1.0e6*(span.time_start - self.time_origin), 'dur': 1.0e6*elapsed, 'args': {'bytes': span.nbytes}})
+
+    def summary(self):
+        """Returns the per-stage totals, with throughput in GB/sec"""
+        stages = []
+        for name in self.stages:
+            stage = dict(self.stages[name])
+            stage['name'] = name
+            stage['throughput'] = 0.0
+            if stage['time'] > 0.0:
+                stage['throughput'] = float(stage['bytes']) / 2.0**30 / stage['time']
+            stages.append(stage)
+        stages.sort(key=lambda stage: -stage['time'])
+        return {'peak_rss': self.peak_rss, 'stages': stages}
+
+    def print_summary(self):
+        for stage in self.summary()['stages']:
+            print(stage['name'] + ': ' + str(round(stage['time'], 3)) + ' sec in ' + str(stage['count']) + ' spans, ' + str(round(float(stage['bytes'])/2.0**30, 3)) + ' GB (' + str(round(stage['throughput'], 3)) + ' GB/sec)')
+        print('peak memory: ' + str(round(self.peak_rss, 3)) + ' GB')
+
+    def save_json(self, fileName):
+        with open(fileName, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
+
+    def save_chrome_trace(self, fileName):
+        """Writes the spans in Chrome trace format, which can be viewed with chrome://tracing or Perfetto"""
+        with open(fileName, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
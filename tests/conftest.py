@@ -0,0 +1,9 @@
+import os
+import sys
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(tests_dir, '..', 'leapctrails'))
+
+# LEAP, xrayphysics, and matplotlib are not needed by the code under test; the stand-ins in stubs/ are
+# only found if they are not installed (the worker processes of the tests inherit this search path)
+sys.path.append(os.path.join(tests_dir, 'stubs'))
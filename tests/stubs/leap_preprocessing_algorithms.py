@@ -0,0 +1 @@
+# Stand-in for LEAP's leap_preprocessing_algorithms module, used by the tests when LEAP is not installed
@@ -0,0 +1,93 @@
+# Stand-in for LEAP's leapctype module, used by the tests when LEAP is not installed:
+# tomographicModels only stores its parameters and performs no projections
+import os
+import numpy as np
+
+has_torch = False
+
+
+class tomographicModels:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.params = {'geometry': 'CONE', 'detectorType': 'FLAT', 'axisOfSymmetry': 90.0, 'gpus': [0]}
+        self.angles = np.zeros(0, dtype=np.float32)
+
+    def __getattr__(self, name):
+        if name == 'params':
+            raise AttributeError(name)
+        if name.startswith('get_'):
+            return lambda: self.params.get(name[4:], 0)
+        if name.startswith('set_'):
+            def setter(value):
+                self.params[name[4:]] = value
+                return True
+            return setter
+        raise AttributeError(name)
+
+    def copy_parameters(self, leapct):
+        self.params = dict(leapct.params)
+        self.angles = leapct.angles.copy()
+
+    def set_numAngles(self, numAngles):
+        self.params['numAngles'] = int(numAngles)
+        self.angles = np.zeros(int(numAngles), dtype=np.float32)
+
+    def setAngleArray(self, numAngles, angularRange):
+        return np.array(range(numAngles), dtype=np.float32) * angularRange / float(numAngles)
+
+    def set_angles(self, phis):
+        self.angles = np.array(phis, dtype=np.float32)
+        self.params['numAngles'] = self.angles.size
+
+    def get_angles(self):
+        return self.angles
+
+    def get_angularRange(self):
+        if self.angles.size < 2:
+            return 0.0
+        return float(self.angles[-1] - self.angles[0]) * float(self.angles.size) / float(self.angles.size-1)
+
+    def set_flatDetector(self):
+        self.params['detectorType'] = 'FLAT'
+
+    def set_curvedDetector(self):
+        self.params['detectorType'] = 'CURVED'
+
+    def clear_axisOfSymmetry(self):
+        self.params['axisOfSymmetry'] = 90.0
+
+    def get_normalizedHelicalPitch(self):
+        return 0.0
+
+    def ct_geometry_defined(self):
+        return self.params.get('numAngles', 0) > 0 and self.params.get('numRows', 0) > 0 and self.params.get('numCols', 0) > 0
+
+    def ct_volume_defined(self):
+        return self.params.get('numX', 0) > 0 and self.params.get('numY', 0) > 0 and self.params.get('numZ', 0) > 0
+
+    def all_defined(self):
+        return self.ct_geometry_defined() and self.ct_volume_defined()
+
+    def save_parameters(self, fileName):
+        with open(fileName, 'w') as f:
+            for key, value in self.params.items():
+                f.write(key + ' = ' + repr(value) + '\n')
+            f.write('angles = ' + repr(self.angles.tolist()) + '\n')
+        return True
+
+    def load_parameters(self, fileName):
+        if os.path.isfile(fileName) == False:
+            return False
+        with open(fileName, 'r') as f:
+            for line in f.read().splitlines():
+                key, sep, value = line.partition(' = ')
+                if key == 'angles':
+                    self.angles = np.array(eval(value), dtype=np.float32)
+                elif len(sep) > 0:
+                    self.params[key] = eval(value)
+        return True
+
+    def get_file_list(self, pattern):
+        return None
@@ -0,0 +1 @@
+# Stand-in for matplotlib, used by the tests when it is not installed
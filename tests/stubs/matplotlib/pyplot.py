@@ -0,0 +1 @@
+# Stand-in for matplotlib.pyplot, used by the tests when matplotlib is not installed
@@ -0,0 +1,44 @@
+import os
+from batch_queue import BatchQueue, BatchJob, estimate_peak_memory, parse_pipeline, run_batch_job
+
+
+def write_parameter_file(path):
+    fileName = os.path.join(str(path), 'scan.txt')
+    with open(fileName, 'w') as f:
+        f.write('path = ' + str(path) + '\n')
+        f.write('data_type = ATTENUATION\nprojection_file = attenRad.tif\n')
+        f.write('numAngles = 256\nangular_range = 360\nnumRows = 128\nnumCols = 256\n')
+        f.write('numX = 256\nnumY = 256\nnumZ = 64\nvoxelWidth = 1.0\nvoxelHeight = 1.0\n')
+    return fileName
+
+def make_job(memory):
+    job = BatchJob('scan_' + str(memory) + '.txt', parse_pipeline(None))
+    job.memory = memory
+    return job
+
+def test_estimate_peak_memory(tmp_path):
+    queue = BatchQueue(max_memory=16.0, numWorkers=2)
+    job = queue.add(write_parameter_file(tmp_path))
+    lctserver = queue.lctserver
+    P = lctserver.projection_memory()
+    V = lctserver.volume_memory()
+    assert P > 0.0 and V > 0.0
+    assert abs(job.peak_memory - (P + V)) < 1.0e-9
+    assert abs(estimate_peak_memory(lctserver, ['makeAttenuationRadiographs', 'ringRemoval']) - P) < 1.0e-9
+    assert abs(estimate_peak_memory(lctserver, [('ringRemoval', {'which': 'slow'})]) - 3.0*P) < 1.0e-9
+    assert abs(estimate_peak_memory(lctserver, ['TVdenoising']) - 3.0*V) < 1.0e-9
+    assert abs(estimate_peak_memory(lctserver, ['not_an_algorithm']) - (P + V)) < 1.0e-9
+
+def test_next_job_best_fit():
+    queue = BatchQueue(max_memory=10.0, numWorkers=4)
+    queue.jobs = [make_job(2.0), make_job(8.0), make_job(5.0)]
+    assert queue.next_job(6.0) is queue.jobs[2]
+    assert queue.next_job(10.0) is queue.jobs[1]
+    assert queue.next_job(1.0) is None
+    queue.jobs[1].status = 'running'
+    assert queue.next_job(10.0) is queue.jobs[2]
+
+def test_run_batch_job_loads_parameters(tmp_path):
+    result = run_batch_job(write_parameter_file(tmp_path), [], 4.0, 'batch_out')
+    assert result['success'], result['error']
+    assert os.path.isfile(os.path.join(str(tmp_path), 'batch_out', 'leapct_params.txt'))
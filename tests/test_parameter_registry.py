@@ -0,0 +1,52 @@
+import os
+from leapctype import tomographicModels
+from leapctserver import leapctserver
+
+
+KEYS = ['numAngles', 'numRows', 'numCols', 'angular_range', 'numX', 'numY', 'numZ', 'voxelWidth', 'data_type', 'projection_file']
+
+def write_file(fileName, lines):
+    with open(fileName, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def make_server(path):
+    return leapctserver(tomographicModels(), str(path), 'out')
+
+def test_load_include_cycle_and_round_trip(tmp_path):
+    write_file(tmp_path / 'a.txt', ['# volume', 'numX = 64', 'numY = 64', 'numZ = 16', 'voxelWidth = 0.5', 'data_type = ATTENUATION', 'projection_file = attenRad.tif', 'b.txt'])
+    write_file(tmp_path / 'b.txt', ['numAngles = 90', 'angular_range = 180', 'numRows = 8', 'numCols = 64', 'a.txt'])
+
+    lctserver = make_server(tmp_path)
+    lctserver.load_parameters(str(tmp_path / 'a.txt'))
+    assert lctserver.getParam('numAngles') == '90'
+    assert lctserver.getParam('numX') == '64'
+    assert lctserver.getParam('data_type') == 'ATTEN_RAD'
+    assert lctserver.data_type == lctserver.ATTENUATION
+    assert abs(float(lctserver.getParam('angular_range')) - 180.0) < 1.0e-3
+
+    lctserver.save_parameters()
+    saved = os.path.join(str(tmp_path), 'out', 'leapct_params.txt')
+    with open(saved, 'r') as f:
+        assert 'data_type = ATTENUATION' in f.read().splitlines()
+
+    reloaded = make_server(tmp_path)
+    reloaded.load_parameters(saved)
+    for key in KEYS:
+        assert reloaded.getParam(key) == lctserver.getParam(key), key
+
+    assert reloaded.clear_cmd('clear numX')
+    assert reloaded.getParam('numX') == '0'
+    assert reloaded.clear_cmd('clear arange')
+    assert reloaded.getParam('numAngles') == '0'
+    assert reloaded.clear_cmd('clear dataType')
+    assert reloaded.data_type == reloaded.UNSPECIFIED
+    assert reloaded.clear_cmd('clear not_a_parameter') == False
+
+def test_memory_overheads_file_is_opt_in(tmp_path):
+    lctserver = make_server(tmp_path)
+    assert lctserver.memory_accountant.overheads_file is None
+    assert lctserver.getParam('memory_overheads_file') == ''
+    lctserver.parameters.apply(lctserver, [('memory_overheads_file', 'overheads.json')], False)
+    assert lctserver.memory_accountant.overheads_file == os.path.join(str(tmp_path), 'overheads.json')
+    assert lctserver.clear_cmd('clear memory_overheads_file')
+    assert lctserver.memory_accountant.overheads_file is None
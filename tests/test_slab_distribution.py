@@ -0,0 +1,28 @@
+import os
+from slab_distribution import LocalTransport
+
+
+def test_local_transport_map(tmp_path):
+    parameter_file = os.path.join(str(tmp_path), 'scan.txt')
+    with open(parameter_file, 'w') as f:
+        f.write('path = ' + str(tmp_path) + '\n')
+        f.write('numX = 32\nnumY = 32\nnumZ = 8\n')
+
+    # a trivial task: each worker loads the parameter file and saves the parameters of its slab
+    tasks = []
+    for n in range(4):
+        tasks.append({'index': n, 'slices': [2*n, 2*n+1], 'operation': 'zslice_processing', 'algorithm': 'save_parameters',
+                      'kwargs': {'fileName': 'slab_' + str(n) + '.txt'}, 'parameter_file': parameter_file, 'outputDir': 'slabs',
+                      'output_file': os.path.join('slabs', 'zslice.tif'), 'max_CPU_memory_usage': 1.0})
+    results = {}
+    def callback(task, result):
+        results[task['index']] = result
+    LocalTransport(numWorkers=2).map(tasks, callback)
+
+    assert sorted(results.keys()) == [0, 1, 2, 3]
+    for n in range(4):
+        assert results[n]['success'], results[n]['error']
+        assert results[n]['slices'] == [2*n, 2*n+1]
+        assert os.path.isfile(os.path.join(str(tmp_path), 'slabs', 'slab_' + str(n) + '.txt'))
+    with open(os.path.join(str(tmp_path), 'slabs', 'geometry.txt'), 'r') as f:
+        assert 'numZ = 8' in f.read()